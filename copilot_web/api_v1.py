@@ -0,0 +1,395 @@
+"""
+api_v1.py - Versioned JSON API over loaded schedule data (/api/v1).
+
+/context and /context-debug only return prompt text, so Power BI and internal
+tools had to scrape it. These endpoints expose the same data as rows:
+
+  GET /api/v1/projects
+  GET /api/v1/projects/<slug>                    snapshots, data dates, health, data version
+  GET /api/v1/projects/<slug>/activities         ?snapshot=current|previous|baseline|<update label>
+  GET /api/v1/projects/<slug>/milestones
+  GET /api/v1/projects/<slug>/variance           ?comparison=previous|baseline
+  GET /api/v1/projects/<slug>/critical-path      ?activity=<name or ID>
+  GET /api/v1/projects/<slug>/risks
+
+Every list endpoint accepts:
+  fields=id,name,finish           projection (unknown fields → 400)
+  filter=critical:eq:true         repeatable; ops eq ne lt le gt ge contains in (a|b|c)
+  limit=100                       page size (max 1000)
+  cursor=<next_cursor>            opaque; bound to the data version and query
+
+Responses carry an ETag derived from the project data version — the file
+fingerprint the in-memory schedule state was built from
+(project_loader.get_loaded_version) — plus the query, so If-None-Match returns
+304 until a reload picks up an upload or edit. A cursor from an older
+data version is rejected with 409 so pages are never stitched across versions.
+Rows for each (project, version, dataset) are built once and memoized.
+"""
+
+import json
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from flask import Blueprint, jsonify, make_response, request
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint("api_v1", __name__, url_prefix="/api/v1")
+
+API_VERSION = 1
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+_ROLES = ("current", "previous", "baseline")
+_FILTER_OPS = ("eq", "ne", "lt", "le", "gt", "ge", "contains", "in")
+
+_datasets: "OrderedDict[tuple, List[dict]]" = OrderedDict()   # (slug, version, dataset, variant) → rows
+_DATASET_CACHE_MAX = 64
+_lock = threading.Lock()
+
+
+class ApiError(Exception):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+@bp.errorhandler(ApiError)
+def _api_error(e: ApiError):
+    return jsonify({"error": str(e)}), e.status
+
+
+# ---------------------------------------------------------------------------
+# Dataset builders — plain JSON rows, memoized per data version
+# ---------------------------------------------------------------------------
+
+def _facts(slug: str) -> dict:
+    from project_loader import get_schedule_facts
+    facts = get_schedule_facts(slug)
+    if not facts:
+        raise ApiError(f"No schedule loaded for project '{slug}'", 404)
+    return facts
+
+
+def _json_rows(rows: List[dict]) -> List[dict]:
+    """Dates → ISO strings so rows serialize and compare the same way everywhere."""
+    out = []
+    for r in rows:
+        out.append({k: (v.isoformat() if hasattr(v, "isoformat") else v) for k, v in r.items()})
+    return out
+
+
+def _snapshot_tasks(slug: str, snapshot: str):
+    if snapshot in _ROLES:
+        key = {"current": "tasks", "previous": "previous_tasks", "baseline": "baseline_tasks"}[snapshot]
+        tasks = _facts(slug).get(key)
+        if tasks is None:
+            raise ApiError(f"Project '{slug}' has no {snapshot} snapshot loaded", 404)
+        return tasks
+    try:
+        import schedule_db
+        stored = schedule_db.get_snapshot(slug, snapshot)
+    except ImportError:
+        stored = None
+    if stored is None:
+        raise ApiError(f"Unknown snapshot '{snapshot}' for project '{slug}'", 404)
+    return stored["tasks"]
+
+
+def _build_activities(slug: str, snapshot: str) -> List[dict]:
+    from portfolio_store import normalize_tasks
+    return _json_rows(normalize_tasks(_snapshot_tasks(slug, snapshot)))
+
+
+def _build_milestones(slug: str, _variant: str) -> List[dict]:
+    from schedule_tools import get_milestone_trend
+    _facts(slug)
+    return get_milestone_trend(slug).get("milestones", [])
+
+
+def _build_variance(slug: str, comparison: str) -> List[dict]:
+    from variance_engine import compute_variance
+    facts = _facts(slug)
+    other = facts.get("previous_tasks" if comparison == "previous" else "baseline_tasks")
+    if not facts.get("tasks") or not other:
+        raise ApiError(f"Project '{slug}' has no {comparison} snapshot to compare against", 404)
+    variance = compute_variance(current_tasks=facts["tasks"], previous_tasks=other,
+                                label_current=facts.get("current_label") or "Current",
+                                label_previous=facts.get("previous_label") if comparison == "previous" else "Baseline")
+    rows = []
+    for phase, data in (variance.get("phases") or {}).items():
+        for direction in ("slipped", "accelerated"):
+            for item in data.get(direction) or []:
+                rows.append({"direction": direction, **item, "phase": item.get("phase") or phase})
+    rows.sort(key=lambda r: (-(r.get("finish_delta") or 0), r.get("name") or ""))
+    return rows
+
+
+def _build_critical_path(slug: str, activity: str) -> List[dict]:
+    from schedule_tools import get_critical_path
+    _facts(slug)
+    result = get_critical_path(slug, activity or None)
+    if result.get("error"):
+        raise ApiError(result["error"], 404)
+    return [{"position": i, **row} for i, row in enumerate(result.get("chain", []))]
+
+
+def _build_risks(slug: str, _variant: str) -> List[dict]:
+    from risk_engine import run_risk_diagnostics
+    from datetime import date
+    facts = _facts(slug)
+    data_date = None
+    if facts.get("data_date"):
+        try:
+            data_date = date.fromisoformat(str(facts["data_date"])[:10])
+        except ValueError:
+            pass
+    risk = run_risk_diagnostics(tasks=facts.get("tasks") or [], relationships=list(facts.get("relationships") or []),
+                                data_date=data_date)
+    rows = []
+    for category in ("schedule_health", "schedule_detail", "constructability"):
+        for finding in risk.get(category) or []:
+            rows.append({"category": category, **finding})
+    return rows
+
+
+_BUILDERS: Dict[str, Callable[[str, str], List[dict]]] = {
+    "activities": _build_activities,
+    "milestones": _build_milestones,
+    "variance": _build_variance,
+    "critical-path": _build_critical_path,
+    "risks": _build_risks,
+}
+
+
+def _data_version(slug: str) -> str:
+    from project_loader import get_loaded_version
+    version = get_loaded_version(slug)
+    if not version:
+        raise ApiError(f"Unknown project '{slug}'", 404)
+    return version
+
+
+def _dataset(slug: str, version: str, name: str, variant: str) -> List[dict]:
+    key = (slug, version, name, variant)
+    with _lock:
+        rows = _datasets.get(key)
+        if rows is not None:
+            _datasets.move_to_end(key)
+            return rows
+    rows = _BUILDERS[name](slug, variant)
+    if _data_version(slug) != version:
+        return rows  # reloaded while building — don't file newer rows under the old version
+    with _lock:
+        _datasets[key] = rows
+        while len(_datasets) > _DATASET_CACHE_MAX:
+            _datasets.popitem(last=False)
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# Projection / filters / cursor / ETag
+# ---------------------------------------------------------------------------
+
+def _known_fields(rows: List[dict]) -> List[str]:
+    seen: Dict[str, None] = {}
+    for r in rows[:200]:
+        for k in r:
+            seen.setdefault(k, None)
+    return list(seen)
+
+
+def _coerce(sample, raw: str):
+    if isinstance(sample, bool):
+        if raw.lower() not in ("true", "false", "1", "0"):
+            raise ApiError(f"Expected true/false, got '{raw}'")
+        return raw.lower() in ("true", "1")
+    if isinstance(sample, (int, float)):
+        try:
+            return float(raw)
+        except ValueError:
+            raise ApiError(f"Expected a number, got '{raw}'")
+    return raw
+
+
+def _parse_filters(specs: List[str], rows: List[dict], fields: List[str]) -> List[Callable[[dict], bool]]:
+    preds = []
+    for spec in specs:
+        parts = spec.split(":", 2)
+        if len(parts) != 3 or parts[1] not in _FILTER_OPS:
+            raise ApiError(f"Bad filter '{spec}' — use field:op:value with op in {', '.join(_FILTER_OPS)}")
+        field, op, raw = parts
+        if field not in fields:
+            raise ApiError(f"Unknown filter field '{field}'")
+        sample = next((r.get(field) for r in rows if r.get(field) is not None), "")
+        if op == "in":
+            wanted = {_coerce(sample, v) for v in raw.split("|")}
+            preds.append(lambda r, f=field, w=wanted: r.get(f) in w)
+        elif op == "contains":
+            needle = raw.lower()
+            preds.append(lambda r, f=field, n=needle: n in str(r.get(f) or "").lower())
+        else:
+            value = _coerce(sample, raw)
+            cmp = {
+                "eq": lambda a, b: a == b, "ne": lambda a, b: a != b,
+                "lt": lambda a, b: a < b, "le": lambda a, b: a <= b,
+                "gt": lambda a, b: a > b, "ge": lambda a, b: a >= b,
+            }[op]
+            if op in ("eq", "ne"):
+                preds.append(lambda r, f=field, v=value, c=cmp: c(r.get(f), v))
+            else:
+                # Ordering comparisons skip rows with no value (e.g. no finish date)
+                preds.append(lambda r, f=field, v=value, c=cmp: r.get(f) not in (None, "") and c(r.get(f), v))
+    return preds
+
+
+def _encode_cursor(state: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> dict:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ApiError("Malformed cursor")
+
+
+def _not_modified(etag: str):
+    resp = make_response("", 304)
+    resp.set_etag(etag)
+    return resp
+
+
+def _list_response(slug: str, name: str, variant: str, extra: Optional[dict] = None):
+    version = _data_version(slug)
+    args = request.args
+    query_sig = hashlib.sha256(json.dumps(
+        [name, variant, args.get("fields", ""), sorted(args.getlist("filter"))]).encode()).hexdigest()[:12]
+    try:
+        limit = max(1, min(int(args.get("limit", DEFAULT_LIMIT)), MAX_LIMIT))
+    except ValueError:
+        raise ApiError("limit must be an integer")
+    offset = 0
+    if args.get("cursor"):
+        state = _decode_cursor(args["cursor"])
+        if state.get("v") != version:
+            raise ApiError("Cursor refers to an older version of this project's data — restart from the first page", 409)
+        if state.get("q") != query_sig:
+            raise ApiError("Cursor was issued for a different query")
+        offset = int(state.get("o", 0))
+
+    etag = hashlib.sha256(f"{API_VERSION}|{version}|{query_sig}|{offset}|{limit}".encode()).hexdigest()[:32]
+    if request.if_none_match and request.if_none_match.contains(etag):
+        return _not_modified(etag)
+
+    rows = _dataset(slug, version, name, variant)
+    fields = _known_fields(rows)
+    preds = _parse_filters(args.getlist("filter"), rows, fields)
+    selected = [r for r in rows if all(p(r) for p in preds)] if preds else rows
+    wanted = [f.strip() for f in args.get("fields", "").split(",") if f.strip()]
+    unknown = [f for f in wanted if f not in fields]
+    if unknown and rows:
+        raise ApiError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(fields)}")
+
+    page = selected[offset:offset + limit]
+    if wanted:
+        page = [{f: r.get(f) for f in wanted} for r in page]
+    next_offset = offset + limit
+    body = {
+        "api_version": API_VERSION,
+        "project": slug,
+        "dataset": name,
+        **(extra or {}),
+        "data_version": version,
+        "fields": wanted or fields,
+        "total": len(selected),
+        "count": len(page),
+        "items": page,
+        "next_cursor": _encode_cursor({"v": version, "q": query_sig, "o": next_offset})
+                       if next_offset < len(selected) else None,
+    }
+    resp = jsonify(body)
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+# ---------------------------------------------------------------------------
+# Routes
+# ---------------------------------------------------------------------------
+
+@bp.route("/projects", methods=["GET"])
+def projects():
+    from project_loader import list_projects, has_schedule, get_loaded_version
+    return jsonify({
+        "api_version": API_VERSION,
+        "projects": [{"slug": p["slug"], "display_name": p["display_name"], "type": p["type"],
+                      "has_schedule": has_schedule(p["slug"]), "data_version": get_loaded_version(p["slug"]) or None}
+                     for p in list_projects()],
+    })
+
+
+@bp.route("/projects/<slug>", methods=["GET"])
+def project(slug):
+    from project_loader import get_project_health
+    version = _data_version(slug)
+    etag = hashlib.sha256(f"{API_VERSION}|{version}|project".encode()).hexdigest()[:32]
+    if request.if_none_match and request.if_none_match.contains(etag):
+        return _not_modified(etag)
+    facts = _facts(slug)
+    snapshots = {role: facts.get(key) is not None for role, key in
+                 (("current", "tasks"), ("previous", "previous_tasks"), ("baseline", "baseline_tasks"))}
+    try:
+        import schedule_db
+        stored = [s["label"] for s in schedule_db.list_snapshots(slug)]
+    except ImportError:
+        stored = []
+    resp = jsonify({
+        "api_version": API_VERSION,
+        "project": slug,
+        "project_name": facts.get("project_name"),
+        "data_version": version,
+        "data_date": facts.get("data_date"),
+        "current_label": facts.get("current_label"),
+        "previous_label": facts.get("previous_label"),
+        "snapshots": [role for role, loaded in snapshots.items() if loaded],
+        "stored_updates": stored,
+        "health": get_project_health(slug),
+        "datasets": sorted(_BUILDERS),
+    })
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+@bp.route("/projects/<slug>/activities", methods=["GET"])
+def activities(slug):
+    snapshot = request.args.get("snapshot", "current")
+    return _list_response(slug, "activities", snapshot, {"snapshot": snapshot})
+
+
+@bp.route("/projects/<slug>/milestones", methods=["GET"])
+def milestones(slug):
+    return _list_response(slug, "milestones", "")
+
+
+@bp.route("/projects/<slug>/variance", methods=["GET"])
+def variance(slug):
+    comparison = request.args.get("comparison", "previous")
+    if comparison not in ("previous", "baseline"):
+        raise ApiError("comparison must be 'previous' or 'baseline'")
+    return _list_response(slug, "variance", comparison, {"comparison": comparison})
+
+
+@bp.route("/projects/<slug>/critical-path", methods=["GET"])
+def critical_path(slug):
+    activity = (request.args.get("activity") or "").strip()
+    return _list_response(slug, "critical-path", activity, {"activity": activity or None})
+
+
+@bp.route("/projects/<slug>/risks", methods=["GET"])
+def risks(slug):
+    return _list_response(slug, "risks", "")
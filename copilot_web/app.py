@@ -7,6 +7,7 @@ import threading
 import time
 import logging
 import tempfile
+import hashlib
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -22,6 +23,11 @@ app.secret_key = os.getenv("SECRET_KEY", "dev-secret-change-in-production")
 app.permanent_session_lifetime = 28800  # 8 hours in seconds
 _APP_PASSWORD = os.getenv("APP_PASSWORD", "")
 
+# Path prefixes of JSON endpoints: unauthenticated calls get a 401, not a login
+# redirect. Features append their own prefix next to their routes.
+_API_PREFIXES = ["/chat", "/upload", "/docs", "/projects", "/context", "/scrape", "/screenshot",
+                 "/health"]
+
 def require_auth(f):
     """Decorator that redirects unauthenticated requests to /login."""
     @wraps(f)
@@ -31,9 +37,7 @@ def require_auth(f):
             return f(*args, **kwargs)
         if not session.get("authenticated"):
             # API endpoints return 401; browser routes redirect to login
-            if request.path.startswith(("/chat", "/upload", "/docs", "/projects",
-                                        "/context", "/scrape", "/screenshot",
-                                        "/health")):
+            if request.path.startswith(tuple(_API_PREFIXES)):
                 return jsonify({"error": "Unauthorized"}), 401
             return redirect(url_for("login"))
         return f(*args, **kwargs)
@@ -45,11 +49,32 @@ def allow_iframe(response):
     response.headers["Content-Security-Policy"] = "frame-ancestors *"
     return response
 
-def get_client():
+# Shared keep-alive client + fair concurrency limiter (see llm_pool.py)
+try:
+    from llm_pool import get_limited_client, get_stats as get_llm_pool_stats, LLMQueueTimeout
+except ImportError as _lpe:
+    logger.warning(f"LLM pool not available: {_lpe}")
+    get_limited_client = None
+    def get_llm_pool_stats(): return {}
+    class LLMQueueTimeout(Exception): pass
+
+def _client_user_id():
+    """Per-browser-session id used for per-user LLM concurrency limits."""
+    from flask import has_request_context
+    if not has_request_context():
+        return None
+    if "client_id" not in session:
+        import uuid
+        session["client_id"] = uuid.uuid4().hex[:12]
+    return session["client_id"]
+
+def get_client(project_slug=None):
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         return None
-    return openai.OpenAI(api_key=api_key)
+    if get_limited_client is not None:
+        return get_limited_client(project=project_slug, user=_client_user_id())
+    return openai.OpenAI(api_key=api_key, base_url=os.getenv("OPENAI_BASE_URL") or None)
 
 SYSTEM_BASE = """You are Stelic Copilot — operating in the role of an expert project controls engineer with over 25 years of experience reviewing construction schedules, identifying risk, and advising owners and contractors on schedule performance.
 You specialize in Primavera P6, Microsoft Project, critical path methodology, schedule variance analysis, DCMA diagnostics, and construction sequencing logic.
@@ -80,7 +105,8 @@ You are equipped with the following data sources. Use all of them proactively wh
 SCHEDULE COMPRESSION PDF DATA — USER UPLOAD WORKFLOW:
 - Compression reports from the Schedule Validator are NOT automatically loaded at startup (to avoid build delays).
 - If the user asks about compression %, schedule compression analysis, or remaining work compression, and you see "COMPRESSION REPORT — VERIFIED" in the context, use that data.
-- If you do NOT see compression data in the context, tell the user: "I don't have compression data for this project yet. Please upload the Schedule Compression PDF from the validator and I'll analyze it for you."
+- If there is no verified PDF but you see "REMAINING WORK COMPRESSION (computed from schedule data" in the context, use that computed % and monthly activity-days table, and say it was computed from the schedule files.
+- If you see neither, tell the user: "I don't have compression data for this project yet. Please upload the Schedule Compression PDF from the validator and I'll analyze it for you."
 - When a user uploads a compression PDF, it is cached and associated with the project update number, making it available for future reference and comparisons.
 - Historical compression data across multiple updates is stored and can be referenced for trend analysis.
 
@@ -241,10 +267,11 @@ EXAMPLE CP SHIFT RESPONSE (match this tone):
 "The critical path has shifted from the prior path led by [Prior Lead Activity] to a current turnover-driven path now led by [Current Lead Activity], continuing through [mid activities] and closing at [end activity]. This shift appears to reflect [genuine completion of prior work / a logic revision / float erosion on the new path] — assess whether the new sequence is supported by field conditions."
 
 SCHEDULE COMPRESSION ANALYSIS — HOW TO HANDLE:
-The context may contain two compression sources — use them in this priority order:
+The context may contain several compression sources — use them in this priority order:
 1. "COMPRESSION REPORT — VERIFIED (Schedule Validator)" block — human-verified output. This is the authoritative source for compression %. Always use these numbers. Do not override with computed estimates.
 2. "COMPRESSION HISTORY (prior updates)" block — headline numbers from prior compression PDFs. Use for trend narrative across updates.
-3. "SCHEDULE COMPRESSION ANALYSIS (Current vs Previous)" block — computed estimate. Use only if no verified PDF is available, or as supporting context for density/span change detail.
+3. "REMAINING WORK COMPRESSION (computed from schedule data — monthly activity days)" block — same metric and monthly table as the validator, computed natively from the current and previous schedules. Use when no verified PDF is available. If a CROSS-CHECK line says it differs from the PDF, the PDF wins.
+4. "SCHEDULE COMPRESSION ANALYSIS (Current vs Previous)" block — span/density estimate. Use only as supporting context for density/span change detail.
 
 When asked about compression ("is the schedule compressed?", "is the contractor tightening durations on paper?", "is work being pushed together?", "compression report"):
 - Lead with the verified PDF compression % if available. State it as the confirmed figure.
@@ -508,6 +535,9 @@ This is the raw predecessor network. Use it to:
    Step 6: Report: "[Activity X] slipped [N] calendar days because its predecessor [Activity Y] finished [N] days late, driven by [root cause activity]."
 3. ANSWER ACTIVITY-SPECIFIC CP QUESTIONS:
    "What drives [Activity X]?" → Look up X in RELATIONSHIPS, find predecessors, report names and float.
+When the RELATIONSHIPS block is not in the context, the same steps are available through the schedule
+tools: get_predecessors / get_successors walk the network (with finish and float per link),
+get_activity_variance gives an activity's movement, and get_critical_path traces to any activity.
 
 CP WARNING HANDLING:
 If the CRITICAL PATH CHAIN block contains a CP WARNING (chain depth ≤ 2 or disconnected milestone):
@@ -533,13 +563,12 @@ Each milestone row in the STANDARDIZED MILESTONES block now includes a pre-compu
 
 SCRAPER_AVAILABLE = False
 try:
-    from scraper import load_context, scrape_and_extract
+    from scraper import load_context
     SCRAPER_AVAILABLE = True
     logger.info("Scraper module loaded successfully.")
 except ImportError:
     logger.warning("Scraper module not available — running without auto-context.")
     def load_context(): return ""
-    def scrape_and_extract(): return {}
 
 MPP_AVAILABLE = False
 try:
@@ -554,17 +583,75 @@ except Exception as _e:
     MPPParser = None
 
 try:
-    from project_loader import load_all_projects, get_project_context, list_projects, has_schedule, update_milestone_prior_dates
+    from project_loader import (load_all_projects, reload_project, get_project_context, list_projects,
+                                has_schedule, update_milestone_prior_dates, PROJECTS_DIR)
     load_all_projects()
     logger.info("Project buckets loaded.")
 except Exception as _pe:
     logger.warning(f"Project loader not available: {_pe}")
     def load_all_projects(): pass
-    def get_project_context(slug, page=None): return ""
+    def reload_project(slug, force=False): return False
+    PROJECTS_DIR = os.path.join(_here, "projects")
+    def get_project_context(slug, page=None, compact=False): return ""
     def list_projects(): return []
     def has_schedule(slug): return False
     def update_milestone_prior_dates(slug): return 0
 
+try:
+    from project_loader import get_schedule_facts
+    from local_answers import answer_question, get_stats as get_local_answer_stats
+except Exception as _lae:
+    logger.warning(f"Local answer engine not available: {_lae}")
+    def get_schedule_facts(slug): return None
+    def answer_question(question, facts): return None
+    def get_local_answer_stats(): return {}
+
+try:
+    from project_loader import get_project_version
+    import response_cache
+    RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "1") != "0"
+except Exception as _rce:
+    logger.warning(f"Response cache not available: {_rce}")
+    RESPONSE_CACHE_ENABLED = False
+
+IMAGE_DESCRIBE_PROMPT = (
+    "You are a project controls analyst. Describe this image in detail as it relates to construction schedule management. "
+    "Extract all visible text, dates, milestone names, activity names, percentages, and any schedule data. "
+    "If this is a dashboard screenshot, list every milestone name and date visible. "
+    "If this is a chart or graph, describe what it shows including axis labels and values. "
+    "Be thorough — this description will be used as reference data for schedule analysis."
+)
+
+try:
+    from image_prep import describe_image, prepare_data_url, get_stats as get_vision_cache_stats
+except Exception as _ipe:
+    logger.warning(f"Image preprocessing not available: {_ipe}")
+    def describe_image(client, data, prompt, model="gpt-4o", max_distance=0, label="image", **create_kwargs):
+        import base64
+        b64 = base64.b64encode(data).decode("utf-8")
+        resp = client.chat.completions.create(model=model, messages=[{"role": "user", "content": [
+            {"type": "text", "text": prompt},
+            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}", "detail": "high"}}]}],
+            **create_kwargs)
+        return resp.choices[0].message.content, False
+    def prepare_data_url(data_url): return data_url, None
+    def get_vision_cache_stats(): return {}
+
+try:
+    from conversation import compact_history, get_stats as get_conversation_stats
+except Exception as _cve:
+    logger.warning(f"Conversation compaction not available: {_cve}")
+    def compact_history(client, session_id, conversation_id, messages, history_offset=0, slug=None):
+        return messages, {}
+    def get_conversation_stats(): return {}
+
+try:
+    from schedule_tools import run_tool_loop, TOOLS_PROMPT_NOTE
+    SCHEDULE_TOOLS_ENABLED = os.getenv("SCHEDULE_TOOLS", "1") != "0"
+except Exception as _ste:
+    logger.warning(f"Schedule tools not available: {_ste}")
+    SCHEDULE_TOOLS_ENABLED = False
+
 try:
     from tracker_loader import load_tracker
     load_tracker()
@@ -573,35 +660,38 @@ except Exception as _te:
     logger.warning(f"Tracker loader not available: {_te}")
     def load_tracker(): pass
 
-# Pre-build portfolio summary once at startup — not per-request
-_PORTFOLIO_CTX = ""
+# Portfolio summary — tracker_loader memoizes it and rebuilds only when the
+# tracker CSV or a project's health changes, so it is safe to call per request.
 try:
     from tracker_loader import get_portfolio_summary
-    _sched_flags = {p["slug"]: has_schedule(p["slug"]) for p in list_projects()}
-    _PORTFOLIO_CTX = get_portfolio_summary(_sched_flags)
-    logger.info("Portfolio summary cached.")
+    logger.info(f"Portfolio summary ready ({len(get_portfolio_summary())} chars).")
 except Exception as _pfe:
-    logger.warning(f"Portfolio summary cache failed: {_pfe}")
+    logger.warning(f"Portfolio summary not available: {_pfe}")
+    def get_portfolio_summary(schedule_flags=None): return ""
+
+
+def _portfolio_ctx() -> str:
+    try:
+        return get_portfolio_summary()
+    except Exception as e:
+        logger.warning(f"Portfolio summary failed: {e}")
+        return ""
 
 
 # ---------------------------------------------------------------------------
 # PROJECT-SCOPED DOCUMENT MEMORY
 # ---------------------------------------------------------------------------
-# In-memory store: { slug: [ {filename, label, content, timestamp}, ... ] }
-# Persisted to copilot_web/projects/{slug}/user_docs.json on every write.
-# Loaded from disk at startup so docs survive server restarts.
+# Per-project append-only store: copilot_web/projects/{slug}/user_docs.log
+# (one encrypted record per upload/delete) + user_docs.idx (metadata index).
+# Startup reads only the index; document bodies are read on demand.
+# Legacy user_docs.json files are migrated on first open — see doc_store.py.
 # ---------------------------------------------------------------------------
 
-_project_docs: dict = {}  # slug -> list of doc dicts
-
-def _docs_path(slug: str) -> str:
-    """Path to the user_docs.json file for a project."""
-    here = os.path.dirname(os.path.abspath(__file__))
-    return os.path.join(here, "projects", slug, "user_docs.json")
+from doc_store import get_store as _doc_store, has_docs as _has_stored_docs
 
 # Import encryption helpers (graceful no-op if cryptography not installed or key not set)
 try:
-    from crypto import read_encrypted_json, write_encrypted_json, write_encrypted_bytes, read_encrypted_bytes, is_enabled as _crypto_enabled
+    from crypto import read_encrypted_json, write_encrypted_json, write_encrypted_bytes, read_encrypted_bytes, encrypt_file, is_enabled as _crypto_enabled
 except ImportError:
     def read_encrypted_json(path):
         with open(path, "r", encoding="utf-8") as f: return json.load(f)
@@ -611,31 +701,45 @@ except ImportError:
         with open(path, "wb") as f: f.write(data)
     def read_encrypted_bytes(path):
         with open(path, "rb") as f: return f.read()
+    def encrypt_file(src_path, dst_path):
+        import shutil; shutil.copyfile(src_path, dst_path)
     def _crypto_enabled(): return False
 
-def _load_project_docs(slug: str) -> list:
-    """Load persisted docs from disk for a project slug (decrypts if ENCRYPTION_KEY is set)."""
-    path = _docs_path(slug)
-    if os.path.exists(path):
-        try:
-            return read_encrypted_json(path)
-        except Exception:
-            pass
-    return []
-
-def _save_project_docs(slug: str):
-    """Persist in-memory docs to disk for a project slug (encrypts if ENCRYPTION_KEY is set)."""
-    path = _docs_path(slug)
+# Passage retrieval over uploaded docs (falls back to full injection if unavailable)
+try:
+    from doc_index import build_docs_context as _build_docs_context, sync as _sync_doc_index, drop as _drop_doc_index
+except ImportError:
+    _build_docs_context = None
+    def _sync_doc_index(slug, docs): return (0, 0)
+    def _drop_doc_index(slug): pass
+
+def _project_docs(slug: str) -> list:
+    """Live documents for a project (lazy StoredDoc mappings, upload order)."""
+    if not _has_stored_docs(slug):
+        return []
+    return _doc_store(slug).docs()
+
+def _sync_project_docs_index(slug: str):
+    """Bring the passage retrieval index in line with the store after a write."""
     try:
-        write_encrypted_json(path, _project_docs.get(slug, []))
+        _sync_doc_index(slug, _project_docs(slug))
     except Exception as e:
-        logger.warning(f"[{slug}] Could not persist user_docs: {e}")
+        logger.warning(f"[{slug}] Could not update doc index: {e}")
 
-def _get_project_docs_context(slug: str) -> str:
-    """Build the USER-PROVIDED DOCUMENTS context block for a project."""
-    docs = _project_docs.get(slug, [])
+def _get_project_docs_context(slug: str, query: str = "") -> str:
+    """
+    Build the USER-PROVIDED DOCUMENTS context block for a project. Once a
+    project's documents outgrow a single prompt, only the passages matching
+    `query` (the latest user message) are included — see doc_index.py.
+    """
+    docs = _project_docs(slug)
     if not docs:
         return ""
+    if _build_docs_context is not None:
+        try:
+            return _build_docs_context(slug, docs, query)
+        except Exception as e:
+            logger.warning(f"[{slug}] Doc retrieval failed, injecting full documents: {e}")
     lines = ["=== USER-PROVIDED DOCUMENTS ===",
              "These files were manually uploaded by the user for this project.",
              "Use them as supplementary context — they may contain dashboard screenshots, notes, milestone clarifications, or other reference material.",
@@ -652,16 +756,16 @@ def _get_project_docs_context(slug: str) -> str:
         lines.append("")
     return "\n".join(lines)
 
-# Pre-load all project docs from disk at startup
+# Open every project's doc store at startup (index only — bodies stay on disk)
 try:
     _here_docs = os.path.dirname(os.path.abspath(__file__))
     _proj_dir = os.path.join(_here_docs, "projects")
     if os.path.exists(_proj_dir):
         for _slug in os.listdir(_proj_dir):
-            _loaded = _load_project_docs(_slug)
-            if _loaded:
-                _project_docs[_slug] = _loaded
-                logger.info(f"Loaded {len(_loaded)} user doc(s) for {_slug}")
+            if _has_stored_docs(_slug):
+                _n_docs = len(_doc_store(_slug))
+                if _n_docs:
+                    logger.info(f"Indexed {_n_docs} user doc(s) for {_slug}")
 except Exception as _de:
     logger.warning(f"User docs preload failed: {_de}")
 
@@ -724,35 +828,13 @@ def _parse_uploaded_file(filepath: str, filename: str, client=None) -> str:
             return f"[PDF parse error for {filename}: {e}]"
 
     elif ext in (".png", ".jpg", ".jpeg", ".webp", ".gif"):
-        # Use GPT-4o Vision to describe the image
+        # Use GPT-4o Vision to describe the image (downscaled; repeat images come from the vision cache)
         try:
-            import base64
-            with open(filepath, "rb") as fh:
-                b64 = base64.b64encode(fh.read()).decode("utf-8")
-            mime = {"png": "image/png", "jpg": "image/jpeg", "jpeg": "image/jpeg",
-                    "webp": "image/webp", "gif": "image/gif"}.get(ext.lstrip("."), "image/png")
-            data_url = f"data:{mime};base64,{b64}"
-
             if client:
-                resp = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[{
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": (
-                                "You are a project controls analyst. Describe this image in detail as it relates to construction schedule management. "
-                                "Extract all visible text, dates, milestone names, activity names, percentages, and any schedule data. "
-                                "If this is a dashboard screenshot, list every milestone name and date visible. "
-                                "If this is a chart or graph, describe what it shows including axis labels and values. "
-                                "Be thorough — this description will be used as reference data for schedule analysis."
-                            )},
-                            {"type": "image_url", "image_url": {"url": data_url, "detail": "high"}}
-                        ]
-                    }],
-                    max_tokens=1500,
-                    timeout=30
-                )
-                description = resp.choices[0].message.content
+                with open(filepath, "rb") as fh:
+                    raw = fh.read()
+                description, _ = describe_image(client, raw, IMAGE_DESCRIBE_PROMPT, label=filename,
+                                                max_tokens=1500, timeout=30)
                 return f"[Image: {filename}]\n{description}"
             else:
                 # No client — store the raw base64 reference for later vision use
@@ -763,22 +845,43 @@ def _parse_uploaded_file(filepath: str, filename: str, client=None) -> str:
     else:
         return f"[Unsupported file type: {ext}. Supported: .mpp, .xml, .xer, .csv, .txt, .md, .docx, .pdf, .png, .jpg, .jpeg, .webp]"
 
-def background_scraper(interval_seconds=1800):
-    """Runs scraper every interval_seconds (default 30 min) in a background thread."""
-    if not SCRAPER_AVAILABLE:
-        return
-    time.sleep(10)
-    while True:
-        try:
-            logger.info("Background scraper: starting scrape cycle...")
-            scrape_and_extract()
-            logger.info("Background scraper: cycle complete.")
-        except Exception as e:
-            logger.error(f"Background scraper error: {e}")
-        time.sleep(interval_seconds)
+# Dashboard scraping runs in one leader per host (scraper_worker.py holds a file
+# lock). SCRAPER_MODE=external (default): a separate, supervised
+# `python scraper_worker.py` process scrapes (see supervisord.conf) and this
+# process only reads the published snapshot. embedded: opt-in for single-process
+# dev — this process competes for the lock and scrapes in a thread if it wins.
+# off: never scrape.
+SCRAPER_MODE = os.getenv("SCRAPER_MODE", "external").lower()
+try:
+    from scraper_worker import run_forever as _scraper_loop, request_scrape, read_status as _scraper_status
+except ImportError:
+    _scraper_loop = None
+    def request_scrape(): raise RuntimeError("scraper worker not available")
+    def _scraper_status(): return {}
+
+if SCRAPER_AVAILABLE and SCRAPER_MODE == "embedded" and _scraper_loop is not None:
+    scraper_thread = threading.Thread(target=_scraper_loop, kwargs={"initial_delay": 10}, daemon=True)
+    scraper_thread.start()
+
+# Files dropped straight into projects/<slug>/ (copied in, synced from a share)
+# are picked up without a restart: project_watcher debounces bursts per slug and
+# reloads only that project on a background worker. PROJECT_WATCH=off disables.
+try:
+    from project_watcher import ProjectWatcher
+except ImportError:
+    ProjectWatcher = None
+
+
+def _watch_reload(slug: str) -> bool:
+    changed = reload_project(slug)
+    if changed:
+        _invalidate_responses(slug)
+    return changed
+
 
-scraper_thread = threading.Thread(target=background_scraper, daemon=True)
-scraper_thread.start()
+project_watcher = ProjectWatcher(PROJECTS_DIR, reload_fn=_watch_reload) if ProjectWatcher else None
+if project_watcher is not None:
+    project_watcher.start()
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
@@ -834,24 +937,29 @@ def context_debug(slug):
     Use this to diagnose why the agent missed a milestone, ignored a PDF, or produced
     a shallow CP chain. Shows every block: SYSTEM_BASE, portfolio context, milestone
     block, CP chain, near-critical table, variance, relationships, verify/variance/
-    compression PDFs, and user-uploaded documents.
+    compression PDFs, and user-uploaded documents. ?q=<question> shows which
+    document passages that question would pull in.
     """
     page_view = request.args.get("page", None)
+    compact = request.args.get("compact", "0") == "1"
 
     system = SYSTEM_BASE
 
-    if _PORTFOLIO_CTX:
-        system += f"\n\n{_PORTFOLIO_CTX}"
+    portfolio_ctx = _portfolio_ctx()
+    if portfolio_ctx:
+        system += f"\n\n{portfolio_ctx}"
 
     dashboard_context = load_context()
     if dashboard_context:
         system += f"\n\n{dashboard_context}"
 
-    proj_ctx = get_project_context(slug, page_view)
+    proj_ctx = get_project_context(slug, page_view, compact=compact)
     if proj_ctx:
         system += f"\n\n{proj_ctx}"
+    if compact and SCHEDULE_TOOLS_ENABLED:
+        system += f"\n\n{TOOLS_PROMPT_NOTE}"
 
-    docs_ctx = _get_project_docs_context(slug)
+    docs_ctx = _get_project_docs_context(slug, request.args.get("q", ""))
     if docs_ctx:
         system += f"\n\n{docs_ctx}"
 
@@ -876,6 +984,7 @@ def context_debug(slug):
     return jsonify({
         "project_slug": slug,
         "page_view": page_view,
+        "compact": compact,
         "total_chars": len(system),
         "estimated_tokens": len(system) // 4,
         "blocks": blocks_present,
@@ -892,6 +1001,153 @@ def get_projects():
         p["has_schedule"] = has_schedule(p["slug"])
     return jsonify({"projects": projects})
 
+_API_PREFIXES.append("/search/")
+
+@app.route("/search/<slug>", methods=["GET"])
+@require_auth
+def search_activities(slug):
+    """
+    Ranked activity lookup by partial name or activity ID across the loaded
+    snapshots of a project. Query params: q (required), snapshot
+    (current|previous|baseline, default all), limit (default 10, max 50).
+    """
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify({"error": "Missing query parameter 'q'"}), 400
+    snapshot = request.args.get("snapshot") or None
+    if snapshot and snapshot not in ("current", "previous", "baseline"):
+        return jsonify({"error": f"Unknown snapshot '{snapshot}'"}), 400
+    try:
+        limit = max(1, min(int(request.args.get("limit", 10)), 50))
+    except ValueError:
+        limit = 10
+    try:
+        from search_index import search
+    except ImportError:
+        return jsonify({"error": "Search index not available"}), 503
+    t0 = time.perf_counter()
+    results = search(slug, query, snapshot=snapshot, limit=limit)
+    return jsonify({
+        "project_slug": slug,
+        "query": query,
+        "snapshot": snapshot or "all",
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 3),
+        "results": results,
+    })
+
+_API_PREFIXES.append("/local-answers/stats")
+
+@app.route("/local-answers/stats", methods=["GET"])
+@require_auth
+def local_answer_stats():
+    """Hit rate of the local factual-answer engine (questions answered without the LLM)."""
+    return jsonify(get_local_answer_stats())
+
+_API_PREFIXES.append("/llm-pool/stats")
+
+@app.route("/llm-pool/stats", methods=["GET"])
+@require_auth
+def llm_pool_stats():
+    """In-flight / queued LLM calls and queue-wait percentiles."""
+    return jsonify(get_llm_pool_stats())
+
+_API_PREFIXES.append("/response-cache/stats")
+
+@app.route("/response-cache/stats", methods=["GET"])
+@require_auth
+def response_cache_stats():
+    """Hit rate and size of the on-disk copilot reply cache."""
+    if not RESPONSE_CACHE_ENABLED:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **response_cache.get_stats()})
+
+_API_PREFIXES.append("/conversation/stats")
+
+@app.route("/conversation/stats", methods=["GET"])
+@require_auth
+def conversation_stats():
+    """Running-summary compaction of long chat sessions (folds, summary sizes)."""
+    return jsonify(get_conversation_stats())
+
+_API_PREFIXES.append("/vision-cache/stats")
+
+@app.route("/vision-cache/stats", methods=["GET"])
+@require_auth
+def vision_cache_stats():
+    """Vision descriptions served from the image cache instead of a model call."""
+    return jsonify(get_vision_cache_stats())
+
+_API_PREFIXES.append("/portfolio/")
+
+@app.route("/portfolio/stats", methods=["GET"])
+@require_auth
+def portfolio_store_stats():
+    """Snapshots published to the columnar portfolio store and query counters."""
+    try:
+        import portfolio_store
+        return jsonify(portfolio_store.get_stats())
+    except ImportError:
+        return jsonify({"available": False})
+
+# Versioned JSON API (/api/v1) for Power BI and internal tools — same auth as the UI
+try:
+    from api_v1 import bp as api_v1_bp
+
+    @api_v1_bp.before_request
+    @require_auth
+    def _api_v1_auth():
+        return None
+
+    app.register_blueprint(api_v1_bp)
+    _API_PREFIXES.append("/api/")
+except ImportError as _ae:
+    logger.warning(f"JSON API not available: {_ae}")
+
+_API_PREFIXES.append("/schedule-db/stats")
+
+@app.route("/schedule-db/stats", methods=["GET"])
+@require_auth
+def schedule_db_stats():
+    """Row counts of the shared SQLite schedule index and parse-reuse counters."""
+    try:
+        import schedule_db
+        return jsonify(schedule_db.get_stats())
+    except ImportError:
+        return jsonify({"enabled": False})
+
+@app.route("/portfolio/milestone-slips", methods=["GET"])
+@require_auth
+def portfolio_milestone_slips():
+    """
+    Cross-project milestone movement from the portfolio store.
+    ?milestone=substantial&min_days=30&since=2026-10-01&against=prior|baseline
+    """
+    try:
+        import portfolio_store
+    except ImportError:
+        return jsonify({"error": "Portfolio store not available"}), 503
+    if not portfolio_store.available():
+        return jsonify({"error": "Portfolio store not available (pyarrow not installed)"}), 503
+    rows = portfolio_store.milestone_slips(
+        milestone=request.args.get("milestone") or None,
+        min_days=request.args.get("min_days", 0, type=int),
+        since=request.args.get("since") or None,
+        against="baseline" if request.args.get("against") == "baseline" else "prior",
+    )
+    return jsonify({"count": len(rows), "milestones": rows})
+
+_API_PREFIXES.append("/decrypt-cache/stats")
+
+@app.route("/decrypt-cache/stats", methods=["GET"])
+@require_auth
+def decrypt_cache_stats_route():
+    """Hit/miss counters of the in-memory decrypted-file cache (encrypted deployments)."""
+    try:
+        from crypto import decrypt_cache_stats
+        return jsonify({"encryption": _crypto_enabled(), **decrypt_cache_stats()})
+    except ImportError:
+        return jsonify({"encryption": False})
+
 @app.route("/screenshot/<int:page_num>", methods=["GET"])
 @require_auth
 def view_screenshot(page_num):
@@ -935,7 +1191,7 @@ def upload_file():
             tmp_path = tmp.name
 
         # Pass client so images can be described via Vision
-        _client = get_client()
+        _client = get_client(project_slug)
         content = _parse_uploaded_file(tmp_path, f.filename, client=_client)
 
         # --- Auto-snapshot prior dates before a new update_N schedule file is saved ---
@@ -962,14 +1218,14 @@ def upload_file():
                             logger.warning(f"[{project_slug}] prior_update_date snapshot failed: {_snap_e}")
                     # Save the raw file to the project bucket (encrypted if ENCRYPTION_KEY is set)
                     _saved_path = os.path.join(_proj_dir, f.filename)
-                    with open(tmp_path, "rb") as _raw_fh:
-                        _raw_bytes = _raw_fh.read()
-                    write_encrypted_bytes(_saved_path, _raw_bytes)
+                    encrypt_file(tmp_path, _saved_path)
                     _saved_to_disk = True
                     logger.info(f"[{project_slug}] Saved schedule file to project folder: {_saved_path} (encrypted={_crypto_enabled()})")
-                    # Reload all projects so the new file is picked up immediately
+                    # Reload just this project so the new file is picked up immediately
+                    # (the folder watcher then sees an unchanged version and skips it)
                     try:
-                        load_all_projects()
+                        reload_project(project_slug)
+                        _invalidate_responses(project_slug)
                         logger.info(f"[{project_slug}] Project context reloaded after new schedule file upload")
                     except Exception as _rel_e:
                         logger.warning(f"[{project_slug}] Reload after upload failed: {_rel_e}")
@@ -996,13 +1252,11 @@ def upload_file():
                 "content": content,
                 "timestamp": datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC"),
             }
-            if project_slug not in _project_docs:
-                _project_docs[project_slug] = []
-            # Replace existing doc with same filename, or append
-            existing = [d for d in _project_docs[project_slug] if d["filename"] != f.filename]
-            existing.append(doc_entry)
-            _project_docs[project_slug] = existing
-            _save_project_docs(project_slug)
+            # Appends one record; an existing doc with the same filename is superseded
+            store = _doc_store(project_slug)
+            store.put(doc_entry)
+            _sync_project_docs_index(project_slug)
+            _invalidate_responses(project_slug)
             logger.info(f"[{project_slug}] Stored user doc: {f.filename}")
             return jsonify({
                 "status": "stored",
@@ -1010,7 +1264,7 @@ def upload_file():
                 "project_slug": project_slug,
                 "filename": f.filename,
                 "label": label,
-                "doc_count": len(_project_docs[project_slug]),
+                "doc_count": len(store),
                 "preview": content[:300]
             })
         else:
@@ -1031,13 +1285,13 @@ def upload_file():
 @require_auth
 def list_project_docs(slug):
     """List all user-uploaded documents stored for a project."""
-    docs = _project_docs.get(slug, [])
+    docs = _project_docs(slug)
     return jsonify({
         "project_slug": slug,
         "doc_count": len(docs),
         "docs": [{"filename": d["filename"], "label": d["label"],
                   "timestamp": d["timestamp"], "user_note": d.get("user_note", ""),
-                  "preview": d["content"][:200]} for d in docs]
+                  "preview": d["preview"][:200]} for d in docs]
     })
 
 
@@ -1045,36 +1299,63 @@ def list_project_docs(slug):
 @require_auth
 def delete_project_doc(slug, filename):
     """Remove a specific uploaded document from a project's memory."""
-    if slug not in _project_docs:
+    if not _has_stored_docs(slug):
         return jsonify({"error": "Project not found"}), 404
-    before = len(_project_docs[slug])
-    _project_docs[slug] = [d for d in _project_docs[slug] if d["filename"] != filename]
-    _save_project_docs(slug)
-    removed = before - len(_project_docs[slug])
-    return jsonify({"status": "ok", "removed": removed, "remaining": len(_project_docs[slug])})
+    store = _doc_store(slug)
+    removed = 1 if store.delete(filename) else 0
+    if removed:
+        _sync_project_docs_index(slug)
+        _invalidate_responses(slug)
+    return jsonify({"status": "ok", "removed": removed, "remaining": len(store)})
 
 
 @app.route("/docs/<slug>/clear", methods=["POST"])
 @require_auth
 def clear_project_docs(slug):
     """Clear all user-uploaded documents for a project."""
-    _project_docs[slug] = []
-    _save_project_docs(slug)
+    if _has_stored_docs(slug):
+        _doc_store(slug).clear()
+    _drop_doc_index(slug)
+    _invalidate_responses(slug)
     return jsonify({"status": "cleared", "project_slug": slug})
 
 @app.route("/scrape", methods=["POST"])
 @require_auth
 def trigger_scrape():
-    """Manual trigger to force a fresh scrape."""
-    if not SCRAPER_AVAILABLE:
+    """Manual trigger to force a fresh scrape (run by the scraper leader, not this request)."""
+    if SCRAPER_MODE == "off":
         return jsonify({"error": "Scraper not available"}), 503
     try:
-        threading.Thread(target=scrape_and_extract, daemon=True).start()
-        return jsonify({"status": "Scrape triggered in background."})
+        request_scrape()
+        return jsonify({"status": "Scrape requested — the scraper worker will pick it up within a few seconds."})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/scrape/stats", methods=["GET"])
+@require_auth
+def scrape_stats():
+    """Last scrape cycle (from the leader's status file): pages reused vs. sent to Vision, wall time."""
+    return jsonify({"available": SCRAPER_AVAILABLE, "mode": SCRAPER_MODE, **_scraper_status()})
+
+
+_API_PREFIXES.append("/watcher/stats")
+
+@app.route("/watcher/stats", methods=["GET"])
+@require_auth
+def watcher_stats():
+    """Project folder watcher: mode (watchdog/poll/off), coalesced events, reloads, pending slugs."""
+    if project_watcher is None:
+        return jsonify({"mode": "off"})
+    return jsonify(project_watcher.get_stats())
+
+
+def _invalidate_responses(slug: str):
+    """Drop cached copilot replies for a project whose data just changed."""
+    if RESPONSE_CACHE_ENABLED and slug:
+        response_cache.invalidate(slug)
+
+
 @app.route("/chat", methods=["POST"])
 @require_auth
 def chat():
@@ -1085,44 +1366,94 @@ def chat():
     project_slug = data.get("project_slug", None)
     page_view = data.get("page_view", None)
 
-    client = get_client()
-    if not client:
-        return jsonify({"error": "No API key configured."}), 500
+    # Pasted screenshots are downscaled to what the model actually sees (memoized
+    # per image, so re-sent screenshots aren't decoded again)
+    image_fp = None
+    if image_b64:
+        image_b64, image_fp = prepare_data_url(image_b64)
+
+    # Factual questions (dates, counts, float, % complete) are answered from the
+    # in-memory schedule — no LLM round trip. Narrative questions return None.
+    if project_slug and not image_b64 and not context:
+        last_question = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+        if isinstance(last_question, str):
+            local_reply = answer_question(last_question, get_schedule_facts(project_slug))
+            if local_reply:
+                return jsonify({"reply": local_reply, "source": "local"})
 
     dashboard_context = load_context()
 
     system = SYSTEM_BASE
 
-    # Portfolio overview — injected from startup cache, never rebuilt per-request
-    if _PORTFOLIO_CTX:
-        system += f"\n\n{_PORTFOLIO_CTX}"
+    # Portfolio overview — memoized in tracker_loader, follows tracker CSV edits
+    portfolio_ctx = _portfolio_ctx()
+    if portfolio_ctx:
+        system += f"\n\n{portfolio_ctx}"
 
     if dashboard_context:
         system += f"\n\n{dashboard_context}"
 
+    # Detect report mode — narratives get the full context in one shot
+    REPORT_TRIGGERS = ("generate report", "draft narrative", "write the narrative", "generate narrative", "re-draft ", "[report mode]")
+    last_user_msg = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    last_user_lower = last_user_msg.lower() if isinstance(last_user_msg, str) else ""
+    is_report_mode = any(t in last_user_lower for t in REPORT_TRIGGERS)
+
+    # Interactive Q&A sends a compact context and lets the model pull
+    # relationships / activity detail through schedule tools on demand
+    use_tools = bool(project_slug) and SCHEDULE_TOOLS_ENABLED and not is_report_mode and not image_b64
+
+    # Repeated questions against unchanged project data (and the same pasted
+    # image, if any) are served from the reply cache. Narratives and ad-hoc
+    # context always go to the model; "regenerate" skips the lookup but
+    # refreshes the stored reply.
+    cache_key = None
+    if RESPONSE_CACHE_ENABLED and project_slug and not is_report_mode and not context and (not image_b64 or image_fp):
+        image_digest = image_fp["digest"] if image_fp else ""
+        prompt_version = hashlib.sha256(
+            f"{SYSTEM_BASE}\x00{portfolio_ctx}\x00{dashboard_context}\x00{use_tools}\x00{image_digest}".encode("utf-8")).hexdigest()[:16]
+        cache_key = response_cache.make_key(project_slug, get_project_version(project_slug), page_view,
+                                            messages[-30:], prompt_version)
+        if cache_key and not data.get("regenerate"):
+            cached_reply = response_cache.get(cache_key)
+            if cached_reply is not None:
+                return jsonify({"reply": cached_reply, "cached": True})
+
+    client = get_client(project_slug)
+    if not client:
+        return jsonify({"error": "No API key configured."}), 500
+
     if project_slug:
-        proj_ctx = get_project_context(project_slug, page_view)
+        proj_ctx = get_project_context(project_slug, page_view, compact=use_tools)
         if proj_ctx:
             system += f"\n\n{proj_ctx}"
+        if use_tools:
+            system += f"\n\n{TOOLS_PROMPT_NOTE}"
 
-        # Inject project-scoped user-uploaded documents
-        docs_ctx = _get_project_docs_context(project_slug)
+        # Inject project-scoped user-uploaded documents (passages relevant to this question)
+        docs_ctx = _get_project_docs_context(project_slug, last_user_lower)
         if docs_ctx:
             system += f"\n\n{docs_ctx}"
 
     if context:
         system += f"\n\nUSER-PROVIDED CONTEXT:\n{context}"
 
-    # Detect report mode and append narrative style guide
-    REPORT_TRIGGERS = ("generate report", "draft narrative", "write the narrative", "generate narrative", "re-draft ", "[report mode]")
-    last_user_msg = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
-    last_user_lower = last_user_msg.lower() if isinstance(last_user_msg, str) else ""
-    is_report_mode = any(t in last_user_lower for t in REPORT_TRIGGERS)
     if is_report_mode:
         system += f"\n\n{NARRATIVE_STYLE_GUIDE}"
         logger.info(f"[{project_slug or 'no-project'}] Report mode triggered — narrative style guide appended")
 
-    full_messages = [{"role": "system", "content": system}] + messages[-30:]
+    # Last few turns verbatim, older turns as an incrementally maintained summary
+    window = messages[-30:]
+    try:
+        history_offset = int(data.get("history_offset") or 0) + len(messages) - len(window)
+    except (TypeError, ValueError):
+        history_offset = len(messages) - len(window)
+    history, history_info = compact_history(client, _client_user_id(), data.get("conversation_id"),
+                                            window, history_offset, project_slug)
+    if history_info.get("summary_tokens"):
+        logger.info(f"[{project_slug or 'no-project'}] History: {history_info['verbatim']} messages + summary "
+                    f"of {history_info['covered']} (~{history_info['history_tokens']} tokens)")
+    full_messages = [{"role": "system", "content": system}] + history
 
     if image_b64:
         last_user_text = next(
@@ -1139,15 +1470,30 @@ def chat():
         })
 
     try:
+        if use_tools:
+            reply, trace = run_tool_loop(client, "gpt-4o", full_messages, project_slug,
+                                         temperature=0.3, timeout=25)
+            if trace:
+                logger.info(f"[{project_slug}] Tool calls: " + ", ".join(f"{t['tool']} ({t['ms']} ms)" for t in trace))
+            if cache_key:
+                response_cache.put(cache_key, project_slug, reply)
+            return jsonify({"reply": reply, "tool_calls": len(trace)})
+
         response = client.chat.completions.create(
             model="gpt-5.4" if is_report_mode else "gpt-4o",
             messages=full_messages,
             temperature=0.5 if is_report_mode else 0.3,
             timeout=60 if is_report_mode else 25
         )
-        return jsonify({"reply": response.choices[0].message.content})
+        reply = response.choices[0].message.content
+        if cache_key:
+            response_cache.put(cache_key, project_slug, reply)
+        return jsonify({"reply": reply})
     except openai.APITimeoutError:
         return jsonify({"error": "__timeout__"}), 504
+    except LLMQueueTimeout as e:
+        logger.warning(f"[{project_slug or 'no-project'}] {e}")
+        return jsonify({"error": "__busy__"}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -0,0 +1,220 @@
+"""
+conversation.py - Running-summary compaction of long chat histories.
+
+chat() used to forward the browser's last 30 turns verbatim on every request,
+so a long session paid for 30 full turns (on top of the system prompt) each
+time and anything older than that simply vanished. This module keeps the last
+KEEP_VERBATIM messages as-is and folds older turns into a running summary:
+
+  - The browser sends a conversation_id plus the absolute index of the first
+    message in its window (history_offset), so the server knows exactly which
+    turns the summary already covers even though it only sees a window.
+  - The summary is maintained incrementally: once FOLD_BATCH unsummarized
+    older messages have accumulated, those turns (and only those) are merged
+    into the existing summary by a small background LLM call. The current
+    request never waits for it — it sends the not-yet-folded turns verbatim.
+  - Prompt history therefore stays bounded at roughly
+    summary (<= SUMMARY_MAX_WORDS) + FOLD_BATCH + KEEP_VERBATIM messages
+    no matter how long the session runs.
+
+State is per (browser session, conversation_id), in memory, LRU-bounded.
+Token figures are estimates (~4 characters per token), used for logging and
+/conversation/stats rather than billing.
+
+Usage:
+    from conversation import compact_history
+    history, info = compact_history(client, session_id, conversation_id,
+                                    messages, history_offset, project_slug)
+    full_messages = [{"role": "system", "content": system}] + history
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+KEEP_VERBATIM = int(os.getenv("CHAT_KEEP_VERBATIM", "8"))    # most recent messages sent as-is
+FOLD_BATCH = int(os.getenv("CHAT_FOLD_BATCH", "8"))          # older messages per summary update
+SUMMARY_MAX_WORDS = 250
+SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL", "gpt-4o-mini")
+MAX_CONVERSATIONS = 500
+IDLE_TTL_SECONDS = 12 * 3600
+
+SUMMARY_PROMPT = f"""You maintain the running summary of an earlier part of a conversation between a project controls user and a schedule copilot.
+Merge the NEW TURNS into the EXISTING SUMMARY and return only the updated summary (plain text, at most {SUMMARY_MAX_WORDS} words).
+Keep: project and activity names/IDs, dates, float and variance figures the user relied on, corrections the user made, decisions, and open questions.
+Drop: pleasantries, formatting, and detail that later turns superseded."""
+
+_conversations: "OrderedDict[tuple, dict]" = OrderedDict()   # (session, conversation_id) → state
+_lock = threading.Lock()
+_stats = {"turns": 0, "compacted_turns": 0, "folds": 0, "fold_failures": 0, "gaps": 0}
+
+
+def estimate_tokens(messages) -> int:
+    """Rough token count for a message list or string (~4 chars/token + per-message overhead)."""
+    if isinstance(messages, str):
+        return len(messages) // 4
+    total = 0
+    for m in messages:
+        content = m.get("content", "")
+        total += 4 + len(content if isinstance(content, str) else str(content)) // 4
+    return total
+
+
+def _new_state() -> dict:
+    return {"summary": "", "covered": 0, "summary_tokens": 0, "folding": False, "last_used": time.time()}
+
+
+def _get_state(key: tuple) -> dict:
+    with _lock:
+        state = _conversations.get(key)
+        if state is None:
+            state = _conversations[key] = _new_state()
+        _conversations.move_to_end(key)
+        state["last_used"] = time.time()
+        cutoff = time.time() - IDLE_TTL_SECONDS
+        while _conversations and (len(_conversations) > MAX_CONVERSATIONS
+                                  or next(iter(_conversations.values()))["last_used"] < cutoff):
+            _conversations.popitem(last=False)
+        return state
+
+
+def _transcript(messages: List[dict]) -> str:
+    lines = []
+    for m in messages:
+        content = m.get("content", "")
+        if not isinstance(content, str):
+            content = " ".join(p.get("text", "") for p in content if isinstance(p, dict))
+        lines.append(f"{m.get('role', 'user').upper()}: {content.strip()}")
+    return "\n\n".join(lines)
+
+
+def _fold(client, state: dict, turns: List[dict], upto: int, slug: Optional[str]) -> None:
+    """Merge `turns` into the running summary; advances state['covered'] to `upto` on success."""
+    try:
+        prompt = (f"EXISTING SUMMARY:\n{state['summary'] or '(none yet)'}\n\n"
+                  f"NEW TURNS:\n{_transcript(turns)}")
+        response = client.chat.completions.create(
+            model=SUMMARY_MODEL,
+            messages=[{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": prompt}],
+            temperature=0.2,
+            timeout=30,
+        )
+        summary = (response.choices[0].message.content or "").strip()
+        if not summary:
+            raise ValueError("empty summary")
+        with _lock:
+            state["summary"] = summary
+            state["covered"] = upto
+            state["summary_tokens"] = estimate_tokens(summary)
+            _stats["folds"] += 1
+        logger.info(f"[{slug or 'no-project'}] Conversation summary now covers {upto} messages "
+                    f"(~{state['summary_tokens']} tokens)")
+    except Exception as e:
+        with _lock:
+            _stats["fold_failures"] += 1
+        logger.warning(f"[{slug or 'no-project'}] Conversation summary update failed: {e}")
+    finally:
+        with _lock:
+            state["folding"] = False
+
+
+def compact_history(client, session_id: Optional[str], conversation_id: Optional[str],
+                    messages: List[dict], history_offset: int = 0,
+                    slug: Optional[str] = None, background: bool = True) -> Tuple[List[dict], dict]:
+    """
+    Returns (history, info): the messages to send after the system prompt, and
+    {"summary_tokens", "verbatim", "history_tokens", "covered"} for logging.
+
+    messages is the browser's window; history_offset is the absolute index of
+    messages[0] in the whole conversation. Without a conversation_id nothing is
+    tracked and the window is returned unchanged.
+    """
+    if not conversation_id or len(messages) <= KEEP_VERBATIM:
+        return messages, {"summary_tokens": 0, "verbatim": len(messages),
+                          "history_tokens": estimate_tokens(messages), "covered": 0}
+
+    state = _get_state((session_id, conversation_id))
+    total = history_offset + len(messages)
+    older_end = total - KEEP_VERBATIM             # absolute index where the verbatim tail starts
+
+    with _lock:
+        _stats["turns"] += 1
+        if state["covered"] > total:
+            # Conversation restarted under the same id (e.g. a reset the page didn't report)
+            state.update(_new_state())
+        if state["covered"] < history_offset:
+            # Turns between the summary and the window were never seen; they can't be recovered
+            _stats["gaps"] += 1
+        start = max(state["covered"], history_offset)
+        summary, covered = state["summary"], state["covered"]
+        pending = messages[start - history_offset:older_end - history_offset]
+        should_fold = client is not None and len(pending) >= FOLD_BATCH and not state["folding"]
+        if should_fold:
+            state["folding"] = True
+
+    history = []
+    if summary:
+        history.append({"role": "system",
+                        "content": f"EARLIER IN THIS CONVERSATION (summary of {covered} messages):\n{summary}"})
+        with _lock:
+            _stats["compacted_turns"] += 1
+    history += pending + messages[older_end - history_offset:]
+
+    if should_fold:
+        args = (client, state, pending, older_end, slug)
+        if background:
+            threading.Thread(target=_fold, args=args, daemon=True).start()
+        else:
+            _fold(*args)
+
+    info = {"summary_tokens": estimate_tokens(summary), "verbatim": len(history) - (1 if summary else 0),
+            "history_tokens": estimate_tokens(history), "covered": covered}
+    return history, info
+
+
+def reset(session_id: Optional[str], conversation_id: str) -> None:
+    with _lock:
+        _conversations.pop((session_id, conversation_id), None)
+
+
+def get_stats() -> dict:
+    with _lock:
+        out = dict(_stats)
+        states = list(_conversations.values())
+    out["conversations"] = len(states)
+    out["avg_summary_tokens"] = round(sum(s["summary_tokens"] for s in states) / len(states)) if states else 0
+    out["settings"] = {"keep_verbatim": KEEP_VERBATIM, "fold_batch": FOLD_BATCH, "summary_model": SUMMARY_MODEL}
+    return out
+
+
+if __name__ == "__main__":
+    # Simulate a 120-turn session against a stub summarizer and show that the
+    # history sent per turn stays flat while the window-only approach grows to 30.
+    from types import SimpleNamespace
+
+    class _StubClient:
+        def __init__(self):
+            self.chat = SimpleNamespace(completions=self)
+
+        def create(self, **kwargs):
+            text = kwargs["messages"][-1]["content"]
+            content = f"Summary through: {text[-80:]}"
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    logging.basicConfig(level=logging.WARNING)
+    client = _StubClient()
+    convo = []
+    print(f"{'turn':>4} {'window msgs':>11} {'window tok':>10} {'compact msgs':>12} {'compact tok':>11}")
+    for turn in range(1, 121):
+        convo.append({"role": "user", "content": f"Question {turn}: what changed on activity A{turn:04d}? " * 3})
+        window = convo[-30:]
+        history, info = compact_history(client, "s1", "c1", window, len(convo) - len(window), background=False)
+        convo.append({"role": "assistant", "content": f"Answer {turn}: A{turn:04d} slipped {turn % 7} days. " * 6})
+        if turn % 15 == 0:
+            print(f"{turn:>4} {len(window):>11} {estimate_tokens(window):>10} {len(history):>12} {info['history_tokens']:>11}")
+    print(get_stats())
@@ -51,11 +51,24 @@ def _is_contract_completion(name: str) -> bool:
 def _find_target_task(tasks: List[Dict], target_name: Optional[str] = None) -> Optional[Dict]:
     """
     Find the target task to trace back from.
-    If target_name provided: fuzzy match by substring (case-insensitive).
+    If target_name provided: best ranked match from the activity search index
+    (exact ID/name, then substring, then token/trigram fuzzy match), else the
+    first substring match, else the task sharing the most query words.
     If not provided: find contract completion milestone.
     Falls back to the latest-finishing incomplete task.
     """
     if target_name:
+        # Ranked token/trigram index lookup (reuses the loaded snapshot's index).
+        # The traced chain names its target, so the top hit is used even when a
+        # runner-up scores close to it (no margin requirement). Below the index's
+        # score floor, the loose substring/token matching below still applies.
+        try:
+            from search_index import index_for
+            hit = index_for(tasks).best(target_name, min_margin=0.0)
+            if hit is not None:
+                return hit
+        except ImportError:
+            pass
         low = target_name.lower()
         # Exact substring match first
         for t in tasks:
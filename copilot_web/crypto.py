@@ -1,22 +1,48 @@
 """
 crypto.py — Encryption at rest for sensitive project files.
 
-Uses Fernet symmetric encryption (AES-128-CBC + HMAC-SHA256).
-Key is loaded from the ENCRYPTION_KEY environment variable.
+Two formats, one key (ENCRYPTION_KEY environment variable):
+  - Fernet (AES-128-CBC + HMAC-SHA256) for small blobs: JSON stores, doc records.
+  - Chunked AES-256-GCM stream for schedule files. The file is a header plus
+    64 KiB chunks, each authenticated on its own. The chunk counter and a
+    final-chunk flag are bound into the AAD, so reordering or truncation
+    fails. open_decrypted() returns a file-like reader that decrypts one
+    chunk at a time, so parsers read schedules straight from memory without
+    a plaintext temp file. The AES key is derived from ENCRYPTION_KEY with
+    HKDF-SHA256.
+
+Files written before the stream format (whole-file Fernet tokens) remain
+readable everywhere; `python crypto.py migrate` rewrites them in place.
 
 If ENCRYPTION_KEY is not set, all operations are pass-through (no encryption).
 This allows local development without a key while production is fully encrypted.
 
 Usage:
     from crypto import encrypt_bytes, decrypt_bytes, encrypt_json, decrypt_json, encrypt_file, decrypt_file
+    with open_decrypted("projects/frisco_tx/update_7.xer") as fh:
+        P6Parser(fh)
 
 Key generation (run once, store result in Render env vars):
     python3 -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"
+
+Decrypted plaintext of files read through read_encrypted_json / read_encrypted_bytes /
+open_decrypted is kept in a process-wide LRU cache keyed by (path, mtime_ns, size),
+bounded by DECRYPT_CACHE_MB (default 64; 0 disables). It lives in memory only and
+is never written to disk. decrypt_cache_stats() reports hits, misses and evictions.
+
+Migrate existing project folders (Fernet → chunked stream; --encrypt-plain also
+encrypts schedule files that are still plaintext):
+    ENCRYPTION_KEY=... python crypto.py migrate projects/ [--dry-run] [--encrypt-plain]
 """
 
+import io
 import os
 import json
+import struct
 import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
@@ -25,10 +51,19 @@ logger = logging.getLogger(__name__)
 # ---------------------------------------------------------------------------
 
 _fernet = None
+_stream_key = None          # AES-256-GCM key for the chunked format (HKDF of ENCRYPTION_KEY)
 _encryption_enabled = False
 
+def _derive_stream_key(fernet_key: bytes) -> bytes:
+    import base64
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=None,
+                info=b"sixterminal/chunked-aesgcm/v1").derive(base64.urlsafe_b64decode(fernet_key))
+
+
 def _load_key():
-    global _fernet, _encryption_enabled
+    global _fernet, _stream_key, _encryption_enabled
     key = os.environ.get("ENCRYPTION_KEY", "").strip()
     if not key:
         logger.info("[crypto] ENCRYPTION_KEY not set — encryption disabled (pass-through mode)")
@@ -36,6 +71,7 @@ def _load_key():
     try:
         from cryptography.fernet import Fernet
         _fernet = Fernet(key.encode() if isinstance(key, str) else key)
+        _stream_key = _derive_stream_key(key.encode() if isinstance(key, str) else key)
         _encryption_enabled = True
         logger.info("[crypto] Encryption at rest enabled (Fernet/AES-128-CBC)")
     except Exception as e:
@@ -56,9 +92,13 @@ def encrypt_bytes(data: bytes) -> bytes:
 
 
 def decrypt_bytes(data: bytes) -> bytes:
-    """Decrypt raw bytes. Returns plaintext bytes, or original bytes if encryption disabled.
-    Falls back to returning original bytes if decryption fails (handles unencrypted legacy files).
+    """Decrypt raw bytes (Fernet token or chunked stream). Returns plaintext bytes, or original
+    bytes if encryption disabled. Falls back to returning original bytes if Fernet decryption
+    fails (handles unencrypted legacy files).
     """
+    if data[:len(STREAM_MAGIC)] == STREAM_MAGIC:
+        with open_stream(io.BytesIO(data)) as reader:
+            return reader.read()
     if not _encryption_enabled or _fernet is None:
         return data
     try:
@@ -90,31 +130,409 @@ def decrypt_json(data: bytes):
 # ---------------------------------------------------------------------------
 
 def write_encrypted_json(path: str, obj) -> None:
-    """Write a Python object as encrypted JSON to a file."""
+    """Write a Python object as encrypted JSON to a file (temp file + rename, never torn)."""
     os.makedirs(os.path.dirname(path), exist_ok=True) if os.path.dirname(path) else None
-    with open(path, "wb") as f:
-        f.write(encrypt_json(obj))
+    data = encrypt_json(obj)
+    _atomic_write(path, lambda dst: dst.write(data))
 
 
 def read_encrypted_json(path: str):
     """Read and decrypt a JSON file. Returns Python object."""
-    with open(path, "rb") as f:
-        return decrypt_json(f.read())
+    return json.loads(_read_plaintext(path).decode("utf-8"))
 
 
 def write_encrypted_bytes(path: str, data: bytes) -> None:
-    """Write raw bytes to a file, encrypted."""
+    """Write raw bytes to a file, encrypted with the chunked stream format."""
     os.makedirs(os.path.dirname(path), exist_ok=True) if os.path.dirname(path) else None
-    with open(path, "wb") as f:
-        f.write(encrypt_bytes(data))
+    _atomic_write(path, lambda dst: _write_stream(io.BytesIO(data), dst))
 
 
 def read_encrypted_bytes(path: str) -> bytes:
-    """Read and decrypt raw bytes from a file."""
-    with open(path, "rb") as f:
-        return decrypt_bytes(f.read())
+    """Read and decrypt raw bytes from a file (either format, or plaintext)."""
+    return _read_plaintext(path)
 
 
 def is_enabled() -> bool:
     """Returns True if encryption is active."""
     return _encryption_enabled
+
+
+# ---------------------------------------------------------------------------
+# Decrypted-bytes cache (memory only — plaintext is never persisted)
+# ---------------------------------------------------------------------------
+
+DECRYPT_CACHE_MAX_BYTES = int(float(os.environ.get("DECRYPT_CACHE_MB", "64")) * 1024 * 1024)
+
+
+class _DecryptCache:
+    """LRU of path → (mtime_ns, size, plaintext), bounded by total plaintext bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def cacheable(self, size: int) -> bool:
+        # A single file may take at most a quarter of the budget
+        return 0 < self.max_bytes and size <= self.max_bytes // 4
+
+    def get(self, path: str, st: os.stat_result) -> Optional[bytes]:
+        key = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+            return None
+
+    def put(self, path: str, st: os.stat_result, data: bytes) -> None:
+        if not self.cacheable(len(data)):
+            return
+        key = os.path.abspath(path)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[2])
+            self._entries[key] = (st.st_mtime_ns, st.st_size, data)
+            self._bytes += len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._bytes > self.max_bytes and self._entries:
+            _, (_, _, dropped) = self._entries.popitem(last=False)
+            self._bytes -= len(dropped)
+            self.evictions += 1
+
+    def resize(self, max_bytes: int) -> None:
+        with self._lock:
+            self.max_bytes = max(0, int(max_bytes))
+            self._evict()
+
+    def discard(self, path: str) -> None:
+        with self._lock:
+            old = self._entries.pop(os.path.abspath(path), None)
+            if old is not None:
+                self._bytes -= len(old[2])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+_decrypt_cache = _DecryptCache(DECRYPT_CACHE_MAX_BYTES)
+
+
+def decrypt_cache_stats() -> dict:
+    """Hit/miss/eviction counters and current size of the decrypted-bytes cache."""
+    return _decrypt_cache.stats()
+
+
+def configure_decrypt_cache(max_bytes: int) -> None:
+    """Change the cache bound at runtime (0 disables caching); evicts as needed."""
+    _decrypt_cache.resize(max_bytes)
+
+
+def clear_decrypt_cache() -> None:
+    _decrypt_cache.clear()
+
+
+def _decrypt_path(path: str) -> bytes:
+    """Decrypt a whole file (stream, Fernet or plaintext) without touching the cache."""
+    fh = open(path, "rb")
+    if fh.read(len(STREAM_MAGIC)) == STREAM_MAGIC:
+        fh.seek(0)
+        with open_stream(fh) as reader:
+            return reader.read()
+    with fh:
+        fh.seek(0)
+        return decrypt_bytes(fh.read())
+
+
+def _read_plaintext(path: str) -> bytes:
+    """Whole-file plaintext, served from the cache when the file hasn't changed."""
+    if not _encryption_enabled:
+        # Nothing to decrypt (stream files still fail loudly in _decrypt_path)
+        return _decrypt_path(path)
+    st = os.stat(path)
+    if not _decrypt_cache.cacheable(st.st_size):
+        return _decrypt_path(path)
+    data = _decrypt_cache.get(path, st)
+    if data is None:
+        data = _decrypt_path(path)
+        _decrypt_cache.put(path, st, data)
+    return data
+
+
+# ---------------------------------------------------------------------------
+# Chunked AES-256-GCM stream format
+# ---------------------------------------------------------------------------
+#   header : MAGIC(4) | version(1) | chunk_size(4, BE) | nonce_prefix(8)
+#   chunk  : flag(1: 0 = more, 1 = final) | ct_len(4, BE) | ciphertext + 16-byte tag
+#   nonce  = nonce_prefix | counter(4, BE)
+#   AAD    = header | counter(4, BE) | flag
+# ---------------------------------------------------------------------------
+
+STREAM_MAGIC = b"SXC1"
+STREAM_VERSION = 1
+STREAM_CHUNK_SIZE = 64 * 1024
+
+_HEADER = struct.Struct(">4sBI8s")
+_CHUNK = struct.Struct(">BI")
+_FERNET_PREFIX = b"gAAAAA"
+
+
+class StreamDecryptError(ValueError):
+    """Chunked stream is corrupt, truncated, or was written with a different key."""
+
+
+def _aesgcm():
+    if _stream_key is None:
+        raise StreamDecryptError("Encrypted stream but ENCRYPTION_KEY is not set")
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    return AESGCM(_stream_key)
+
+
+def _write_stream(src, dst, chunk_size: int = STREAM_CHUNK_SIZE) -> None:
+    """Encrypt everything readable from src into dst (or copy it through if encryption is off)."""
+    if not _encryption_enabled:
+        while True:
+            block = src.read(chunk_size)
+            if not block:
+                return
+            dst.write(block)
+    aead = _aesgcm()
+    header = _HEADER.pack(STREAM_MAGIC, STREAM_VERSION, chunk_size, os.urandom(8))
+    prefix = header[-8:]
+    dst.write(header)
+    counter = 0
+    block = src.read(chunk_size)
+    while True:
+        nxt = src.read(chunk_size) if block else b""
+        flag = 0 if nxt else 1
+        ctr = struct.pack(">I", counter)
+        ct = aead.encrypt(prefix + ctr, block, header + ctr + bytes([flag]))
+        dst.write(_CHUNK.pack(flag, len(ct)) + ct)
+        if flag:
+            return
+        block = nxt
+        counter += 1
+
+
+class _DecryptingReader(io.RawIOBase):
+    """Raw reader over a chunked stream; authenticates and decrypts one chunk at a time."""
+
+    def __init__(self, fh):
+        self._fh = fh
+        header = fh.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise StreamDecryptError("Truncated stream header")
+        magic, version, self._chunk_size, self._prefix = _HEADER.unpack(header)
+        if magic != STREAM_MAGIC or version != STREAM_VERSION:
+            raise StreamDecryptError(f"Unsupported stream format {magic!r} v{version}")
+        self._header = header
+        self._aead = _aesgcm()
+        self._counter = 0
+        self._buf = memoryview(b"")
+        self._done = False
+
+    def readable(self) -> bool:
+        return True
+
+    def _next_chunk(self) -> None:
+        from cryptography.exceptions import InvalidTag
+        head = self._fh.read(_CHUNK.size)
+        if len(head) < _CHUNK.size:
+            raise StreamDecryptError("Stream truncated before final chunk")
+        flag, ct_len = _CHUNK.unpack(head)
+        ct = self._fh.read(ct_len)
+        if len(ct) < ct_len:
+            raise StreamDecryptError("Stream truncated inside a chunk")
+        ctr = struct.pack(">I", self._counter)
+        try:
+            plain = self._aead.decrypt(self._prefix + ctr, ct, self._header + ctr + bytes([flag]))
+        except InvalidTag:
+            raise StreamDecryptError(f"Chunk {self._counter} failed authentication")
+        self._counter += 1
+        self._done = flag == 1
+        self._buf = memoryview(plain)
+
+    def readinto(self, b) -> int:
+        while not self._buf and not self._done:
+            self._next_chunk()
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+    def close(self) -> None:
+        try:
+            self._fh.close()
+        finally:
+            super().close()
+
+
+def open_stream(fh) -> io.BufferedReader:
+    """Wrap an open binary handle positioned at a chunked-stream header."""
+    return io.BufferedReader(_DecryptingReader(fh), buffer_size=STREAM_CHUNK_SIZE)
+
+
+def open_decrypted(path: str):
+    """
+    Open a file for binary reading, decrypting transparently:
+      cached / cacheable encrypted file → BytesIO over the cached plaintext
+      large chunked stream → streaming reader (one chunk in memory at a time)
+      large legacy Fernet  → BytesIO of the decrypted file (Fernet can't be streamed)
+      plaintext            → the plain file handle
+    Use as a context manager; the result is a readable binary file object.
+    """
+    fh = open(path, "rb")
+    head = fh.read(len(_FERNET_PREFIX))
+    fh.seek(0)
+    encrypted = head[:len(STREAM_MAGIC)] == STREAM_MAGIC or (_encryption_enabled and head == _FERNET_PREFIX)
+    if encrypted and _encryption_enabled and _decrypt_cache.cacheable(os.fstat(fh.fileno()).st_size):
+        # Small enough to keep: serve repeat reads from the decrypted-bytes cache
+        fh.close()
+        return io.BytesIO(_read_plaintext(path))
+    if head[:len(STREAM_MAGIC)] == STREAM_MAGIC:
+        try:
+            return open_stream(fh)
+        except Exception:
+            fh.close()
+            raise
+    if encrypted:
+        with fh:
+            return io.BytesIO(decrypt_bytes(fh.read()))
+    return fh
+
+
+def file_format(path: str) -> str:
+    """'stream', 'fernet' or 'plain' — sniffed from the first bytes of the file."""
+    with open(path, "rb") as fh:
+        head = fh.read(len(_FERNET_PREFIX))
+    if head[:len(STREAM_MAGIC)] == STREAM_MAGIC:
+        return "stream"
+    if head == _FERNET_PREFIX:
+        return "fernet"
+    return "plain"
+
+
+def _atomic_write(path: str, write) -> None:
+    tmp = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp, "wb") as dst:
+            write(dst)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(tmp, path)
+    finally:
+        _decrypt_cache.discard(path)
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def encrypt_file(src_path: str, dst_path: str) -> None:
+    """Stream-encrypt a plaintext file to dst_path (a plain copy if encryption is disabled)."""
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True) if os.path.dirname(dst_path) else None
+    with open(src_path, "rb") as src:
+        _atomic_write(dst_path, lambda dst: _write_stream(src, dst))
+
+
+def decrypt_file(src_path: str, dst_path: str) -> None:
+    """Write the plaintext of an encrypted file (either format) to dst_path."""
+    with open_decrypted(src_path) as src:
+        _atomic_write(dst_path, lambda dst: _copy(src, dst))
+
+
+def _copy(src, dst) -> None:
+    while True:
+        block = src.read(STREAM_CHUNK_SIZE)
+        if not block:
+            return
+        dst.write(block)
+
+
+# ---------------------------------------------------------------------------
+# Migration: legacy Fernet schedule files → chunked stream
+# ---------------------------------------------------------------------------
+
+SCHEDULE_EXTS = (".mpp", ".xml", ".xer")
+
+
+def migrate_folder(root: str, dry_run: bool = False, encrypt_plain: bool = False) -> dict:
+    """
+    Rewrite every Fernet-encrypted schedule file under root in the chunked format
+    (atomic per file). Optionally encrypt schedule files that are still plaintext.
+    """
+    if not _encryption_enabled:
+        raise RuntimeError("ENCRYPTION_KEY must be set to migrate")
+    counts = {"converted": 0, "encrypted": 0, "already_stream": 0, "plain_skipped": 0, "failed": 0}
+    for dirpath, _, files in os.walk(root):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in SCHEDULE_EXTS:
+                continue
+            path = os.path.join(dirpath, name)
+            fmt = file_format(path)
+            if fmt == "stream":
+                counts["already_stream"] += 1
+                continue
+            if fmt == "plain" and not encrypt_plain:
+                counts["plain_skipped"] += 1
+                continue
+            action = "converted" if fmt == "fernet" else "encrypted"
+            if dry_run:
+                logger.info(f"[crypto] would migrate ({fmt}): {path}")
+                counts[action] += 1
+                continue
+            try:
+                if fmt == "fernet":
+                    with open(path, "rb") as fh:
+                        token = fh.read()
+                    plain = _fernet.decrypt(token)
+                    _atomic_write(path, lambda dst: _write_stream(io.BytesIO(plain), dst))
+                else:
+                    with open(path, "rb") as src:
+                        data = src.read()
+                    _atomic_write(path, lambda dst: _write_stream(io.BytesIO(data), dst))
+                with open_decrypted(path) as check:
+                    while check.read(STREAM_CHUNK_SIZE):
+                        pass
+                counts[action] += 1
+                logger.info(f"[crypto] migrated ({fmt} → stream): {path}")
+            except Exception as e:
+                counts["failed"] += 1
+                logger.warning(f"[crypto] migration failed for {path}: {e}")
+    return counts
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    args = sys.argv[1:]
+    if not args or args[0] != "migrate":
+        print("Usage: ENCRYPTION_KEY=... python crypto.py migrate [projects_dir] [--dry-run] [--encrypt-plain]")
+        sys.exit(2)
+    paths = [a for a in args[1:] if not a.startswith("--")]
+    root = paths[0] if paths else os.path.join(os.path.dirname(os.path.abspath(__file__)), "projects")
+    result = migrate_folder(root, dry_run="--dry-run" in args, encrypt_plain="--encrypt-plain" in args)
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if result["failed"] else 0)
@@ -0,0 +1,406 @@
+"""
+doc_index.py - BM25 retrieval over user-uploaded project documents.
+
+Every chat used to carry the full extracted text of every document uploaded to
+a project (PDF text up to 8,000 chars, DOCX up to 6,000, Vision descriptions),
+so prompts grew with each upload whether or not the question had anything to
+do with them. This module splits each document into overlapping passages,
+keeps a BM25 inverted index per project, and returns only the passages that
+match the latest user message.
+
+  - Chunking happens once, when a document is added. Each document's passages
+    are persisted as one record in an append-only DocStore
+    (projects/{slug}/user_docs_passages.log/.idx, encrypted like the doc store),
+    so an upload appends one record and a delete appends a tombstone — nothing
+    is rewritten in proportion to the other documents. Postings are rebuilt in
+    memory from those records on first use.
+  - sync(slug, docs) is incremental: documents are fingerprinted by
+    (filename, timestamp, length) and only new or changed ones are chunked;
+    removed ones are dropped from the postings.
+  - Small document sets (under FULL_INJECT_CHARS in total) are injected whole —
+    retrieval only kicks in once the full text would crowd the prompt.
+
+Usage:
+    from doc_index import sync, build_docs_context
+    sync("frisco_tx", docs)                                   # after upload/delete/clear
+    ctx = build_docs_context("frisco_tx", docs, "what did the owner say about roofing?")
+"""
+
+import os
+import re
+import math
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from doc_store import DocStore
+
+logger = logging.getLogger(__name__)
+
+PASSAGE_STORE = "user_docs_passages"
+LEGACY_INDEX_NAME = "user_docs_index.json"   # whole-file index, replaced by PASSAGE_STORE
+CHUNK_CHARS = 900          # target passage size
+CHUNK_OVERLAP = 150        # carried into the next passage so sentences aren't cut in half
+TOP_K = 5                  # passages injected per chat turn
+MAX_CONTEXT_CHARS = 6000   # hard cap on injected passage text
+FULL_INJECT_CHARS = 6000   # below this total, inject every document whole
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were "
+    "will with what when where which who why how do does did can could should would i me my we "
+    "our you your they them their there here about into than then so if not no yes".split()
+)
+
+
+def _tokens(text: str) -> List[str]:
+    out = []
+    for tok in _TOKEN_RE.findall((text or "").lower()):
+        if tok in _STOPWORDS or len(tok) < 2:
+            continue
+        # Light plural folding so "pours"/"pour", "inspections"/"inspection" match
+        if len(tok) > 4 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]
+        out.append(tok)
+    return out
+
+
+def _doc_size(doc) -> int:
+    """Content length in chars — from stored metadata when present, so lazy docs stay unread."""
+    size = doc.get("size")
+    return size if isinstance(size, int) else len(doc.get("content") or "")
+
+
+def _fingerprint(doc) -> str:
+    return f"{doc.get('filename', '')}|{doc.get('timestamp', '')}|{_doc_size(doc)}"
+
+
+def chunk_text(text: str, size: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[str]:
+    """Split text into ~size-char passages, preferring paragraph, line and sentence breaks."""
+    text = (text or "").strip()
+    if len(text) <= size:
+        return [text] if text else []
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            window = text[start:end]
+            for sep in ("\n\n", "\n", ". ", "; ", " "):
+                cut = window.rfind(sep)
+                if cut > size // 2:
+                    end = start + cut + len(sep)
+                    break
+        chunks.append(text[start:end].strip())
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+        # Re-align the overlap to a word boundary
+        space = text.find(" ", start)
+        if 0 <= space < end:
+            start = space + 1
+    return [c for c in chunks if c]
+
+
+class DocIndex:
+    """BM25 index over the passages of one project's documents."""
+
+    def __init__(self):
+        self.docs: Dict[str, dict] = {}                 # fingerprint → {filename, label, timestamp, user_note, chunk_ids}
+        self.chunks: Dict[int, dict] = {}               # chunk id → {fp, part, text, len}
+        self._postings: Dict[str, Dict[int, int]] = {}  # term → {chunk id: term frequency}
+        self._total_len = 0
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def add(self, doc: dict, chunks: Optional[List[str]] = None, fp: Optional[str] = None) -> None:
+        fp = fp or _fingerprint(doc)
+        if fp in self.docs:
+            return
+        if chunks is None:
+            chunks = chunk_text(doc.get("content") or "")
+        ids = []
+        for part, text in enumerate(chunks, 1):
+            cid = self._next_id
+            self._next_id += 1
+            # Index the label and note with every passage so "the RFI log" finds it
+            toks = _tokens(f"{doc.get('label', '')} {doc.get('user_note', '')} {text}")
+            for term, tf in Counter(toks).items():
+                self._postings.setdefault(term, {})[cid] = tf
+            self.chunks[cid] = {"fp": fp, "part": part, "text": text, "len": len(toks)}
+            self._total_len += len(toks)
+            ids.append(cid)
+        self.docs[fp] = {
+            "filename": doc.get("filename", ""),
+            "label": doc.get("label") or doc.get("filename", ""),
+            "timestamp": doc.get("timestamp", ""),
+            "user_note": doc.get("user_note", ""),
+            "chunk_ids": ids,
+        }
+
+    def remove(self, fp: str) -> None:
+        entry = self.docs.pop(fp, None)
+        if not entry:
+            return
+        for cid in entry["chunk_ids"]:
+            chunk = self.chunks.pop(cid, None)
+            if chunk is None:
+                continue
+            self._total_len -= chunk["len"]
+        dead = set(entry["chunk_ids"])
+        for term in list(self._postings):
+            posting = self._postings[term]
+            for cid in dead.intersection(posting):
+                del posting[cid]
+            if not posting:
+                del self._postings[term]
+
+    def search(self, query: str, k: int = TOP_K) -> List[Tuple[float, int]]:
+        """Top-k (score, chunk id) by BM25, best first."""
+        n = len(self.chunks)
+        if not n:
+            return []
+        avgdl = self._total_len / n if n else 1.0
+        scores: Dict[int, float] = {}
+        for term in set(_tokens(query)):
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for cid, tf in posting.items():
+                dl = self.chunks[cid]["len"]
+                denom = tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / max(avgdl, 1e-9))
+                scores[cid] = scores.get(cid, 0.0) + idf * tf * (BM25_K1 + 1) / denom
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+        return [(round(s, 4), cid) for cid, s in ranked[:k]]
+
+    def record(self, fp: str) -> dict:
+        """Persisted form of one document's passages (a PASSAGE_STORE record)."""
+        entry = self.docs[fp]
+        return {"filename": fp, "source": entry["filename"], "label": entry["label"],
+                "timestamp": entry["timestamp"], "user_note": entry.get("user_note", ""),
+                "chunk_chars": CHUNK_CHARS, "chunks": [self.chunks[c]["text"] for c in entry["chunk_ids"]]}
+
+    def add_record(self, record: dict) -> bool:
+        """Re-index a persisted record; False if it was chunked with other settings."""
+        if record.get("chunk_chars") != CHUNK_CHARS:
+            return False
+        stub = {"filename": record.get("source", ""), "label": record.get("label", ""),
+                "timestamp": record.get("timestamp", ""), "user_note": record.get("user_note", "")}
+        self.add(stub, chunks=record.get("chunks", []), fp=record.get("filename"))
+        return True
+
+
+# ---------------------------------------------------------------------------
+# Per-project registry
+# ---------------------------------------------------------------------------
+
+_indexes: Dict[str, DocIndex] = {}
+_stores: Dict[str, DocStore] = {}
+_lock = threading.Lock()
+
+
+def _project_dir(slug: str) -> str:
+    here = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(here, "projects", slug)
+
+
+def _store(slug: str) -> Optional[DocStore]:
+    """The project's passage record store, or None if the project folder doesn't exist."""
+    store = _stores.get(slug)
+    if store is None:
+        folder = _project_dir(slug)
+        if not os.path.isdir(folder):
+            return None
+        store = _stores[slug] = DocStore(folder, name=PASSAGE_STORE)
+    return store
+
+
+def _load(slug: str) -> DocIndex:
+    idx = _indexes.get(slug)
+    if idx is not None:
+        return idx
+    idx = DocIndex()
+    legacy = os.path.join(_project_dir(slug), LEGACY_INDEX_NAME)
+    if os.path.exists(legacy):
+        # Derived data — the next sync() re-chunks from the doc store
+        try:
+            os.remove(legacy)
+        except OSError as e:
+            logger.warning(f"[{slug}] Could not remove legacy doc index: {e}")
+    store = _store(slug)
+    if store is not None:
+        try:
+            stale = [d["filename"] for d in store.docs() if not idx.add_record(store.get(d["filename"]) or {})]
+            for fp in stale:
+                store.delete(fp)
+        except Exception as e:
+            logger.warning(f"[{slug}] Doc index unreadable, rebuilding: {e}")
+            idx = DocIndex()
+    _indexes[slug] = idx
+    return idx
+
+
+def _persist(slug: str, idx: DocIndex, added: List[str], removed: List[str]) -> None:
+    """Append the changed documents' passage records — cost ∝ the change, not the project."""
+    store = _store(slug)
+    if store is None:
+        return
+    try:
+        for fp in removed:
+            store.delete(fp)
+        for fp in added:
+            store.put(idx.record(fp))
+    except Exception as e:
+        logger.warning(f"[{slug}] Could not persist doc index: {e}")
+
+
+def sync(slug: str, docs) -> Tuple[int, int]:
+    """
+    Bring the project's index in line with its current document list.
+    Only new/changed documents are chunked. Returns (added, removed).
+    """
+    t0 = time.perf_counter()
+    with _lock:
+        idx = _load(slug)
+        wanted = {_fingerprint(d): d for d in docs or []}
+        removed = [fp for fp in idx.docs if fp not in wanted]
+        added = [fp for fp in wanted if fp not in idx.docs]
+        for fp in removed:
+            idx.remove(fp)
+        for fp in added:
+            idx.add(wanted[fp])
+        if added or removed:
+            _persist(slug, idx, added, removed)
+            logger.info(f"[{slug}] Doc index synced: +{len(added)} -{len(removed)} docs, "
+                        f"{len(idx)} passages in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    return len(added), len(removed)
+
+
+def search(slug: str, query: str, k: int = TOP_K) -> List[dict]:
+    """Top-k passages for a project as dicts (filename, label, part, parts, score, text)."""
+    idx = _load(slug)
+    out = []
+    for score, cid in idx.search(query, k):
+        chunk = idx.chunks[cid]
+        entry = idx.docs.get(chunk["fp"], {})
+        out.append({"filename": entry.get("filename", ""), "label": entry.get("label", ""),
+                    "timestamp": entry.get("timestamp", ""), "part": chunk["part"],
+                    "parts": len(entry.get("chunk_ids", [])), "score": score, "text": chunk["text"]})
+    return out
+
+
+def build_docs_context(slug: str, docs: List[dict], query: str = "",
+                       k: int = TOP_K, max_chars: int = MAX_CONTEXT_CHARS) -> str:
+    """
+    USER-PROVIDED DOCUMENTS block for one chat turn: a one-line catalog of every
+    uploaded document, plus either the full text (small sets) or the top-k
+    passages that match `query`.
+    """
+    if not docs:
+        return ""
+    lines = ["=== USER-PROVIDED DOCUMENTS ===",
+             "These files were manually uploaded by the user for this project.",
+             "Use them as supplementary context — they may contain dashboard screenshots, notes, milestone clarifications, or other reference material.",
+             "The user can refer to these in conversation. Connect them to the schedule analysis when relevant.",
+             ""]
+
+    total = sum(_doc_size(d) for d in docs)
+    if total <= FULL_INJECT_CHARS or not query.strip():
+        if total > FULL_INJECT_CHARS:
+            # No question to rank against — fall back to the newest documents that fit
+            docs = _newest_within(docs, max_chars)
+        for i, doc in enumerate(docs, 1):
+            label = doc.get("label") or doc.get("filename", f"Document {i}")
+            lines.append(f"--- Document {i}: {label} (uploaded: {doc.get('timestamp', '')}) ---")
+            if doc.get("user_note"):
+                lines.append(f"User note: {doc['user_note']}")
+            lines.append(doc.get("content", "[No content extracted]"))
+            lines.append("")
+        return "\n".join(lines)
+
+    sync(slug, docs)
+    lines.append("Documents on file (only the passages relevant to the current question are shown below):")
+    for doc in docs:
+        label = doc.get("label") or doc.get("filename", "")
+        note = f" — note: {doc['user_note']}" if doc.get("user_note") else ""
+        lines.append(f"  • {label} ({doc.get('filename', '')}, uploaded {doc.get('timestamp', '')}){note}")
+    lines.append("")
+
+    hits = search(slug, query, k)
+    if not hits:
+        lines.append("No passage in the uploaded documents matches this question. "
+                     "If the user is asking about a document, ask them which one or what it covers.")
+        return "\n".join(lines)
+
+    used = 0
+    for h in hits:
+        if used + len(h["text"]) > max_chars and used:
+            break
+        lines.append(f"--- Excerpt from {h['label']} (part {h['part']} of {h['parts']}) ---")
+        lines.append(h["text"])
+        lines.append("")
+        used += len(h["text"])
+    return "\n".join(lines)
+
+
+def _newest_within(docs: List[dict], max_chars: int) -> List[dict]:
+    picked, used = [], 0
+    for doc in reversed(docs):
+        size = _doc_size(doc)
+        if picked and used + size > max_chars:
+            break
+        picked.append(doc)
+        used += size
+    return list(reversed(picked))
+
+
+def drop(slug: str) -> None:
+    """Forget a project's index (in memory and on disk) — used by /docs/<slug>/clear."""
+    with _lock:
+        _indexes.pop(slug, None)
+        store = _store(slug)
+        if store is not None:
+            try:
+                store.clear()
+            except OSError as e:
+                logger.warning(f"[{slug}] Could not clear doc index: {e}")
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO)
+
+    paras = {
+        "owner_meeting.pdf": "Owner meeting minutes. The roofing subcontractor confirmed dry-in for Building B is "
+                             "delayed by two weeks due to membrane delivery. Concrete pours on level 3 are on hold "
+                             "pending the structural RFI response. ",
+        "rfi_log.docx": "RFI 42: Embed plate conflict at grid C4, awaiting engineer of record. RFI 43: Elevator pit "
+                        "depth discrepancy. RFI 44: Storefront glazing substitution approved. ",
+        "dashboard.png": "Screenshot of the portfolio dashboard showing 12 projects, 3 flagged red for negative float. ",
+    }
+    docs = [{"filename": f, "label": f, "user_note": "", "timestamp": "2026-01-01 00:00 UTC",
+             "content": (body * 40)} for f, body in paras.items()]
+
+    import tempfile
+    slug = "_doc_index_demo"
+    _demo_dir = tempfile.mkdtemp(prefix="doc_index_")
+    _project_dir = lambda s: _demo_dir  # noqa: E731
+    t0 = time.perf_counter()
+    print("sync:", sync(slug, docs), f"{(time.perf_counter() - t0) * 1000:.1f} ms")
+    full = sum(len(d["content"]) for d in docs)
+    for q in ("when is the roof dry-in?", "what is the status of RFI 43?", "how many projects are red?"):
+        ctx = build_docs_context(slug, docs, q)
+        top = search(slug, q, 1)
+        print(f"{q!r}: {len(ctx):,} chars injected (vs {full:,}) — top: {top[0]['label']} {top[0]['score']}")
+    print("resync after delete:", sync(slug, docs[:2]))
+    _indexes.clear()
+    print("reload from disk:", len(_load(slug)), "passages")
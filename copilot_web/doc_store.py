@@ -0,0 +1,452 @@
+"""
+doc_store.py - Append-only, per-record encrypted store for project user documents.
+
+user_docs.json used to be rewritten and re-encrypted in full on every upload,
+delete and clear, and decrypted and parsed in full for every project at
+startup. Each project now keeps two files in its folder:
+
+  user_docs.log    append-only segment of framed records
+                   [4-byte big-endian length][encrypted JSON record]
+                   record = {"op": "put", "doc": {...}} | {"op": "del", "filename": ...}
+  user_docs.idx    small encrypted JSON index: filename → offset/length + metadata
+                   (label, timestamp, note, size, preview), plus segment size and dead bytes
+
+  - Uploads append one record (cost ∝ size of the new document) and rewrite the index.
+  - Deletes append a tombstone; the old record's bytes are counted as dead.
+  - A background compactor rewrites the live records into a fresh segment
+    (atomic os.replace) once dead bytes pass COMPACT_MIN_DEAD and COMPACT_RATIO.
+  - Startup reads only the index; bodies are read from the segment on first access.
+  - If the index is behind the segment (crash between append and index write) the
+    missing tail is replayed; a torn final record is truncated away.
+  - Legacy user_docs.json is imported once and renamed to user_docs.json.migrated.
+  - Several gunicorn workers can share a folder: every read and write takes an
+    flock on user_docs.lock and first reloads the index (and replays the segment
+    tail) if another process changed either file since this one last looked.
+
+Usage:
+    from doc_store import get_store
+    store = get_store("frisco_tx")
+    store.put({"filename": "rfi_log.docx", "label": "RFI log", "content": "...", "timestamp": "..."})
+    for doc in store.docs():        # lazy: doc["content"] reads the segment on demand
+        doc["label"], doc["size"]
+    store.delete("rfi_log.docx")
+"""
+
+import os
+import json
+import struct
+import logging
+import threading
+from collections.abc import Mapping
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows — single-process deployments only
+    fcntl = None
+
+try:
+    from crypto import encrypt_bytes, decrypt_bytes, read_encrypted_json, write_encrypted_json
+except ImportError:
+    def encrypt_bytes(data): return data
+    def decrypt_bytes(data): return data
+
+    def read_encrypted_json(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def write_encrypted_json(path, obj):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, indent=2, default=str)
+
+STORE_NAME = "user_docs"           # file stem; other record stores (doc_index passages) pass their own
+SEGMENT_NAME = f"{STORE_NAME}.log"
+INDEX_NAME = f"{STORE_NAME}.idx"
+LOCK_NAME = f"{STORE_NAME}.lock"
+LEGACY_NAME = f"{STORE_NAME}.json"
+INDEX_VERSION = 1
+
+COMPACT_MIN_DEAD = 256 * 1024   # don't bother compacting below this many dead bytes
+COMPACT_RATIO = 0.5             # ...or while dead bytes are under half the segment
+PREVIEW_CHARS = 300
+
+_HEADER = struct.Struct(">I")
+_META_KEYS = ("filename", "label", "user_note", "timestamp")
+
+
+class StoredDoc(Mapping):
+    """
+    Read-only view of one stored document. Metadata lives in the index;
+    "content" is read and decrypted from the segment only when asked for.
+    """
+    __slots__ = ("_store", "_meta")
+
+    def __init__(self, store: "DocStore", meta: dict):
+        self._store = store
+        self._meta = meta
+
+    def __getitem__(self, key):
+        if key == "content":
+            return self._store.read_content(self._meta["filename"])
+        return self._meta[key]
+
+    def __iter__(self):
+        yield from self._meta
+        yield "content"
+
+    def __len__(self) -> int:
+        return len(self._meta) + 1
+
+    def __repr__(self) -> str:
+        return f"StoredDoc({self._meta.get('filename')!r}, {self._meta.get('size', 0)} chars)"
+
+
+class DocStore:
+    """Append-only document store for one project folder ({name}.log / .idx / .lock, default user_docs)."""
+
+    def __init__(self, folder: str, name: str = STORE_NAME):
+        self.folder = folder
+        self.name = name
+        self.segment_path = os.path.join(folder, f"{name}.log")
+        self.index_path = os.path.join(folder, f"{name}.idx")
+        self.lock_path = os.path.join(folder, f"{name}.lock")
+        self._entries: Dict[str, dict] = {}   # filename → {offset, length, label, ..., size, preview}
+        self._segment_size = 0
+        self._dead_bytes = 0
+        self._stamp = None                    # (index, segment) stat when this view was last in sync
+        self._lock = threading.RLock()
+        self._lock_fh = None
+        self._lock_depth = 0
+        self._compacting = False
+        self._open()
+
+    # -- Cross-process locking -------------------------------------------------
+
+    @contextmanager
+    def _locked(self):
+        """Thread lock plus an exclusive flock shared with other worker processes."""
+        with self._lock:
+            if self._lock_depth == 0 and fcntl is not None and os.path.isdir(self.folder):
+                if self._lock_fh is None:
+                    self._lock_fh = open(self.lock_path, "a")
+                fcntl.flock(self._lock_fh.fileno(), fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and self._lock_fh is not None:
+                    fcntl.flock(self._lock_fh.fileno(), fcntl.LOCK_UN)
+
+    def _disk_stamp(self) -> tuple:
+        stamp = []
+        for path in (self.index_path, self.segment_path):
+            try:
+                st = os.stat(path)
+                stamp.append((st.st_ino, st.st_size, st.st_mtime_ns))
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _refresh(self) -> None:
+        """Reload if another process appended, deleted or compacted since we last looked (under _locked)."""
+        if self._disk_stamp() != self._stamp:
+            self._load()
+
+    # -- Open / recovery -----------------------------------------------------
+
+    def _open(self) -> None:
+        with self._locked():
+            self._load()
+            legacy = os.path.join(self.folder, LEGACY_NAME)
+            if self.name == STORE_NAME and os.path.exists(legacy):
+                self._migrate_legacy(legacy)
+
+    def _load(self) -> None:
+        """Read the index, then replay whatever the segment holds beyond it."""
+        self._entries, self._segment_size, self._dead_bytes = {}, 0, 0
+        if os.path.exists(self.index_path):
+            try:
+                data = read_encrypted_json(self.index_path)
+                if data.get("version") == INDEX_VERSION:
+                    self._entries = dict(data.get("entries", {}))
+                    self._segment_size = int(data.get("segment_size", 0))
+                    self._dead_bytes = int(data.get("dead_bytes", 0))
+            except Exception as e:
+                logger.warning(f"[doc_store] Index unreadable for {self.folder}, rescanning: {e}")
+                self._entries, self._segment_size, self._dead_bytes = {}, 0, 0
+
+        actual = os.path.getsize(self.segment_path) if os.path.exists(self.segment_path) else 0
+        if actual < self._segment_size:
+            # Segment replaced or truncated behind the index's back — start over
+            self._entries, self._segment_size, self._dead_bytes = {}, 0, 0
+        if actual != self._segment_size:
+            self._replay(self._segment_size)
+            self._write_index()
+        self._stamp = self._disk_stamp()
+
+    def _replay(self, start: int) -> None:
+        """Apply records from byte offset `start` to the end of the segment."""
+        if not os.path.exists(self.segment_path):
+            return
+        torn = False
+        with open(self.segment_path, "rb") as f:
+            f.seek(start)
+            offset = start
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    torn = bool(header)
+                    break
+                (length,) = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length:
+                    torn = True
+                    break
+                try:
+                    record = json.loads(decrypt_bytes(payload).decode("utf-8"))
+                except Exception as e:
+                    # Complete but unreadable (wrong ENCRYPTION_KEY?) — never truncate on this
+                    logger.warning(f"[doc_store] Unreadable record at byte {offset} in {self.segment_path}: {e}")
+                    break
+                self._apply(record, offset, _HEADER.size + length)
+                offset += _HEADER.size + length
+        if torn:
+            logger.warning(f"[doc_store] Truncating torn record at byte {offset} in {self.segment_path}")
+            with open(self.segment_path, "r+b") as f:
+                f.truncate(offset)
+        self._segment_size = offset
+
+    def _apply(self, record: dict, offset: int, length: int) -> None:
+        if record.get("op") == "put":
+            doc = record.get("doc", {})
+            name = doc.get("filename", "")
+            old = self._entries.get(name)
+            if old:
+                self._dead_bytes += old["length"]
+            self._entries[name] = self._meta_for(doc, offset, length)
+        elif record.get("op") == "del":
+            old = self._entries.pop(record.get("filename", ""), None)
+            if old:
+                self._dead_bytes += old["length"]
+            self._dead_bytes += length
+
+    def _migrate_legacy(self, legacy: str) -> None:
+        try:
+            docs = read_encrypted_json(legacy)
+        except Exception as e:
+            logger.warning(f"[doc_store] Could not read legacy {legacy}: {e}")
+            return
+        for doc in docs or []:
+            if doc.get("filename") and doc.get("filename") not in self._entries:
+                self._append({"op": "put", "doc": doc})
+        self._write_index()
+        os.replace(legacy, legacy + ".migrated")
+        logger.info(f"[doc_store] Migrated {len(docs or [])} doc(s) from {legacy}")
+
+    # -- Low-level I/O -------------------------------------------------------
+
+    @staticmethod
+    def _meta_for(doc: dict, offset: int, length: int) -> dict:
+        content = doc.get("content") or ""
+        meta = {k: doc.get(k, "") for k in _META_KEYS}
+        meta.update({"offset": offset, "length": length, "size": len(content),
+                     "preview": content[:PREVIEW_CHARS]})
+        return meta
+
+    def _append(self, record: dict) -> None:
+        payload = encrypt_bytes(json.dumps(record, default=str).encode("utf-8"))
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.segment_path, "ab") as f:
+            offset = f.tell()
+            f.write(_HEADER.pack(len(payload)) + payload)
+            f.flush()
+            os.fsync(f.fileno())
+        self._apply(record, offset, _HEADER.size + len(payload))
+        self._segment_size = offset + _HEADER.size + len(payload)
+
+    def _write_index(self) -> None:
+        tmp = self.index_path + ".tmp"
+        write_encrypted_json(tmp, {"version": INDEX_VERSION, "segment_size": self._segment_size,
+                                   "dead_bytes": self._dead_bytes, "entries": self._entries})
+        os.replace(tmp, self.index_path)
+        self._stamp = self._disk_stamp()
+
+    def _read_record(self, entry: dict) -> dict:
+        with open(self.segment_path, "rb") as f:
+            f.seek(entry["offset"] + _HEADER.size)
+            payload = f.read(entry["length"] - _HEADER.size)
+        return json.loads(decrypt_bytes(payload).decode("utf-8"))
+
+    # -- Public API ----------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def docs(self) -> List[StoredDoc]:
+        """All live documents in upload order (metadata only until content is read)."""
+        with self._locked():
+            self._refresh()
+            metas = sorted(self._entries.values(), key=lambda m: m["offset"])
+            return [StoredDoc(self, {k: v for k, v in m.items() if k not in ("offset", "length")})
+                    for m in metas]
+
+    def read_content(self, filename: str) -> str:
+        with self._locked():
+            self._refresh()
+            entry = self._entries.get(filename)
+            if entry is None:
+                return ""
+            return self._read_record(entry).get("doc", {}).get("content", "")
+
+    def get(self, filename: str) -> Optional[dict]:
+        """Full document dict (content included), or None."""
+        with self._locked():
+            self._refresh()
+            entry = self._entries.get(filename)
+            return self._read_record(entry).get("doc") if entry else None
+
+    def put(self, doc: dict) -> None:
+        """Add a document, replacing any existing one with the same filename."""
+        with self._locked():
+            self._refresh()
+            self._append({"op": "put", "doc": doc})
+            self._write_index()
+        self._maybe_compact()
+
+    def delete(self, filename: str) -> bool:
+        with self._locked():
+            self._refresh()
+            if filename not in self._entries:
+                return False
+            self._append({"op": "del", "filename": filename})
+            self._write_index()
+        self._maybe_compact()
+        return True
+
+    def clear(self) -> int:
+        """Drop every document. Nothing is live afterwards, so the segment is simply reset."""
+        with self._locked():
+            self._refresh()
+            n = len(self._entries)
+            self._entries, self._segment_size, self._dead_bytes = {}, 0, 0
+            if os.path.exists(self.segment_path):
+                os.remove(self.segment_path)
+            self._write_index()
+            return n
+
+    def stats(self) -> dict:
+        with self._locked():
+            self._refresh()
+        return {"docs": len(self._entries), "segment_bytes": self._segment_size,
+                "dead_bytes": self._dead_bytes}
+
+    # -- Compaction ----------------------------------------------------------
+
+    def needs_compaction(self) -> bool:
+        return (self._dead_bytes >= COMPACT_MIN_DEAD
+                and self._dead_bytes >= COMPACT_RATIO * max(self._segment_size, 1))
+
+    def _maybe_compact(self) -> None:
+        if self.needs_compaction() and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self.compact, daemon=True, name=f"doc-compact-{os.path.basename(self.folder)}").start()
+
+    def compact(self) -> int:
+        """Rewrite live records into a fresh segment. Returns bytes reclaimed."""
+        try:
+            with self._locked():
+                self._refresh()
+                if not self._dead_bytes:
+                    return 0  # another worker already compacted
+                before = self._segment_size
+                tmp = self.segment_path + ".compact"
+                entries: Dict[str, dict] = {}
+                with open(self.segment_path, "rb") as src, open(tmp, "wb") as dst:
+                    for name, entry in sorted(self._entries.items(), key=lambda kv: kv[1]["offset"]):
+                        src.seek(entry["offset"])
+                        raw = src.read(entry["length"])
+                        new_entry = dict(entry, offset=dst.tell())
+                        dst.write(raw)
+                        entries[name] = new_entry
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                    size = dst.tell()
+                os.replace(tmp, self.segment_path)
+                self._entries, self._segment_size, self._dead_bytes = entries, size, 0
+                self._write_index()
+            logger.info(f"[doc_store] Compacted {self.segment_path}: {before:,} → {size:,} bytes")
+            return before - size
+        except Exception as e:
+            logger.warning(f"[doc_store] Compaction failed for {self.segment_path}: {e}")
+            return 0
+        finally:
+            self._compacting = False
+
+
+# ---------------------------------------------------------------------------
+# Per-project registry
+# ---------------------------------------------------------------------------
+
+_stores: Dict[str, DocStore] = {}
+_registry_lock = threading.Lock()
+
+
+def _projects_dir() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "projects")
+
+
+def get_store(slug: str) -> DocStore:
+    """Open (index only) or return the cached store for a project slug."""
+    with _registry_lock:
+        store = _stores.get(slug)
+        if store is None:
+            store = DocStore(os.path.join(_projects_dir(), slug))
+            _stores[slug] = store
+        return store
+
+
+def has_docs(slug: str) -> bool:
+    """True if the project folder has stored (or legacy) documents — doesn't open the store."""
+    folder = os.path.join(_projects_dir(), slug)
+    return any(os.path.exists(os.path.join(folder, n)) for n in (INDEX_NAME, SEGMENT_NAME, LEGACY_NAME))
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import tempfile
+
+    logging.basicConfig(level=logging.INFO)
+    COMPACT_MIN_DEAD = 0
+
+    folder = tempfile.mkdtemp(prefix="doc_store_")
+    body = "Owner meeting minutes — roofing dry-in delayed two weeks. " * 200
+    legacy = [{"filename": f"doc_{i}.pdf", "label": f"Doc {i}", "user_note": "",
+               "timestamp": "2026-01-01 00:00 UTC", "content": body} for i in range(50)]
+    write_encrypted_json(os.path.join(folder, LEGACY_NAME), legacy)
+
+    t0 = time.perf_counter()
+    store = DocStore(folder)
+    print(f"migrate {len(store)} docs: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    t0 = time.perf_counter()
+    store.put({"filename": "new.pdf", "label": "New", "content": body, "timestamp": "now"})
+    print(f"append 1 doc: {(time.perf_counter() - t0) * 1000:.2f} ms  (full rewrite of user_docs.json: "
+          f"{sum(len(d['content']) for d in legacy) / 1024:,.0f} KiB)")
+
+    t0 = time.perf_counter()
+    reopened = DocStore(folder)
+    docs = reopened.docs()
+    print(f"reopen (index only): {(time.perf_counter() - t0) * 1000:.2f} ms, {len(docs)} docs, "
+          f"first body {len(docs[0]['content'])} chars")
+
+    for i in range(40):
+        reopened.delete(f"doc_{i}.pdf")
+    time.sleep(0.2)
+    print("after deletes + background compaction:", reopened.stats())
+    assert DocStore(folder).get("doc_45.pdf")["content"] == body
+    print(f"store in {folder}", file=sys.stderr)
@@ -0,0 +1,364 @@
+"""
+image_prep.py - Downscale images for Vision calls and cache their descriptions.
+
+Uploaded images, pasted chat screenshots and scraper screenshots all went to
+GPT-4o at full resolution with detail="high". The API scales every image to
+fit 2048x2048 and then to a 768 px shortest side before tiling it, so any
+pixels beyond that are upload bandwidth the model never sees. This module:
+
+  - prepare_image(): resizes to that effective resolution up front and
+    recompresses (optimized PNG or JPEG, whichever is smaller), keeping the
+    original when it is already smaller.
+  - fingerprint(): a digest of the decoded pixels (identical for the same
+    image however it was re-encoded or renamed) plus a difference hash
+    (perceptual: also survives resizing and lossy recompression).
+  - VisionCache / describe_image(): Vision output keyed by (prompt, image).
+    An image that was already described (re-uploaded, re-pasted, or an
+    unchanged dashboard page) costs no model call. Entries are persisted
+    with write_encrypted_json and LRU-bounded.
+  - prepare_data_url(): memoized downscale of a browser data URL so a
+    screenshot re-sent on later turns is only processed once.
+
+Near-duplicate matching by perceptual hash is opt-in (max_distance > 0):
+on schedule screenshots a changed milestone date moves a 16x16 dHash by
+fewer bits than JPEG re-encoding does, so text-bearing images are matched on
+exact pixels by default.
+
+Usage:
+    from image_prep import prepare_image, describe_image
+    data, mime, info = prepare_image(raw_bytes)
+    text, cached = describe_image(client, raw_bytes, prompt)
+"""
+
+import io
+import os
+import re
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = None
+    PIL_AVAILABLE = False
+
+try:
+    from crypto import read_encrypted_json, write_encrypted_json
+except ImportError:
+    def read_encrypted_json(path):
+        with open(path, "r", encoding="utf-8") as f: return json.load(f)
+    def write_encrypted_json(path, obj):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f: json.dump(obj, f, indent=2, default=str)
+
+# GPT-4o "high" detail: fit within 2048x2048, then shortest side to 768.
+MAX_SIDE = 2048
+SHORT_SIDE = 768
+JPEG_QUALITY = 85
+
+CACHE_PATH = os.getenv("VISION_CACHE_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "vision", "descriptions.json")
+MAX_CACHE_ENTRIES = 500
+
+# dHash grid: 16x16 → 256-bit hash
+HASH_SIZE = 16
+
+_MIME = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp", "GIF": "image/gif"}
+_DATA_URL = re.compile(r"^data:(image/[\w.+-]+);base64,(.*)$", re.S)
+
+
+def _target_size(width: int, height: int) -> Tuple[int, int]:
+    scale = min(1.0, MAX_SIDE / max(width, height), SHORT_SIDE / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def prepare_image(data: bytes) -> Tuple[bytes, str, dict]:
+    """
+    Resize an image to the model's effective resolution and recompress it.
+    Returns (bytes, mime, info). Without Pillow, or for images it can't read,
+    the original bytes are returned unchanged.
+    """
+    info = {"original_bytes": len(data), "bytes": len(data), "resized": False}
+    if not PIL_AVAILABLE:
+        return data, "image/png", info
+    try:
+        img = Image.open(io.BytesIO(data))
+        src_format = img.format or "PNG"
+        info["original_size"] = img.size
+        target = _target_size(*img.size)
+        img.load()
+        if getattr(img, "is_animated", False):
+            img.seek(0)
+        if target != img.size:
+            img = img.resize(target, Image.LANCZOS)
+            info["resized"] = True
+        info["size"] = img.size
+
+        has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+        candidates = []
+        png = io.BytesIO()
+        (img if img.mode in ("RGB", "RGBA", "L", "LA", "P") else img.convert("RGB")).save(png, "PNG", optimize=True)
+        candidates.append((png.getvalue(), "image/png"))
+        if not has_alpha:
+            jpg = io.BytesIO()
+            img.convert("RGB").save(jpg, "JPEG", quality=JPEG_QUALITY, optimize=True)
+            candidates.append((jpg.getvalue(), "image/jpeg"))
+        out, mime = min(candidates, key=lambda c: len(c[0]))
+        if len(out) >= len(data):
+            # The API downsizes server-side anyway, so the smaller original costs the same tokens
+            return data, _MIME.get(src_format, "image/png"), info
+        info["bytes"] = len(out)
+        return out, mime, info
+    except Exception as e:
+        logger.warning(f"[image_prep] Could not preprocess image: {e}")
+        return data, "image/png", info
+
+
+def _dhash(img, hash_size: int = HASH_SIZE) -> str:
+    px = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS).tobytes()
+    bits = 0
+    for row in range(hash_size):
+        base = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (px[base + col + 1] > px[base + col])
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def fingerprint(data: bytes) -> Optional[dict]:
+    """
+    {"digest": sha256 of the decoded RGB pixels, "phash": difference hash},
+    or None if the image can't be read.
+    """
+    if not PIL_AVAILABLE:
+        return {"digest": hashlib.sha256(data).hexdigest(), "phash": None}
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.load()
+        rgb = img.convert("RGB")
+        h = hashlib.sha256(f"{rgb.size}".encode())
+        h.update(rgb.tobytes())
+        return {"digest": h.hexdigest(), "phash": _dhash(rgb)}
+    except Exception as e:
+        logger.warning(f"[image_prep] Could not fingerprint image: {e}")
+        return None
+
+
+def dhash(data: bytes, hash_size: int = HASH_SIZE) -> Optional[str]:
+    """Difference hash (hash_size² bits, hex). None if the image can't be read."""
+    if not PIL_AVAILABLE:
+        return None
+    try:
+        return _dhash(Image.open(io.BytesIO(data)), hash_size)
+    except Exception as e:
+        logger.warning(f"[image_prep] Could not hash image: {e}")
+        return None
+
+
+def hamming(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+class VisionCache:
+    """Vision outputs keyed by prompt and image fingerprint; persisted, LRU-bounded."""
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = MAX_CACHE_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: Optional[OrderedDict] = None   # "prompt_key:digest" → {"text", "phash", "ts", "hits"}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self) -> OrderedDict:
+        if self._entries is None:
+            entries = OrderedDict()
+            if os.path.exists(self.path):
+                try:
+                    for item in read_encrypted_json(self.path):
+                        entries[item["key"]] = item
+                except Exception as e:
+                    logger.warning(f"[image_prep] Vision cache unreadable, starting empty: {e}")
+            self._entries = entries
+        return self._entries
+
+    def _save(self) -> None:
+        try:
+            write_encrypted_json(self.path, list(self._entries.values()))
+        except Exception as e:
+            logger.warning(f"[image_prep] Could not persist vision cache: {e}")
+
+    def get(self, prompt_key: str, fp: Optional[dict], max_distance: int = 0) -> Optional[str]:
+        if not fp:
+            return None
+        with self._lock:
+            entries = self._load()
+            key = f"{prompt_key}:{fp['digest']}"
+            entry = entries.get(key)
+            if entry is None and max_distance > 0 and fp.get("phash"):
+                best = None
+                for k, e in entries.items():
+                    if e["prompt"] == prompt_key and e.get("phash") and len(e["phash"]) == len(fp["phash"]):
+                        d = hamming(e["phash"], fp["phash"])
+                        if d <= max_distance and (best is None or d < best[0]):
+                            best = (d, k)
+                if best:
+                    key, entry = best[1], entries[best[1]]
+            if entry is None:
+                self.misses += 1
+                return None
+            entries.move_to_end(key)
+            entry["hits"] = entry.get("hits", 0) + 1
+            self.hits += 1
+            return entry["text"]
+
+    def put(self, prompt_key: str, fp: Optional[dict], text: str) -> None:
+        if not fp or not text:
+            return
+        with self._lock:
+            entries = self._load()
+            key = f"{prompt_key}:{fp['digest']}"
+            entries[key] = {"key": key, "prompt": prompt_key, "phash": fp.get("phash"),
+                            "text": text, "ts": time.time(), "hits": 0}
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self._save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = len(self._load())
+        total = self.hits + self.misses
+        return {"entries": n, "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0}
+
+
+vision_cache = VisionCache()
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+def describe_image(client, data: bytes, prompt: str, model: str = "gpt-4o",
+                   max_distance: int = 0, label: str = "image", **create_kwargs) -> Tuple[str, bool]:
+    """
+    Run a Vision prompt over an image, reusing a cached answer for the same
+    image (or, with max_distance > 0, a perceptually near one). Returns (text, cached).
+    """
+    pkey = prompt_key(prompt)
+    fp = fingerprint(data)
+    cached = vision_cache.get(pkey, fp, max_distance)
+    if cached is not None:
+        logger.info(f"[image_prep] Vision cache hit for {label}")
+        return cached, True
+    prepared, mime, info = prepare_image(data)
+    if info["bytes"] < info["original_bytes"]:
+        logger.info(f"[image_prep] {label}: {info['original_bytes']:,} → {info['bytes']:,} bytes "
+                    f"({info.get('original_size')} → {info.get('size')})")
+    response = client.chat.completions.create(
+        model=model,
+        messages=[{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": {"url": to_data_url(prepared, mime), "detail": "high"}},
+            ],
+        }],
+        **create_kwargs,
+    )
+    text = response.choices[0].message.content or ""
+    vision_cache.put(pkey, fp, text)
+    return text, False
+
+
+def to_data_url(data: bytes, mime: str) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+
+
+_url_memo: "OrderedDict[str, Tuple[str, Optional[dict]]]" = OrderedDict()
+_url_memo_lock = threading.Lock()
+_URL_MEMO_MAX = 32
+
+
+def prepare_data_url(data_url: str) -> Tuple[str, Optional[dict]]:
+    """
+    Downscale a browser data URL. Returns (data_url, fingerprint); results
+    are memoized so an image re-sent on later turns isn't decoded again.
+    """
+    digest = hashlib.sha256(data_url.encode("ascii", "ignore")).hexdigest()
+    with _url_memo_lock:
+        if digest in _url_memo:
+            _url_memo.move_to_end(digest)
+            return _url_memo[digest]
+    m = _DATA_URL.match(data_url or "")
+    if not m:
+        return data_url, None
+    try:
+        raw = base64.b64decode(m.group(2))
+    except Exception:
+        return data_url, None
+    prepared, mime, info = prepare_image(raw)
+    result = (to_data_url(prepared, mime) if info["bytes"] < len(raw) else data_url, fingerprint(raw))
+    with _url_memo_lock:
+        _url_memo[digest] = result
+        while len(_url_memo) > _URL_MEMO_MAX:
+            _url_memo.popitem(last=False)
+    return result
+
+
+def get_stats() -> dict:
+    return vision_cache.stats()
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    from types import SimpleNamespace
+    from PIL import ImageDraw
+
+    logging.basicConfig(level=logging.INFO)
+    vision_cache = VisionCache(os.path.join(tempfile.mkdtemp(), "descriptions.json"))
+
+    def _screenshot(kpi: str) -> bytes:
+        img = Image.new("RGB", (1400, 900), "white")
+        d = ImageDraw.Draw(img)
+        for i in range(6):
+            d.rectangle([40 + i * 220, 60, 220 + i * 220, 200], outline="black", width=3)
+            d.text((60 + i * 220, 100), f"Milestone {i}: {kpi}", fill="black")
+        d.line([(40, 400), (1360, 800)], fill="navy", width=6)
+        buf = io.BytesIO()
+        img.save(buf, "PNG")
+        return buf.getvalue()
+
+    path = sys.argv[1] if len(sys.argv) > 1 else None
+    raw = open(path, "rb").read() if path else _screenshot("2026-03-01")
+    out, mime, info = prepare_image(raw)
+    print(f"prepare_image: {info} → {mime}")
+
+    calls = []
+
+    class _Stub:
+        chat = SimpleNamespace(completions=SimpleNamespace(
+            create=lambda **kw: calls.append(kw) or SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content="a dashboard"))])))
+
+    describe_image(_Stub(), raw, "Describe")
+    buf = io.BytesIO()
+    Image.open(io.BytesIO(raw)).convert("RGB").save(buf, "PNG", compress_level=1)   # same pixels, new bytes
+    _, cached = describe_image(_Stub(), buf.getvalue(), "Describe")
+    print(f"re-encoded copy cached={cached}, model calls={len(calls)}")
+    if not path:
+        changed = _screenshot("2026-04-15")
+        _, cached = describe_image(_Stub(), changed, "Describe")
+        print(f"changed KPI cached={cached} (dHash distance {hamming(dhash(raw), dhash(changed))}), "
+              f"model calls={len(calls)}")
+    print(get_stats())
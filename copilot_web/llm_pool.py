@@ -0,0 +1,315 @@
+"""
+llm_pool.py - One shared OpenAI client plus a fair concurrency limiter for LLM calls.
+
+get_client() used to build a new openai.OpenAI per request (new TLS
+connections every chat turn), and nothing capped how many completions ran at
+once when the whole team hit /chat together. This module provides:
+
+  - get_shared_client(): a process-wide client whose HTTP pool keeps
+    connections alive across requests (rebuilt only if the key/base URL change).
+  - FairLimiter: global, per-project and per-user concurrency caps with a FIFO
+    queue. A waiter blocked only by its own project/user cap doesn't hold up
+    waiters behind it; otherwise slots are granted in arrival order.
+  - LimitedClient: drop-in for client.chat.completions.create(...) that holds a
+    slot for the duration of each call (so tool loops queue per round).
+  - Queue-wait metrics (p50/p95/max, timeouts, in-flight by project).
+
+Configuration (environment):
+  OPENAI_BASE_URL          alternate endpoint (proxy, Azure gateway, local stub)
+  LLM_MAX_CONCURRENCY      total in-flight completions            (default 8)
+  LLM_MAX_PER_PROJECT      in-flight per project slug             (default 3)
+  LLM_MAX_PER_USER         in-flight per browser session / user   (default 2)
+  LLM_QUEUE_TIMEOUT        seconds to wait for a slot before 503  (default 30)
+
+Usage:
+    from llm_pool import get_limited_client, LLMQueueTimeout
+    client = get_limited_client(project="frisco_tx", user=session_id)
+    client.chat.completions.create(model="gpt-4o", messages=[...])
+
+Load test against a local HTTP stub of /v1/chat/completions (no API key needed):
+    python llm_pool.py [requests] [stub_latency_ms]
+"""
+
+import os
+import time
+import threading
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import openai
+except ImportError:
+    openai = None
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+class LLMQueueTimeout(Exception):
+    """No LLM slot became free within the queue timeout."""
+
+
+# ---------------------------------------------------------------------------
+# Fair limiter
+# ---------------------------------------------------------------------------
+
+class FairLimiter:
+    """Counting limiter with global / per-project / per-user caps and a FIFO wait queue."""
+
+    def __init__(self, max_total: int = 8, max_per_project: int = 3, max_per_user: int = 2,
+                 timeout: float = 30.0):
+        self.max_total = max_total
+        self.max_per_project = max_per_project
+        self.max_per_user = max_per_user
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._queue: deque = deque()             # waiting tickets, arrival order
+        self._in_flight = 0
+        self._by_project: Dict[str, int] = {}
+        self._by_user: Dict[str, int] = {}
+        # Metrics
+        self._waits_ms: deque = deque(maxlen=1000)
+        self.granted = 0
+        self.timeouts = 0
+        self.max_queue_depth = 0
+
+    def _fits(self, project: Optional[str], user: Optional[str]) -> bool:
+        if self._in_flight >= self.max_total:
+            return False
+        if project and self._by_project.get(project, 0) >= self.max_per_project:
+            return False
+        if user and self._by_user.get(user, 0) >= self.max_per_user:
+            return False
+        return True
+
+    def _first_eligible(self):
+        """Earliest queued ticket that could run now (skips tickets blocked by their own caps)."""
+        for ticket in self._queue:
+            if self._fits(ticket[0], ticket[1]):
+                return ticket
+        return None
+
+    def acquire(self, project: Optional[str] = None, user: Optional[str] = None,
+                timeout: Optional[float] = None) -> float:
+        """Block until a slot is free. Returns the time waited in ms; raises LLMQueueTimeout."""
+        timeout = self.timeout if timeout is None else timeout
+        ticket = (project, user, object())
+        t0 = time.perf_counter()
+        deadline = t0 + timeout
+        with self._cond:
+            self._queue.append(ticket)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            try:
+                while self._first_eligible() is not ticket:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise LLMQueueTimeout(
+                            f"No LLM slot within {timeout:.0f}s "
+                            f"(in flight {self._in_flight}/{self.max_total}, queued {len(self._queue)})")
+                    self._cond.wait(remaining)
+            finally:
+                self._queue.remove(ticket)
+                # Whoever is now first-eligible may have been waiting on our queue position
+                self._cond.notify_all()
+            self._in_flight += 1
+            if project:
+                self._by_project[project] = self._by_project.get(project, 0) + 1
+            if user:
+                self._by_user[user] = self._by_user.get(user, 0) + 1
+            waited = (time.perf_counter() - t0) * 1000
+            self._waits_ms.append(waited)
+            self.granted += 1
+        if waited > 1000:
+            logger.info(f"[llm_pool] Waited {waited:.0f} ms for an LLM slot (project={project})")
+        return waited
+
+    def release(self, project: Optional[str] = None, user: Optional[str] = None) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            for counts, key in ((self._by_project, project), (self._by_user, user)):
+                if key:
+                    counts[key] -= 1
+                    if not counts[key]:
+                        del counts[key]
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, project: Optional[str] = None, user: Optional[str] = None,
+             timeout: Optional[float] = None):
+        waited = self.acquire(project, user, timeout)
+        try:
+            yield waited
+        finally:
+            self.release(project, user)
+
+    def stats(self) -> dict:
+        with self._cond:
+            waits = sorted(self._waits_ms)
+            pct = lambda p: round(waits[min(len(waits) - 1, int(p * len(waits)))], 1) if waits else 0.0  # noqa: E731
+            return {
+                "limits": {"total": self.max_total, "per_project": self.max_per_project,
+                           "per_user": self.max_per_user, "queue_timeout_s": self.timeout},
+                "in_flight": self._in_flight,
+                "queued": len(self._queue),
+                "in_flight_by_project": dict(self._by_project),
+                "granted": self.granted,
+                "timeouts": self.timeouts,
+                "max_queue_depth": self.max_queue_depth,
+                "wait_ms": {"p50": pct(0.5), "p95": pct(0.95), "max": round(waits[-1], 1) if waits else 0.0,
+                            "samples": len(waits)},
+            }
+
+
+limiter = FairLimiter(
+    max_total=_env_int("LLM_MAX_CONCURRENCY", 8),
+    max_per_project=_env_int("LLM_MAX_PER_PROJECT", 3),
+    max_per_user=_env_int("LLM_MAX_PER_USER", 2),
+    timeout=float(_env_int("LLM_QUEUE_TIMEOUT", 30)),
+)
+
+
+# ---------------------------------------------------------------------------
+# Shared client
+# ---------------------------------------------------------------------------
+
+_client = None
+_client_key: Optional[tuple] = None
+_client_lock = threading.Lock()
+
+
+def get_shared_client(api_key: Optional[str] = None, base_url: Optional[str] = None):
+    """
+    Process-wide openai.OpenAI instance. Its HTTP connection pool is reused by
+    every request, so TLS connections stay alive between chat turns.
+    """
+    global _client, _client_key
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    base_url = base_url or os.getenv("OPENAI_BASE_URL") or None
+    if not api_key or openai is None:
+        return None
+    key = (api_key, base_url)
+    with _client_lock:
+        if _client is None or _client_key != key:
+            _client = openai.OpenAI(api_key=api_key, base_url=base_url)
+            _client_key = key
+            logger.info(f"[llm_pool] Shared OpenAI client created (base_url={base_url or 'default'})")
+        return _client
+
+
+class _LimitedCompletions:
+    def __init__(self, owner: "LimitedClient"):
+        self._owner = owner
+
+    def create(self, **kwargs):
+        o = self._owner
+        with o.limiter.slot(o.project, o.user):
+            return o.client.chat.completions.create(**kwargs)
+
+
+class _LimitedChat:
+    def __init__(self, owner: "LimitedClient"):
+        self.completions = _LimitedCompletions(owner)
+
+
+class LimitedClient:
+    """
+    Wraps a client so chat.completions.create() runs inside a limiter slot.
+    Everything else is passed through to the underlying client.
+    """
+
+    def __init__(self, client, project: Optional[str] = None, user: Optional[str] = None,
+                 limiter_: Optional[FairLimiter] = None):
+        self.client = client
+        self.project = project
+        self.user = user
+        self.limiter = limiter_ or limiter
+        self.chat = _LimitedChat(self)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def get_limited_client(project: Optional[str] = None, user: Optional[str] = None,
+                       api_key: Optional[str] = None, base_url: Optional[str] = None):
+    """Shared client wrapped with the process limiter, or None if no API key is configured."""
+    client = get_shared_client(api_key, base_url)
+    return LimitedClient(client, project, user) if client is not None else None
+
+
+def get_stats() -> dict:
+    return limiter.stats()
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    logging.basicConfig(level=logging.WARNING)
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 24
+    latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 200) / 1000
+
+    peers = set()
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            with lock:
+                peers.add(self.client_address)
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+            time.sleep(latency)
+            with lock:
+                active["now"] -= 1
+            reply = json.dumps({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": f"ok {body['messages'][-1]['content']}"}}],
+                "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(reply)))
+            self.end_headers()
+            self.wfile.write(reply)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    projects = ["frisco_tx", "selma_nc", "willis_tx"]
+
+    def one(i):
+        c = get_limited_client(project=projects[i % 3], user=f"user{i % 5}", api_key="stub", base_url=base)
+        r = c.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": str(i)}])
+        return r.choices[0].message.content
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=n_requests) as ex:
+        replies = list(ex.map(one, range(n_requests)))
+    elapsed = time.perf_counter() - t0
+    server.shutdown()
+
+    assert replies == [f"ok {i}" for i in range(n_requests)]
+    s = get_stats()
+    print(f"{n_requests} requests in {elapsed:.2f}s | peak concurrent at stub {active['peak']} "
+          f"(limit {s['limits']['total']}) | TCP connections used {len(peers)}")
+    print(json.dumps(s, indent=2))
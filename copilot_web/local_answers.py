@@ -0,0 +1,468 @@
+"""
+local_answers.py - Deterministic answers to factual schedule questions.
+
+"When does Drywall finish?", "how many critical activities are there?",
+"what's the data date?" — the answers are already in memory (parsed tasks,
+milestone map, variance summary), so sending them to the LLM costs seconds and
+tokens for no gain. This module matches a small set of factual intents with
+regexes, resolves the activity through the search index, and answers in
+milliseconds. Anything narrative ("why", "explain", "risk", "draft ...") or
+any question it can't resolve confidently returns None so the caller falls
+back to the LLM.
+
+Works from a plain facts dict, so both front ends can use it:
+  - Flask /chat:          project_loader.get_schedule_facts(slug)
+  - Streamlit copilot:    facts_from_parser(parser)
+
+Usage:
+    from local_answers import answer_question, get_stats
+    reply = answer_question("when does roof install finish?", facts)
+    if reply is None:
+        ... call the LLM ...
+"""
+
+import re
+import time
+import logging
+import threading
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Questions containing any of these need judgement, not a lookup
+NARRATIVE_MARKERS = re.compile(
+    r"\b(why|explain|narrative|report|summar\w*|story|impact|risk\w*|recommend\w*|should|"
+    r"concern\w*|cause\w*|driv(?:e|es|ing|er)|compare|trend|draft|write|analy\w+|assess\w*|"
+    r"opinion|think|recover\w*|mitigat\w*)\b"
+)
+
+# Log the running hit rate every N questions
+LOG_EVERY = 50
+
+_stats_lock = threading.Lock()
+_stats = {"questions": 0, "answered": 0, "total_ms": 0.0, "by_intent": {}}
+
+
+# ---------------------------------------------------------------------------
+# Formatting helpers
+# ---------------------------------------------------------------------------
+
+def _to_date(val) -> Optional[date]:
+    if val is None:
+        return None
+    if isinstance(val, datetime):
+        return val.date()
+    if isinstance(val, date):
+        return val
+    s = str(val).strip()[:10]
+    for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y"):
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _fmt_date(val) -> str:
+    d = _to_date(val)
+    return f"{d:%B} {d.day}, {d.year}" if d else "not scheduled"
+
+
+def _float_days(task) -> Optional[float]:
+    """Total float in days from XER hours or MPP slack strings."""
+    hrs = task.get("total_float_hrs")
+    if hrs is not None:
+        try:
+            hrs = float(hrs)
+            if hrs == hrs:  # not NaN
+                return round(hrs / 8.0, 1)
+        except (TypeError, ValueError):
+            pass
+    slack = str(task.get("total_slack") or "").strip().lower()
+    m = re.match(r"^(-?[\d.]+)\s*([a-z]*)", slack)
+    if m:
+        val, unit = float(m.group(1)), m.group(2)
+        if unit.startswith("h"):
+            return round(val / 8.0, 1)
+        if unit.startswith("w"):
+            return round(val * 5, 1)
+        return round(val, 1)
+    return None
+
+
+def _name(task) -> str:
+    return (task.get("name") or task.get("task_name") or "").strip()
+
+
+def _finish(task):
+    return task.get("finish") or task.get("target_end_date") or task.get("early_end_date")
+
+
+def _start(task):
+    return task.get("start") or task.get("target_start_date") or task.get("early_start_date")
+
+
+def _source_note(facts: dict) -> str:
+    label = facts.get("current_label") or "current schedule"
+    dd = facts.get("data_date")
+    return f"_(From {label}" + (f", data date {_fmt_date(dd)}" if dd else "") + ".)_"
+
+
+# ---------------------------------------------------------------------------
+# Activity resolution
+# ---------------------------------------------------------------------------
+
+def _index(facts: dict, snapshot: str = "current"):
+    key = {"current": "index", "previous": "previous_index", "baseline": "baseline_index"}[snapshot]
+    idx = facts.get(key)
+    if idx is None:
+        tasks = facts.get({"current": "tasks", "previous": "previous_tasks", "baseline": "baseline_tasks"}[snapshot])
+        if not tasks:
+            return None
+        from search_index import index_for
+        idx = facts[key] = index_for(tasks)
+    return idx
+
+
+def _clean_phrase(phrase: str) -> str:
+    return re.sub(r"^(the|activity|task|milestone)\s+", "", phrase.strip(" ?.!'\""), flags=re.I)
+
+
+def _resolve(facts: dict, phrase: str, snapshot: str = "current"):
+    """
+    Milestone-map standardized names first ("Substantial Completion" → mapped
+    activity), then ranked index lookup. Returns the task mapping, or None when
+    nothing matches well or no single activity clearly beats the rest.
+    """
+    phrase = _clean_phrase(phrase)
+    if not phrase:
+        return None
+    idx = _index(facts, snapshot)
+    if idx is None:
+        return None
+    low = phrase.lower()
+    for m in facts.get("milestones") or []:
+        std = (m.get("standardized_name") or "").lower()
+        if std and (std == low or (len(low) >= 4 and low in std)):
+            hit = idx.get(m.get("activity_name") or "", str(m.get("activity_id") or ""))
+            if hit is not None:
+                return hit
+    return idx.best(phrase)
+
+
+def _clarify(facts: dict, phrase: str) -> Optional[str]:
+    """
+    When _resolve() found no clear winner because several activities score
+    about the same ("drywall" → four drywall activities), list them instead of
+    picking one. None when the phrase simply doesn't match anything well.
+    """
+    from search_index import MIN_MATCH_SCORE, MIN_MATCH_MARGIN
+    phrase = _clean_phrase(phrase)
+    idx = _index(facts, "current") if phrase else None
+    if idx is None:
+        return None
+    hits = idx.search(phrase, limit=8)
+    if not hits or hits[0][0] < MIN_MATCH_SCORE:
+        return None
+    tied = [idx.task(key) for score, key in hits if hits[0][0] - score < MIN_MATCH_MARGIN]
+    if len(tied) < 2:
+        return None
+    # Same name + same finish reads as one line; keep every activity ID on it
+    rows: Dict[Tuple[str, str], List[str]] = {}
+    for t in tied:
+        ids = rows.setdefault((_name(t), _fmt_date(_finish(t))), [])
+        if t.get("id") and str(t["id"]) not in ids:
+            ids.append(str(t["id"]))
+    listed = "\n".join(
+        f"- {name} — finishes {fin}" + (f" (ID{'s' if len(ids) > 1 else ''} {', '.join(ids)})" if ids else "")
+        for (name, fin), ids in rows.items()
+    )
+    return f"Several activities match \"{phrase}\":\n{listed}\nWhich one do you mean?"
+
+
+# ---------------------------------------------------------------------------
+# Intents — each returns an answer string or None
+# ---------------------------------------------------------------------------
+
+_ACT = r"(?P<act>.+?)"
+
+def _intent_page(q: str, facts: dict) -> Optional[str]:
+    if facts.get("current_view") and re.search(r"\b(what\s+page|what\s+tab|where\s+am\s+i|which\s+page|which\s+tab)\b", q):
+        return f"You're currently on: {facts['current_view']}."
+    return None
+
+
+def _intent_data_date(q: str, facts: dict) -> Optional[str]:
+    if re.search(r"\b(data|status)\s+date\b", q) and facts.get("data_date"):
+        return f"The data date of {facts.get('current_label') or 'the current schedule'} is {_fmt_date(facts['data_date'])}."
+    return None
+
+
+_STATUS_CODES = {"tk_complete": "complete", "tk_active": "in_progress", "tk_notstart": "not_started"}
+
+
+def _state(task) -> Optional[str]:
+    """
+    complete / in_progress / not_started from the P6 status code, else from
+    actual dates (MPP). None when the task carries neither — percent complete
+    alone isn't trusted (P6 physical % is often 0 on finished activities).
+    """
+    code = str(task.get("status") or "").strip().lower()
+    if code in _STATUS_CODES:
+        return _STATUS_CODES[code]
+    if "actual_start" in task or "actual_finish" in task:
+        if task.get("actual_finish"):
+            return "complete"
+        return "in_progress" if task.get("actual_start") else "not_started"
+    return None
+
+
+def _intent_counts(q: str, facts: dict) -> Optional[str]:
+    m = re.search(r"\bhow\s+many\s+(?P<what>[a-z\- ]+?)(?:\s+(?:are|is|do|does|have|has|in|on|remain\w*|there)\b|\?|$)", q)
+    if not m:
+        return None
+    what = m.group("what").strip()
+    tasks = [t for t in (facts.get("tasks") or []) if not t.get("summary", False)]
+    if not tasks:
+        return None
+
+    # (pattern tested against the question from "how many" on, label, field it needs, predicate)
+    buckets: List[Tuple[str, str, str, Callable]] = [
+        (r"near[\s\-]?critical", "near-critical", "near_critical", lambda t: bool(t.get("near_critical"))),
+        (r"critical", "critical", "critical", lambda t: bool(t.get("critical"))),
+        (r"not[\s\-]started|unstarted", "not-started", "state", lambda t: _state(t) == "not_started"),
+        (r"in[\s\-]progress|underway|ongoing", "in-progress", "state", lambda t: _state(t) == "in_progress"),
+        # "started" = anything with an actual start, finished or not
+        (r"\bstarted\b", "started", "state", lambda t: _state(t) in ("in_progress", "complete")),
+        (r"remain\w*|\bleft\b|incomplete|outstanding|open\b", "incomplete", "state", lambda t: _state(t) != "complete"),
+        (r"\b(?:complete[d]?|finished|done)\b", "completed", "state", lambda t: _state(t) == "complete"),
+        (r"", "", "", lambda t: True),
+    ]
+    text = q[m.start():]
+    milestones_only = "milestone" in what
+    if not milestones_only and not re.search(r"activit|task|critical|item", what):
+        return None
+    if milestones_only and not any(t.get("milestone") for t in tasks):
+        return None  # no milestone flags in this schedule — a count of 0 would be a guess
+    pool = [t for t in tasks if t.get("milestone")] if milestones_only else tasks
+    for pattern, label, field, pred in buckets:
+        if not re.search(pattern, text):
+            continue
+        if field == "state" and any(_state(t) is None for t in pool):
+            return None
+        if field in ("critical", "near_critical"):
+            # Flags derived from float: need float values, and flags that actually vary
+            if all(_float_days(t) is None for t in tasks) or len({bool(t.get(field)) for t in tasks}) < 2:
+                return None
+        n = sum(1 for t in pool if pred(t))
+        desc = f"{label} {'milestones' if milestones_only else 'activities'}".strip()
+        return f"There are {n} {desc} in {facts.get('current_label') or 'the current schedule'}. {_source_note(facts)}"
+    return None
+
+
+def _intent_slip_counts(q: str, facts: dict) -> Optional[str]:
+    v = facts.get("variance")
+    if not v or not re.search(r"\bhow\s+many\s+(?:activities|tasks|items)\b.*\b(slip\w*|accelerat\w*|moved|pulled\s+in)\b", q):
+        return None
+    prev = facts.get("previous_label") or "the previous update"
+    if re.search(r"accelerat|pulled\s+in", q):
+        n, worst, days = v.get("total_accelerated", 0), v.get("max_accel_activity"), v.get("max_accel_days", 0)
+        extra = f" The largest was {worst} ({days} calendar days earlier)." if worst and days else ""
+        return f"{n} activities accelerated compared to {prev}.{extra}"
+    n, worst, days = v.get("total_slipped", 0), v.get("max_slip_activity"), v.get("max_slip_days", 0)
+    extra = f" The largest slip was {worst} (+{days} calendar days)." if worst and days else ""
+    return f"{n} activities slipped compared to {prev}.{extra}"
+
+
+def _intent_project_finish(q: str, facts: dict) -> Optional[str]:
+    if not re.search(r"\b(when\s+(?:does|will|is)\s+(?:the\s+)?(?:project|job|building)\s+(?:finish|complete|be\s+(?:done|complete|finished)|end)|"
+                     r"(?:project|overall)\s+(?:finish|completion)\s+date)\b", q):
+        return None
+    # Latest finish of any real activity, as project_loader._project_finish: a
+    # "completion" milestone found by name can finish before work still scheduled
+    dated = [(d, t) for t in (facts.get("tasks") or []) if not t.get("summary", False)
+             for d in [_to_date(_finish(t))] if d]
+    if not dated:
+        return None
+    finish, last = max(dated, key=lambda dt: dt[0])
+    return (f"The project is forecast to finish {_fmt_date(finish)} — the latest finish of any "
+            f"activity (**{_name(last)}**). {_source_note(facts)}")
+
+
+def _intent_activity_dates(q: str, facts: dict) -> Optional[str]:
+    m = (re.search(rf"\bwhen\s+(?:does|will|is|did)\s+{_ACT}\s+(?P<kind>finish|complete|end|be\s+(?:done|complete|finished)|start|begin)\b", q)
+         or re.search(rf"\b(?P<kind>finish|completion|end|start)\s+date\s+(?:of|for)\s+{_ACT}$", q)
+         or re.search(rf"\b{_ACT}\s+(?P<kind>finish|completion|start)\s+date\b", q))
+    if not m:
+        return None
+    act = m.group("act")
+    if re.fullmatch(r"(the\s+)?(project|job|building)", act.strip()):
+        return None
+    task = _resolve(facts, act)
+    if task is None:
+        return _clarify(facts, act)
+    is_start = m.group("kind").startswith(("start", "begin"))
+    when = _start(task) if is_start else _finish(task)
+    verb = "starts" if is_start else "finishes"
+    state = _state(task)
+    if state is None:
+        try:
+            state = "complete" if float(task.get("percent_complete") or 0) >= 100 else None
+        except (TypeError, ValueError):
+            state = None
+    if state == "complete" and not is_start:
+        actual = task.get("actual_finish") or when
+        return f"**{_name(task)}** is complete (finished {_fmt_date(actual)}). {_source_note(facts)}"
+    return f"**{_name(task)}** {verb} {_fmt_date(when)}. {_source_note(facts)}"
+
+
+def _intent_float(q: str, facts: dict) -> Optional[str]:
+    m = (re.search(rf"\b(?:total\s+)?(?:float|slack)\s+(?:on|for|of)\s+{_ACT}$", q)
+         or re.search(rf"\bhow\s+much\s+(?:total\s+)?(?:float|slack)\s+(?:does|do|is\s+on|is\s+there\s+on)\s+{_ACT}(?:\s+have)?$", q))
+    if not m:
+        return None
+    task = _resolve(facts, m.group("act"))
+    if task is None:
+        return _clarify(facts, m.group("act"))
+    days = _float_days(task)
+    if days is None:
+        return None
+    status = " — it is on the critical path" if days <= 0 else (" — near-critical" if days <= 10 else "")
+    return f"**{_name(task)}** has {days:g} days of total float{status}. {_source_note(facts)}"
+
+
+def _intent_percent(q: str, facts: dict) -> Optional[str]:
+    m = (re.search(rf"\b(?:percent|%)\s+complete\s+(?:is\s+|of\s+|for\s+)?{_ACT}$", q)
+         or re.search(rf"\bhow\s+(?:far\s+along|complete|much\s+progress)\s+(?:is|has)\s+{_ACT}(?:\s+made)?$", q)
+         or re.search(rf"\bhow\s+(?:much|far)\s+of\s+{_ACT}\s+is\s+(?:done|complete)$", q))
+    if not m:
+        return None
+    act = m.group("act")
+    if re.fullmatch(r"(the\s+)?(project|job|building|schedule)", act.strip()):
+        tasks = [t for t in (facts.get("tasks") or []) if not t.get("summary", False)]
+        if not tasks:
+            return None
+        avg = sum(float(t.get("percent_complete") or 0) for t in tasks) / len(tasks)
+        return f"The schedule is {avg:.1f}% complete (average across {len(tasks)} activities). {_source_note(facts)}"
+    task = _resolve(facts, act)
+    if task is None:
+        return _clarify(facts, act)
+    return f"**{_name(task)}** is {float(task.get('percent_complete') or 0):.0f}% complete. {_source_note(facts)}"
+
+
+def _intent_activity_slip(q: str, facts: dict) -> Optional[str]:
+    m = (re.search(rf"\bhow\s+(?:much|many\s+days)\s+(?:did|has)\s+{_ACT}\s+(?:slip\w*|move\w*|change\w*)", q)
+         or re.search(rf"\b(?:variance|slip)\s+(?:on|for|of)\s+{_ACT}$", q))
+    if not m or not facts.get("previous_tasks"):
+        return None
+    curr = _resolve(facts, m.group("act"))
+    if curr is None:
+        return _clarify(facts, m.group("act"))
+    prev = _index(facts, "previous").get(_name(curr), str(curr.get("id") or ""))
+    if prev is None:
+        return None
+    c, p = _to_date(_finish(curr)), _to_date(_finish(prev))
+    if not c or not p:
+        return None
+    delta = (c - p).days
+    prev_label = facts.get("previous_label") or "the previous update"
+    if delta == 0:
+        move = "has not moved"
+    elif delta > 0:
+        move = f"slipped {delta} calendar days"
+    else:
+        move = f"accelerated {-delta} calendar days"
+    return (f"**{_name(curr)}** {move} since {prev_label} "
+            f"(finish {_fmt_date(p)} → {_fmt_date(c)}).")
+
+
+# Order matters: more specific intents first
+INTENTS: List[Tuple[str, Callable[[str, dict], Optional[str]]]] = [
+    ("page", _intent_page),
+    ("data_date", _intent_data_date),
+    ("slip_counts", _intent_slip_counts),
+    ("counts", _intent_counts),
+    ("project_finish", _intent_project_finish),
+    ("activity_slip", _intent_activity_slip),
+    ("float", _intent_float),
+    ("percent_complete", _intent_percent),
+    ("activity_dates", _intent_activity_dates),
+]
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def _record(intent: Optional[str], elapsed_ms: float) -> None:
+    with _stats_lock:
+        _stats["questions"] += 1
+        _stats["total_ms"] += elapsed_ms
+        if intent:
+            _stats["answered"] += 1
+            _stats["by_intent"][intent] = _stats["by_intent"].get(intent, 0) + 1
+        n, hits = _stats["questions"], _stats["answered"]
+    if n % LOG_EVERY == 0:
+        logger.info(f"[local_answers] Hit rate {hits}/{n} ({100 * hits / n:.0f}%)")
+
+
+def match_intent(question: str, facts: dict) -> Tuple[Optional[str], Optional[str]]:
+    """Return (intent_name, answer) or (None, None). Does not touch the stats."""
+    if not question or not isinstance(question, str):
+        return None, None
+    q = re.sub(r"\s+", " ", question.strip().lower()).rstrip(" ?.!")
+    if NARRATIVE_MARKERS.search(q) or len(q) > 200:
+        return None, None
+    for name, fn in INTENTS:
+        try:
+            ans = fn(q, facts)
+        except Exception as e:
+            logger.debug(f"[local_answers] Intent {name} failed: {e}")
+            ans = None
+        if ans:
+            return name, ans
+    return None, None
+
+
+def answer_question(question: str, facts: Optional[dict]) -> Optional[str]:
+    """
+    Answer a factual schedule question from in-memory data, or return None
+    to let the caller fall back to the LLM. Every call counts toward get_stats().
+    """
+    t0 = time.perf_counter()
+    intent, ans = match_intent(question, facts or {}) if facts else (None, None)
+    _record(intent, (time.perf_counter() - t0) * 1000)
+    return ans
+
+
+def get_stats() -> dict:
+    """Hit rate and per-intent counts since process start."""
+    with _stats_lock:
+        n = _stats["questions"]
+        return {
+            "questions": n,
+            "answered_locally": _stats["answered"],
+            "fell_back_to_llm": n - _stats["answered"],
+            "hit_rate": round(_stats["answered"] / n, 3) if n else 0.0,
+            "avg_ms": round(_stats["total_ms"] / n, 3) if n else 0.0,
+            "by_intent": dict(_stats["by_intent"]),
+        }
+
+
+def facts_from_parser(parser, label: str = "the current schedule", current_view: Optional[str] = None) -> dict:
+    """
+    Build a facts dict from a P6Parser (Streamlit app). Uses the parser's own
+    _normalize_task_row so task dicts match the Flask loader's XER tasks.
+    """
+    tasks = []
+    df = getattr(parser, "df_activities", None)
+    if df is not None and not df.empty:
+        tasks = [parser._normalize_task_row(row) for _, row in df.iterrows()]
+    dd = (getattr(parser, "project_metadata", None) or {}).get("data_date")
+    return {
+        "tasks": tasks,
+        "data_date": dd.strftime("%Y-%m-%d") if hasattr(dd, "strftime") else dd,
+        "current_label": label,
+        "current_view": current_view,
+    }
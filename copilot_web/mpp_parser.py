@@ -12,7 +12,7 @@ Supports:
 import os
 import logging
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union, BinaryIO
 
 logger = logging.getLogger(__name__)
 
@@ -40,8 +40,11 @@ class MPPParser:
     Provides LLM-ready context for the AI Copilot.
     """
 
-    def __init__(self, file_path: str):
-        self.file_path = file_path
+    def __init__(self, file_path: Union[str, BinaryIO, bytes], name: Optional[str] = None):
+        # file_path may also be an open binary file (e.g. crypto.open_decrypted) or raw
+        # bytes — then `name` (the original filename) is used for logging and project naming
+        self._source = file_path
+        self.file_path = file_path if isinstance(file_path, str) else (name or getattr(file_path, "name", "schedule"))
         self.project = None
         self.tasks: List[Dict[str, Any]] = []
         self.resources: List[Dict[str, Any]] = []
@@ -62,7 +65,7 @@ class MPPParser:
         try:
             reader = UniversalProjectReader()
             try:
-                self.project = reader.read(self.file_path)
+                self.project = reader.read(self._java_source())
             except Exception as e:
                 if "password" in str(e).lower() or "encrypted" in str(e).lower():
                     raise ValueError(f"MPP file is password protected and cannot be read: {self.file_path}")
@@ -77,6 +80,15 @@ class MPPParser:
             logger.error(f"Failed to parse file: {e}")
             raise
 
+    def _java_source(self):
+        """Path string for files on disk; an in-memory java.io.InputStream for buffers/streams."""
+        if isinstance(self._source, str):
+            return self._source
+        import jpype
+        from java.io import ByteArrayInputStream
+        data = self._source if isinstance(self._source, (bytes, bytearray)) else self._source.read()
+        return ByteArrayInputStream(jpype.JArray(jpype.JByte)(bytes(data)))
+
     def _extract_metadata(self):
         """Pull project-level properties."""
         p = self.project.getProjectProperties()
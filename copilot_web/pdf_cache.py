@@ -0,0 +1,196 @@
+"""
+pdf_cache.py - Content-addressed cache for PDF extraction results.
+
+compression_updateN.pdf, variance_N.pdf and verify_N.pdf never change once they
+are dropped into a project folder, but every project load used to run pdfplumber
+over all of them again (including every prior update's compression PDF).
+
+Results are keyed by the SHA-256 of the PDF bytes plus the extractor kind, kept
+in memory for the life of the process and persisted with write_encrypted_json so
+they survive restarts. A renamed or re-uploaded copy of the same PDF is a cache
+hit; an edited PDF gets a new digest and is extracted again. The in-memory layer
+is an LRU bounded to PDF_MEMO_ENTRIES results and hands out copies, so a caller
+that edits its result can't change what the next caller gets.
+
+When a PDF is new, its pages are extracted in parallel on one shared process
+pool (pdfminer is pure Python, so threads would serialize on the GIL). The pool
+is started on first use and reused for every later PDF.
+
+Usage:
+    from pdf_cache import cached_extract, extract_page_texts
+    lines = cached_extract(path, "lines", my_extractor)
+"""
+
+import os
+import copy
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from crypto import read_encrypted_json, write_encrypted_json
+except ImportError:
+    def read_encrypted_json(path):
+        with open(path, "r", encoding="utf-8") as f: return json.load(f)
+    def write_encrypted_json(path, obj):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f: json.dump(obj, f, indent=2, default=str)
+
+CACHE_DIR = os.getenv("PDF_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "pdf")
+
+# Bump when an extractor's output format changes so stale entries are ignored.
+CACHE_VERSION = 1
+
+# Below this many pages the process pool costs more than it saves.
+PARALLEL_MIN_PAGES = 6
+MAX_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "0") or 0) or min(4, os.cpu_count() or 1)
+
+# Extraction results kept in memory (LRU); older ones are re-read from disk
+MEMO_MAX_ENTRIES = int(os.getenv("PDF_MEMO_ENTRIES", "64"))
+
+_memo: "OrderedDict[Tuple[str, str], object]" = OrderedDict()
+_memo_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's bytes, read in 1 MB blocks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Page-parallel text extraction
+# ---------------------------------------------------------------------------
+
+def _extract_page_range(args: Tuple[str, int, int]) -> List[str]:
+    """Worker: open the PDF independently and extract text for pages [start, end)."""
+    pdf_path, start, end = args
+    import pdfplumber
+    texts = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages[start:end]:
+            texts.append(page.extract_text() or "")
+    return texts
+
+
+def extract_page_texts(pdf_path: str, max_pages: int = 30) -> List[str]:
+    """
+    Return the extracted text of the first max_pages pages (one string per page).
+    Large PDFs are split into contiguous page ranges and extracted in a process
+    pool; if the pool cannot be started the pages are extracted sequentially.
+    Raises if pdfplumber is missing or the file cannot be opened.
+    """
+    import pdfplumber
+    with pdfplumber.open(pdf_path) as pdf:
+        n_pages = min(len(pdf.pages), max_pages)
+
+    if n_pages < PARALLEL_MIN_PAGES or MAX_WORKERS <= 1:
+        return _extract_page_range((pdf_path, 0, n_pages))
+
+    # One contiguous range per worker, so each worker opens the PDF once
+    step = -(-n_pages // min(MAX_WORKERS, n_pages))  # ceil division
+    ranges = [(pdf_path, s, min(s + step, n_pages)) for s in range(0, n_pages, step)]
+    try:
+        chunks = list(_get_pool().map(_extract_page_range, ranges))
+        return [text for chunk in chunks for text in chunk]
+    except Exception as e:
+        logger.debug(f"[pdf_cache] Parallel extraction unavailable ({e}) — extracting sequentially")
+        _reset_pool()
+        return _extract_page_range((pdf_path, 0, n_pages))
+
+
+def _get_pool():
+    """The module-wide extraction pool, started on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+        return _pool
+
+
+def _reset_pool() -> None:
+    """Drop a pool that failed (e.g. a worker died) so the next PDF starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+def _cache_path(digest: str, kind: str) -> str:
+    return os.path.join(CACHE_DIR, f"{digest}.{kind}.v{CACHE_VERSION}.json")
+
+
+def _remember(key: Tuple[str, str], result) -> None:
+    """Store a private copy of result in the LRU. Call with _memo_lock held."""
+    _memo[key] = copy.deepcopy(result)
+    _memo.move_to_end(key)
+    while len(_memo) > MEMO_MAX_ENTRIES:
+        _memo.popitem(last=False)
+
+
+def cached_extract(pdf_path: str, kind: str, extractor: Callable[[str], object]):
+    """
+    Return extractor(pdf_path), reusing a prior result for identical PDF content.
+
+    kind names the extractor ("lines", "compression", ...) so one PDF can hold
+    several cached results. Exceptions raised by the extractor propagate and
+    nothing is cached, so a transient failure is retried on the next load.
+    """
+    digest = file_digest(pdf_path)
+    key = (digest, kind)
+
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            _stats["memory_hits"] += 1
+            return copy.deepcopy(_memo[key])
+
+    path = _cache_path(digest, kind)
+    if os.path.exists(path):
+        try:
+            entry = read_encrypted_json(path)
+            if entry.get("kind") == kind and entry.get("version") == CACHE_VERSION:
+                with _memo_lock:
+                    _remember(key, entry["result"])
+                    _stats["disk_hits"] += 1
+                return entry["result"]
+        except Exception as e:
+            logger.warning(f"[pdf_cache] Unreadable cache entry {os.path.basename(path)}: {e} — re-extracting")
+
+    result = extractor(pdf_path)
+    with _memo_lock:
+        _remember(key, result)
+        _stats["misses"] += 1
+    try:
+        write_encrypted_json(path, {
+            "kind": kind,
+            "version": CACHE_VERSION,
+            "source": os.path.basename(pdf_path),
+            "result": result,
+        })
+    except Exception as e:
+        logger.warning(f"[pdf_cache] Could not persist {kind} result for {os.path.basename(pdf_path)}: {e}")
+    return result
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters since process start."""
+    with _memo_lock:
+        return {**_stats, "entries_in_memory": len(_memo)}
@@ -0,0 +1,511 @@
+"""
+portfolio_store.py - Columnar store of normalized schedule data across projects.
+
+Portfolio questions ("which jobs slipped Substantial Completion more than 30
+days this month?") used to mean reading every project's text context. The
+loader now publishes each parsed snapshot as Parquet tables, partitioned by
+project and update:
+
+    .cache/portfolio/<table>/slug=<slug>/update=<update>/part.parquet
+
+  tasks          id, name, wbs, milestone, summary, critical, percent_complete,
+                 start, finish, baseline_start, baseline_finish, total_float_days
+  relationships  task_id, predecessor_id, type, lag
+  milestones     milestone, activity, current/prior/baseline finish,
+                 variance_vs_prior_days, drift_vs_baseline_days
+  variance       one row per update: data date, health status, drift and
+                 update-over-update slip/accel figures, task counts
+
+manifest.json records which updates each project has, the project version each
+was written from and which one is latest, so partitions are pruned before any
+file is opened and unchanged snapshots are never rewritten. Writers in every
+worker process take an flock on manifest.lock for the read-modify-write, and the
+manifest is replaced atomically. Queries read only the requested columns of the
+selected partitions; decoded partitions are kept in memory until the file
+changes, so portfolio aggregates come back in a few milliseconds. Files go through write_encrypted_bytes, so they are encrypted at
+rest when ENCRYPTION_KEY is set.
+
+pyarrow is optional — without it the store is disabled and callers fall back to
+the in-memory project_loader state.
+
+Usage:
+    import portfolio_store
+    portfolio_store.scan("tasks", columns=["name", "finish"], slugs=["frisco_tx"])
+    portfolio_store.milestone_slips("substantial", min_days=30, since="2026-10-01")
+    portfolio_store.latest_health()
+"""
+
+import os
+import re
+import io
+import copy
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
+
+try:
+    import fcntl
+except ImportError:  # Windows — single-process deployments only
+    fcntl = None
+
+try:
+    from crypto import write_encrypted_bytes, read_encrypted_bytes, write_encrypted_json, read_encrypted_json, is_enabled
+except ImportError:
+    def write_encrypted_bytes(path, data):
+        with open(path, "wb") as f: f.write(data)
+    def read_encrypted_bytes(path):
+        with open(path, "rb") as f: return f.read()
+    def write_encrypted_json(path, obj):
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f: json.dump(obj, f, indent=2, default=str)
+        os.replace(tmp, path)
+    def read_encrypted_json(path):
+        with open(path, "r", encoding="utf-8") as f: return json.load(f)
+    def is_enabled(): return False
+
+STORE_DIR = os.getenv("PORTFOLIO_STORE_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "portfolio")
+MANIFEST_PATH = os.path.join(STORE_DIR, "manifest.json")
+LOCK_PATH = os.path.join(STORE_DIR, "manifest.lock")
+TABLES = ("tasks", "relationships", "milestones", "variance")
+
+_lock = threading.RLock()
+_manifest_cache = {"mtime": None, "data": {}}
+_partition_cache: Dict[tuple, object] = {}     # (path, mtime_ns, columns) → pa.Table
+_PARTITION_CACHE_MAX = 512
+_stats = {"snapshots_written": 0, "snapshots_skipped": 0, "queries": 0, "partitions_read": 0,
+          "partition_cache_hits": 0}
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def _schemas() -> Dict[str, "pa.Schema"]:
+    return {
+        "tasks": pa.schema([
+            ("id", pa.string()), ("name", pa.string()), ("wbs", pa.string()),
+            ("milestone", pa.bool_()), ("summary", pa.bool_()), ("critical", pa.bool_()),
+            ("percent_complete", pa.float64()),
+            ("start", pa.date32()), ("finish", pa.date32()),
+            ("baseline_start", pa.date32()), ("baseline_finish", pa.date32()),
+            ("total_float_days", pa.float64()),
+        ]),
+        "relationships": pa.schema([
+            ("task_id", pa.string()), ("predecessor_id", pa.string()),
+            ("type", pa.string()), ("lag", pa.string()),
+        ]),
+        "milestones": pa.schema([
+            ("milestone", pa.string()), ("activity", pa.string()),
+            ("current_finish", pa.date32()), ("prior_update_finish", pa.date32()),
+            ("baseline_finish", pa.date32()),
+            ("variance_vs_prior_days", pa.int32()), ("drift_vs_baseline_days", pa.int32()),
+        ]),
+        "variance": pa.schema([
+            ("data_date", pa.date32()), ("current_label", pa.string()), ("previous_label", pa.string()),
+            ("status", pa.string()), ("compression_pct", pa.float64()),
+            ("max_slip_days", pa.int32()), ("max_accel_days", pa.int32()),
+            ("total_slipped", pa.int32()), ("total_accelerated", pa.int32()),
+            ("update_max_slip_days", pa.int32()), ("update_max_accel_days", pa.int32()),
+            ("update_total_slipped", pa.int32()), ("update_total_accelerated", pa.int32()),
+            ("task_count", pa.int32()), ("critical_count", pa.int32()), ("milestone_count", pa.int32()),
+            ("written_at", pa.string()),
+        ]),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Normalization
+# ---------------------------------------------------------------------------
+
+def _to_date(value) -> Optional[date]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    s = str(value).strip()[:10]
+    for fmt in ("%Y-%m-%d", "%m/%d/%Y"):
+        try:
+            return datetime.strptime(s, fmt).date()
+        except ValueError:
+            pass
+    return None
+
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_tasks(tasks: Iterable) -> List[dict]:
+    """MPP / XER / XML task dicts (or TaskViews) → one common row shape."""
+    from local_answers import _float_days
+    rows = []
+    for t in tasks or []:
+        try:
+            pct = float(t.get("percent_complete") or t.get("complete_pct") or 0)
+        except (TypeError, ValueError):
+            pct = None
+        rows.append({
+            "id": str(t.get("id") or t.get("task_id") or t.get("activity_id") or "").strip(),
+            "name": (t.get("name") or t.get("task_name") or "").strip(),
+            "wbs": str(t.get("wbs") or "").strip(),
+            "milestone": bool(t.get("milestone", False)),
+            "summary": bool(t.get("summary", False)),
+            "critical": bool(t.get("critical", False)),
+            "percent_complete": pct,
+            "start": _to_date(t.get("start") or t.get("target_start_date") or t.get("early_start_date")),
+            "finish": _to_date(t.get("finish") or t.get("target_end_date") or t.get("early_end_date")),
+            "baseline_start": _to_date(t.get("baseline_start") or t.get("bl_start")),
+            "baseline_finish": _to_date(t.get("baseline_finish") or t.get("bl_finish")),
+            "total_float_days": _float_days(t),
+        })
+    return rows
+
+
+def normalize_relationships(relationships: Iterable) -> List[dict]:
+    rows = []
+    for r in relationships or []:
+        succ = str(r.get("task_id") or r.get("succ_task_id") or "").strip()
+        pred = str(r.get("predecessor_task_id") or r.get("pred_task_id") or "").strip()
+        if succ and pred:
+            rows.append({
+                "task_id": succ,
+                "predecessor_id": pred,
+                "type": str(r.get("type") or r.get("pred_type") or "FS").strip(),
+                "lag": str(r.get("lag") or r.get("lag_hr_cnt") or "").strip(),
+            })
+    return rows
+
+
+def normalize_milestones(milestones: Iterable[dict]) -> List[dict]:
+    """Rows from schedule_tools.get_milestone_trend()["milestones"]."""
+    return [{
+        "milestone": m.get("milestone") or "",
+        "activity": m.get("activity") or "",
+        "current_finish": _to_date(m.get("current_finish")),
+        "prior_update_finish": _to_date(m.get("prior_update_finish")),
+        "baseline_finish": _to_date(m.get("baseline_finish")),
+        "variance_vs_prior_days": _int(m.get("variance_vs_prior_days")),
+        "drift_vs_baseline_days": _int(m.get("drift_vs_baseline_days")),
+    } for m in milestones or []]
+
+
+# ---------------------------------------------------------------------------
+# Manifest / partitions
+# ---------------------------------------------------------------------------
+
+def _safe(part: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.\-]", "_", str(part))
+
+
+def _partition_path(table: str, slug: str, update: str) -> str:
+    return os.path.join(STORE_DIR, table, f"slug={_safe(slug)}", f"update={_safe(update)}", "part.parquet")
+
+
+def _manifest() -> dict:
+    """manifest.json, re-read only when another process rewrote it."""
+    try:
+        mtime = os.stat(MANIFEST_PATH).st_mtime_ns
+    except OSError:
+        return {}
+    with _lock:
+        if _manifest_cache["mtime"] != mtime:
+            try:
+                _manifest_cache["data"] = read_encrypted_json(MANIFEST_PATH)
+                _manifest_cache["mtime"] = mtime
+            except Exception as e:
+                logger.warning(f"[portfolio_store] Could not read manifest: {e}")
+                return _manifest_cache["data"]
+        return _manifest_cache["data"]
+
+
+@contextmanager
+def _locked():
+    """
+    Thread lock plus an exclusive flock on manifest.lock, held across every
+    manifest read-modify-write so concurrent workers can't drop each other's entries.
+    """
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(STORE_DIR, exist_ok=True)
+        with open(LOCK_PATH, "a") as fh:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+def _save_manifest(manifest: dict) -> None:
+    """Replace manifest.json atomically. Call with _locked() held."""
+    os.makedirs(STORE_DIR, exist_ok=True)
+    write_encrypted_json(MANIFEST_PATH, manifest)
+    _manifest_cache.update(mtime=os.stat(MANIFEST_PATH).st_mtime_ns, data=manifest)
+
+
+def _update_key(label: str) -> tuple:
+    """Sort order for update labels: baseline < update_1 < update_2 < ... < update_10."""
+    m = re.search(r"(\d+)", label or "")
+    if (label or "").lower().startswith("baseline"):
+        return (0, 0, label)
+    return (1, int(m.group(1)) if m else 0, label)
+
+
+def get_version() -> Optional[int]:
+    """Changes whenever any process publishes a snapshot (manifest mtime)."""
+    try:
+        return os.stat(MANIFEST_PATH).st_mtime_ns
+    except OSError:
+        return None
+
+
+def has_snapshot(slug: str, update: str, version: Optional[str] = None) -> bool:
+    entry = _manifest().get(slug, {}).get("updates", {}).get(update)
+    return bool(entry) and (version is None or entry.get("version") == version)
+
+
+def write_snapshot(slug: str, update: str, version: str, tasks=None, relationships=None,
+                   milestones=None, variance: Optional[dict] = None, latest: bool = True) -> bool:
+    """
+    Publish one project update. Skipped (returns False) if that update was
+    already written from the same project version.
+    """
+    if not available():
+        return False
+    if has_snapshot(slug, update, version):
+        _stats["snapshots_skipped"] += 1
+        return False
+    schemas = _schemas()
+    variance = dict(variance or {})
+    task_rows = normalize_tasks(tasks)
+    variance.setdefault("task_count", len(task_rows))
+    variance.setdefault("critical_count", sum(1 for t in task_rows if t["critical"] and not t["summary"]))
+    variance.setdefault("milestone_count", sum(1 for t in task_rows if t["milestone"]))
+    variance["data_date"] = _to_date(variance.get("data_date"))
+    variance["written_at"] = datetime.utcnow().isoformat() + "Z"
+    rows = {
+        "tasks": task_rows,
+        "relationships": normalize_relationships(relationships),
+        "milestones": normalize_milestones(milestones),
+        "variance": [{k: variance.get(k) for k in schemas["variance"].names}],
+    }
+    t0 = time.perf_counter()
+    with _locked():
+        if has_snapshot(slug, update, version):     # another worker published it while we normalized
+            _stats["snapshots_skipped"] += 1
+            return False
+        for table in TABLES:
+            arrow = pa.Table.from_pylist(rows[table], schema=schemas[table])
+            buf = io.BytesIO()
+            pq.write_table(arrow, buf, compression="zstd")
+            path = _partition_path(table, slug, update)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_encrypted_bytes(path, buf.getvalue())
+
+        manifest = copy.deepcopy(_manifest())
+        entry = manifest.setdefault(slug, {"updates": {}})
+        entry["updates"][update] = {"version": version, "data_date": str(variance["data_date"] or ""),
+                                    "tasks": len(task_rows), "written_at": variance["written_at"]}
+        if latest or not entry.get("latest"):
+            entry["latest"] = update
+        _save_manifest(manifest)
+        _stats["snapshots_written"] += 1
+    logger.info(f"[{slug}] Portfolio store: wrote {update} ({len(task_rows)} tasks, "
+                f"{len(rows['relationships'])} links, {len(rows['milestones'])} milestones) "
+                f"in {(time.perf_counter() - t0) * 1000:.0f} ms")
+    return True
+
+
+def drop_project(slug: str) -> None:
+    """Remove every partition and the manifest entry for a project."""
+    import shutil
+    with _locked():
+        for table in TABLES:
+            shutil.rmtree(os.path.join(STORE_DIR, table, f"slug={_safe(slug)}"), ignore_errors=True)
+        manifest = copy.deepcopy(_manifest())
+        if manifest.pop(slug, None) is not None:
+            _save_manifest(manifest)
+
+
+def _read_partition(table: str, slug: str, update: str, columns: Optional[tuple]):
+    path = _partition_path(table, slug, update)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    key = (path, mtime, columns)
+    with _lock:
+        cached = _partition_cache.get(key)
+        if cached is not None:
+            _stats["partition_cache_hits"] += 1
+            return cached
+    if is_enabled():
+        source = pa.BufferReader(read_encrypted_bytes(path))
+    else:
+        source = path                       # plain Parquet — read just the needed column chunks
+    arrow = pq.read_table(source, columns=list(columns) if columns else None, memory_map=not is_enabled())
+    with _lock:
+        if len(_partition_cache) >= _PARTITION_CACHE_MAX:
+            _partition_cache.pop(next(iter(_partition_cache)))
+        for stale in [k for k in _partition_cache if k[0] == path and k[1] != mtime]:
+            del _partition_cache[stale]
+        _partition_cache[key] = arrow
+        _stats["partitions_read"] += 1
+    return arrow
+
+
+# ---------------------------------------------------------------------------
+# Queries
+# ---------------------------------------------------------------------------
+
+def scan(table: str, columns: Optional[List[str]] = None, slugs: Optional[Iterable[str]] = None,
+         updates="latest", where=None):
+    """
+    Read `columns` of `table` for the selected partitions as one pyarrow Table
+    with slug and update columns prepended.
+
+    updates: "latest" (default), "all", or a list of update labels.
+    where:   optional pyarrow.compute expression applied after the read,
+             e.g. pc.field("finish") > pa.scalar(date(2026, 1, 1)).
+    """
+    if not available():
+        raise RuntimeError("pyarrow is not installed — portfolio store disabled")
+    if table not in TABLES:
+        raise ValueError(f"Unknown table '{table}'")
+    _stats["queries"] += 1
+    manifest = _manifest()
+    wanted = set(slugs) if slugs is not None else None
+    cols = tuple(columns) if columns else None
+    parts = []
+    for slug in sorted(manifest):
+        if wanted is not None and slug not in wanted:
+            continue
+        entry = manifest[slug]
+        if updates == "latest":
+            labels = [entry.get("latest")] if entry.get("latest") else []
+        elif updates == "all":
+            labels = sorted(entry.get("updates", {}), key=_update_key)
+        else:
+            labels = [u for u in updates if u in entry.get("updates", {})]
+        for label in labels:
+            arrow = _read_partition(table, slug, label, cols)
+            if arrow is None:
+                continue
+            n = arrow.num_rows
+            arrow = arrow.add_column(0, "update", pa.array([label] * n, pa.string()))
+            arrow = arrow.add_column(0, "slug", pa.array([slug] * n, pa.string()))
+            parts.append(arrow)
+    if not parts:
+        schema = _schemas()[table]
+        fields = [schema.field(c) for c in (cols or schema.names)]
+        return pa.schema([("slug", pa.string()), ("update", pa.string())] + fields).empty_table()
+    result = pa.concat_tables(parts)
+    if where is not None:
+        result = result.filter(where)
+    return result
+
+
+def latest_health() -> Dict[str, dict]:
+    """{slug: {status, compression_pct, max_slip_days, max_accel_days, ...}} from each project's latest update."""
+    if not available():
+        return {}
+    arrow = scan("variance", columns=["status", "compression_pct", "max_slip_days", "max_accel_days",
+                                      "total_slipped", "total_accelerated", "data_date"])
+    out = {}
+    for row in arrow.to_pylist():
+        if row["status"]:
+            slug = row.pop("slug")
+            row.pop("update")
+            out[slug] = row
+    return out
+
+
+def milestone_slips(milestone: Optional[str] = None, min_days: int = 0, since=None,
+                    against: str = "prior", slugs: Optional[Iterable[str]] = None) -> List[dict]:
+    """
+    Milestones whose latest forecast moved later by more than min_days
+    (against="prior" update or "baseline"), optionally only for projects whose
+    latest data date is on/after `since` and milestones whose name contains
+    `milestone`. Sorted by slip, largest first.
+    """
+    if not available():
+        return []
+    days_col = "variance_vs_prior_days" if against == "prior" else "drift_vs_baseline_days"
+    arrow = scan("milestones", columns=["milestone", "current_finish", "prior_update_finish",
+                                        "baseline_finish", days_col], slugs=slugs,
+                 where=pc.field(days_col) > min_days)
+    if milestone:
+        arrow = arrow.filter(pc.match_substring(arrow["milestone"], milestone, ignore_case=True))
+    since = _to_date(since)
+    manifest = _manifest()
+    rows = []
+    for row in arrow.to_pylist():
+        data_date = manifest.get(row["slug"], {}).get("updates", {}).get(row["update"], {}).get("data_date")
+        if since and (not data_date or _to_date(data_date) < since):
+            continue
+        row["data_date"] = data_date or None
+        row["slip_days"] = row.pop(days_col)
+        for k in ("current_finish", "prior_update_finish", "baseline_finish"):
+            row[k] = row[k].isoformat() if row[k] else None
+        rows.append(row)
+    rows.sort(key=lambda r: -r["slip_days"])
+    return rows
+
+
+def get_stats() -> dict:
+    manifest = _manifest() if available() else {}
+    out = dict(_stats)
+    out.update({
+        "available": available(),
+        "store_dir": STORE_DIR,
+        "projects": len(manifest),
+        "snapshots": sum(len(e.get("updates", {})) for e in manifest.values()),
+        "partition_cache_entries": len(_partition_cache),
+    })
+    return out
+
+
+if __name__ == "__main__":
+    # Publish every loaded project, then time a few portfolio-wide queries.
+    import sys
+    here = os.path.dirname(os.path.abspath(__file__))
+    if here not in sys.path:
+        sys.path.insert(0, here)
+    logging.basicConfig(level=logging.INFO)
+    if not available():
+        sys.exit("pyarrow is not installed")
+    from project_loader import load_all_projects
+    load_all_projects()
+    import portfolio_store as store          # the instance project_loader wrote through
+
+    for label, fn in (
+        ("critical tasks per project", lambda: pc.value_counts(
+            store.scan("tasks", ["critical"], where=pc.field("critical"))["slug"]).to_pylist()),
+        ("latest health", store.latest_health),
+        ("milestones slipped > 30 cd", lambda: store.milestone_slips(min_days=30)),
+    ):
+        fn()                                         # first call decodes the partitions
+        t0 = time.perf_counter()
+        result = fn()
+        print(f"{label}: {(time.perf_counter() - t0) * 1000:.2f} ms → {str(result)[:160]}")
+    print(store.get_stats())
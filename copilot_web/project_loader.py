@@ -9,6 +9,8 @@ import os
 import json
 import logging
 import sys
+import threading
+from datetime import datetime
 from typing import Dict, Optional
 
 logger = logging.getLogger(__name__)
@@ -24,12 +26,38 @@ except ImportError:
     def write_encrypted_json(path, obj):
         with open(path, "w", encoding="utf-8") as f: json.dump(obj, f, indent=2, default=str)
 
+# Long-lived task caches are held as compact column tables, not lists of dicts
+from task_store import compact_tasks
+from search_index import index_snapshot, drop_snapshot, get_index
+
+# Shared SQLite index of parsed schedules (tasks, links, FTS) — see schedule_db.py
+try:
+    import schedule_db
+except ImportError:
+    schedule_db = None
+
+# Columnar cross-project store — optional (needs pyarrow)
+try:
+    import portfolio_store
+except ImportError:
+    portfolio_store = None
+
 _project_cache: Dict[str, str] = {}
 _project_meta: Dict[str, dict] = {}
 _project_health: Dict[str, dict] = {}  # {slug: {status, compression_pct, max_slip_days, max_accel_days}}
-_project_tasks: Dict[str, list] = {}          # {slug: [task_dicts]} — current schedule tasks for milestone lookup
-_project_tasks_previous: Dict[str, list] = {}  # {slug: [task_dicts]} — previous update tasks
-_project_tasks_baseline: Dict[str, list] = {}  # {slug: [task_dicts]} — baseline tasks
+_project_tasks: Dict[str, list] = {}          # {slug: TaskTable} — current schedule tasks for milestone lookup
+_project_tasks_previous: Dict[str, list] = {}  # {slug: TaskTable} — previous update tasks
+_project_tasks_baseline: Dict[str, list] = {}  # {slug: TaskTable} — baseline tasks
+_project_compression: Dict[str, dict] = {}     # {slug: compute_compression_histogram() result} — current vs previous
+_project_variance: Dict[str, dict] = {}        # {slug: compute_variance()["summary"]} — current vs previous
+_project_snapshot_info: Dict[str, dict] = {}   # {slug: {data_date, current_label, previous_label}}
+_milestone_cache: Dict[str, tuple] = {}        # {slug: (mtime, milestones)} — parsed milestone_map.json
+_project_relationships: Dict[str, list] = {}   # {slug: TaskTable} — current schedule predecessor links
+_project_relationships_ctx: Dict[str, str] = {}  # {slug: RELATIONSHIPS block} — omitted from compact context
+_loaded_versions: Dict[str, str] = {}          # {slug: get_project_version() at last load}
+
+# Serializes full and per-project reloads (startup, uploads, project_watcher)
+_reload_lock = threading.RLock()
 
 
 def _get_mpp_parser():
@@ -57,30 +85,231 @@ def load_all_projects():
         logger.warning(f"Projects directory not found: {PROJECTS_DIR}")
         return
 
-    for slug in sorted(os.listdir(PROJECTS_DIR)):
-        project_path = os.path.join(PROJECTS_DIR, slug)
-        if not os.path.isdir(project_path):
-            continue
+    with _reload_lock:
+        for slug in sorted(os.listdir(PROJECTS_DIR)):
+            project_path = os.path.join(PROJECTS_DIR, slug)
+            if not os.path.isdir(project_path):
+                continue
+            if not os.path.exists(os.path.join(project_path, "meta.json")):
+                continue
+            _load_project(slug)
 
-        meta_path = os.path.join(project_path, "meta.json")
-        if not os.path.exists(meta_path):
-            continue
+    loaded = sum(1 for v in _project_cache.values() if v)
+    logger.info(f"Project loader: {len(_project_meta)} projects, {loaded} with schedule data.")
+
+
+def _load_project(slug: str) -> None:
+    """Read meta.json and (re)build one project's context and derived stores."""
+    project_path = os.path.join(PROJECTS_DIR, slug)
+    # Taken before parsing (a file landing mid-build leaves it stale, so the next
+    # reload_project() picks it up) but published only once the state is built:
+    # get_loaded_version() must never name files the served state doesn't reflect.
+    version = get_project_version(slug)
 
-        with open(meta_path, "r") as f:
-            meta = json.load(f)
-        _project_meta[slug] = meta
+    with open(os.path.join(project_path, "meta.json"), "r") as f:
+        meta = json.load(f)
+    _project_meta[slug] = meta
 
+    # The rebuild fills `state`; the previous build keeps being served until
+    # it is swapped in whole. A failed or empty build publishes an empty state,
+    # so a schedule that no longer parses (or was removed) stops being served.
+    state: dict = {}
+    try:
+        context = _build_versioned_context(slug, project_path, state)
+    except Exception as e:
+        logger.error(f"[{slug}] Load failed: {e}")
+        context, state = "", {}
+    _publish_state(slug, state)
+    _project_cache[slug] = context
+    logger.info(f"[{slug}] Loaded — {'with schedule data' if context else 'metadata only'}")
+    if context:
+        _publish_derived(slug)
+    if slug not in _project_tasks:
+        _drop_published(slug)
+    _loaded_versions[slug] = version
+
+
+def reload_project(slug: str, force: bool = False) -> bool:
+    """
+    Rebuild a single project after its files changed on disk, leaving every
+    other project untouched. Returns False when nothing was done because the
+    folder's version fingerprint matches what was last loaded (unless force).
+    A slug whose folder or meta.json is gone is dropped from every cache.
+    """
+    project_path = os.path.join(PROJECTS_DIR, slug)
+    with _reload_lock:
+        if not os.path.exists(os.path.join(project_path, "meta.json")):
+            if slug not in _project_meta:
+                return False
+            _drop_project(slug)
+            logger.info(f"[{slug}] Project removed — caches dropped")
+            return True
+        if not force and _loaded_versions.get(slug) == get_project_version(slug):
+            return False
+        _load_project(slug)
+        return True
+
+
+# Per-slug state derived from the parsed schedule files (everything but meta and the context text)
+_SCHEDULE_CACHES = (_project_health, _project_tasks, _project_tasks_previous, _project_tasks_baseline,
+                    _project_compression, _project_variance, _project_snapshot_info, _milestone_cache,
+                    _project_relationships, _project_relationships_ctx)
+
+
+# _build_versioned_context() state key → the per-slug cache it is published to
+_STATE_CACHES = (("tasks", _project_tasks), ("previous_tasks", _project_tasks_previous),
+                 ("baseline_tasks", _project_tasks_baseline), ("relationships", _project_relationships),
+                 ("relationships_ctx", _project_relationships_ctx), ("snapshot_info", _project_snapshot_info),
+                 ("variance", _project_variance), ("compression", _project_compression),
+                 ("health", _project_health))
+_STATE_SNAPSHOTS = (("current", "tasks"), ("previous", "previous_tasks"), ("baseline", "baseline_tasks"))
+
+
+def _publish_state(slug: str, state: dict) -> None:
+    """
+    Swap a finished build into the per-slug caches. Search indexes are updated
+    in place (ActivityIndex.update diffs against the previous build) and dropped
+    only for snapshots the build no longer has.
+    """
+    for snapshot, key in _STATE_SNAPSHOTS:
+        if key in state:
+            index_snapshot(slug, snapshot, state[key])
+        else:
+            drop_snapshot(slug, snapshot)
+    for key, cache in _STATE_CACHES:
+        if key in state:
+            cache[slug] = state[key]
+        else:
+            cache.pop(slug, None)
+
+
+def _clear_schedule_caches(slug: str) -> None:
+    for cache in _SCHEDULE_CACHES:
+        cache.pop(slug, None)
+
+
+def _drop_published(slug: str) -> None:
+    """Remove a project's rows from schedule_db and portfolio_store."""
+    if schedule_db is not None:
         try:
-            context = _build_versioned_context(slug, project_path)
-            _project_cache[slug] = context
-            status = "with schedule data" if context else "metadata only"
-            logger.info(f"[{slug}] Loaded — {status}")
+            schedule_db.drop_project(slug)
         except Exception as e:
-            logger.error(f"[{slug}] Load failed: {e}")
-            _project_cache[slug] = ""
+            logger.warning(f"[{slug}] Schedule DB drop failed: {e}")
+    if portfolio_store is not None and portfolio_store.available():
+        try:
+            portfolio_store.drop_project(slug)
+        except Exception as e:
+            logger.warning(f"[{slug}] Portfolio store drop failed: {e}")
 
-    loaded = sum(1 for v in _project_cache.values() if v)
-    logger.info(f"Project loader: {len(_project_meta)} projects, {loaded} with schedule data.")
+
+def _drop_project(slug: str) -> None:
+    for cache in (_project_cache, _project_meta, _loaded_versions):
+        cache.pop(slug, None)
+    _clear_schedule_caches(slug)
+    for snapshot in ("current", "previous", "baseline"):
+        drop_snapshot(slug, snapshot)
+    _drop_published(slug)
+
+
+def _index_variance(current_path: str, comparison: str, variance: dict) -> None:
+    if schedule_db is None:
+        return
+    try:
+        schedule_db.ingest_variance(*schedule_db.snapshot_key(current_path), comparison, variance)
+    except Exception as e:
+        logger.warning(f"Schedule DB variance ingest failed for {current_path}: {e}")
+
+
+def _publish_derived(slug: str) -> None:
+    """Resolve the milestone map once and publish it to schedule_db and portfolio_store."""
+    if slug not in _project_tasks:
+        return
+    milestones = []
+    try:
+        from schedule_tools import get_milestone_trend
+        milestones = get_milestone_trend(slug).get("milestones", [])
+    except Exception as e:
+        logger.warning(f"[{slug}] Milestone resolution for stores failed: {e}")
+    current_file = _project_snapshot_info.get(slug, {}).get("current_file")
+    if schedule_db is not None and current_file:
+        try:
+            schedule_db.ingest_milestones(*schedule_db.snapshot_key(current_file), milestones)
+        except Exception as e:
+            logger.warning(f"[{slug}] Schedule DB milestone ingest failed: {e}")
+    _publish_portfolio_snapshot(slug, milestones)
+
+
+def _publish_portfolio_snapshot(slug: str, milestones: list) -> None:
+    """Write the current update's tasks, links, milestone resolutions and variance to portfolio_store."""
+    if portfolio_store is None or not portfolio_store.available() or slug not in _project_tasks:
+        return
+    try:
+        info = _project_snapshot_info.get(slug, {})
+        update = (info.get("current_label") or "current").lower().replace(" ", "_")
+        health = _project_health.get(slug) or {}
+        upd = _project_variance.get(slug) or {}
+        variance = {
+            "data_date": info.get("data_date"),
+            "current_label": info.get("current_label"),
+            "previous_label": info.get("previous_label"),
+            **{k: health.get(k) for k in ("status", "compression_pct", "max_slip_days", "max_accel_days",
+                                          "total_slipped", "total_accelerated")},
+            **{f"update_{k}": upd.get(k) for k in ("max_slip_days", "max_accel_days",
+                                                   "total_slipped", "total_accelerated")},
+        }
+        if not variance["data_date"]:
+            try:
+                from tracker_loader import get_tracker_data
+                variance["data_date"] = ((get_tracker_data(slug) or {}).get("current") or {}).get("data_date")
+            except ImportError:
+                pass
+        portfolio_store.write_snapshot(slug, update, get_project_version(slug),
+                                       tasks=_project_tasks[slug], relationships=_project_relationships.get(slug),
+                                       milestones=milestones, variance=variance)
+    except Exception as e:
+        logger.warning(f"[{slug}] Portfolio store publish failed: {e}")
+
+
+# Derived/cache files that don't change what the copilot knows about a project
+_VERSION_IGNORE = ("user_docs_index.json", "user_docs.lock",
+                   "user_docs_passages.log", "user_docs_passages.idx", "user_docs_passages.lock")
+
+
+def get_loaded_version(slug: str) -> str:
+    """
+    get_project_version() of the files the in-memory state for slug was built
+    from ("" if it isn't loaded). Lags get_project_version() between a file
+    landing and the reload that picks it up — key caches of loader data on this.
+    """
+    return _loaded_versions.get(slug, "")
+
+
+def get_project_version(slug: str) -> str:
+    """
+    Short fingerprint of everything a project's context is built from: the
+    name, size and mtime of every file in its folder (schedules, PDFs,
+    milestone map, uploaded docs) plus the portfolio tracker. Any upload, edit
+    or deletion changes it; a reload of unchanged files does not.
+    """
+    import hashlib
+    h = hashlib.sha256()
+    project_path = os.path.join(PROJECTS_DIR, slug)
+    try:
+        entries = sorted(os.scandir(project_path), key=lambda e: e.name)
+    except OSError:
+        return ""
+    for entry in entries:
+        if entry.name in _VERSION_IGNORE or ".tmp" in entry.name or not entry.is_file():
+            continue
+        st = entry.stat()
+        h.update(f"{entry.name}|{st.st_size}|{st.st_mtime_ns}\n".encode())
+    try:
+        from tracker_loader import TRACKER_PATH
+        if TRACKER_PATH and os.path.exists(TRACKER_PATH):
+            h.update(f"tracker|{os.stat(TRACKER_PATH).st_mtime_ns}".encode())
+    except ImportError:
+        pass
+    return h.hexdigest()[:16]
 
 
 def _find_versioned_files(project_path: str) -> dict:
@@ -137,41 +366,61 @@ def _find_versioned_files(project_path: str) -> dict:
 def _parse_schedule(filepath: str) -> Optional[dict]:
     """
     Parse any schedule file (mpp/xml/xer) and return a normalized dict:
-    { raw_context: str, source: str, tasks: List[Dict] }
-    tasks is used by the variance engine for delta computation.
-    If ENCRYPTION_KEY is set the file is decrypted to a temp file before parsing.
+    { raw_context: str, source: str, tasks: List[Dict], relationships: List[Dict], data_date: str | None }
+    tasks is used by the variance engine for delta computation; data_date
+    (YYYY-MM-DD, status date for MPP/XML) anchors remaining-work calculations.
+
+    Project files are served from schedule_db when an unchanged copy was
+    already parsed (by this or another process); fresh parses are bulk-loaded
+    into it.
+    """
+    in_projects = os.path.abspath(filepath).startswith(os.path.abspath(PROJECTS_DIR) + os.sep)
+    if schedule_db is not None and in_projects:
+        stored = schedule_db.load_parsed(filepath)
+        if stored is not None:
+            return stored
+    parsed = _parse_schedule_file(filepath)
+    if parsed and schedule_db is not None and in_projects:
+        try:
+            schedule_db.ingest_parsed(filepath, parsed)
+        except Exception as e:
+            logger.warning(f"Schedule DB ingest failed for {filepath}: {e}")
+    return parsed
+
+
+def _parse_schedule_file(filepath: str) -> Optional[dict]:
+    """
+    Run the MPP/XML or XER parser. Encrypted files are decrypted as a stream
+    straight into the parser — no plaintext temp file (see crypto.open_decrypted).
     """
-    import tempfile
     ext = os.path.splitext(filepath)[1].lower()
 
-    # Decrypt to a temp file if encryption is enabled
+    # Plain path when nothing to decrypt, otherwise an in-memory decrypting reader
     try:
-        from crypto import read_encrypted_bytes, is_enabled as _enc_on
-        if _enc_on():
-            _raw = read_encrypted_bytes(filepath)
-            _tmp = tempfile.NamedTemporaryFile(delete=False, suffix=ext)
-            _tmp.write(_raw)
-            _tmp.close()
-            _parse_path = _tmp.name
-        else:
-            _parse_path = filepath
+        from crypto import open_decrypted, file_format
+        _source = filepath if file_format(filepath) == "plain" else open_decrypted(filepath)
     except ImportError:
-        _parse_path = filepath
+        _source = filepath
+    except Exception as e:
+        logger.error(f"Could not open {filepath}: {e}")
+        return None
 
     try:
         if ext in (".mpp", ".xml"):
             MPPParser = _get_mpp_parser()
-            p = MPPParser(_parse_path)
+            p = MPPParser(_source, name=os.path.basename(filepath))
             raw = p.get_llm_context()
             return {
                 "raw_context": raw,
                 "source": os.path.basename(filepath),
                 "tasks": p.tasks,
+                "relationships": p.relationships,
+                "data_date": (p.project_metadata.get("status_date") or "")[:10] or None,
             }
 
         elif ext == ".xer":
             P6Parser = _get_xer_parser()
-            p = P6Parser(_parse_path)
+            p = P6Parser(_source)
             ctx = p.get_llm_context()
             info = ctx.get("project_info", {})
             metrics = ctx.get("project_metrics", {})
@@ -203,44 +452,58 @@ def _parse_schedule(filepath: str) -> Optional[dict]:
             if p.df_activities is not None and not p.df_activities.empty:
                 for _, row in p.df_activities.iterrows():
                     xer_tasks.append(p._normalize_task_row(row))
+            # Same relationship shape as MPPParser.relationships
+            xer_rels = []
+            if p.df_relationships is not None and not p.df_relationships.empty:
+                for _, row in p.df_relationships.iterrows():
+                    if row.get("pred_task_id") is None:
+                        continue
+                    xer_rels.append({
+                        "task_id": str(row.get("task_id", "")),
+                        "predecessor_task_id": str(row.get("pred_task_id", "")),
+                        "type": str(row.get("pred_type") or "PR_FS").replace("PR_", ""),
+                        "lag": str(row.get("lag_hr_cnt") or 0),
+                    })
+            _dd = p.project_metadata.get("data_date")
             return {
                 "raw_context": "\n".join(lines),
                 "source": os.path.basename(filepath),
                 "tasks": xer_tasks,
+                "relationships": xer_rels,
+                "data_date": _dd.strftime("%Y-%m-%d") if hasattr(_dd, "strftime") else None,
             }
 
     except Exception as e:
         logger.error(f"Parse failed for {filepath}: {e}")
         return None
     finally:
-        # Clean up temp decryption file if one was created
-        if _parse_path != filepath:
-            try:
-                os.unlink(_parse_path)
-            except Exception:
-                pass
+        if _source is not filepath:
+            _source.close()
 
     return None
 
 
+def _pdf_lines(pdf_path: str) -> list:
+    """Filtered text lines (len > 5) from the first 30 pages. Raises on failure."""
+    from pdf_cache import extract_page_texts
+    lines = []
+    for text in extract_page_texts(pdf_path, max_pages=30):
+        for line in text.splitlines():
+            line = line.strip()
+            if len(line) > 5:
+                lines.append(line)
+    return lines
+
+
 def _extract_pdf_milestones(pdf_path: str) -> list:
     """
     Extract meaningful lines from verify.pdf for schedule crosscheck.
     Filters out blank lines and short header/footer noise.
+    Results are cached by PDF content hash (see pdf_cache.py).
     """
     try:
-        import pdfplumber
-        entries = []
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages[:30]:
-                text = page.extract_text()
-                if not text:
-                    continue
-                for line in text.splitlines():
-                    line = line.strip()
-                    if len(line) > 5:
-                        entries.append(line)
-        return entries
+        from pdf_cache import cached_extract
+        return cached_extract(pdf_path, "lines", _pdf_lines)
     except Exception as e:
         logger.warning(f"PDF crosscheck failed: {e}")
         return []
@@ -250,25 +513,69 @@ def _extract_variance_pdf(pdf_path: str) -> list:
     """
     Extract text lines from a variance_N.pdf report.
     Returns filtered, meaningful lines for LLM injection.
+    Results are cached by PDF content hash (see pdf_cache.py).
     """
     try:
-        import pdfplumber
-        lines = []
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages[:30]:
-                text = page.extract_text()
-                if not text:
-                    continue
-                for line in text.splitlines():
-                    line = line.strip()
-                    if len(line) > 5:
-                        lines.append(line)
-        return lines
+        from pdf_cache import cached_extract
+        return cached_extract(pdf_path, "lines", _pdf_lines)
     except Exception as e:
         logger.warning(f"Variance PDF extraction failed ({pdf_path}): {e}")
         return []
 
 
+def _parse_compression_pdf(pdf_path: str) -> Optional[dict]:
+    """Uncached body of _extract_compression_pdf. Raises on I/O or pdfplumber failure."""
+    import re
+    from pdf_cache import extract_page_texts
+    result = {
+        "compression_pct": None,
+        "earlier_data_date": None,
+        "later_data_date": None,
+        "earlier_finish": None,
+        "later_finish": None,
+        "monthly": [],   # [{month, earlier_days, later_days}]
+        "raw_lines": [],
+    }
+
+    full_text = "\n".join(t for t in extract_page_texts(pdf_path, max_pages=5) if t)
+
+    lines = [l.strip() for l in full_text.splitlines() if l.strip()]
+    result["raw_lines"] = lines
+
+    for line in lines:
+        # Compression % — e.g. "Remaining Work Compression  -5 %"
+        m = re.search(r'Remaining Work Compression\s+([-+]?\d+)\s*%', line, re.IGNORECASE)
+        if m:
+            result["compression_pct"] = int(m.group(1))
+
+        # Data dates — e.g. "Data Date:  01/19/2026"
+        m = re.findall(r'Data Date[:\s]+(\d{1,2}/\d{1,2}/\d{4})', line)
+        if m:
+            if result["earlier_data_date"] is None:
+                result["earlier_data_date"] = m[0]
+            elif result["later_data_date"] is None and m[0] != result["earlier_data_date"]:
+                result["later_data_date"] = m[0]
+
+        # Finish dates — e.g. "Finish Date:  07/01/2026"
+        m = re.findall(r'Finish Date[:\s]+(\d{1,2}/\d{1,2}/\d{4})', line)
+        if m:
+            if result["earlier_finish"] is None:
+                result["earlier_finish"] = m[0]
+            elif result["later_finish"] is None and m[0] != result["earlier_finish"]:
+                result["later_finish"] = m[0]
+
+        # Monthly table rows — e.g. "Apr 26  177  155" or "Mar 26 25 41"
+        m = re.match(r'^([A-Za-z]{3}\s+\d{2})\s+(\d+)\s+(\d+)$', line)
+        if m:
+            result["monthly"].append({
+                "month": m.group(1),
+                "earlier_days": int(m.group(2)),
+                "later_days": int(m.group(3)),
+            })
+
+    return result if result["compression_pct"] is not None else None
+
+
 def _extract_compression_pdf(pdf_path: str) -> Optional[dict]:
     """
     Parse a Schedule Compression PDF (from schedule validator).
@@ -280,63 +587,13 @@ def _extract_compression_pdf(pdf_path: str) -> Optional[dict]:
       - Table: A = Earlier schedule (data date, finish date)
                B = Later schedule (data date, finish date)
       - Monthly table: Month | Activity Days (A) | Activity Days (B)
+
+    Results are cached by PDF content hash (see pdf_cache.py), so prior
+    updates' compression PDFs are only read once.
     """
     try:
-        import pdfplumber
-        import re
-        result = {
-            "compression_pct": None,
-            "earlier_data_date": None,
-            "later_data_date": None,
-            "earlier_finish": None,
-            "later_finish": None,
-            "monthly": [],   # [{month, earlier_days, later_days}]
-            "raw_lines": [],
-        }
-
-        with pdfplumber.open(pdf_path) as pdf:
-            full_text = ""
-            for page in pdf.pages[:5]:
-                t = page.extract_text()
-                if t:
-                    full_text += t + "\n"
-
-        lines = [l.strip() for l in full_text.splitlines() if l.strip()]
-        result["raw_lines"] = lines
-
-        for line in lines:
-            # Compression % — e.g. "Remaining Work Compression  -5 %"
-            m = re.search(r'Remaining Work Compression\s+([-+]?\d+)\s*%', line, re.IGNORECASE)
-            if m:
-                result["compression_pct"] = int(m.group(1))
-
-            # Data dates — e.g. "Data Date:  01/19/2026"
-            m = re.findall(r'Data Date[:\s]+(\d{1,2}/\d{1,2}/\d{4})', line)
-            if m:
-                if result["earlier_data_date"] is None:
-                    result["earlier_data_date"] = m[0]
-                elif result["later_data_date"] is None and m[0] != result["earlier_data_date"]:
-                    result["later_data_date"] = m[0]
-
-            # Finish dates — e.g. "Finish Date:  07/01/2026"
-            m = re.findall(r'Finish Date[:\s]+(\d{1,2}/\d{1,2}/\d{4})', line)
-            if m:
-                if result["earlier_finish"] is None:
-                    result["earlier_finish"] = m[0]
-                elif result["later_finish"] is None and m[0] != result["earlier_finish"]:
-                    result["later_finish"] = m[0]
-
-            # Monthly table rows — e.g. "Apr 26  177  155" or "Mar 26 25 41"
-            m = re.match(r'^([A-Za-z]{3}\s+\d{2})\s+(\d+)\s+(\d+)$', line)
-            if m:
-                result["monthly"].append({
-                    "month": m.group(1),
-                    "earlier_days": int(m.group(2)),
-                    "later_days": int(m.group(3)),
-                })
-
-        return result if result["compression_pct"] is not None else None
-
+        from pdf_cache import cached_extract
+        return cached_extract(pdf_path, "compression", _parse_compression_pdf)
     except Exception as e:
         logger.warning(f"Compression PDF extraction failed ({pdf_path}): {e}")
         return None
@@ -367,11 +624,13 @@ def _format_compression_pdf_context(data: dict, label: str = "") -> str:
     return "\n".join(lines)
 
 
-def _build_versioned_context(slug: str, project_path: str) -> str:
+def _build_versioned_context(slug: str, project_path: str, state: dict) -> str:
     """
     Build the full LLM context for a project using versioned files.
     Handles any mix of mpp/xml/xer across baseline and updates.
     Uses verify.pdf as a silent crosscheck if present.
+    Task tables, variance, health etc. go into `state` (see _STATE_CACHES),
+    not the live caches — _load_project() publishes them once the build is done.
     """
     files = _find_versioned_files(project_path)
     baseline_path = files["baseline"]
@@ -433,10 +692,24 @@ def _build_versioned_context(slug: str, project_path: str) -> str:
         return "\n".join(parts)
 
     # --- Store tasks for milestone date cross-referencing ---
-    _project_tasks[slug] = current_data.get("tasks", [])
-    # Clear previous/baseline caches so stale data doesn't bleed across reloads
-    _project_tasks_previous.pop(slug, None)
-    _project_tasks_baseline.pop(slug, None)
+    state["tasks"] = compact_tasks(current_data.get("tasks", []))
+    state["relationships"] = compact_tasks(current_data.get("relationships", []))
+    if schedule_db is not None:
+        try:
+            schedule_db.set_roles(
+                slug,
+                current=schedule_db.snapshot_key(current_path)[1],
+                previous=schedule_db.snapshot_key(previous_path)[1] if previous_path else None,
+                baseline=schedule_db.snapshot_key(baseline_path)[1] if baseline_path else None,
+            )
+        except Exception as e:
+            logger.warning(f"[{slug}] Schedule DB roles update failed: {e}")
+    state["snapshot_info"] = {
+        "current_file": current_path,
+        "data_date": current_data.get("data_date"),
+        "current_label": current_label.replace("_", " ").title(),
+        "previous_label": None,
+    }
 
     # --- Compression % from current tasks ---
     _compression_pct = None
@@ -458,7 +731,8 @@ def _build_versioned_context(slug: str, project_path: str) -> str:
     if previous_path:
         previous_data = _parse_schedule(previous_path)
         if previous_data:
-            _project_tasks_previous[slug] = previous_data.get("tasks", [])
+            state["previous_tasks"] = compact_tasks(previous_data.get("tasks", []))
+            state["snapshot_info"]["previous_label"] = os.path.splitext(os.path.basename(previous_path))[0].replace("_", " ").title()
             parts.append("")
             parts.append(f"=== PREVIOUS SCHEDULE ({os.path.basename(previous_path)}) ===")
             parts.append(previous_data["raw_context"])
@@ -476,6 +750,8 @@ def _build_versioned_context(slug: str, project_path: str) -> str:
                 label_current=current_label.replace("_", " ").title(),
                 label_previous=os.path.splitext(os.path.basename(previous_path))[0].replace("_", " ").title(),
             )
+            state["variance"] = variance.get("summary", {})
+            _index_variance(current_path, "previous", variance)
             variance_ctx = format_variance_for_context(variance, max_items_per_phase=12)
             if variance_ctx:
                 parts.append("")
@@ -506,6 +782,7 @@ def _build_versioned_context(slug: str, project_path: str) -> str:
                 logger.warning(f"[{slug}] Compression computation failed: {_ce}")
 
             # --- Verified compression PDF (schedule validator output) — current update ---
+            comp_pdf_data = None
             if _compression_pdf_path:
                 try:
                     comp_pdf_data = _extract_compression_pdf(_compression_pdf_path)
@@ -519,6 +796,29 @@ def _build_versioned_context(slug: str, project_path: str) -> str:
                 except Exception as _cpdf:
                     logger.warning(f"[{slug}] Compression PDF inject failed: {_cpdf}")
 
+            # --- Remaining work compression histogram (computed — no PDF needed) ---
+            try:
+                from variance_engine import compute_compression_histogram, format_compression_histogram_for_context
+                _tracker_dd = None
+                try:
+                    from tracker_loader import get_tracker_data
+                    _td = get_tracker_data(slug) or {}
+                    _tracker_dd = (_td.get("current") or {}).get("data_date") or None
+                except ImportError:
+                    pass
+                comp_hist = compute_compression_histogram(
+                    current_tasks=current_data["tasks"],
+                    previous_tasks=previous_data["tasks"],
+                    current_data_date=current_data.get("data_date") or _tracker_dd,
+                    previous_data_date=previous_data.get("data_date"),
+                )
+                if comp_hist:
+                    state["compression"] = comp_hist
+                    parts.append("")
+                    parts.append(format_compression_histogram_for_context(comp_hist, comp_pdf_data))
+            except Exception as _che:
+                logger.warning(f"[{slug}] Compression histogram failed: {_che}")
+
             # --- Historical compression PDFs (prior updates — headline only) ---
             try:
                 import re as _reh
@@ -573,7 +873,7 @@ def _build_versioned_context(slug: str, project_path: str) -> str:
     if baseline_path and baseline_path != current_path:
         baseline_data = _parse_schedule(baseline_path)
         if baseline_data:
-            _project_tasks_baseline[slug] = baseline_data.get("tasks", [])
+            state["baseline_tasks"] = compact_tasks(baseline_data.get("tasks", []))
             parts.append("")
             parts.append(f"=== BASELINE SCHEDULE ({os.path.basename(baseline_path)}) ===")
             parts.append(baseline_data["raw_context"])
@@ -588,6 +888,7 @@ def _build_versioned_context(slug: str, project_path: str) -> str:
                         label_current=current_label.replace("_", " ").title(),
                         label_previous="Baseline",
                     )
+                    _index_variance(current_path, "baseline", drift)
                     drift_ctx = format_variance_for_context(drift, max_items_per_phase=12)
                     if drift_ctx:
                         parts.append("")
@@ -595,7 +896,7 @@ def _build_versioned_context(slug: str, project_path: str) -> str:
                         parts.append(drift_ctx)
                     # --- Populate project health from baseline drift ---
                     s = drift.get("summary", {})
-                    _project_health[slug] = {
+                    state["health"] = {
                         "status": _health_tag(
                             s.get("max_slip_days", 0),
                             s.get("max_accel_days", 0),
@@ -720,16 +1021,16 @@ def _build_versioned_context(slug: str, project_path: str) -> str:
                     pred_str = f"{pred_id} \"{pred_name}\"" if pred_name else pred_id
                     rel_lines.append(f"  {succ_str} → {pred_str} ({rel_type})")
             if rel_lines:
-                parts.append("")
-                parts.append(
+                # Kept out of the cached schedule context so compact (tool-calling)
+                # prompts can skip it; get_project_context appends it otherwise.
+                state["relationships_ctx"] = "\n".join([
                     f"=== RELATIONSHIPS ({len(rel_lines)} links) ===\n"
                     f"Format: Activity ID \"Name\" → Predecessor ID \"Name\" (type)\n"
                     f"Use this table to trace any activity's upstream chain manually.\n"
                     f"To source a delay: find the slipped activity, look up its predecessor IDs here,\n"
                     f"then look those IDs up in SCHEDULE DATA for their finish dates and float.\n"
                     f"Walk back until you reach the root driver (earliest activity with no predecessors or earliest start)."
-                )
-                parts.extend(rel_lines)
+                ] + rel_lines)
     except Exception as _rele:
         logger.warning(f"[{slug}] Relationships injection failed: {_rele}")
 
@@ -763,23 +1064,22 @@ def _health_tag(max_slip: int, max_accel: int, total_slipped: int, total_acceler
     return "ON TIME"
 
 
-def _build_task_lookup(tasks: list) -> tuple:
-    """Return (name_lookup, id_lookup) dicts from a task list."""
-    by_name: dict = {}
-    by_id: dict = {}
-    for t in tasks:
-        name = (t.get("name") or t.get("task_name") or "").strip().lower()
-        tid = str(t.get("id") or t.get("task_id") or t.get("activity_id") or "").strip()
-        if name:
-            by_name[name] = t
-        if tid:
-            by_id[tid] = t
-    return by_name, by_id
+_SNAPSHOT_TASKS = {
+    "current": _project_tasks,
+    "previous": _project_tasks_previous,
+    "baseline": _project_tasks_baseline,
+}
 
 
-def _resolve_task(act_name: str, act_id: str, by_name: dict, by_id: dict):
-    """Find a task by activity name or ID."""
-    return by_name.get(act_name.lower()) or by_id.get(act_id) or None
+def _task_index(slug: str, snapshot: str):
+    """Search index for a loaded snapshot (built on first use if missing); None if it isn't loaded."""
+    idx = get_index(slug, snapshot)
+    if idx is None:
+        tasks = _SNAPSHOT_TASKS[snapshot].get(slug)
+        if not tasks:
+            return None
+        idx = index_snapshot(slug, snapshot, tasks)
+    return idx
 
 
 def _extract_finish(task) -> str:
@@ -809,10 +1109,10 @@ def _load_milestone_map(slug: str) -> str:
         if not milestones:
             return ""
 
-        # Build lookups for all three schedule versions
-        curr_by_name, curr_by_id = _build_task_lookup(_project_tasks.get(slug, []))
-        prev_by_name, prev_by_id = _build_task_lookup(_project_tasks_previous.get(slug, []))
-        base_by_name, base_by_id = _build_task_lookup(_project_tasks_baseline.get(slug, []))
+        # Name/ID indexes for all three schedule versions
+        curr_idx = _task_index(slug, "current")
+        prev_idx = _task_index(slug, "previous")
+        base_idx = _task_index(slug, "baseline")
 
         lines = [
             "STANDARDIZED MILESTONES (dates cross-referenced across schedule versions — VERIFIED = 2+ sources agree):"
@@ -822,9 +1122,9 @@ def _load_milestone_map(slug: str) -> str:
             act_name = (m.get("activity_name") or "").strip()
             act_id = str(m.get("activity_id") or "")
 
-            curr_task = _resolve_task(act_name, act_id, curr_by_name, curr_by_id)
-            prev_task = _resolve_task(act_name, act_id, prev_by_name, prev_by_id)
-            base_task = _resolve_task(act_name, act_id, base_by_name, base_by_id)
+            curr_task = curr_idx.get(act_name, act_id) if curr_idx else None
+            prev_task = prev_idx.get(act_name, act_id) if prev_idx else None
+            base_task = base_idx.get(act_name, act_id) if base_idx else None
 
             if curr_task:
                 curr_finish = _extract_finish(curr_task)
@@ -903,10 +1203,14 @@ def _load_milestone_map(slug: str) -> str:
         return ""
 
 
-def get_project_context(slug: str, page: Optional[str] = None) -> str:
+def get_project_context(slug: str, page: Optional[str] = None, compact: bool = False) -> str:
     """
     Returns the full context string for a project slug.
     Optionally adds a page hint so the LLM knows what view the user is on.
+    compact=True sends only the schedule headline (finish, data date, variance
+    summary) next to the milestone table instead of the full schedule, previous,
+    baseline and RELATIONSHIPS blocks — used when the model can fetch activity
+    detail on demand through schedule_tools.
     """
     meta = _project_meta.get(slug)
     if not meta:
@@ -934,15 +1238,77 @@ def get_project_context(slug: str, page: Optional[str] = None) -> str:
         parts.append(milestone_ctx)
 
     schedule_ctx = _project_cache.get(slug, "")
-    if schedule_ctx:
+    if schedule_ctx and compact and slug in _project_tasks:
+        parts.append("")
+        parts.append(_headline_context(slug))
+    elif schedule_ctx:
         parts.append("")
         parts.append(schedule_ctx)
+        rel_ctx = _project_relationships_ctx.get(slug, "")
+        if rel_ctx:
+            parts.append("")
+            parts.append(rel_ctx)
     else:
         parts.append("[No schedule file loaded for this project yet. User can attach an MPP/XER file to provide schedule data.]")
 
     return "\n".join(parts)
 
 
+def _project_finish(tasks) -> str:
+    """Latest finish date (YYYY-MM-DD) across non-summary tasks, or ""."""
+    finishes = [_extract_finish(t) for t in tasks or [] if not t.get("summary", False)]
+    return max((f for f in finishes if f), default="")
+
+
+def _headline_context(slug: str) -> str:
+    """
+    Schedule headline for compact (tool-calling) prompts: versions, data date,
+    project finish against the previous update and baseline, progress, and the
+    variance summary. Activity-level detail is left to schedule_tools.
+    """
+    info = _project_snapshot_info.get(slug, {})
+    tasks = _project_tasks.get(slug) or []
+    current_file = os.path.basename(info.get("current_file") or "")
+    lines = ["=== SCHEDULE HEADLINE ===",
+             f"Current submission: {info.get('current_label') or 'current'} ({current_file})",
+             f"Data Date: {info.get('data_date') or 'N/A'}"]
+
+    finish = _project_finish(tasks)
+    if finish:
+        line = f"Project finish (latest activity finish): {finish}"
+        for label, other in ((info.get("previous_label"), _project_tasks_previous.get(slug)),
+                             ("Baseline", _project_tasks_baseline.get(slug))):
+            other_finish = _project_finish(other) if other else ""
+            if label and other_finish:
+                delta = (datetime.strptime(finish, "%Y-%m-%d") - datetime.strptime(other_finish, "%Y-%m-%d")).days
+                line += f" | {label}: {other_finish} ({delta:+d} calendar days)"
+        lines.append(line)
+
+    real = [t for t in tasks if not t.get("summary", False)]
+    if real:
+        pct = sum(float(t.get("percent_complete") or 0) for t in real) / len(real)
+        lines.append(f"Activities: {len(real)} | Average % complete: {pct:.1f}%")
+
+    v = _project_variance.get(slug)
+    if v:
+        line = (f"Variance vs {info.get('previous_label') or 'previous update'}: "
+                f"{v.get('total_compared', 0)} compared | {v.get('total_slipped', 0)} slipped | "
+                f"{v.get('total_accelerated', 0)} accelerated (calendar days)")
+        if v.get("max_slip_days", 0) > 0:
+            line += f" | largest slip {v['max_slip_days']}d — {v.get('max_slip_activity', '')}"
+        if v.get("max_accel_days", 0) > 0:
+            line += f" | largest pull-forward {v['max_accel_days']}d — {v.get('max_accel_activity', '')}"
+        lines.append(line)
+
+    health = _project_health.get(slug)
+    if health:
+        lines.append(f"Health vs baseline: {health.get('status')}")
+
+    lines.append("Activity-level detail (dates, float, logic, critical path, per-activity variance) "
+                 "is not included — look it up with the schedule tools.")
+    return "\n".join(lines)
+
+
 def _page_hint(page: str) -> str:
     """Return a brief instruction hint based on the current Power BI page view."""
     hints = {
@@ -978,6 +1344,58 @@ def get_project_health(slug: str) -> Optional[dict]:
     return _project_health.get(slug)
 
 
+def get_project_compression(slug: str) -> Optional[dict]:
+    """Returns the computed remaining-work compression histogram (current vs previous) for a slug."""
+    return _project_compression.get(slug)
+
+
+def _milestone_entries(slug: str) -> list:
+    """Raw milestone list from milestone_map.json, re-read only when the file changes."""
+    mm_path = os.path.join(PROJECTS_DIR, slug, "milestone_map.json")
+    try:
+        mtime = os.path.getmtime(mm_path)
+    except OSError:
+        return []
+    cached = _milestone_cache.get(slug)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    try:
+        milestones = read_encrypted_json(mm_path).get("milestones", [])
+    except Exception as e:
+        logger.warning(f"[{slug}] Could not read milestone map: {e}")
+        return []
+    _milestone_cache[slug] = (mtime, milestones)
+    return milestones
+
+
+def get_schedule_facts(slug: str) -> Optional[dict]:
+    """
+    Structured, in-memory view of a loaded project for local_answers and other
+    non-LLM consumers: task tables and search indexes for each snapshot, the
+    milestone map, variance summary and data date. None if no schedule is loaded.
+    """
+    if slug not in _project_tasks:
+        return None
+    info = _project_snapshot_info.get(slug, {})
+    return {
+        "slug": slug,
+        "project_name": _project_meta.get(slug, {}).get("display_name", slug),
+        "data_date": info.get("data_date"),
+        "current_label": info.get("current_label"),
+        "previous_label": info.get("previous_label"),
+        "tasks": _project_tasks.get(slug),
+        "previous_tasks": _project_tasks_previous.get(slug),
+        "baseline_tasks": _project_tasks_baseline.get(slug),
+        "index": _task_index(slug, "current"),
+        "previous_index": get_index(slug, "previous"),
+        "baseline_index": get_index(slug, "baseline"),
+        "milestones": _milestone_entries(slug),
+        "variance": _project_variance.get(slug),
+        "compression": _project_compression.get(slug),
+        "relationships": _project_relationships.get(slug),
+    }
+
+
 def update_milestone_prior_dates(slug: str) -> int:
     """
     Rolls the current forecast dates into prior_update_date for each milestone
@@ -1000,14 +1418,16 @@ def update_milestone_prior_dates(slug: str) -> int:
         if not milestones:
             return 0
 
-        # Build current task lookup from in-memory parsed tasks
-        curr_by_name, curr_by_id = _build_task_lookup(_project_tasks.get(slug, []))
+        # Current task index from in-memory parsed tasks
+        curr_idx = _task_index(slug, "current")
+        if curr_idx is None:
+            return 0
 
         updated = 0
         for m in milestones:
             act_name = (m.get("activity_name") or "").strip()
             act_id = str(m.get("activity_id") or "")
-            curr_task = _resolve_task(act_name, act_id, curr_by_name, curr_by_id)
+            curr_task = curr_idx.get(act_name, act_id)
             if curr_task:
                 curr_finish = _extract_finish(curr_task)
                 if curr_finish:
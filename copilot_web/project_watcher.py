@@ -0,0 +1,303 @@
+"""
+project_watcher.py - Watches copilot_web/projects/ and reloads a project when
+its schedule, PDF or milestone files change on disk.
+
+Events are coalesced per slug: a burst (a whole update folder copied in, a large
+.mpp written in chunks) becomes ONE reload, fired once the slug has been quiet
+for PROJECT_WATCH_DEBOUNCE seconds and its files have stopped growing between
+two checks. Reloads run on a single background worker, so a slow parse never
+blocks a request thread and two reloads of the same project never overlap.
+
+Uses watchdog (inotify / FSEvents / ReadDirectoryChanges) when installed and
+falls back to polling file stats every PROJECT_WATCH_POLL_INTERVAL seconds —
+network shares and some containers don't deliver inotify events.
+
+Env:
+    PROJECT_WATCH=auto|poll|off   (default auto: watchdog if available, else poll)
+    PROJECT_WATCH_DEBOUNCE=3      quiet seconds before a slug is reloaded
+    PROJECT_WATCH_POLL_INTERVAL=5 seconds between stat scans in poll mode
+    PROJECT_WATCH_MAX_WAIT=120    reload anyway after this long of continuous churn
+
+Usage:
+    from project_watcher import ProjectWatcher
+    watcher = ProjectWatcher(PROJECTS_DIR, reload_fn=reload_project)
+    watcher.start()
+    watcher.get_stats()
+"""
+import os
+import queue
+import threading
+import time
+import logging
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+    WATCHDOG_AVAILABLE = False
+
+WATCH_MODE = os.getenv("PROJECT_WATCH", "auto").lower()
+DEBOUNCE_SECONDS = float(os.getenv("PROJECT_WATCH_DEBOUNCE", "3"))
+POLL_INTERVAL = float(os.getenv("PROJECT_WATCH_POLL_INTERVAL", "5"))
+MAX_WAIT_SECONDS = float(os.getenv("PROJECT_WATCH_MAX_WAIT", "120"))
+
+# What a project's context is built from; uploaded-doc stores and caches are not
+WATCH_EXTS = (".mpp", ".xml", ".xer", ".pdf")
+WATCH_NAMES = ("meta.json", "milestone_map.json")
+
+
+def _is_watched(name: str) -> bool:
+    lower = name.lower()
+    if ".tmp" in lower or lower.startswith((".", "~$")):
+        return False
+    return lower.endswith(WATCH_EXTS) or lower in WATCH_NAMES
+
+
+def _fingerprint(project_path: str) -> tuple:
+    """(name, size, mtime_ns) of every watched file in a project folder."""
+    try:
+        entries = list(os.scandir(project_path))
+    except OSError:
+        return ()
+    out = []
+    for entry in entries:
+        if not _is_watched(entry.name):
+            continue
+        try:
+            if not entry.is_file():
+                continue
+            st = entry.stat()
+        except OSError:
+            continue
+        out.append((entry.name, st.st_size, st.st_mtime_ns))
+    return tuple(sorted(out))
+
+
+_READ_EVENTS = ("opened", "closed_no_write")
+
+
+class _EventHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "ProjectWatcher"):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        # Reads (opened / closed_no_write) arrive on inotify too — only writes matter
+        if event.is_directory or event.event_type in _READ_EVENTS:
+            return
+        for path in (event.src_path, getattr(event, "dest_path", None)):
+            slug = self.watcher.slug_for(path) if path else None
+            if slug:
+                self.watcher.notify(slug)
+
+
+class ProjectWatcher:
+    """Debounced, per-slug change detection feeding a single reload worker."""
+
+    def __init__(self, projects_dir: str, reload_fn: Callable[[str], bool],
+                 debounce: float = DEBOUNCE_SECONDS, poll_interval: float = POLL_INTERVAL,
+                 max_wait: float = MAX_WAIT_SECONDS, mode: str = WATCH_MODE):
+        self.projects_dir = os.path.abspath(projects_dir)
+        self.reload_fn = reload_fn
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self.mode = mode
+        self._cond = threading.Condition()
+        self._pending: Dict[str, dict] = {}   # {slug: {first, last, events, fp}}
+        self._queued: set = set()
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._seen: Dict[str, tuple] = {}     # poll mode: {slug: fingerprint}
+        self._observer = None
+        self._stop = threading.Event()
+        self._threads = []
+        self._stats = {"events": 0, "coalesced": 0, "reloads": 0, "unchanged": 0,
+                       "errors": 0, "reload_seconds": 0.0, "last_reload": None}
+
+    # --- event intake ---
+
+    def slug_for(self, path: str) -> Optional[str]:
+        """Project slug for a file directly inside projects/<slug>/, if it's one we watch."""
+        rel = os.path.relpath(os.path.abspath(path), self.projects_dir)
+        parts = rel.split(os.sep)
+        if len(parts) != 2 or parts[0] in (os.curdir, os.pardir):
+            return None
+        return parts[0] if _is_watched(parts[1]) else None
+
+    def notify(self, slug: str) -> None:
+        """Record a change for slug; restarts its quiet period."""
+        now = time.monotonic()
+        with self._cond:
+            self._stats["events"] += 1
+            entry = self._pending.get(slug)
+            if entry is None:
+                self._pending[slug] = {"first": now, "last": now, "events": 1, "fp": None}
+            else:
+                entry["last"] = now
+                entry["events"] += 1
+                self._stats["coalesced"] += 1
+            self._cond.notify()
+
+    # --- lifecycle ---
+
+    def start(self) -> str:
+        """Start watching; returns the mode actually in use ("watchdog", "poll" or "off")."""
+        if self.mode == "off" or not os.path.isdir(self.projects_dir):
+            self.mode = "off"
+            return self.mode
+        if self.mode != "poll" and WATCHDOG_AVAILABLE:
+            try:
+                self._observer = Observer()
+                self._observer.schedule(_EventHandler(self), self.projects_dir, recursive=True)
+                self._observer.start()
+                self.mode = "watchdog"
+            except Exception as e:
+                # inotify watch limit reached, unsupported filesystem, ...
+                logger.warning(f"[watcher] Native file events unavailable ({e}) — polling instead")
+                self._observer = None
+        if self._observer is None:
+            self.mode = "poll"
+            self._seen = self._scan()
+            self._spawn(self._poll_loop, "project-watch-poll")
+        self._spawn(self._debounce_loop, "project-watch-debounce")
+        self._spawn(self._worker_loop, "project-watch-worker")
+        logger.info(f"[watcher] Watching {self.projects_dir} ({self.mode}, debounce {self.debounce:g}s)")
+        return self.mode
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._queue.put(None)
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+        for t in self._threads:
+            t.join(timeout=5)
+
+    def _spawn(self, target, name: str) -> None:
+        t = threading.Thread(target=target, name=name, daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    # --- polling fallback ---
+
+    def _scan(self) -> Dict[str, tuple]:
+        try:
+            slugs = [e.name for e in os.scandir(self.projects_dir) if e.is_dir()]
+        except OSError:
+            return {}
+        return {slug: _fingerprint(os.path.join(self.projects_dir, slug)) for slug in slugs}
+
+    def _poll_loop(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            current = self._scan()
+            for slug in set(current) | set(self._seen):
+                if current.get(slug) != self._seen.get(slug):
+                    self.notify(slug)
+            self._seen = current
+
+    # --- debounce: quiet period + stable sizes, then hand off to the worker ---
+
+    def _debounce_loop(self) -> None:
+        while not self._stop.is_set():
+            ready = []
+            with self._cond:
+                now = time.monotonic()
+                wait = self.debounce
+                for slug, entry in list(self._pending.items()):
+                    due = entry["last"] + self.debounce
+                    if now < due and now - entry["first"] < self.max_wait:
+                        wait = min(wait, due - now)
+                        continue
+                    ready.append((slug, entry))
+                if not ready:
+                    self._cond.wait(timeout=max(wait, 0.05))
+                    continue
+            for slug, entry in ready:
+                fp = _fingerprint(os.path.join(self.projects_dir, slug))
+                with self._cond:
+                    if self._pending.get(slug) is not entry:
+                        continue
+                    stable = fp == entry["fp"]
+                    if not stable and time.monotonic() - entry["first"] < self.max_wait:
+                        # Still being written (or first look): wait one more quiet period
+                        entry["fp"] = fp
+                        entry["last"] = time.monotonic()
+                        continue
+                    del self._pending[slug]
+                    if slug in self._queued:
+                        continue
+                    self._queued.add(slug)
+                logger.info(f"[watcher] [{slug}] {entry['events']} change event(s) coalesced — reload queued")
+                self._queue.put(slug)
+
+    # --- single reload worker ---
+
+    def _worker_loop(self) -> None:
+        while True:
+            slug = self._queue.get()
+            if slug is None or self._stop.is_set():
+                return
+            with self._cond:
+                self._queued.discard(slug)
+            t0 = time.perf_counter()
+            try:
+                changed = self.reload_fn(slug)
+            except Exception as e:
+                logger.error(f"[watcher] [{slug}] Reload failed: {e}")
+                with self._cond:
+                    self._stats["errors"] += 1
+                continue
+            elapsed = time.perf_counter() - t0
+            with self._cond:
+                if changed is False:
+                    self._stats["unchanged"] += 1
+                    continue
+                self._stats["reloads"] += 1
+                self._stats["reload_seconds"] += elapsed
+                self._stats["last_reload"] = {"slug": slug, "seconds": round(elapsed, 3),
+                                              "at": time.strftime("%Y-%m-%d %H:%M:%S")}
+            logger.info(f"[watcher] [{slug}] Reloaded in {elapsed:.2f}s")
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["reload_seconds"] = round(stats["reload_seconds"], 3)
+            return {
+                "mode": self.mode,
+                "projects_dir": self.projects_dir,
+                "debounce_seconds": self.debounce,
+                "poll_interval_seconds": self.poll_interval if self.mode == "poll" else None,
+                "pending": sorted(self._pending),
+                "queued": sorted(self._queued),
+                **stats,
+            }
+
+
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+
+    logging.basicConfig(level=logging.INFO)
+    root = tempfile.mkdtemp()
+    os.makedirs(os.path.join(root, "demo"))
+    calls = []
+    for mode in ("auto", "poll"):
+        calls.clear()
+        w = ProjectWatcher(root, reload_fn=lambda s: calls.append(s) or True,
+                           debounce=0.5, poll_interval=0.2, mode=mode)
+        print("mode:", w.start())
+        for i in range(20):  # burst: one folder copy
+            with open(os.path.join(root, "demo", f"update_{mode}_{i}.xer"), "w") as f:
+                f.write("x" * 1000)
+            time.sleep(0.01)
+        time.sleep(2.5)
+        w.stop()
+        print(f"  reloads={calls}  stats={w.get_stats()}")
+    shutil.rmtree(root)
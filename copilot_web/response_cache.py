@@ -0,0 +1,228 @@
+"""
+response_cache.py - On-disk cache of copilot replies for repeated questions.
+
+PMs ask "what's the critical path?" and "top risks?" for the same project many
+times a day, and each one was a fresh GPT call even though nothing about the
+project had changed since the last upload. Replies are cached in SQLite under
+
+    sha256(slug, project version, prompt version, page view,
+           normalized question, recent message history)
+
+where the project version (project_loader.get_project_version) fingerprints
+every file the project's context is built from — any upload, edit or deletion
+produces new keys, so stale answers are never served. Rows for a slug are also
+purged explicitly on upload / doc changes / reload to reclaim space.
+
+  - TTL: RESPONSE_CACHE_TTL seconds (default 6 h)
+  - LRU: at most RESPONSE_CACHE_MAX rows (default 2000), least recently used evicted
+  - Replies are stored with encrypt_bytes, so they are encrypted at rest when
+    ENCRYPTION_KEY is set; keys are hashes and never contain question text.
+  - Callers bypass the cache for report mode, images, ad-hoc context and
+    explicit regenerate requests.
+
+Usage:
+    from response_cache import make_key, get, put, invalidate
+    key = make_key(slug, version, page_view, messages, prompt_version)
+    reply = get(key)
+    if reply is None:
+        reply = call_llm(...)
+        put(key, slug, reply)
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from crypto import encrypt_bytes, decrypt_bytes
+except ImportError:
+    def encrypt_bytes(data): return data
+    def decrypt_bytes(data): return data
+
+CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "responses.sqlite")
+TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL", str(6 * 3600)))
+MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX", "2000"))
+
+# Prior turns that shape the answer to a follow-up ("and the one after that?")
+HISTORY_TURNS = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key         TEXT PRIMARY KEY,
+    slug        TEXT NOT NULL,
+    reply       BLOB NOT NULL,
+    created     REAL NOT NULL,
+    last_access REAL NOT NULL,
+    hits        INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_slug ON responses(slug);
+CREATE INDEX IF NOT EXISTS responses_lru ON responses(last_access);
+"""
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0, "invalidated": 0}
+
+_WS = re.compile(r"\s+")
+_PUNCT = re.compile(r"[,;:!?]+")
+_TRAILING = re.compile(r"[\s?.!]+$")
+
+
+def _conn() -> sqlite3.Connection:
+    """One connection per thread (sqlite3 connections aren't shareable across threads)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        conn = sqlite3.connect(CACHE_PATH, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def _bump(name: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += n
+
+
+def normalize_question(text: str) -> str:
+    """Case-, whitespace- and punctuation-insensitive form of a question."""
+    return _TRAILING.sub("", _WS.sub(" ", _PUNCT.sub(" ", (text or "").lower())).strip())
+
+
+def make_key(slug: str, project_version: str, page_view: Optional[str], messages: List[dict],
+             prompt_version: str = "") -> Optional[str]:
+    """
+    Cache key for a chat turn, or None if the turn isn't cacheable (no user
+    question, or non-text content such as an image part).
+    """
+    if not messages or messages[-1].get("role") != "user":
+        return None
+    question = messages[-1].get("content")
+    if not isinstance(question, str) or not question.strip():
+        return None
+    history = []
+    for m in messages[:-1][-HISTORY_TURNS:]:
+        content = m.get("content")
+        if not isinstance(content, str):
+            return None
+        history.append([m.get("role"), normalize_question(content)])
+    payload = json.dumps([slug, project_version, prompt_version, page_view or "",
+                          normalize_question(question), history], separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(key: Optional[str]) -> Optional[str]:
+    """Cached reply for key (refreshing its LRU position), or None."""
+    if not key:
+        return None
+    try:
+        conn = _conn()
+        row = conn.execute("SELECT reply, created FROM responses WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None:
+            _bump("misses")
+            return None
+        if now - row[1] > TTL_SECONDS:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            _bump("expired")
+            _bump("misses")
+            return None
+        conn.execute("UPDATE responses SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key))
+        _bump("hits")
+        return decrypt_bytes(bytes(row[0])).decode("utf-8")
+    except Exception as e:
+        logger.warning(f"[response_cache] get failed: {e}")
+        return None
+
+
+def put(key: Optional[str], slug: str, reply: str) -> None:
+    """Store a reply and evict least-recently-used rows beyond MAX_ENTRIES."""
+    if not key or not reply:
+        return
+    try:
+        conn = _conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, slug, reply, created, last_access, hits) VALUES (?, ?, ?, ?, ?, 0)",
+            (key, slug, encrypt_bytes(reply.encode("utf-8")), now, now))
+        _bump("stores")
+        (count,) = conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > MAX_ENTRIES:
+            cur = conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                (count - MAX_ENTRIES,))
+            _bump("evictions", cur.rowcount)
+    except Exception as e:
+        logger.warning(f"[response_cache] put failed: {e}")
+
+
+def invalidate(slug: Optional[str] = None) -> int:
+    """Drop every cached reply for a project (or all projects). Returns rows removed."""
+    try:
+        conn = _conn()
+        if slug:
+            cur = conn.execute("DELETE FROM responses WHERE slug = ?", (slug,))
+        else:
+            cur = conn.execute("DELETE FROM responses")
+        if cur.rowcount:
+            logger.info(f"[response_cache] Invalidated {cur.rowcount} cached repl{'y' if cur.rowcount == 1 else 'ies'} for {slug or 'all projects'}")
+        _bump("invalidated", cur.rowcount)
+        return cur.rowcount
+    except Exception as e:
+        logger.warning(f"[response_cache] invalidate failed: {e}")
+        return 0
+
+
+def purge_expired() -> int:
+    try:
+        cur = _conn().execute("DELETE FROM responses WHERE created < ?", (time.time() - TTL_SECONDS,))
+        _bump("expired", cur.rowcount)
+        return cur.rowcount
+    except Exception as e:
+        logger.warning(f"[response_cache] purge failed: {e}")
+        return 0
+
+
+def get_stats() -> dict:
+    with _stats_lock:
+        out = dict(_stats)
+    lookups = out["hits"] + out["misses"]
+    out["hit_rate"] = round(out["hits"] / lookups, 3) if lookups else 0.0
+    try:
+        (out["entries"],) = _conn().execute("SELECT COUNT(*) FROM responses").fetchone()
+    except Exception:
+        out["entries"] = None
+    out.update({"ttl_seconds": TTL_SECONDS, "max_entries": MAX_ENTRIES})
+    return out
+
+
+if __name__ == "__main__":
+    import tempfile
+    logging.basicConfig(level=logging.INFO)
+    CACHE_PATH = os.path.join(tempfile.mkdtemp(), "responses.sqlite")
+    MAX_ENTRIES = 3
+
+    msgs = [{"role": "user", "content": "What's the critical path?"}]
+    k1 = make_key("frisco_tx", "v1", "Schedule", msgs)
+    k_same = make_key("frisco_tx", "v1", "Schedule", [{"role": "user", "content": "what's the critical path"}])
+    k_new_version = make_key("frisco_tx", "v2", "Schedule", msgs)
+    assert k1 == k_same and k1 != k_new_version
+    assert get(k1) is None
+    put(k1, "frisco_tx", "The critical path runs through roofing.")
+    assert get(k_same) == "The critical path runs through roofing."
+    assert get(k_new_version) is None
+    for i in range(4):
+        put(make_key("selma_nc", "v1", None, [{"role": "user", "content": f"q{i}"}]), "selma_nc", f"a{i}")
+    invalidate("selma_nc")
+    print(get_stats())
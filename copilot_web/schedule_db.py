@@ -0,0 +1,568 @@
+"""
+schedule_db.py - Shared SQLite index of parsed schedules, with FTS5 activity search.
+
+Every web process used to parse every MPP/XER file on startup and then answer
+ad-hoc questions by looping over dicts. Parsed schedules now also go into one
+SQLite database per deployment (.cache/schedule.sqlite, WAL mode):
+
+  snapshots       one row per schedule file (slug, label e.g. "update_12",
+                  file signature, data date, raw LLM context, full task list)
+  tasks           normalized, indexed columns per activity + an FTS5 index
+                  (tasks_fts) on activity name and notes
+  relationships   predecessor links
+  milestones      milestone-map resolutions for the project's current update
+  variance_items  slipped / accelerated activities vs previous update and baseline
+  projects        which snapshot is current / previous / baseline per project
+
+  - Ingest is one bulk transaction per file, straight from _parse_schedule
+    output, and is skipped when the file's size+mtime signature is unchanged.
+  - _parse_schedule asks load_parsed() first, so a second gunicorn worker (or a
+    restart) gets tasks, links and raw context back from SQLite instead of
+    re-running MPXJ / xerparser.
+  - WAL means readers never block on the writer; each thread keeps its own
+    connection.
+
+With ENCRYPTION_KEY set, raw context and task blobs are stored with
+encrypt_bytes, but the indexed columns and the FTS index are plaintext, so the
+database stays off unless SCHEDULE_DB=1 is set explicitly. SCHEDULE_DB=0
+disables it everywhere.
+
+Usage:
+    import schedule_db
+    schedule_db.search_activities("roof membrane", slug="frisco_tx")
+    schedule_db.find_tasks(critical=True, finish_before="2026-12-31")
+    schedule_db.variance_items(min_slip=30)
+    schedule_db.query("SELECT slug, COUNT(*) FROM tasks JOIN snapshots ...")
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from crypto import encrypt_bytes, decrypt_bytes, is_enabled as _crypto_enabled
+except ImportError:
+    def encrypt_bytes(data): return data
+    def decrypt_bytes(data): return data
+    def _crypto_enabled(): return False
+
+DB_PATH = os.getenv("SCHEDULE_DB_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".cache", "schedule.sqlite")
+_SETTING = os.getenv("SCHEDULE_DB", "")
+ENABLED = _SETTING == "1" or (_SETTING != "0" and not _crypto_enabled())
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id          INTEGER PRIMARY KEY,
+    slug        TEXT NOT NULL,
+    label       TEXT NOT NULL,
+    source      TEXT,
+    signature   TEXT NOT NULL,
+    data_date   TEXT,
+    task_count  INTEGER NOT NULL DEFAULT 0,
+    raw_context BLOB,
+    tasks_blob  BLOB,
+    loaded_at   REAL NOT NULL,
+    UNIQUE (slug, label)
+);
+CREATE TABLE IF NOT EXISTS projects (
+    slug        TEXT PRIMARY KEY,
+    current     TEXT,
+    previous    TEXT,
+    baseline    TEXT,
+    updated_at  REAL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id               INTEGER PRIMARY KEY,
+    snapshot_id      INTEGER NOT NULL,
+    task_id          TEXT,
+    name             TEXT,
+    wbs              TEXT,
+    notes            TEXT,
+    milestone        INTEGER,
+    summary          INTEGER,
+    critical         INTEGER,
+    percent_complete REAL,
+    start            TEXT,
+    finish           TEXT,
+    baseline_start   TEXT,
+    baseline_finish  TEXT,
+    total_float_days REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_snapshot_task ON tasks(snapshot_id, task_id);
+CREATE INDEX IF NOT EXISTS tasks_snapshot_finish ON tasks(snapshot_id, finish);
+CREATE INDEX IF NOT EXISTS tasks_critical ON tasks(snapshot_id, critical, total_float_days);
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+    name, notes, content='tasks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS tasks_ai AFTER INSERT ON tasks BEGIN
+    INSERT INTO tasks_fts(rowid, name, notes) VALUES (new.id, new.name, new.notes);
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_ad AFTER DELETE ON tasks BEGIN
+    INSERT INTO tasks_fts(tasks_fts, rowid, name, notes) VALUES ('delete', old.id, old.name, old.notes);
+END;
+CREATE TABLE IF NOT EXISTS relationships (
+    snapshot_id    INTEGER NOT NULL,
+    task_id        TEXT NOT NULL,
+    predecessor_id TEXT NOT NULL,
+    type           TEXT,
+    lag            TEXT
+);
+CREATE INDEX IF NOT EXISTS rel_succ ON relationships(snapshot_id, task_id);
+CREATE INDEX IF NOT EXISTS rel_pred ON relationships(snapshot_id, predecessor_id);
+CREATE TABLE IF NOT EXISTS milestones (
+    snapshot_id            INTEGER NOT NULL,
+    milestone              TEXT,
+    activity               TEXT,
+    current_finish         TEXT,
+    prior_update_finish    TEXT,
+    baseline_finish        TEXT,
+    variance_vs_prior_days INTEGER,
+    drift_vs_baseline_days INTEGER
+);
+CREATE INDEX IF NOT EXISTS milestones_snapshot ON milestones(snapshot_id);
+CREATE TABLE IF NOT EXISTS variance_items (
+    snapshot_id      INTEGER NOT NULL,
+    comparison       TEXT NOT NULL,
+    direction        TEXT NOT NULL,
+    name             TEXT,
+    phase            TEXT,
+    finish_delta     INTEGER,
+    start_delta      INTEGER,
+    curr_finish      TEXT,
+    prev_finish      TEXT,
+    float_days       REAL,
+    critical         INTEGER,
+    percent_complete REAL
+);
+CREATE INDEX IF NOT EXISTS variance_snapshot ON variance_items(snapshot_id, comparison, finish_delta);
+"""
+
+# Columns returned for task rows
+_TASK_COLUMNS = ("task_id", "name", "wbs", "milestone", "summary", "critical", "percent_complete",
+                 "start", "finish", "baseline_start", "baseline_finish", "total_float_days")
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {"ingested": 0, "ingest_skipped": 0, "parse_hits": 0, "parse_misses": 0, "queries": 0}
+
+
+def _conn() -> sqlite3.Connection:
+    """One connection per thread; WAL so readers never wait on an ingest."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+        conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+def _bump(name: str, n: int = 1) -> None:
+    with _stats_lock:
+        _stats[name] += n
+
+
+def snapshot_key(filepath: str) -> tuple:
+    """(slug, label) for a schedule file: projects/<slug>/<label>.<ext>."""
+    return (os.path.basename(os.path.dirname(os.path.abspath(filepath))),
+            os.path.splitext(os.path.basename(filepath))[0].lower())
+
+
+# Bump when the shape of _parse_schedule's task dicts changes, so stored parses are redone
+PARSE_FORMAT = 2
+
+
+def file_signature(filepath: str) -> str:
+    st = os.stat(filepath)
+    return f"p{PARSE_FORMAT}|{os.path.basename(filepath)}|{st.st_size}|{st.st_mtime_ns}"
+
+
+# ---------------------------------------------------------------------------
+# Ingest
+# ---------------------------------------------------------------------------
+
+def _flag(value) -> Optional[int]:
+    return None if value is None else int(bool(value))
+
+
+def _task_rows(snapshot_id: int, tasks: Iterable) -> Iterable[tuple]:
+    from portfolio_store import normalize_tasks
+    for t, n in zip(tasks, normalize_tasks(tasks)):
+        yield (snapshot_id, n["id"], n["name"], n["wbs"], str(t.get("notes") or "") or None,
+               _flag(n["milestone"]), _flag(n["summary"]), _flag(n["critical"]), n["percent_complete"],
+               *(d.isoformat() if d else None for d in (n["start"], n["finish"],
+                                                        n["baseline_start"], n["baseline_finish"])),
+               n["total_float_days"])
+
+
+def ingest_parsed(filepath: str, parsed: dict) -> bool:
+    """
+    Bulk-load one _parse_schedule result (tasks, relationships, raw context) in
+    a single transaction, replacing any earlier load of the same file.
+    Returns False if the stored copy already matches the file signature.
+    """
+    if not ENABLED or not parsed:
+        return False
+    slug, label = snapshot_key(filepath)
+    signature = file_signature(filepath)
+    conn = _conn()
+    row = conn.execute("SELECT signature FROM snapshots WHERE slug = ? AND label = ?", (slug, label)).fetchone()
+    if row is not None and row["signature"] == signature:
+        _bump("ingest_skipped")
+        return False
+
+    tasks = list(parsed.get("tasks") or [])
+    rels = list(parsed.get("relationships") or [])
+    t0 = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        old = conn.execute("SELECT id FROM snapshots WHERE slug = ? AND label = ?", (slug, label)).fetchone()
+        if old is not None:
+            _delete_snapshot_rows(conn, old["id"])
+            conn.execute("DELETE FROM snapshots WHERE id = ?", (old["id"],))
+        cur = conn.execute(
+            "INSERT INTO snapshots (slug, label, source, signature, data_date, task_count, raw_context, tasks_blob, loaded_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (slug, label, parsed.get("source"), signature, parsed.get("data_date"), len(tasks),
+             encrypt_bytes((parsed.get("raw_context") or "").encode("utf-8")),
+             encrypt_bytes(json.dumps(tasks, default=str).encode("utf-8")), time.time()))
+        sid = cur.lastrowid
+        conn.executemany(
+            "INSERT INTO tasks (snapshot_id, task_id, name, wbs, notes, milestone, summary, critical, percent_complete, "
+            "start, finish, baseline_start, baseline_finish, total_float_days) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            _task_rows(sid, tasks))
+        conn.executemany(
+            "INSERT INTO relationships (snapshot_id, task_id, predecessor_id, type, lag) VALUES (?, ?, ?, ?, ?)",
+            ((sid, str(r.get("task_id") or ""), str(r.get("predecessor_task_id") or ""),
+              r.get("type"), r.get("lag")) for r in rels if r.get("task_id") and r.get("predecessor_task_id")))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    _bump("ingested")
+    logger.info(f"[{slug}] Schedule DB: loaded {label} ({len(tasks)} tasks, {len(rels)} links) "
+                f"in {(time.perf_counter() - t0) * 1000:.0f} ms")
+    return True
+
+
+def _delete_snapshot_rows(conn: sqlite3.Connection, sid: int) -> None:
+    for table in ("tasks", "relationships", "milestones", "variance_items"):
+        conn.execute(f"DELETE FROM {table} WHERE snapshot_id = ?", (sid,))
+
+
+def _snapshot_result(conn: sqlite3.Connection, row) -> dict:
+    rels = [{"task_id": r["task_id"], "predecessor_task_id": r["predecessor_id"], "type": r["type"], "lag": r["lag"]}
+            for r in conn.execute("SELECT task_id, predecessor_id, type, lag FROM relationships "
+                                  "WHERE snapshot_id = ? ORDER BY rowid", (row["id"],))]
+    return {
+        "raw_context": decrypt_bytes(bytes(row["raw_context"])).decode("utf-8"),
+        "source": row["source"],
+        "tasks": json.loads(decrypt_bytes(bytes(row["tasks_blob"])).decode("utf-8")),
+        "relationships": rels,
+        "data_date": row["data_date"],
+    }
+
+
+def load_parsed(filepath: str) -> Optional[dict]:
+    """
+    The stored _parse_schedule result for a file whose signature still matches,
+    or None. Relationship dicts are rebuilt from the link table.
+    """
+    if not ENABLED:
+        return None
+    try:
+        slug, label = snapshot_key(filepath)
+        signature = file_signature(filepath)
+        conn = _conn()
+        row = conn.execute(
+            "SELECT id, source, signature, data_date, raw_context, tasks_blob FROM snapshots WHERE slug = ? AND label = ?",
+            (slug, label)).fetchone()
+        if row is None or row["signature"] != signature or row["tasks_blob"] is None:
+            _bump("parse_misses")
+            return None
+        _bump("parse_hits")
+        return _snapshot_result(conn, row)
+    except Exception as e:
+        logger.warning(f"[schedule_db] Could not read stored parse for {filepath}: {e}")
+        return None
+
+
+def get_snapshot(slug: str, label: str) -> Optional[dict]:
+    """Stored parse of any loaded update of a project (e.g. "update_7"), regardless of current role."""
+    if not ENABLED:
+        return None
+    conn = _conn()
+    row = conn.execute(
+        "SELECT id, source, signature, data_date, raw_context, tasks_blob FROM snapshots WHERE slug = ? AND label = ?",
+        (slug, label)).fetchone()
+    return _snapshot_result(conn, row) if row is not None and row["tasks_blob"] is not None else None
+
+
+def list_snapshots(slug: str) -> List[dict]:
+    """Loaded updates of a project with their data dates and task counts."""
+    if not ENABLED:
+        return []
+    return [dict(r) for r in _conn().execute(
+        "SELECT label, source, data_date, task_count, loaded_at FROM snapshots WHERE slug = ? ORDER BY loaded_at",
+        (slug,))]
+
+
+def _snapshot_id(conn: sqlite3.Connection, slug: str, label: str) -> Optional[int]:
+    row = conn.execute("SELECT id FROM snapshots WHERE slug = ? AND label = ?", (slug, label)).fetchone()
+    return row["id"] if row else None
+
+
+def set_roles(slug: str, current: Optional[str], previous: Optional[str] = None,
+              baseline: Optional[str] = None) -> None:
+    """Record which file labels are the project's current / previous / baseline snapshots."""
+    if not ENABLED:
+        return
+    _conn().execute(
+        "INSERT OR REPLACE INTO projects (slug, current, previous, baseline, updated_at) VALUES (?, ?, ?, ?, ?)",
+        (slug, current, previous, baseline, time.time()))
+
+
+def ingest_variance(slug: str, label: str, comparison: str, variance: dict) -> None:
+    """Replace the slipped/accelerated items of `label` vs `comparison` ("previous" or "baseline")."""
+    if not ENABLED or not variance:
+        return
+    conn = _conn()
+    sid = _snapshot_id(conn, slug, label)
+    if sid is None:
+        return
+    rows = []
+    for phase, data in (variance.get("phases") or {}).items():
+        for direction in ("slipped", "accelerated"):
+            for item in data.get(direction) or []:
+                rows.append((sid, comparison, direction, item.get("name"), item.get("phase") or phase,
+                             item.get("finish_delta"), item.get("start_delta"), item.get("curr_finish"),
+                             item.get("prev_finish"), item.get("float_days"), _flag(item.get("critical")),
+                             item.get("percent_complete")))
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM variance_items WHERE snapshot_id = ? AND comparison = ?", (sid, comparison))
+        conn.executemany("INSERT INTO variance_items VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def ingest_milestones(slug: str, label: str, milestones: List[dict]) -> None:
+    """Replace the milestone-map resolutions (schedule_tools.get_milestone_trend rows) of a snapshot."""
+    if not ENABLED:
+        return
+    conn = _conn()
+    sid = _snapshot_id(conn, slug, label)
+    if sid is None:
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM milestones WHERE snapshot_id = ?", (sid,))
+        conn.executemany("INSERT INTO milestones VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+            (sid, m.get("milestone"), m.get("activity"), m.get("current_finish"), m.get("prior_update_finish"),
+             m.get("baseline_finish"), m.get("variance_vs_prior_days"), m.get("drift_vs_baseline_days"))
+            for m in milestones or []])
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def drop_project(slug: str) -> None:
+    if not ENABLED:
+        return
+    conn = _conn()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for (sid,) in conn.execute("SELECT id FROM snapshots WHERE slug = ?", (slug,)).fetchall():
+            _delete_snapshot_rows(conn, sid)
+        conn.execute("DELETE FROM snapshots WHERE slug = ?", (slug,))
+        conn.execute("DELETE FROM projects WHERE slug = ?", (slug,))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+# ---------------------------------------------------------------------------
+# Queries
+# ---------------------------------------------------------------------------
+
+_ROLES = ("current", "previous", "baseline")
+
+
+def _snapshot_filter(slug: Optional[str], snapshot: str) -> tuple:
+    """SQL fragment (on alias s) + params selecting snapshots by role or label, optionally for one project."""
+    clauses, params = [], []
+    if snapshot in _ROLES:
+        clauses.append(f"s.label = (SELECT p.{snapshot} FROM projects p WHERE p.slug = s.slug)")
+    elif snapshot != "all":
+        clauses.append("s.label = ?")
+        params.append(snapshot)
+    if slug:
+        clauses.append("s.slug = ?")
+        params.append(slug)
+    return (" AND ".join(clauses) or "1"), params
+
+
+def _rows(sql: str, params) -> List[dict]:
+    _bump("queries")
+    return [dict(r) for r in _conn().execute(sql, params)]
+
+
+def _fts_query(text: str) -> str:
+    """User text → FTS5 query: every word must match, each as a prefix."""
+    words = re.findall(r"\w+", text or "")
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def search_activities(text: str, slug: Optional[str] = None, snapshot: str = "current",
+                      limit: int = 20) -> List[dict]:
+    """Full-text search over activity names and notes, best matches first (bm25)."""
+    if not ENABLED:
+        return []
+    match = _fts_query(text)
+    if not match:
+        return []
+    where, params = _snapshot_filter(slug, snapshot)
+    cols = ", ".join(f"t.{c}" for c in _TASK_COLUMNS)
+    return _rows(
+        f"SELECT s.slug, s.label AS snapshot, {cols}, bm25(tasks_fts) AS rank "
+        f"FROM tasks_fts JOIN tasks t ON t.id = tasks_fts.rowid JOIN snapshots s ON s.id = t.snapshot_id "
+        f"WHERE tasks_fts MATCH ? AND {where} ORDER BY rank LIMIT ?",
+        [match, *params, int(limit)])
+
+
+def find_tasks(slug: Optional[str] = None, snapshot: str = "current", critical: Optional[bool] = None,
+               milestone: Optional[bool] = None, incomplete: bool = False, max_float: Optional[float] = None,
+               finish_after: Optional[str] = None, finish_before: Optional[str] = None,
+               limit: int = 200) -> List[dict]:
+    """Indexed task filter across one or all projects (summary rows excluded), ordered by finish."""
+    if not ENABLED:
+        return []
+    where, params = _snapshot_filter(slug, snapshot)
+    clauses = [where, "COALESCE(t.summary, 0) = 0"]
+    if critical is not None:
+        clauses.append("t.critical = ?")
+        params.append(int(critical))
+    if milestone is not None:
+        clauses.append("t.milestone = ?")
+        params.append(int(milestone))
+    if incomplete:
+        clauses.append("COALESCE(t.percent_complete, 0) < 100")
+    if max_float is not None:
+        clauses.append("t.total_float_days <= ?")
+        params.append(float(max_float))
+    if finish_after:
+        clauses.append("t.finish >= ?")
+        params.append(str(finish_after)[:10])
+    if finish_before:
+        clauses.append("t.finish <= ?")
+        params.append(str(finish_before)[:10])
+    cols = ", ".join(f"t.{c}" for c in _TASK_COLUMNS)
+    return _rows(
+        f"SELECT s.slug, s.label AS snapshot, {cols} FROM tasks t JOIN snapshots s ON s.id = t.snapshot_id "
+        f"WHERE {' AND '.join(clauses)} ORDER BY t.finish LIMIT ?", [*params, int(limit)])
+
+
+def predecessors(slug: str, task_id: str, snapshot: str = "current") -> List[dict]:
+    """Direct predecessors of one activity with their dates and float."""
+    if not ENABLED:
+        return []
+    where, params = _snapshot_filter(slug, snapshot)
+    cols = ", ".join(f"t.{c}" for c in _TASK_COLUMNS)
+    return _rows(
+        f"SELECT r.type, r.lag, {cols} FROM relationships r JOIN snapshots s ON s.id = r.snapshot_id "
+        f"LEFT JOIN tasks t ON t.snapshot_id = r.snapshot_id AND t.task_id = r.predecessor_id "
+        f"WHERE {where} AND r.task_id = ? ORDER BY t.finish DESC", [*params, str(task_id)])
+
+
+def variance_items(slug: Optional[str] = None, comparison: str = "previous", min_slip: Optional[int] = None,
+                   phase: Optional[str] = None, critical_only: bool = False, limit: int = 200) -> List[dict]:
+    """Slipped/accelerated activities of each project's current update, largest slip first."""
+    if not ENABLED:
+        return []
+    where, params = _snapshot_filter(slug, "current")
+    clauses = [where, "v.comparison = ?"]
+    params.append(comparison)
+    if min_slip is not None:
+        clauses.append("v.finish_delta >= ?")
+        params.append(int(min_slip))
+    if phase:
+        clauses.append("v.phase = ?")
+        params.append(phase)
+    if critical_only:
+        clauses.append("v.critical = 1")
+    return _rows(
+        f"SELECT s.slug, s.label AS snapshot, v.direction, v.name, v.phase, v.finish_delta, v.start_delta, "
+        f"v.curr_finish, v.prev_finish, v.float_days, v.critical, v.percent_complete "
+        f"FROM variance_items v JOIN snapshots s ON s.id = v.snapshot_id "
+        f"WHERE {' AND '.join(clauses)} ORDER BY v.finish_delta DESC LIMIT ?", [*params, int(limit)])
+
+
+def query(sql: str, params: Iterable = ()) -> List[dict]:
+    """Ad-hoc read-only SQL (writes are rejected by SQLite's query_only mode)."""
+    if not ENABLED:
+        return []
+    conn = _conn()
+    conn.execute("PRAGMA query_only = ON")
+    try:
+        return _rows(sql, list(params))
+    finally:
+        conn.execute("PRAGMA query_only = OFF")
+
+
+def get_stats() -> dict:
+    with _stats_lock:
+        out = dict(_stats)
+    out.update({"enabled": ENABLED, "path": DB_PATH})
+    if ENABLED:
+        try:
+            conn = _conn()
+            for table in ("snapshots", "tasks", "relationships", "milestones", "variance_items"):
+                (out[table],) = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()
+            out["size_kb"] = round(os.path.getsize(DB_PATH) / 1024)
+        except Exception as e:
+            out["error"] = str(e)
+    return out
+
+
+if __name__ == "__main__":
+    # Load every project (populating the database), then time a few queries
+    # against the same questions answered by Python loops over task dicts.
+    import sys
+    here = os.path.dirname(os.path.abspath(__file__))
+    if here not in sys.path:
+        sys.path.insert(0, here)
+    logging.basicConfig(level=logging.INFO)
+    from project_loader import load_all_projects, _project_tasks
+    t0 = time.perf_counter()
+    load_all_projects()
+    print(f"load_all_projects: {time.perf_counter() - t0:.1f} s")
+    import schedule_db as db                  # the instance project_loader wrote through
+
+    word = (sys.argv[1] if len(sys.argv) > 1 else "roof").lower()
+    for label, fn in (
+        (f"FTS '{word}' (all projects)", lambda: db.search_activities(word, limit=50)),
+        (f"loop  '{word}' (all projects)", lambda: [t for tasks in _project_tasks.values() for t in tasks
+                                                  if word in (t.get("name") or "").lower()][:50]),
+        ("critical incomplete tasks", lambda: db.find_tasks(critical=True, incomplete=True)),
+        ("slips >= 30 cd vs previous", lambda: db.variance_items(min_slip=30)),
+    ):
+        t0 = time.perf_counter()
+        rows = fn()
+        print(f"{label}: {len(rows)} rows in {(time.perf_counter() - t0) * 1000:.2f} ms")
+    print(db.get_stats())
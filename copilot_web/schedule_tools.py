@@ -0,0 +1,476 @@
+"""
+schedule_tools.py - Local schedule query tools exposed to the model via function calling.
+
+Instead of pasting every relationship and activity into the system prompt,
+/chat sends a compact project context plus these tools; the model asks for the
+detail it needs and each call is answered from the in-memory task tables,
+search index and relationship table in well under a millisecond.
+
+Tools:
+  find_activity         ranked name/ID search across current/previous/baseline
+  get_activity          full detail for one activity (dates, float, % complete, link counts)
+  get_predecessors      upstream walk (depth 1-5) with finish/float per link
+  get_successors        downstream walk (depth 1-5)
+  get_activity_variance current vs previous vs baseline start/finish movement
+  get_milestone_trend   standardized milestones across snapshots
+  get_critical_path     float-ranked driving chain to completion or to any activity
+
+Usage:
+    from schedule_tools import TOOLS, run_tool_loop
+    reply, trace = run_tool_loop(client, "gpt-4o", messages, slug="frisco_tx")
+
+End-to-end check without OpenAI (scripted stub model issues the tool calls):
+    python schedule_tools.py colorado_springs_co
+"""
+
+import json
+import time
+import logging
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_TOOL_ROUNDS = 6
+MAX_WALK_DEPTH = 5
+MAX_WALK_NODES = 60
+
+_ACTIVITY_PARAM = {
+    "type": "string",
+    "description": "Activity name (partial is fine) or activity ID.",
+}
+
+TOOLS = [
+    {"type": "function", "function": {
+        "name": "find_activity",
+        "description": "Search activities by partial name or ID. Returns ranked matches with dates. Use before other tools when the name is ambiguous.",
+        "parameters": {"type": "object", "properties": {
+            "query": {"type": "string", "description": "Name fragment or activity ID."},
+            "snapshot": {"type": "string", "enum": ["current", "previous", "baseline"],
+                         "description": "Limit to one schedule version (default: all)."},
+            "limit": {"type": "integer", "minimum": 1, "maximum": 20},
+        }, "required": ["query"]},
+    }},
+    {"type": "function", "function": {
+        "name": "get_activity",
+        "description": "Full detail for one activity in the current schedule: start, finish, % complete, total float, critical flags, predecessor/successor counts.",
+        "parameters": {"type": "object", "properties": {"activity": _ACTIVITY_PARAM}, "required": ["activity"]},
+    }},
+    {"type": "function", "function": {
+        "name": "get_predecessors",
+        "description": "Walk upstream logic from an activity. Each link lists the predecessor's finish, float, % complete and relationship type.",
+        "parameters": {"type": "object", "properties": {
+            "activity": _ACTIVITY_PARAM,
+            "depth": {"type": "integer", "minimum": 1, "maximum": MAX_WALK_DEPTH, "description": "Levels to walk (default 1)."},
+        }, "required": ["activity"]},
+    }},
+    {"type": "function", "function": {
+        "name": "get_successors",
+        "description": "Walk downstream logic from an activity to see what it drives.",
+        "parameters": {"type": "object", "properties": {
+            "activity": _ACTIVITY_PARAM,
+            "depth": {"type": "integer", "minimum": 1, "maximum": MAX_WALK_DEPTH, "description": "Levels to walk (default 1)."},
+        }, "required": ["activity"]},
+    }},
+    {"type": "function", "function": {
+        "name": "get_activity_variance",
+        "description": "Start/finish movement of one activity: current vs previous update and vs baseline, in calendar days (positive = slipped).",
+        "parameters": {"type": "object", "properties": {"activity": _ACTIVITY_PARAM}, "required": ["activity"]},
+    }},
+    {"type": "function", "function": {
+        "name": "get_milestone_trend",
+        "description": "Standardized milestones with baseline, prior update and current forecast finish plus movement. Optionally filter to one milestone.",
+        "parameters": {"type": "object", "properties": {
+            "milestone": {"type": "string", "description": "Standardized milestone name (optional)."},
+        }},
+    }},
+    {"type": "function", "function": {
+        "name": "get_critical_path",
+        "description": "Float-ranked driving chain back from contract completion, or from a named activity (per-activity runoff).",
+        "parameters": {"type": "object", "properties": {
+            "activity": {"type": "string", "description": "Optional target activity; omit for the project critical path."},
+        }},
+    }},
+]
+
+TOOLS_PROMPT_NOTE = (
+    "SCHEDULE TOOLS: This prompt carries only the schedule headline and milestone table — individual activities, "
+    "the previous and baseline schedules and the RELATIONSHIPS table are not included. "
+    "Use the schedule tools to look up activities, walk predecessors/successors, check an activity's variance, "
+    "milestone trends, or a per-activity critical path instead of guessing. Call tools only when the context above "
+    "doesn't already answer the question, and never mention tool names to the user."
+)
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def _facts(slug: str) -> dict:
+    from project_loader import get_schedule_facts
+    facts = get_schedule_facts(slug)
+    if not facts:
+        raise LookupError(f"No schedule loaded for project '{slug}'")
+    return facts
+
+
+def _tid(task) -> str:
+    return str(task.get("id") or task.get("task_id") or task.get("activity_id") or "").strip()
+
+
+def _finish(task) -> str:
+    return str(task.get("finish") or task.get("target_end_date") or task.get("early_end_date") or "")[:10]
+
+
+def _start(task) -> str:
+    return str(task.get("start") or task.get("target_start_date") or task.get("early_start_date") or "")[:10]
+
+
+def _float_days(task) -> Optional[float]:
+    from local_answers import _float_days as _fd
+    return _fd(task)
+
+
+def _brief(task) -> dict:
+    return {
+        "id": _tid(task),
+        "name": (task.get("name") or task.get("task_name") or "").strip(),
+        "start": _start(task),
+        "finish": _finish(task),
+        "percent_complete": task.get("percent_complete"),
+        "total_float_days": _float_days(task),
+        "critical": bool(task.get("critical", False)),
+        "milestone": bool(task.get("milestone", False)),
+    }
+
+
+def _resolve(facts: dict, activity: str, snapshot: str = "current"):
+    from local_answers import _resolve as _res
+    return _res(facts, activity or "", snapshot)
+
+
+def _link_maps(facts: dict) -> Tuple[Dict[str, List[Tuple[str, str]]], Dict[str, List[Tuple[str, str]]]]:
+    """({succ_id: [(pred_id, type)]}, {pred_id: [(succ_id, type)]}) — built once per relationship table."""
+    rels = facts.get("relationships") or []
+    cached = _link_cache.get(facts.get("slug"))
+    if cached and cached[0] is rels:
+        return cached[1], cached[2]
+    preds: Dict[str, List[Tuple[str, str]]] = {}
+    succs: Dict[str, List[Tuple[str, str]]] = {}
+    for r in rels:
+        s = str(r.get("task_id") or r.get("succ_task_id") or "").strip()
+        p = str(r.get("predecessor_task_id") or r.get("pred_task_id") or "").strip()
+        if not s or not p or "None" in (s, p):
+            continue
+        typ = str(r.get("type") or r.get("pred_type") or "FS").replace("PR_", "")
+        preds.setdefault(s, []).append((p, typ))
+        succs.setdefault(p, []).append((s, typ))
+    _link_cache[facts.get("slug")] = (rels, preds, succs)
+    return preds, succs
+
+
+_link_cache: Dict[str, tuple] = {}
+
+
+def _days_between(a: str, b: str) -> Optional[int]:
+    from local_answers import _to_date
+    da, db = _to_date(a), _to_date(b)
+    return (da - db).days if da and db else None
+
+
+# ---------------------------------------------------------------------------
+# Tool implementations — each takes (slug, **args) and returns a JSON-able dict
+# ---------------------------------------------------------------------------
+
+def find_activity(slug: str, query: str, snapshot: Optional[str] = None, limit: int = 8) -> dict:
+    from search_index import search
+    _facts(slug)  # ensures indexes exist
+    return {"query": query, "matches": search(slug, query, snapshot=snapshot, limit=max(1, min(int(limit), 20)))}
+
+
+def get_activity(slug: str, activity: str) -> dict:
+    facts = _facts(slug)
+    task = _resolve(facts, activity)
+    if task is None:
+        return {"error": f"No activity matching '{activity}'"}
+    preds, succs = _link_maps(facts)
+    tid = _tid(task)
+    out = _brief(task)
+    out.update({
+        "near_critical": bool(task.get("near_critical", False)),
+        "summary": bool(task.get("summary", False)),
+        "predecessor_count": len(preds.get(tid, [])),
+        "successor_count": len(succs.get(tid, [])),
+    })
+    for key in ("wbs", "baseline_start", "baseline_finish", "actual_start", "actual_finish",
+                "duration", "constraint_type", "constraint_date"):
+        if task.get(key):
+            out[key] = task.get(key)
+    return out
+
+
+def _walk(slug: str, activity: str, depth: int, upstream: bool) -> dict:
+    facts = _facts(slug)
+    task = _resolve(facts, activity)
+    if task is None:
+        return {"error": f"No activity matching '{activity}'"}
+    preds, succs = _link_maps(facts)
+    links = preds if upstream else succs
+    idx = facts["index"]
+    depth = max(1, min(int(depth or 1), MAX_WALK_DEPTH))
+
+    start_id = _tid(task)
+    seen = {start_id}
+    out = []
+    queue = deque([(start_id, 0)])
+    while queue and len(out) < MAX_WALK_NODES:
+        node, level = queue.popleft()
+        if level >= depth:
+            continue
+        for other, typ in links.get(node, []):
+            if other in seen:
+                continue
+            seen.add(other)
+            t = idx.task(other)
+            row = _brief(t) if t is not None else {"id": other, "name": "(not in schedule)"}
+            row.update({"level": level + 1, "relationship": typ, "via": node})
+            out.append(row)
+            queue.append((other, level + 1))
+    key = "predecessors" if upstream else "successors"
+    return {"activity": _brief(task), "depth": depth, key: out, "truncated": len(out) >= MAX_WALK_NODES}
+
+
+def get_predecessors(slug: str, activity: str, depth: int = 1) -> dict:
+    return _walk(slug, activity, depth, upstream=True)
+
+
+def get_successors(slug: str, activity: str, depth: int = 1) -> dict:
+    return _walk(slug, activity, depth, upstream=False)
+
+
+def get_activity_variance(slug: str, activity: str) -> dict:
+    facts = _facts(slug)
+    curr = _resolve(facts, activity)
+    if curr is None:
+        return {"error": f"No activity matching '{activity}'"}
+    name, tid = (curr.get("name") or "").strip(), _tid(curr)
+    out = {"activity": _brief(curr), "labels": {
+        "current": facts.get("current_label"), "previous": facts.get("previous_label")}}
+    for snap, key in (("previous", "previous_index"), ("baseline", "baseline_index")):
+        idx = facts.get(key)
+        other = idx.get(name, tid) if idx is not None else None
+        if other is None:
+            out[snap] = None
+            continue
+        out[snap] = {
+            "start": _start(other),
+            "finish": _finish(other),
+            "start_delta_days": _days_between(_start(curr), _start(other)),
+            "finish_delta_days": _days_between(_finish(curr), _finish(other)),
+        }
+    # Embedded baseline dates (MPP) when no baseline file is loaded
+    if out.get("baseline") is None and curr.get("baseline_finish"):
+        out["baseline"] = {
+            "start": str(curr.get("baseline_start") or "")[:10],
+            "finish": str(curr.get("baseline_finish"))[:10],
+            "finish_delta_days": _days_between(_finish(curr), str(curr.get("baseline_finish"))),
+        }
+    return out
+
+
+def get_milestone_trend(slug: str, milestone: Optional[str] = None) -> dict:
+    facts = _facts(slug)
+    rows = []
+    for m in sorted(facts.get("milestones") or [], key=lambda x: x.get("sort", 99)):
+        std = m.get("standardized_name", "")
+        if milestone and milestone.lower() not in std.lower():
+            continue
+        act_name, act_id = (m.get("activity_name") or "").strip(), str(m.get("activity_id") or "")
+        finishes = {}
+        for snap, key in (("current", "index"), ("previous", "previous_index"), ("baseline", "baseline_index")):
+            idx = facts.get(key)
+            t = idx.get(act_name, act_id) if idx is not None else None
+            finishes[snap] = _finish(t) if t is not None else None
+        prior = str(m.get("prior_update_date") or "")[:10] or finishes["previous"]
+        rows.append({
+            "milestone": std,
+            "activity": act_name,
+            "current_finish": finishes["current"],
+            "prior_update_finish": prior,
+            "baseline_finish": finishes["baseline"],
+            "variance_vs_prior_days": _days_between(finishes["current"] or "", prior or ""),
+            "drift_vs_baseline_days": _days_between(finishes["current"] or "", finishes["baseline"] or ""),
+        })
+    if milestone and not rows:
+        return {"error": f"No standardized milestone matching '{milestone}'"}
+    return {"milestones": rows}
+
+
+def get_critical_path(slug: str, activity: Optional[str] = None) -> dict:
+    from critical_path import build_critical_chain
+    facts = _facts(slug)
+    tasks = facts.get("tasks") or []
+    rels = facts.get("relationships") or []
+    target_name = None
+    if activity:
+        target = _resolve(facts, activity)
+        if target is None:
+            return {"error": f"No activity matching '{activity}'"}
+        target_name = target.get("name")
+    chain = build_critical_chain(tasks, list(rels), target_name=target_name)
+    if chain.get("error"):
+        return {"error": chain["error"]}
+    return {
+        "mode": chain.get("mode"),
+        "target": _brief(chain["target"]),
+        "depth": chain.get("depth"),
+        "chain": [_brief(t) for t in chain.get("chain", [])],
+        "warning": chain.get("warning"),
+    }
+
+
+TOOL_FUNCTIONS: Dict[str, Callable[..., dict]] = {
+    "find_activity": find_activity,
+    "get_activity": get_activity,
+    "get_predecessors": get_predecessors,
+    "get_successors": get_successors,
+    "get_activity_variance": get_activity_variance,
+    "get_milestone_trend": get_milestone_trend,
+    "get_critical_path": get_critical_path,
+}
+
+
+def execute_tool(slug: str, name: str, arguments) -> str:
+    """Run one tool call and return its JSON result (errors are returned, not raised)."""
+    fn = TOOL_FUNCTIONS.get(name)
+    if fn is None:
+        return json.dumps({"error": f"Unknown tool '{name}'"})
+    try:
+        args = json.loads(arguments) if isinstance(arguments, str) else dict(arguments or {})
+        if not isinstance(args, dict):
+            raise ValueError("arguments must be a JSON object")
+        result = fn(slug, **args)
+    except TypeError as e:
+        result = {"error": f"Bad arguments for {name}: {e}"}
+    except Exception as e:
+        logger.warning(f"[{slug}] Tool {name} failed: {e}")
+        result = {"error": str(e)}
+    return json.dumps(result, default=str)
+
+
+# ---------------------------------------------------------------------------
+# Tool loop
+# ---------------------------------------------------------------------------
+
+def run_tool_loop(client, model: str, messages: List[dict], slug: str,
+                  max_rounds: int = MAX_TOOL_ROUNDS, **create_kwargs) -> Tuple[str, List[dict]]:
+    """
+    Call the model with TOOLS, execute any tool calls locally, feed results back,
+    and repeat until the model answers in text (or max_rounds is reached, after
+    which one final call is made with tools disabled).
+
+    Returns (reply_text, trace) where trace lists {tool, arguments, ms} per call.
+    """
+    messages = list(messages)
+    trace: List[dict] = []
+    for _ in range(max_rounds):
+        response = client.chat.completions.create(
+            model=model, messages=messages, tools=TOOLS, tool_choice="auto", **create_kwargs)
+        msg = response.choices[0].message
+        tool_calls = getattr(msg, "tool_calls", None) or []
+        if not tool_calls:
+            return msg.content or "", trace
+
+        messages.append({
+            "role": "assistant",
+            "content": msg.content or "",
+            "tool_calls": [{
+                "id": tc.id,
+                "type": "function",
+                "function": {"name": tc.function.name, "arguments": tc.function.arguments},
+            } for tc in tool_calls],
+        })
+        for tc in tool_calls:
+            t0 = time.perf_counter()
+            result = execute_tool(slug, tc.function.name, tc.function.arguments)
+            trace.append({"tool": tc.function.name, "arguments": tc.function.arguments,
+                          "ms": round((time.perf_counter() - t0) * 1000, 3)})
+            messages.append({"role": "tool", "tool_call_id": tc.id, "content": result})
+
+    logger.warning(f"[{slug}] Tool loop hit {max_rounds} rounds — forcing a text answer")
+    response = client.chat.completions.create(model=model, messages=messages, tools=TOOLS,
+                                              tool_choice="none", **create_kwargs)
+    return response.choices[0].message.content or "", trace
+
+
+class ScriptedClient:
+    """
+    Offline stand-in for openai.OpenAI that replays a script of turns. Each
+    turn is either a list of (tool_name, arguments_dict) calls or a callable
+    that receives the tool results seen so far and returns the final text.
+    Lets the tool loop run end-to-end with no network or API key.
+    """
+
+    class _Obj:
+        def __init__(self, **kw):
+            self.__dict__.update(kw)
+
+    def __init__(self, script: List):
+        self._script = list(script)
+        self.requests: List[dict] = []
+        self.chat = self._Obj(completions=self._Obj(create=self._create))
+
+    def _create(self, **kwargs):
+        self.requests.append(kwargs)
+        turn = self._script.pop(0) if self._script else (lambda results: "(script exhausted)")
+        O = self._Obj
+        if callable(turn):
+            results = [json.loads(m["content"]) for m in kwargs["messages"] if m.get("role") == "tool"]
+            message = O(content=turn(results), tool_calls=None)
+        else:
+            n = len(self.requests)
+            message = O(content=None, tool_calls=[
+                O(id=f"call_{n}_{i}", type="function",
+                  function=O(name=name, arguments=json.dumps(args)))
+                for i, (name, args) in enumerate(turn)
+            ])
+        return O(choices=[O(message=message)])
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    if here not in sys.path:
+        sys.path.insert(0, here)
+    logging.basicConfig(level=logging.WARNING)
+
+    from project_loader import load_all_projects, get_project_context
+
+    slug = sys.argv[1] if len(sys.argv) > 1 else "colorado_springs_co"
+    load_all_projects()
+
+    full_ctx = get_project_context(slug)
+    compact_ctx = get_project_context(slug, compact=True)
+    print(f"Context: full {len(full_ctx):,} chars → compact {len(compact_ctx):,} chars")
+
+    def _final(results):
+        act = results[0]["matches"][0]["name"] if results and results[0].get("matches") else "?"
+        preds = results[1].get("predecessors", []) if len(results) > 1 else []
+        var = results[2] if len(results) > 2 else {}
+        fin = (var.get("previous") or {}).get("finish_delta_days")
+        return (f"{act}: {len(preds)} upstream activities within 2 levels; "
+                f"finish moved {fin:+d} days vs previous update." if fin is not None else f"{act}: no prior data.")
+
+    client = ScriptedClient([
+        [("find_activity", {"query": "drywall", "snapshot": "current", "limit": 3})],
+        [("get_predecessors", {"activity": "drywall", "depth": 2}),
+         ("get_activity_variance", {"activity": "drywall"})],
+        _final,
+    ])
+    reply, trace = run_tool_loop(client, "stub", [{"role": "system", "content": compact_ctx},
+                                                  {"role": "user", "content": "What's driving drywall?"}], slug)
+    for t in trace:
+        print(f"  tool {t['tool']}({t['arguments']}) — {t['ms']} ms")
+    print(f"Reply: {reply}")
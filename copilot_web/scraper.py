@@ -1,14 +1,75 @@
+"""
+scraper.py - Power BI dashboard scraper (screenshots → GPT-4o Vision → JSON buckets).
+
+The scrape runs as an asyncio pipeline on a dedicated event-loop thread:
+
+  - One Chromium browser/page is kept warm across cycles (relaunched only if
+    it dies), so a cycle costs a page reload rather than a browser start.
+  - Pages are walked in order with readiness detection instead of fixed
+    sleeps. Each changed page is handed to a bounded pool of Vision workers
+    (VISION_CONCURRENCY) and the browser moves on to the next page while
+    the extraction is in flight. A cycle therefore takes about as long as
+    the navigation plus the slowest single extraction.
+  - A page whose screenshot is pixel-identical to the one behind its bucket
+    keeps that bucket (no Vision call).
+  - Buckets and the combined context file are written atomically.
+
+Environment:
+  SCRAPER_URL                 embed URL override (e.g. a local static stand-in)
+  SCRAPER_VISION_CONCURRENCY  in-flight Vision extractions (default 3)
+  OPENAI_BASE_URL             Vision endpoint override (see llm_pool)
+
+Usage:
+    from scraper import scrape_and_extract, load_context
+    scrape_and_extract()          # blocking; safe to call from any thread
+
+Self-test against a local HTML stand-in and a stub Vision endpoint:
+    python scraper.py --selftest
+"""
+
 import os
 import json
+import time
 import base64
+import atexit
+import asyncio
+import hashlib
 import logging
+import tempfile
+import threading
 from datetime import datetime
-from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
 import openai
 
 logger = logging.getLogger(__name__)
 
-PBI_URL = (
+try:
+    from image_prep import describe_image, fingerprint
+except ImportError:
+    def fingerprint(data):
+        return {"digest": hashlib.sha256(data).hexdigest()}
+
+    def describe_image(client, data, prompt, model="gpt-4o", max_distance=0, label="image", **create_kwargs):
+        b64_image = base64.b64encode(data).decode("utf-8")
+        response = client.chat.completions.create(
+            model=model,
+            messages=[{
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64_image}", "detail": "high"}},
+                ],
+            }],
+            **create_kwargs,
+        )
+        return response.choices[0].message.content, False
+
+try:
+    from llm_pool import get_limited_client
+except ImportError:
+    get_limited_client = None
+
+PBI_URL = os.getenv("SCRAPER_URL") or (
     "https://app.powerbi.com/view?r=eyJrIjoiZGY0MGRiMzUtYjNjYS00ZjUwLWE4NGUtZDUxZjNmNzk3"
     "OWYzIiwidCI6IjNjMDI3MWIxLWNjMWQtNGRlZC05ZWFlLWQwYzVlNDViZmExNiIsImMiOjZ9"
 )
@@ -16,6 +77,9 @@ PBI_URL = (
 CONTEXT_DIR = "/tmp/dashboard_cache"
 CONTEXT_FILE = "/tmp/dashboard_context.json"
 
+MAX_PAGES = 5
+VISION_CONCURRENCY = int(os.getenv("SCRAPER_VISION_CONCURRENCY", "3"))
+
 PAGE_LABELS = {
     1: "Landing Page – Project Overview & Milestones",
     2: "Risk Report",
@@ -39,8 +103,90 @@ Return ONLY valid JSON. No markdown fences, no explanation.
 If a field has no data, use an empty array or object for it.
 Example: {"page_title": "Overview", "project": "Anaheim", "kpis": {}, "milestones": [], "risks": [], "filters_active": {}, "other_data": {}}"""
 
+# Readiness detection (replaces fixed sleeps): a page is ready once visuals are
+# in the DOM, no loading indicator is visible, and STABLE_FRAMES consecutive
+# screenshots are pixel-identical (Power BI has finished drawing).
+VISUAL_SELECTOR = "visual-container, .visualContainer, [class*='visual'], iframe[title]"
+BUSY_SELECTOR = ".powerbi-spinner, .spinner, [class*='loading'], [aria-busy='true']"
+NEXT_SELECTORS = (
+    "button[aria-label='Next page']",
+    ".navigation-next",
+    "[title='Next Page']",
+    "button[title='Next page']",
+)
+READY_TIMEOUT_MS = 45000
+NAV_TIMEOUT_MS = 20000
+POLL_MS = 500
+STABLE_FRAMES = 3
+
+# Outcome of the most recent cycle (pages reused vs. sent to Vision, wall time)
+last_cycle = {}
+
+
+async def _busy(page_obj) -> bool:
+    try:
+        for el in await page_obj.query_selector_all(BUSY_SELECTOR):
+            if await el.is_visible():
+                return True
+    except Exception:
+        pass
+    return False
 
-def _extract_page_label(page_obj, page_num: int) -> str:
+
+async def _wait_for_render(page_obj, timeout_ms: int = READY_TIMEOUT_MS, previous: bytes = None) -> bytes:
+    """
+    Poll until the report has settled and return its screenshot. With
+    `previous` (the last page's screenshot), first wait for the view to change
+    so a slow page transition isn't captured as the old page.
+    Falls back to the latest screenshot when the timeout expires.
+    """
+    deadline = time.monotonic() + timeout_ms / 1000
+    try:
+        await page_obj.wait_for_selector(VISUAL_SELECTOR, timeout=timeout_ms)
+    except Exception:
+        logger.warning("Visual selector not found — proceeding with screenshot anyway.")
+    last = None
+    stable = 0
+    changed = previous is None
+    while True:
+        shot = await page_obj.screenshot(full_page=False)
+        changed = changed or shot != previous
+        stable = stable + 1 if changed and shot == last else 1
+        if stable >= STABLE_FRAMES and not await _busy(page_obj):
+            return shot
+        last = shot
+        if time.monotonic() >= deadline:
+            logger.warning(f"Render did not settle within {timeout_ms / 1000:.0f}s — using latest screenshot.")
+            return shot
+        await asyncio.sleep(POLL_MS / 1000)
+
+
+def _load_bucket(page_num: int) -> dict:
+    try:
+        with open(os.path.join(CONTEXT_DIR, f"page_{page_num}.json"), "r") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _write_json_atomic(path: str, obj) -> None:
+    """Write JSON to a temp file in the same directory and rename it over `path`."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(obj, f, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+async def _extract_page_label(page_obj, page_num: int) -> str:
     """Try to read the ACTIVE page tab label from the Power BI nav."""
     try:
         selectors = [
@@ -50,14 +196,14 @@ def _extract_page_label(page_obj, page_num: int) -> str:
             "[class*='active'] .reportPageName",
         ]
         for sel in selectors:
-            el = page_obj.query_selector(sel)
+            el = await page_obj.query_selector(sel)
             if el:
-                text = el.inner_text().strip()
+                text = (await el.inner_text()).strip()
                 if text:
                     return text
-        tabs = page_obj.query_selector_all(".reportPageName, [data-testid='page-tab'] span")
+        tabs = await page_obj.query_selector_all(".reportPageName, [data-testid='page-tab'] span")
         if tabs and page_num - 1 < len(tabs):
-            text = tabs[page_num - 1].inner_text().strip()
+            text = (await tabs[page_num - 1].inner_text()).strip()
             if text:
                 return text
     except Exception:
@@ -65,11 +211,110 @@ def _extract_page_label(page_obj, page_num: int) -> str:
     return PAGE_LABELS.get(page_num, f"Page {page_num}")
 
 
-def scrape_and_extract() -> dict:
+async def _next_button(page_obj):
+    for sel in NEXT_SELECTORS:
+        el = await page_obj.query_selector(sel)
+        if el:
+            return el
+    return None
+
+
+# ---------------------------------------------------------------------------
+# Warm browser session + event-loop thread
+# ---------------------------------------------------------------------------
+
+class _BrowserSession:
+    """One Chromium page kept open across cycles; relaunched if it has died."""
+
+    def __init__(self):
+        self._pw = None
+        self._browser = None
+        self._page = None
+
+    async def page(self):
+        if self._page is not None and not self._page.is_closed() and self._browser.is_connected():
+            return self._page
+        await self.close()
+        self._pw = await async_playwright().start()
+        self._browser = await self._pw.chromium.launch(
+            headless=True,
+            args=["--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu"]
+        )
+        self._page = await self._browser.new_page(viewport={"width": 1400, "height": 900})
+        logger.info("Scraper browser launched.")
+        return self._page
+
+    async def close(self):
+        for closer in (self._browser, self._pw):
+            if closer is not None:
+                try:
+                    await (closer.close() if closer is self._browser else closer.stop())
+                except Exception:
+                    pass
+        self._pw = self._browser = self._page = None
+
+
+_session = _BrowserSession()
+_loop = None
+_loop_lock = threading.Lock()
+_cycle_lock = None     # asyncio.Lock, created on the scraper loop
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Start (once) the event-loop thread that owns the browser session."""
+    global _loop, _cycle_lock
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="scraper-loop", daemon=True).start()
+            _cycle_lock = asyncio.run_coroutine_threadsafe(_make_lock(), _loop).result()
+        return _loop
+
+
+async def _make_lock():
+    return asyncio.Lock()
+
+
+def _vision_client(api_key: str):
+    if get_limited_client is not None:
+        client = get_limited_client(user="scraper", api_key=api_key)
+        if client is not None:
+            return client
+    return openai.OpenAI(api_key=api_key, base_url=os.getenv("OPENAI_BASE_URL") or None)
+
+
+async def _extract(client, sem: asyncio.Semaphore, page_num: int, label: str, screenshot: bytes, digest: str) -> dict:
+    """Vision extraction for one page (runs in a worker thread, bounded by `sem`)."""
+    async with sem:
+        # Downscaled before upload; a page seen before (e.g. toggled back) comes from the vision cache
+        raw, cached = await asyncio.to_thread(describe_image, client, screenshot, VISION_PROMPT,
+                                              label=f"page {page_num}", max_tokens=2500)
+    raw = (raw or "").strip()
+    if raw.startswith("```"):
+        raw = raw.split("```")[1]
+        if raw.startswith("json"):
+            raw = raw[4:]
+
+    try:
+        parsed = json.loads(raw)
+    except json.JSONDecodeError:
+        parsed = {"raw_text": raw}
+
+    parsed["_page_num"] = page_num
+    parsed["_page_label"] = label
+    parsed["_scraped_at"] = datetime.utcnow().isoformat() + "Z"
+    parsed["_image_digest"] = digest
+    parsed["_vision_cached"] = cached
+    bucket_file = os.path.join(CONTEXT_DIR, f"page_{page_num}.json")
+    _write_json_atomic(bucket_file, parsed)
+    logger.info(f"Page {page_num} saved → {bucket_file}")
+    return parsed
+
+
+async def scrape_and_extract_async() -> dict:
     """
-    Opens the Power BI public embed URL, navigates all pages,
-    screenshots each, sends to GPT-4 Vision, saves per-page JSON buckets
-    and a combined context file.
+    Walks the report pages in the warm browser, hands changed pages to the
+    Vision pool as it goes, then writes the combined context file.
     """
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
@@ -77,96 +322,84 @@ def scrape_and_extract() -> dict:
         return {}
 
     os.makedirs(CONTEXT_DIR, exist_ok=True)
-    client = openai.OpenAI(api_key=api_key)
-    all_pages = []
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(
-            headless=True,
-            args=["--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu"]
-        )
-        page = browser.new_page(viewport={"width": 1400, "height": 900})
+    client = _vision_client(api_key)
+    sem = asyncio.Semaphore(VISION_CONCURRENCY)
+    t0 = time.perf_counter()
+    pending = {}           # page_num → Task producing the page bucket
+    reused = {}            # page_num → unchanged bucket
+    session_error = None
 
+    try:
+        page = await _session.page()
         logger.info("Opening Power BI embed URL...")
-        page.goto(PBI_URL, wait_until="networkidle", timeout=90000)
-        page.wait_for_timeout(20000)
-        try:
-            page.wait_for_selector(
-                "visual-container, .visualContainer, [class*='visual'], iframe[title]",
-                timeout=20000
-            )
-            logger.info("Power BI visuals detected in DOM.")
-        except Exception:
-            logger.warning("Visual selector not found — proceeding with screenshot anyway.")
-        page.wait_for_timeout(5000)
+        await page.goto(PBI_URL, wait_until="networkidle", timeout=90000)
+        screenshot_bytes = await _wait_for_render(page)
 
-        for page_num in range(1, 6):
+        for page_num in range(1, MAX_PAGES + 1):
             try:
-                label = _extract_page_label(page, page_num)
+                label = await _extract_page_label(page, page_num)
                 logger.info(f"Scraping page {page_num}: {label}")
 
-                screenshot_bytes = page.screenshot(full_page=False)
                 screenshot_path = f"/tmp/screenshot_page_{page_num}.png"
                 with open(screenshot_path, "wb") as sf:
                     sf.write(screenshot_bytes)
-                logger.info(f"Screenshot saved → {screenshot_path} ({len(screenshot_bytes)} bytes)")
-                b64_image = base64.b64encode(screenshot_bytes).decode("utf-8")
-
-                response = client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[{
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": VISION_PROMPT},
-                            {"type": "image_url", "image_url": {
-                                "url": f"data:image/png;base64,{b64_image}",
-                                "detail": "high"
-                            }},
-                        ],
-                    }],
-                    max_tokens=2500,
-                )
-
-                raw = response.choices[0].message.content.strip()
-                if raw.startswith("```"):
-                    raw = raw.split("```")[1]
-                    if raw.startswith("json"):
-                        raw = raw[4:]
 
-                try:
-                    parsed = json.loads(raw)
-                except json.JSONDecodeError:
-                    parsed = {"raw_text": raw}
-
-                parsed["_page_num"] = page_num
-                parsed["_page_label"] = label
-                parsed["_scraped_at"] = datetime.utcnow().isoformat() + "Z"
-
-                bucket_file = os.path.join(CONTEXT_DIR, f"page_{page_num}.json")
-                with open(bucket_file, "w") as f:
-                    json.dump(parsed, f, indent=2)
-
-                all_pages.append(parsed)
-                logger.info(f"Page {page_num} saved → {bucket_file}")
-
-                next_btn = (
-                    page.query_selector("button[aria-label='Next page']") or
-                    page.query_selector(".navigation-next") or
-                    page.query_selector("[title='Next Page']") or
-                    page.query_selector("button[title='Next page']")
-                )
-                if next_btn:
-                    next_btn.click()
-                    page.wait_for_timeout(5000)
+                digest = ((await asyncio.to_thread(fingerprint, screenshot_bytes)) or {}).get("digest")
+                previous = _load_bucket(page_num)
+                if digest and previous.get("_image_digest") == digest and previous.get("_page_label") == label:
+                    # Visually identical to last cycle — keep the previous extraction
+                    previous["_checked_at"] = datetime.utcnow().isoformat() + "Z"
+                    _write_json_atomic(os.path.join(CONTEXT_DIR, f"page_{page_num}.json"), previous)
+                    reused[page_num] = previous
+                    logger.info(f"Page {page_num} unchanged since {previous.get('_scraped_at')} — reusing bucket")
                 else:
+                    pending[page_num] = asyncio.create_task(
+                        _extract(client, sem, page_num, label, screenshot_bytes, digest))
+
+                next_btn = await _next_button(page)
+                if not next_btn:
                     logger.info("No next page button found — stopping pagination.")
                     break
+                await next_btn.click()
+                screenshot_bytes = await _wait_for_render(page, NAV_TIMEOUT_MS, previous=screenshot_bytes)
 
             except Exception as e:
                 logger.warning(f"Page {page_num} scrape failed: {e}")
                 break
-
-        browser.close()
+    except Exception as e:
+        # Browser or navigation failure — drop the session so the next cycle relaunches
+        logger.warning(f"Scraper browser session failed: {e}")
+        await _session.close()
+        session_error = e
+
+    results = dict(reused)
+    if pending:
+        done = await asyncio.gather(*pending.values(), return_exceptions=True)
+        for page_num, outcome in zip(pending, done):
+            if isinstance(outcome, Exception):
+                logger.warning(f"Page {page_num} extraction failed: {outcome}")
+            else:
+                results[page_num] = outcome
+    all_pages = [results[n] for n in sorted(results)]
+
+    vision_calls = sum(1 for n in pending if n in results and not results[n].get("_vision_cached"))
+    last_cycle.clear()
+    last_cycle.update({
+        "finished_at": datetime.utcnow().isoformat() + "Z",
+        "pages": len(all_pages),
+        "unchanged": len(reused),
+        "vision_calls": vision_calls,
+        "seconds": round(time.perf_counter() - t0, 1),
+    })
+    logger.info(f"Scrape cycle: {len(all_pages)} pages, {len(reused)} unchanged, "
+                f"{vision_calls} Vision call(s), {last_cycle['seconds']}s")
+
+    # Keep the last good combined file rather than publishing an empty one;
+    # the caller records the error
+    if session_error is not None:
+        raise session_error
+    if not all_pages:
+        raise RuntimeError("Scrape cycle produced no pages")
 
     combined = {
         "scraped_at": datetime.utcnow().isoformat() + "Z",
@@ -174,22 +407,72 @@ def scrape_and_extract() -> dict:
         "pages": all_pages,
     }
 
-    with open(CONTEXT_FILE, "w") as f:
-        json.dump(combined, f, indent=2)
+    _write_json_atomic(CONTEXT_FILE, combined)
 
     logger.info(f"Combined context saved → {CONTEXT_FILE} ({len(all_pages)} pages)")
     return combined
 
 
+async def _locked_cycle() -> dict:
+    async with _cycle_lock:
+        return await scrape_and_extract_async()
+
+
+def scrape_and_extract() -> dict:
+    """
+    Opens the Power BI public embed URL, navigates all pages,
+    screenshots each, sends to GPT-4 Vision, saves per-page JSON buckets
+    and a combined context file.
+
+    Blocking wrapper around the async pipeline; concurrent callers (the
+    background loop and a manual /scrape) run one cycle at a time.
+    """
+    loop = _get_loop()
+    return asyncio.run_coroutine_threadsafe(_locked_cycle(), loop).result()
+
+
+def close_browser() -> None:
+    """Shut the warm browser down (e.g. at process exit)."""
+    if _loop is not None:
+        try:
+            asyncio.run_coroutine_threadsafe(_session.close(), _loop).result(timeout=10)
+        except Exception:
+            pass
+
+
+atexit.register(close_browser)
+
+
+# Rendered context block, keyed by the published snapshot's (inode, mtime, size).
+# The scraper publishes by atomic rename, so any new snapshot changes the key.
+_context_cache = {"key": None, "text": ""}
+_context_lock = threading.Lock()
+
+
 def load_context() -> str:
     """
     Load all scraped page buckets and assemble into an organized
     system prompt block, grouped by page/project.
     Returns empty string if nothing scraped yet.
+
+    The block is re-rendered only when a new snapshot has been published;
+    otherwise this is a single stat() call.
     """
-    if not os.path.exists(CONTEXT_FILE):
+    try:
+        st = os.stat(CONTEXT_FILE)
+    except OSError:
         return ""
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    with _context_lock:
+        if _context_cache["key"] == key:
+            return _context_cache["text"]
+    text = _render_context()
+    with _context_lock:
+        _context_cache.update(key=key, text=text)
+    return text
+
 
+def _render_context() -> str:
     try:
         with open(CONTEXT_FILE, "r") as f:
             data = json.load(f)
@@ -241,3 +524,97 @@ def load_context() -> str:
     except Exception as e:
         logger.warning(f"Failed to load context: {e}")
         return ""
+
+
+if __name__ == "__main__":
+    import sys
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    if "--selftest" not in sys.argv:
+        logging.basicConfig(level=logging.INFO)
+        print(json.dumps(scrape_and_extract(), indent=2)[:2000])
+        sys.exit(0)
+
+    # Local stand-in for the embed: five report pages behind a "Next page"
+    # button, each drawn after a short loading spinner.
+    STANDIN_HTML = """<!doctype html><html><body style="margin:0;font:28px sans-serif">
+<div aria-selected="true"><span id="tab"></span></div>
+<div id="spin" class="spinner" style="display:none">Loading…</div>
+<visual-container id="v" style="display:block;padding:40px"></visual-container>
+<button aria-label="Next page" id="next">Next</button>
+<script>
+  const labels = ["Overview", "Risk Report", "Schedule Performance", "Calendar", "Schedule Detail"];
+  let n = 0;
+  function show() {
+    document.getElementById("tab").textContent = labels[n];
+    document.getElementById("v").textContent = "";
+    document.getElementById("spin").style.display = "block";
+    setTimeout(() => {
+      document.getElementById("spin").style.display = "none";
+      document.getElementById("v").textContent = labels[n] + ": milestone M" + (n + 1) + " 2026-0" + (n + 3) + "-15";
+    }, 400);
+  }
+  document.getElementById("next").onclick = () => {
+    n += 1;
+    if (n === labels.length - 1) document.getElementById("next").remove();
+    show();
+  };
+  show();
+</script></body></html>"""
+
+    vision_latency = 1.5
+    vision_hits = []
+
+    class StandInHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            body = STANDIN_HTML.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            vision_hits.append(time.time())
+            time.sleep(vision_latency)
+            content = json.dumps({"page_title": "stub", "kpis": {}, "milestones": [], "risks": [],
+                                  "filters_active": {}, "other_data": {}})
+            body = json.dumps({"id": "stub", "object": "chat.completion", "created": int(time.time()),
+                               "model": "stub", "choices": [{"index": 0, "finish_reason": "stop",
+                               "message": {"role": "assistant", "content": content}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    logging.basicConfig(level=logging.INFO)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    work = tempfile.mkdtemp()
+    PBI_URL = f"{base}/embed"
+    CONTEXT_DIR = os.path.join(work, "pages")
+    CONTEXT_FILE = os.path.join(work, "dashboard_context.json")
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_BASE_URL"] = f"{base}/v1"
+    try:
+        import image_prep
+        image_prep.vision_cache = image_prep.VisionCache(os.path.join(work, "vision.json"))
+    except ImportError:
+        pass
+
+    for cycle in (1, 2):
+        vision_hits.clear()
+        result = scrape_and_extract()
+        print(f"cycle {cycle}: {result.get('total_pages', 0)} pages, {len(vision_hits)} Vision calls, "
+              f"{last_cycle.get('seconds')}s (one Vision call = {vision_latency}s)")
+    close_browser()
+    server.shutdown()
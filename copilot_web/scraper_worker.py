@@ -0,0 +1,204 @@
+"""
+scraper_worker.py - Scheduled dashboard scraper with single-leader election.
+
+app.py used to start a scraper thread in every web process, so gunicorn with N
+workers ran N Chromium instances and paid for N identical Vision passes every
+cycle. The scrape now runs in exactly one place:
+
+  - A process becomes the scraper leader by taking an exclusive flock on
+    SCRAPER_LOCK_FILE. Other processes stand by and retry, so a crashed
+    leader is replaced within STANDBY_POLL_SECONDS.
+  - The leader scrapes every SCRAPER_INTERVAL seconds (default 1800), or
+    sooner when the trigger file is touched (POST /scrape).
+  - Results are published with atomic renames (scraper.CONTEXT_FILE + page
+    buckets), and a status file records the last cycle for /scrape/stats.
+    Web processes only read the published snapshot.
+
+It runs as its own process — the Docker image and render.yaml start it next to
+gunicorn under supervisord (supervisord.conf), which restarts it if it exits;
+web processes default to SCRAPER_MODE=external and only read the snapshot:
+    python scraper_worker.py            # schedule forever (stops cleanly on SIGTERM)
+    python scraper_worker.py --once     # one cycle (if no other leader) and exit
+
+app.py can host the same loop in a thread for single-process dev
+(SCRAPER_MODE=embedded); the lock still guarantees a single scraper per host.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows dev boxes: no election, the process always scrapes
+    fcntl = None
+
+LOCK_FILE = os.getenv("SCRAPER_LOCK_FILE", "/tmp/dashboard_scraper.lock")
+TRIGGER_FILE = os.getenv("SCRAPER_TRIGGER_FILE", "/tmp/dashboard_scraper.trigger")
+STATUS_FILE = os.getenv("SCRAPER_STATUS_FILE", "/tmp/dashboard_scraper_status.json")
+INTERVAL_SECONDS = int(os.getenv("SCRAPER_INTERVAL", "1800"))
+STANDBY_POLL_SECONDS = 30
+TRIGGER_POLL_SECONDS = 5
+
+
+class LeaderLock:
+    """Exclusive, non-blocking flock held for the life of the leader."""
+
+    def __init__(self, path: str = LOCK_FILE):
+        self.path = path
+        self._fh = None
+
+    def acquire(self) -> bool:
+        if self._fh is not None:
+            return True
+        if fcntl is None:
+            return True
+        fh = open(self.path, "a+")
+        try:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            return False
+        fh.seek(0)
+        fh.truncate()
+        fh.write(f"{os.getpid()}\n")
+        fh.flush()
+        self._fh = fh
+        return True
+
+    def release(self) -> None:
+        if self._fh is not None:
+            try:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+            finally:
+                self._fh.close()
+                self._fh = None
+
+    @property
+    def held(self) -> bool:
+        return self._fh is not None or fcntl is None
+
+
+def request_scrape() -> None:
+    """Ask the leader (in whichever process it runs) to scrape now."""
+    with open(TRIGGER_FILE, "a"):
+        os.utime(TRIGGER_FILE, None)
+
+
+def _take_trigger() -> bool:
+    try:
+        os.unlink(TRIGGER_FILE)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def read_status() -> dict:
+    try:
+        with open(STATUS_FILE, "r") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _write_status(**fields) -> None:
+    # Own temp-file + rename rather than scraper's helper: the status must still be
+    # written when scraper (playwright) fails to import.
+    status = read_status()
+    status.update(fields, leader_pid=os.getpid(), updated_at=datetime.utcnow().isoformat() + "Z")
+    tmp = f"{STATUS_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(status, f, indent=2)
+        os.replace(tmp, STATUS_FILE)
+    except Exception as e:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        logger.warning(f"[scraper_worker] Could not write status: {e}")
+
+
+def run_cycle() -> dict:
+    started = time.time()
+    try:
+        from scraper import scrape_and_extract, last_cycle
+        scrape_and_extract()
+        _write_status(last_cycle=dict(last_cycle), last_error=None)
+    except Exception as e:
+        logger.error(f"[scraper_worker] Scrape cycle failed: {e}")
+        _write_status(last_error=str(e), last_error_at=datetime.utcnow().isoformat() + "Z")
+    return {"seconds": round(time.time() - started, 1)}
+
+
+def run_forever(interval_seconds: int = INTERVAL_SECONDS, initial_delay: float = 0,
+                stop: Optional[threading.Event] = None) -> None:
+    """Leader loop: wait for the lock, then scrape on schedule (or on trigger) until stopped."""
+    stop = stop or threading.Event()
+    lock = LeaderLock()
+    if stop.wait(initial_delay):
+        return
+    while not stop.is_set():
+        if not lock.acquire():
+            stop.wait(STANDBY_POLL_SECONDS)
+            continue
+        logger.info(f"[scraper_worker] Scraper leader (pid {os.getpid()}), every {interval_seconds}s")
+        try:
+            while not stop.is_set():
+                _take_trigger()
+                run_cycle()
+                next_run = time.time() + interval_seconds
+                _write_status(next_run_at=datetime.utcfromtimestamp(next_run).isoformat() + "Z")
+                while not stop.is_set() and time.time() < next_run:
+                    if _take_trigger():
+                        logger.info("[scraper_worker] Manual scrape requested")
+                        break
+                    stop.wait(min(TRIGGER_POLL_SECONDS, max(0.0, next_run - time.time())))
+        finally:
+            lock.release()
+    try:
+        from scraper import close_browser
+        close_browser()
+    except ImportError:
+        pass
+
+
+def main(argv=None) -> int:
+    import argparse
+    ap = argparse.ArgumentParser(description="Scheduled Power BI dashboard scraper (single leader per host).")
+    ap.add_argument("--once", action="store_true", help="run one cycle if no other leader holds the lock, then exit")
+    ap.add_argument("--interval", type=int, default=INTERVAL_SECONDS, help="seconds between cycles")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.once:
+        lock = LeaderLock()
+        if not lock.acquire():
+            logger.info("[scraper_worker] Another process is the scraper leader — nothing to do.")
+            return 0
+        try:
+            run_cycle()
+        finally:
+            lock.release()
+        return 0
+
+    # supervisord stops the worker with SIGTERM: finish the loop and close Chromium
+    import signal
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    try:
+        run_forever(args.interval, stop=stop)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,335 @@
+"""
+search_index.py - Inverted index for activity lookup by name or ID.
+
+Chat questions name activities loosely ("level 3 drywall", "roof dry in",
+"A1040"), and the CP and milestone code used to answer them by scanning every
+task with substring and token-overlap loops. This module keeps one
+ActivityIndex per loaded snapshot (slug × current/previous/baseline):
+
+  - exact maps: normalized name → task key, activity ID → task key
+  - token postings: word → task keys (IDF-weighted, prefix-aware)
+  - trigram postings: 3-char gram → task keys (typo-tolerant fuzzy match and
+    fast substring candidate filtering)
+
+Indexes are keyed by activity ID, so a reload only re-tokenizes activities
+whose name changed or that were added/removed (fingerprint diff per task).
+
+Usage:
+    from search_index import index_snapshot, search, find_task
+    index_snapshot("frisco_tx", "current", tasks)
+    search("frisco_tx", "roof dry in", limit=5)
+    find_task("frisco_tx", "roof dry in")          # best current-snapshot task or None
+"""
+
+import re
+import math
+import bisect
+import time
+import logging
+import threading
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# best() / find_task() only return a task that scores at least MIN_MATCH_SCORE
+# (roughly: most query words present, or a whole-phrase substring hit) AND
+# beats the runner-up by MIN_MATCH_MARGIN — "drywall" against four drywall
+# activities is ambiguous, not a match
+MIN_MATCH_SCORE = 0.6
+MIN_MATCH_MARGIN = 0.15
+
+SNAPSHOTS = ("current", "previous", "baseline")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(_TOKEN_RE.findall((text or "").lower()))
+
+
+def _trigrams(norm: str) -> Set[str]:
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _task_key(task, row: int) -> str:
+    tid = str(task.get("id") or task.get("task_id") or task.get("activity_id") or "").strip()
+    return tid if tid and tid != "None" else f"#{row}"
+
+
+def _task_name(task) -> str:
+    return (task.get("name") or task.get("task_name") or "").strip()
+
+
+class Match(NamedTuple):
+    """best_match() result: task is None unless there is a clear winner."""
+    task: Optional[object]
+    score: float
+    margin: float           # top score minus runner-up score (top score if there is no runner-up)
+    candidates: list        # top tasks, best first — for "did you mean" replies
+
+
+class ActivityIndex:
+    """Token + trigram inverted index over one snapshot's activities."""
+
+    def __init__(self, tasks: Iterable = ()):
+        self.tasks = []                         # the indexed sequence (list or TaskTable)
+        self._row: Dict[str, int] = {}          # task key → row in self.tasks
+        self._names: Dict[str, str] = {}        # task key → normalized name
+        self._by_name: Dict[str, str] = {}      # normalized name → task key (first wins)
+        self._by_id: Dict[str, str] = {}        # lowercase activity id → task key
+        self._tok: Dict[str, Set[str]] = {}     # token → task keys
+        self._tri: Dict[str, Set[str]] = {}     # trigram → task keys
+        self._vocab_sorted: List[str] = []
+        self.update(tasks)
+
+    # -- Maintenance ---------------------------------------------------------
+
+    def _add(self, key: str, norm: str) -> None:
+        self._names[key] = norm
+        if norm and norm not in self._by_name:
+            self._by_name[norm] = key
+        for tok in set(norm.split()):
+            self._tok.setdefault(tok, set()).add(key)
+        for g in _trigrams(norm):
+            self._tri.setdefault(g, set()).add(key)
+
+    def _remove(self, key: str) -> None:
+        norm = self._names.pop(key, "")
+        if self._by_name.get(norm) == key:
+            del self._by_name[norm]
+        for tok in set(norm.split()):
+            keys = self._tok.get(tok)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tok[tok]
+        for g in _trigrams(norm):
+            keys = self._tri.get(g)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tri[g]
+
+    def update(self, tasks: Iterable) -> Tuple[int, int, int]:
+        """
+        Re-point the index at a new task sequence, re-indexing only activities
+        that were added, removed or renamed. Returns (added, removed, renamed).
+        """
+        tasks = tasks if hasattr(tasks, "__getitem__") else list(tasks)
+        new_names: Dict[str, str] = {}
+        new_rows: Dict[str, int] = {}
+        by_id: Dict[str, str] = {}
+        for row, t in enumerate(tasks):
+            key = _task_key(t, row)
+            if key in new_rows:
+                continue
+            new_rows[key] = row
+            new_names[key] = _normalize(_task_name(t))
+            if not key.startswith("#"):
+                by_id[key.lower()] = key
+
+        removed = [k for k in self._names if k not in new_names]
+        added = [k for k in new_names if k not in self._names]
+        renamed = [k for k in new_names if k in self._names and self._names[k] != new_names[k]]
+
+        for k in removed + renamed:
+            self._remove(k)
+        for k in added + renamed:
+            self._add(k, new_names[k])
+
+        # Rows shift on every reload; exact-name ownership can change order
+        self.tasks = tasks
+        self._row = new_rows
+        self._by_id = by_id
+        if removed or renamed:
+            self._by_name = {}
+            for k, norm in new_names.items():
+                if norm and norm not in self._by_name:
+                    self._by_name[norm] = k
+        if added or removed or renamed:
+            self._vocab_sorted = sorted(self._tok)
+        return len(added), len(removed), len(renamed)
+
+    def __len__(self) -> int:
+        return len(self._row)
+
+    # -- Lookup --------------------------------------------------------------
+
+    def task(self, key: str):
+        row = self._row.get(key)
+        return self.tasks[row] if row is not None else None
+
+    def get(self, name: str = "", activity_id: str = ""):
+        """Exact lookup by normalized name, then by activity ID. Mirrors _resolve_task."""
+        key = self._by_name.get(_normalize(name)) if name else None
+        if key is None and activity_id:
+            key = self._by_id.get(str(activity_id).strip().lower())
+        return self.task(key) if key else None
+
+    def _prefix_keys(self, tok: str) -> Set[str]:
+        """Task keys for every vocabulary word starting with tok (e.g. 'mech' → 'mechanical')."""
+        out: Set[str] = set()
+        i = bisect.bisect_left(self._vocab_sorted, tok)
+        while i < len(self._vocab_sorted) and self._vocab_sorted[i].startswith(tok):
+            out |= self._tok.get(self._vocab_sorted[i], set())
+            i += 1
+        return out
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[float, str]]:
+        """
+        Ranked fuzzy search. Returns [(score, task_key)] best first, score in 0..~2.
+          exact ID / exact name  → 2.0 / 1.9
+          whole-query substring  → 1.2 + coverage (starting at a word boundary)
+          otherwise              → IDF-weighted token coverage (prefix-aware)
+                                   + share of query trigrams found (typo tolerance)
+                                   + small Dice term favouring shorter names
+        """
+        q = _normalize(query)
+        if not q or not self._names:
+            return []
+
+        id_key = self._by_id.get(str(query).strip().lower())
+        if id_key:
+            return [(2.0, id_key)]
+
+        n = len(self._names)
+        scores: Dict[str, float] = {}
+        exact = self._by_name.get(q)
+        if exact:
+            scores[exact] = 1.9
+
+        # Token coverage with IDF weights; prefix/stem matches count at 70%
+        # ("mech" → mechanical, "completion" → complete via the stem "complet")
+        q_toks = list(dict.fromkeys(q.split()))
+        total_w = 0.0
+        tok_score: Dict[str, float] = {}
+        for tok in q_toks:
+            keys = self._tok.get(tok) or set()
+            stem = tok if len(tok) < 6 else tok[:max(5, len(tok) - 3)]
+            prefixed = self._prefix_keys(stem) - keys if len(tok) >= 3 else set()
+            w = math.log(1 + n / max(len(keys) or len(prefixed), 1))
+            total_w += w
+            for k in keys:
+                tok_score[k] = tok_score.get(k, 0.0) + w
+            for k in prefixed:
+                tok_score[k] = tok_score.get(k, 0.0) + 0.7 * w
+
+        # Trigram overlap (candidates share at least a third of the query's grams)
+        q_grams = _trigrams(q)
+        gram_hits: Dict[str, int] = {}
+        for g in q_grams:
+            for k in self._tri.get(g, ()):
+                gram_hits[k] = gram_hits.get(k, 0) + 1
+        min_hits = max(1, len(q_grams) // 3)
+
+        candidates = set(tok_score) | {k for k, h in gram_hits.items() if h >= min_hits}
+        for k in candidates:
+            if k in scores:
+                continue
+            name = self._names[k]
+            # Phrase must start on a word: "roofing" is not in "waterproofing"
+            if f" {q}" in f" {name}":
+                s = 1.2 + 0.5 * len(q) / max(len(name), 1)
+            else:
+                cover = tok_score.get(k, 0.0) / total_w if total_w else 0.0
+                hits = gram_hits.get(k, 0)
+                contain = hits / len(q_grams)
+                dice = 2 * hits / (len(q_grams) + len(_trigrams(name)))
+                s = 0.7 * cover + 0.4 * contain + 0.1 * dice
+            scores[k] = s
+
+        ranked = sorted(scores.items(), key=lambda kv: (-kv[1], self._row.get(kv[0], 0)))
+        return [(round(s, 4), k) for k, s in ranked[:limit]]
+
+    def best_match(self, query: str, min_score: float = MIN_MATCH_SCORE,
+                   min_margin: float = MIN_MATCH_MARGIN, limit: int = 5) -> Match:
+        """Top hit with its margin over the runner-up; .task is set only for a clear winner."""
+        hits = self.search(query, limit=max(limit, 2))
+        if not hits:
+            return Match(None, 0.0, 0.0, [])
+        top = hits[0][0]
+        margin = round(top - hits[1][0], 4) if len(hits) > 1 else top
+        candidates = [self.task(k) for _, k in hits[:limit]]
+        winner = candidates[0] if top >= min_score and margin >= min_margin else None
+        return Match(winner, top, margin, candidates)
+
+    def best(self, query: str, min_score: float = MIN_MATCH_SCORE, min_margin: float = MIN_MATCH_MARGIN):
+        """The clearly best-matching task, or None (no good hit, or the top two are too close)."""
+        return self.best_match(query, min_score, min_margin).task
+
+
+# ---------------------------------------------------------------------------
+# Registry — one index per (slug, snapshot)
+# ---------------------------------------------------------------------------
+
+_indexes: Dict[Tuple[str, str], ActivityIndex] = {}
+_lock = threading.Lock()
+
+
+def index_snapshot(slug: str, snapshot: str, tasks) -> ActivityIndex:
+    """Create or incrementally update the index for one loaded snapshot."""
+    t0 = time.perf_counter()
+    with _lock:
+        idx = _indexes.get((slug, snapshot))
+        if idx is None:
+            idx = ActivityIndex(tasks)
+            _indexes[(slug, snapshot)] = idx
+            logger.debug(f"[{slug}] Search index built for {snapshot}: {len(idx)} activities "
+                         f"in {(time.perf_counter() - t0) * 1000:.1f} ms")
+        else:
+            added, removed, renamed = idx.update(tasks)
+            logger.debug(f"[{slug}] Search index updated for {snapshot}: +{added} -{removed} ~{renamed} "
+                         f"in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    return idx
+
+
+def drop_snapshot(slug: str, snapshot: str) -> None:
+    with _lock:
+        _indexes.pop((slug, snapshot), None)
+
+
+def get_index(slug: str, snapshot: str = "current") -> Optional[ActivityIndex]:
+    return _indexes.get((slug, snapshot))
+
+
+def index_for(tasks) -> ActivityIndex:
+    """Registered index whose task sequence is `tasks`, else a throwaway index over it."""
+    for idx in list(_indexes.values()):
+        if idx.tasks is tasks:
+            return idx
+    return ActivityIndex(tasks)
+
+
+def search(slug: str, query: str, snapshot: Optional[str] = None, limit: int = 10) -> List[dict]:
+    """
+    Ranked activity matches for a project. snapshot=None searches every loaded
+    snapshot and returns rows tagged with the snapshot they came from.
+    """
+    results = []
+    for snap in ([snapshot] if snapshot else SNAPSHOTS):
+        idx = _indexes.get((slug, snap))
+        if idx is None:
+            continue
+        for score, key in idx.search(query, limit=limit):
+            t = idx.task(key)
+            if t is None:
+                continue
+            results.append({
+                "snapshot": snap,
+                "score": score,
+                "id": None if key.startswith("#") else key,
+                "name": _task_name(t),
+                "start": str(t.get("start") or "")[:10],
+                "finish": str(t.get("finish") or t.get("target_end_date") or "")[:10],
+                "percent_complete": t.get("percent_complete"),
+                "milestone": bool(t.get("milestone", False)),
+            })
+    results.sort(key=lambda r: (-r["score"], SNAPSHOTS.index(r["snapshot"])))
+    return results[:limit]
+
+
+def find_task(slug: str, query: str, snapshot: str = "current"):
+    """Best-matching task mapping in one snapshot, or None."""
+    idx = _indexes.get((slug, snapshot))
+    return idx.best(query) if idx else None
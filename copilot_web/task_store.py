@@ -0,0 +1,320 @@
+"""
+task_store.py - Compact, read-only storage for long-lived task lists.
+
+project_loader keeps the parsed tasks of three snapshots (current, previous,
+baseline) for every project so milestone lookups and prior-date updates don't
+re-parse schedule files. As plain dicts that is one ~25-key hash table per
+activity, with every name, WBS code and date held as its own str object.
+
+TaskTable stores the same data column-wise:
+  - strings   → one uint32 code per row into a per-table pool of interned strings
+                (names repeated across snapshots share a single str object)
+  - ISO dates → one int32 ordinal per row ("YYYY-MM-DD" strings round-trip exactly)
+  - floats / ints / bools → array('d') / array('q') / bytearray
+  - anything else → a plain list (kept as-is)
+
+Rows come back as TaskView objects — read-only Mapping views that support
+.get(), [], `in`, iteration and dict(view), so existing callers that treat
+tasks as dicts keep working unchanged.
+
+Usage:
+    from task_store import TaskTable
+    table = TaskTable.from_records(tasks)
+    for t in table:
+        t.get("name"), t["finish"]
+
+Benchmark (reports dict-list vs TaskTable memory for real schedule files):
+    python task_store.py projects/colorado_springs_co/update_12.xer [...]
+"""
+
+import re
+import sys
+import logging
+from array import array
+from collections.abc import Mapping, Sequence
+from datetime import date
+from typing import Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+# Date column ordinal for "" (real ordinals start at 1)
+_EMPTY_DATE = 0
+
+
+class _Column:
+    """One column: typed storage plus sparse None/absent row sets."""
+    __slots__ = ("kind", "data", "pool", "nulls", "absent")
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.data = {
+            "str": lambda: array("I"),
+            "date": lambda: array("i"),
+            "float": lambda: array("d"),
+            "int": lambda: array("q"),
+            "bool": bytearray,
+            "obj": list,
+        }[kind]()
+        self.pool: Optional[List[str]] = [] if kind == "str" else None
+        self.nulls: Optional[set] = None   # rows whose value is None
+        self.absent: Optional[set] = None  # rows that don't have this key at all
+
+    def get(self, row: int):
+        if self.nulls is not None and row in self.nulls:
+            return None
+        v = self.data[row]
+        kind = self.kind
+        if kind == "str":
+            return self.pool[v]
+        if kind == "date":
+            return date.fromordinal(v).isoformat() if v != _EMPTY_DATE else ""
+        if kind == "bool":
+            return bool(v)
+        return v
+
+
+def _infer_kind(values: List) -> str:
+    """Pick the narrowest column kind that round-trips every non-None value exactly."""
+    types = {type(v) for v in values if v is not None}
+    if not types:
+        return "obj"
+    if types == {str}:
+        non_empty = [v for v in values if v]
+        if non_empty and all(_ISO_DATE.match(v) for v in non_empty):
+            try:
+                for v in non_empty:
+                    date.fromisoformat(v)
+                return "date"
+            except ValueError:
+                pass
+        return "str"
+    if types == {bool}:
+        return "bool"
+    if types == {float}:
+        return "float"
+    if types == {int}:
+        if all(-(1 << 63) <= v < (1 << 63) for v in values if v is not None):
+            return "int"
+    return "obj"
+
+
+class TaskTable(Sequence):
+    """Immutable struct-of-arrays task list. Index or iterate to get TaskView rows."""
+    __slots__ = ("_columns", "_keys", "_n", "__weakref__")
+
+    def __init__(self):
+        self._columns: Dict[str, _Column] = {}
+        self._keys: tuple = ()
+        self._n = 0
+
+    @classmethod
+    def from_records(cls, records: Iterable[Mapping]) -> "TaskTable":
+        """Build a table from an iterable of task dicts (or TaskViews)."""
+        records = list(records)
+        table = cls()
+        table._n = len(records)
+
+        # Preserve first-seen key order so dict(view) matches the source dict
+        keys: Dict[str, None] = {}
+        for r in records:
+            for k in r:
+                keys.setdefault(k, None)
+        table._keys = tuple(sys.intern(k) if isinstance(k, str) else k for k in keys)
+
+        _missing = object()
+        for key in table._keys:
+            values = [r.get(key, _missing) for r in records]
+            present = [v for v in values if v is not _missing]
+            col = _Column(_infer_kind(present))
+            codes: Dict[str, int] = {}
+            for row, v in enumerate(values):
+                if v is _missing or v is None:
+                    # absent rows also read as None through the column
+                    if col.nulls is None:
+                        col.nulls = set()
+                    col.nulls.add(row)
+                    if v is _missing:
+                        if col.absent is None:
+                            col.absent = set()
+                        col.absent.add(row)
+                    v = None
+                if col.kind == "str":
+                    if v is None:
+                        col.data.append(0)
+                        continue
+                    code = codes.get(v)
+                    if code is None:
+                        code = codes[v] = len(col.pool)
+                        col.pool.append(sys.intern(v))
+                    col.data.append(code)
+                elif col.kind == "date":
+                    col.data.append(date.fromisoformat(v).toordinal() if v else _EMPTY_DATE)
+                elif col.kind == "float":
+                    col.data.append(v if v is not None else 0.0)
+                elif col.kind in ("int", "bool"):
+                    col.data.append(int(v) if v is not None else 0)
+                else:
+                    col.data.append(v)
+            if col.kind == "str" and not col.pool:
+                col.pool.append("")
+            table._columns[key] = col
+        return table
+
+    # -- Sequence protocol ---------------------------------------------------
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [TaskView(self, i) for i in range(*idx.indices(self._n))]
+        if idx < 0:
+            idx += self._n
+        if not 0 <= idx < self._n:
+            raise IndexError("TaskTable index out of range")
+        return TaskView(self, idx)
+
+    def __iter__(self) -> Iterator["TaskView"]:
+        for i in range(self._n):
+            yield TaskView(self, i)
+
+    def __repr__(self) -> str:
+        return f"TaskTable({self._n} rows, {len(self._keys)} columns)"
+
+    # -- Helpers -------------------------------------------------------------
+
+    def column(self, key: str) -> list:
+        """All values of one column as a list (None where absent)."""
+        col = self._columns.get(key)
+        if col is None:
+            return [None] * self._n
+        return [col.get(i) for i in range(self._n)]
+
+    def to_records(self) -> List[dict]:
+        """Materialize back into a list of plain dicts."""
+        return [dict(v) for v in self]
+
+    def nbytes(self) -> int:
+        """Approximate memory held by this table (arrays, pools, key tuple)."""
+        total = sys.getsizeof(self._columns) + sys.getsizeof(self._keys)
+        for col in self._columns.values():
+            total += sys.getsizeof(col.data)
+            if col.pool is not None:
+                total += sys.getsizeof(col.pool) + sum(sys.getsizeof(s) for s in col.pool)
+            if col.kind == "obj":
+                total += sum(sys.getsizeof(v) for v in col.data if v is not None)
+            for s in (col.nulls, col.absent):
+                if s is not None:
+                    total += sys.getsizeof(s)
+        return total
+
+
+class TaskView(Mapping):
+    """Read-only dict-like view of one TaskTable row."""
+    __slots__ = ("_table", "_row")
+
+    def __init__(self, table: TaskTable, row: int):
+        self._table = table
+        self._row = row
+
+    def __getitem__(self, key):
+        col = self._table._columns.get(key)
+        if col is None or (col.absent is not None and self._row in col.absent):
+            raise KeyError(key)
+        return col.get(self._row)
+
+    def get(self, key, default=None):
+        col = self._table._columns.get(key)
+        if col is None or (col.absent is not None and self._row in col.absent):
+            return default
+        return col.get(self._row)
+
+    def __contains__(self, key) -> bool:
+        col = self._table._columns.get(key)
+        return col is not None and not (col.absent is not None and self._row in col.absent)
+
+    def __iter__(self):
+        row = self._row
+        for k in self._table._keys:
+            col = self._table._columns[k]
+            if col.absent is None or row not in col.absent:
+                yield k
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"TaskView({dict(self)!r})"
+
+
+def compact_tasks(tasks) -> TaskTable:
+    """Return tasks as a TaskTable (no-op if it already is one)."""
+    if isinstance(tasks, TaskTable):
+        return tasks
+    return TaskTable.from_records(tasks or [])
+
+
+if __name__ == "__main__":
+    import os
+    import gc
+    import time
+    import tracemalloc
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    if here not in sys.path:
+        sys.path.insert(0, here)
+    logging.basicConfig(level=logging.WARNING)
+
+    def _measure(build):
+        gc.collect()
+        tracemalloc.start()
+        obj = build()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return obj, size
+
+    paths = sys.argv[1:]
+    if paths:
+        from project_loader import _parse_schedule
+        snapshots = []
+        for p in paths:
+            parsed = _parse_schedule(p)
+            if parsed and parsed.get("tasks"):
+                snapshots.append((os.path.basename(p), parsed["tasks"]))
+    else:
+        # Synthetic MPP-shaped snapshot when no files are given
+        import random
+        rnd = random.Random(7)
+        words = ["Install", "Rough-in", "Inspect", "Pour", "Frame", "Level", "Building", "Roof", "MEP", "Drywall"]
+        snapshots = [("synthetic", [{
+            "id": str(i), "name": f"{rnd.choice(words)} {rnd.choice(words)} L{i % 12}",
+            "wbs": f"1.{i % 9}.{i % 40}", "outline_level": 3, "milestone": i % 17 == 0,
+            "summary": False, "percent_complete": float(rnd.randint(0, 100)),
+            "baseline_start": "2025-03-01", "baseline_finish": "2025-06-15",
+            "start": date.fromordinal(739000 + i % 400).isoformat(),
+            "finish": date.fromordinal(739030 + i % 400).isoformat(),
+            "actual_start": "", "actual_finish": "", "duration": f"{i % 30}.0d",
+            "baseline_duration": "10.0d", "total_slack": f"{i % 20}.0d", "free_slack": "0.0d",
+            "critical": i % 5 == 0, "notes": "", "constraint_type": "AS_SOON_AS_POSSIBLE",
+            "constraint_date": "", "priority": 500,
+        } for i in range(50000)])]
+
+    for label, tasks in snapshots:
+        # Deep-copy through a JSON-ish rebuild so the baseline measures fresh dicts
+        dicts, dict_bytes = _measure(lambda: [{k: (v if not isinstance(v, str) else "".join(v)) for k, v in t.items()} for t in tasks])
+        table, table_bytes = _measure(lambda: TaskTable.from_records(dicts))
+        # repr() comparison so NaN floats (common in XER float columns) compare equal
+        assert repr(table.to_records()) == repr([dict(t) for t in dicts]), "round-trip mismatch"
+
+        t0 = time.perf_counter()
+        for t in table:
+            t.get("name"), t.get("finish")
+        scan = (time.perf_counter() - t0) * 1000
+
+        saved = 100 * (1 - table_bytes / dict_bytes) if dict_bytes else 0
+        print(f"{label}: {len(tasks)} tasks × {len(table._keys)} keys | "
+              f"dicts {dict_bytes / 1024:,.0f} KiB → TaskTable {table_bytes / 1024:,.0f} KiB "
+              f"({saved:.0f}% smaller) | full scan {scan:.1f} ms")
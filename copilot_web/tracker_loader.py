@@ -2,11 +2,18 @@
 tracker_loader.py - Parses Project tracker1.csv on startup.
 Provides authoritative data dates, update numbers, file names, and project history
 for LLM context injection. Used as a crosscheck against MPP/XER/XML data dates.
+
+The CSV is hot-reloaded: readers call check_reload() (throttled stat + content
+hash), only projects whose rows changed are re-derived, and the tracker context
+blocks and portfolio rows are memoized per project version.
 """
 import os
 import csv
+import time
+import hashlib
 import logging
-from typing import Dict, Optional
+import threading
+from typing import Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +34,22 @@ TRACKER_PATH = _find_tracker()
 
 _tracker_cache: Dict[str, dict] = {}
 
+# Hot reload: the CSV is re-checked (one stat) at most every CHECK_INTERVAL
+# seconds; if its bytes changed, only projects whose rows changed are re-derived.
+CHECK_INTERVAL = float(os.getenv("TRACKER_CHECK_INTERVAL", "2"))
+_file_state = {"stat": None, "digest": None, "checked": 0.0}
+_row_digests: Dict[str, str] = {}          # slug → hash of that project's raw rows
+_slug_versions: Dict[str, int] = {}        # slug → bumped whenever its entry changes
+_version = 0                               # bumped on any tracker change
+_reload_lock = threading.RLock()
+
+MILESTONE_SLIP_DAYS = 30   # portfolio summary lists milestones that moved more than this
+
+# Memoized renderings
+_context_memo: Dict[str, Tuple[int, str]] = {}                 # slug → (slug version, text)
+_row_memo: Dict[str, Tuple[tuple, str]] = {}                   # slug → (row key, portfolio row)
+_summary_memo: Dict[str, object] = {"key": None, "text": ""}
+
 NAME_TO_SLUG = {
     "anaheim":          "anaheim_ca",
     "anna":             "anna_tx",
@@ -57,31 +80,24 @@ def _name_to_slug(raw: str) -> Optional[str]:
     return NAME_TO_SLUG.get(key)
 
 
-def load_tracker():
-    """Parse Project tracker1.csv and build per-project submission history."""
-    global _tracker_cache
-    _tracker_cache = {}
+def _read_rows(path: str) -> Tuple[List[dict], str]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    text = raw.decode("utf-8-sig", errors="replace")
+    return list(csv.DictReader(text.splitlines())), hashlib.sha256(raw).hexdigest()
 
-    path = os.path.abspath(TRACKER_PATH)
-    if not os.path.exists(path):
-        logger.warning(f"Project tracker not found: {path}")
-        return
-
-    try:
-        with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
-            reader = csv.DictReader(f)
-            rows = list(reader)
-    except Exception as e:
-        logger.error(f"Failed to read tracker CSV: {e}")
-        return
 
+def _group_rows(rows: List[dict]) -> Dict[str, dict]:
+    """Group CSV rows into per-project raw data (name, code, type, submissions)."""
     by_slug: Dict[str, dict] = {}
 
     for row in rows:
-        proj_name  = (row.get("Project Name") or row.get("Project Name ") or "").strip()
+        # Header cells carry stray trailing spaces ("Data Date ", "Date Received ")
+        row = {(k or "").strip(): v for k, v in row.items()}
+        proj_name  = (row.get("Project Name") or "").strip()
         code       = (row.get("Code") or "").strip()
-        file_name  = (row.get("File Name") or row.get("File Name ") or "").strip()
-        data_date  = (row.get("Data Date") or row.get("Data Date ") or "").strip()
+        file_name  = (row.get("File Name") or "").strip()
+        data_date  = (row.get("Data Date") or "").strip()
         proj_type  = (row.get("Project Type ( Development / Construction)") or "").strip()
         file_type  = (row.get("File Type (Baseline/ Update )") or row.get("File Type (Baseline/ Update)") or "").strip()
         date_recv  = (row.get("Date Received") or "").strip()
@@ -110,35 +126,114 @@ def load_tracker():
             "date_received": date_recv,
         })
 
-    for slug, data in by_slug.items():
-        subs = data["submissions"]
+    return by_slug
+
 
-        baseline = next((s for s in subs if "baseline" in s["file_type"].lower()), None)
+def _derive(data: dict) -> dict:
+    """Tracker entry for one project: baseline, current/previous update, history."""
+    subs = data["submissions"]
 
-        updates = [s for s in subs if "update" in s["file_type"].lower()]
+    baseline = next((s for s in subs if "baseline" in s["file_type"].lower()), None)
 
-        def update_num(s):
-            parts = s["file_type"].lower().replace("update", "").strip().split()
-            for p in parts:
-                if p.isdigit():
-                    return int(p)
-            return 0
+    updates = [s for s in subs if "update" in s["file_type"].lower()]
 
-        updates.sort(key=update_num)
-        current = updates[-1] if updates else baseline
+    def update_num(s):
+        parts = s["file_type"].lower().replace("update", "").strip().split()
+        for p in parts:
+            if p.isdigit():
+                return int(p)
+        return 0
 
-        _tracker_cache[slug] = {
-            "project_name": data["project_name"],
-            "code": data["code"],
-            "type": data["type"],
-            "baseline": baseline,
-            "current": current,
-            "previous": updates[-2] if len(updates) >= 2 else baseline,
-            "total_updates": len(updates),
-            "all_submissions": subs,
-        }
+    updates.sort(key=update_num)
+    current = updates[-1] if updates else baseline
 
-    logger.info(f"Tracker loaded: {len(_tracker_cache)} projects.")
+    return {
+        "project_name": data["project_name"],
+        "code": data["code"],
+        "type": data["type"],
+        "baseline": baseline,
+        "current": current,
+        "previous": updates[-2] if len(updates) >= 2 else baseline,
+        "total_updates": len(updates),
+        "all_submissions": subs,
+    }
+
+
+def _raw_digest(data: dict) -> str:
+    return hashlib.sha256(repr(sorted(data.items())).encode("utf-8")).hexdigest()
+
+
+def load_tracker(force: bool = True) -> bool:
+    """
+    Parse Project tracker1.csv and build per-project submission history.
+    Incremental: projects whose rows are unchanged keep their cached entry.
+    Returns True if anything changed.
+    """
+    global _version
+    path = os.path.abspath(TRACKER_PATH)
+    with _reload_lock:
+        try:
+            st = os.stat(path)
+        except OSError:
+            if _tracker_cache:
+                _tracker_cache.clear()
+                _row_digests.clear()
+                _version += 1
+            _file_state.update(stat=None, digest=None)
+            logger.warning(f"Project tracker not found: {path}")
+            return False
+        stat_key = (st.st_mtime_ns, st.st_size)
+        if not force and stat_key == _file_state["stat"]:
+            return False
+
+        try:
+            rows, digest = _read_rows(path)
+        except Exception as e:
+            logger.error(f"Failed to read tracker CSV: {e}")
+            return False
+        _file_state["stat"] = stat_key
+        if digest == _file_state["digest"]:
+            return False        # touched but identical
+        _file_state["digest"] = digest
+
+        by_slug = _group_rows(rows)
+        changed = []
+        for slug, data in by_slug.items():
+            d = _raw_digest(data)
+            if _row_digests.get(slug) != d:
+                _tracker_cache[slug] = _derive(data)
+                _row_digests[slug] = d
+                _slug_versions[slug] = _slug_versions.get(slug, 0) + 1
+                changed.append(slug)
+        removed = [slug for slug in _tracker_cache if slug not in by_slug]
+        for slug in removed:
+            _tracker_cache.pop(slug, None)
+            _row_digests.pop(slug, None)
+            _slug_versions[slug] = _slug_versions.get(slug, 0) + 1
+        if changed or removed:
+            _version += 1
+
+    if _version == 1:
+        logger.info(f"Tracker loaded: {len(_tracker_cache)} projects.")
+    elif changed or removed:
+        logger.info(f"Tracker reloaded: {len(changed)} project(s) changed"
+                    f"{f', {len(removed)} removed' if removed else ''} ({', '.join(changed + removed)})")
+    return bool(changed or removed)
+
+
+def check_reload() -> bool:
+    """Reload the tracker if the CSV changed since the last check (throttled to one stat per CHECK_INTERVAL)."""
+    now = time.monotonic()
+    if now - _file_state["checked"] < CHECK_INTERVAL:
+        return False
+    _file_state["checked"] = now
+    return load_tracker(force=False)
+
+
+def get_tracker_version(slug: Optional[str] = None) -> int:
+    """Version of the whole tracker, or of one project's entry; bumps whenever it changes."""
+    check_reload()
+    return _slug_versions.get(slug, 0) if slug else _version
 
 
 def get_tracker_context(slug: str) -> str:
@@ -147,7 +242,17 @@ def get_tracker_context(slug: str) -> str:
     Provides authoritative data dates, update counts, and history.
     Only surfaces to user if requested — used internally for accuracy.
     """
-    data = _tracker_cache.get(slug)
+    check_reload()
+    version = _slug_versions.get(slug, 0)
+    memo = _context_memo.get(slug)
+    if memo and memo[0] == version:
+        return memo[1]
+    text = _render_tracker_context(_tracker_cache.get(slug))
+    _context_memo[slug] = (version, text)
+    return text
+
+
+def _render_tracker_context(data: Optional[dict]) -> str:
     if not data:
         return ""
 
@@ -200,19 +305,68 @@ def get_tracker_context(slug: str) -> str:
 
 def get_tracker_data(slug: str) -> Optional[dict]:
     """Returns raw tracker dict for a slug. None if not tracked."""
+    check_reload()
     return _tracker_cache.get(slug)
 
 
+def _health_key(h: Optional[dict]) -> tuple:
+    if not h:
+        return ()
+    return tuple(h.get(k) for k in ("status", "compression_pct", "max_slip_days", "max_accel_days"))
+
+
+def _project_row(slug: str, data: dict, h: Optional[dict]) -> str:
+    """One portfolio line, memoized on (project version, health figures)."""
+    key = (_slug_versions.get(slug, 0), _health_key(h))
+    memo = _row_memo.get(slug)
+    if memo and memo[0] == key:
+        return memo[1]
+    name = data.get("project_name", slug)
+    total = data.get("total_updates", 0)
+    current = data.get("current") or {}
+    data_date = current.get("data_date", "N/A")
+    if h:
+        status = h["status"]
+        comp = f"{h['compression_pct']}%" if h.get("compression_pct") is not None else "N/A"
+        slip = f"+{h['max_slip_days']}cd" if h.get("max_slip_days") else "—"
+        accel = f"-{h['max_accel_days']}cd" if h.get("max_accel_days") else "—"
+    else:
+        status = "NO SCHEDULE"
+        comp = "N/A"
+        slip = "N/A"
+        accel = "N/A"
+    row = (f"  {name:<22} | {data.get('type','N/A'):<14} | {total} update(s) | "
+           f"Data: {data_date} | {status:<14} | {comp:>6} complete | "
+           f"Slip: {slip} | Accel: {accel}")
+    _row_memo[slug] = (key, row)
+    return row
+
+
 def get_portfolio_summary(schedule_flags: Optional[Dict[str, bool]] = None) -> str:
     """
     Returns a compact portfolio-level health summary across all tracked projects.
     Includes health status, compression %, and max slip/accel from baseline drift.
+
+    Cheap to call per request: the text is rebuilt only when the tracker or a
+    project's health changed, and then only the affected rows are re-rendered.
     """
+    check_reload()
     if not _tracker_cache:
         return ""
 
-    # Pull health data from project_loader if available
+    # Health from the portfolio store (latest published update per project),
+    # overridden by anything this process has loaded more recently
     _health_map = {}
+    store, store_version = None, None
+    try:
+        import portfolio_store as store
+        if store.available():
+            store_version = store.get_version()
+            _health_map.update({s: h for s, h in store.latest_health().items() if s in _tracker_cache})
+        else:
+            store = None
+    except Exception:
+        store = None
     try:
         from project_loader import get_project_health
         for slug in _tracker_cache:
@@ -222,6 +376,10 @@ def get_portfolio_summary(schedule_flags: Optional[Dict[str, bool]] = None) -> s
     except Exception:
         pass
 
+    summary_key = (_version, store_version, tuple(sorted((s, _health_key(h)) for s, h in _health_map.items())))
+    if _summary_memo["key"] == summary_key:
+        return _summary_memo["text"]
+
     lines = [
         "=== PORTFOLIO OVERVIEW (all projects — use for cross-project questions) ===",
         "Columns: Project | Type | Updates | Data Date | Health Status | Compression % | Max Slip vs Baseline | Max Accel vs Baseline",
@@ -242,42 +400,22 @@ def get_portfolio_summary(schedule_flags: Optional[Dict[str, bool]] = None) -> s
         key=lambda x: x[1]["project_name"]
     )
 
-    def _project_row(slug: str, data: dict) -> str:
-        name = data.get("project_name", slug)
-        total = data.get("total_updates", 0)
-        current = data.get("current") or {}
-        data_date = current.get("data_date", "N/A")
-        h = _health_map.get(slug)
-        if h:
-            status = h["status"]
-            comp = f"{h['compression_pct']}%" if h.get("compression_pct") is not None else "N/A"
-            slip = f"+{h['max_slip_days']}cd" if h.get("max_slip_days") else "—"
-            accel = f"-{h['max_accel_days']}cd" if h.get("max_accel_days") else "—"
-        else:
-            status = "NO SCHEDULE"
-            comp = "N/A"
-            slip = "N/A"
-            accel = "N/A"
-        return (f"  {name:<22} | {data.get('type','N/A'):<14} | {total} update(s) | "
-                f"Data: {data_date} | {status:<14} | {comp:>6} complete | "
-                f"Slip: {slip} | Accel: {accel}")
-
     if construction:
         lines.append("CONSTRUCTION PROJECTS:")
         for slug, data in construction:
-            lines.append(_project_row(slug, data))
+            lines.append(_project_row(slug, data, _health_map.get(slug)))
         lines.append("")
 
     if development:
         lines.append("DEVELOPMENT PROJECTS:")
         for slug, data in development:
-            lines.append(_project_row(slug, data))
+            lines.append(_project_row(slug, data, _health_map.get(slug)))
         lines.append("")
 
     if other:
         lines.append("OTHER PROJECTS:")
         for slug, data in other:
-            lines.append(_project_row(slug, data))
+            lines.append(_project_row(slug, data, _health_map.get(slug)))
         lines.append("")
 
     # Append a counts summary line for LLM to use directly
@@ -299,10 +437,31 @@ def get_portfolio_summary(schedule_flags: Optional[Dict[str, bool]] = None) -> s
         lines.append(f"  NO SCHEDULE DATA    ({len(no_data)}): {_names(no_data) or 'none'}")
         lines.append("")
 
+    # Milestone movement across the portfolio, straight from the columnar store
+    if store is not None:
+        try:
+            slips = [r for r in store.milestone_slips(min_days=MILESTONE_SLIP_DAYS) if r["slug"] in _tracker_cache]
+        except Exception as e:
+            logger.warning(f"Portfolio milestone slip query failed: {e}")
+            slips = []
+        if slips:
+            lines.append(f"MILESTONES SLIPPED > {MILESTONE_SLIP_DAYS}cd VS PRIOR UPDATE (latest update per project):")
+            for r in slips[:12]:
+                lines.append(f"  {_tracker_cache[r['slug']]['project_name']} — {r['milestone']}: "
+                             f"+{r['slip_days']}cd (now {r['current_finish']}, prior {r['prior_update_finish']}; "
+                             f"data date {r['data_date'] or 'N/A'})")
+            if len(slips) > 12:
+                lines.append(f"  ... and {len(slips) - 12} more")
+            lines.append("")
+
     lines.append(
         "NOTE: Health status is computed from baseline drift variance. "
         "Compression % = average % complete across all non-summary activities. "
         "For full schedule detail, user must select a project from the dropdown."
     )
 
-    return "\n".join(lines)
+    text = "\n".join(lines)
+    _summary_memo.update(key=summary_key, text=text)
+    for slug in [s for s in _row_memo if s not in _tracker_cache]:
+        del _row_memo[slug]
+    return text
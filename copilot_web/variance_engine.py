@@ -490,6 +490,226 @@ def compute_compression(current_tasks: List[Dict], previous_tasks: List[Dict]) -
     }
 
 
+# ---------------------------------------------------------------------------
+# Remaining-work compression histogram (native replacement for the validator PDF)
+# ---------------------------------------------------------------------------
+
+def _infer_data_date(tasks: List[Dict]) -> Optional[date]:
+    """
+    Best-effort data date when the schedule file does not supply one:
+    the latest finish among completed activities, else the earliest start
+    among incomplete ones.
+    """
+    done, todo = [], []
+    for t in tasks:
+        if t.get("summary", False):
+            continue
+        pct = float(t.get("percent_complete") or 0)
+        if pct >= 100:
+            d = _parse_date(t.get("actual_finish") or t.get("finish") or t.get("target_end_date"))
+            if d:
+                done.append(d)
+        else:
+            d = _parse_date(t.get("start") or t.get("target_start_date") or t.get("early_start_date"))
+            if d:
+                todo.append(d)
+    if done:
+        return max(done)
+    return min(todo) if todo else None
+
+
+def compute_remaining_work_histogram(tasks: List[Dict], data_date=None) -> Dict:
+    """
+    Remaining activity-days per calendar month for one snapshot.
+
+    Each incomplete, non-summary activity contributes one activity-day for every
+    calendar day of its remaining window [max(start, data date), finish]. The
+    per-day counts are built with a difference array (one scatter-add for all
+    interval starts and ends, then a cumulative sum) and bucketed into months
+    with a single reduceat, so cost is O(activities + remaining days).
+
+    Returns:
+        {
+          "data_date": date | None,
+          "finish": date | None,               # latest remaining finish
+          "months": [date],                    # first day of each month
+          "activity_days": [int],              # aligned with months
+          "total_activity_days": int,
+          "remaining_span_days": int,          # data date -> finish, calendar days
+          "incomplete_count": int,
+        }
+    """
+    import numpy as np
+
+    dd = _parse_date(data_date) or _infer_data_date(tasks)
+    empty = {"data_date": dd, "finish": None, "months": [], "activity_days": [],
+             "total_activity_days": 0, "remaining_span_days": 0, "incomplete_count": 0}
+    if dd is None:
+        return empty
+
+    starts, ends = [], []
+    for t in tasks:
+        if t.get("summary", False):
+            continue
+        if float(t.get("percent_complete") or 0) >= 100:
+            continue
+        finish = _parse_date(t.get("finish") or t.get("target_end_date") or t.get("early_end_date"))
+        if finish is None or finish < dd:
+            continue
+        start = _parse_date(t.get("start") or t.get("target_start_date") or t.get("early_start_date")) or finish
+        starts.append(max(start, dd).toordinal())
+        ends.append(finish.toordinal())
+
+    if not starts:
+        return empty
+
+    s = np.asarray(starts, dtype=np.int64)
+    e = np.asarray(ends, dtype=np.int64)
+    e = np.maximum(e, s)
+    origin = int(s.min())
+    last = int(e.max())
+
+    # Active activities per calendar day via a difference array
+    diff = np.zeros(last - origin + 2, dtype=np.int64)
+    np.add.at(diff, s - origin, 1)
+    np.add.at(diff, e - origin + 1, -1)
+    per_day = np.cumsum(diff)[:-1]
+
+    # Month boundaries as offsets into per_day
+    first, end_day = date.fromordinal(origin), date.fromordinal(last)
+    months: List[date] = []
+    y, m = first.year, first.month
+    while (y, m) <= (end_day.year, end_day.month):
+        months.append(date(y, m, 1))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    offsets = np.array([max(mo.toordinal() - origin, 0) for mo in months], dtype=np.int64)
+    by_month = np.add.reduceat(per_day, offsets)
+
+    return {
+        "data_date": dd,
+        "finish": end_day,
+        "months": months,
+        "activity_days": [int(v) for v in by_month],
+        "total_activity_days": int(per_day.sum()),
+        "remaining_span_days": (end_day - dd).days,
+        "incomplete_count": len(starts),
+    }
+
+
+def compute_compression_histogram(
+    current_tasks: List[Dict],
+    previous_tasks: List[Dict],
+    current_data_date=None,
+    previous_data_date=None,
+) -> Dict:
+    """
+    Native equivalent of the schedule validator's compression report:
+    a monthly "Activity Days (A) vs (B)" table and a headline
+    Remaining Work Compression %, with A = previous (earlier) snapshot and
+    B = current (later) snapshot.
+
+    Remaining Work Compression % compares calendar days of remaining span per
+    remaining activity-day: (span_B / work_B) / (span_A / work_A) - 1.
+    Negative = the same work is planned into less time (compressed),
+    positive = expanded. Same sign convention as the validator PDF.
+
+    Returns a dict shaped like _extract_compression_pdf() output
+    (compression_pct, earlier/later data dates and finishes as MM/DD/YYYY,
+    monthly [{month, earlier_days, later_days}]) plus "source": "computed".
+    Returns {} when either snapshot has no remaining work.
+    """
+    a = compute_remaining_work_histogram(previous_tasks, previous_data_date)
+    b = compute_remaining_work_histogram(current_tasks, current_data_date)
+    if not a["total_activity_days"] or not b["total_activity_days"]:
+        return {}
+
+    span_a = max(a["remaining_span_days"], 1)
+    span_b = max(b["remaining_span_days"], 1)
+    ratio = (span_b / b["total_activity_days"]) / (span_a / a["total_activity_days"])
+    compression_pct = int(round((ratio - 1) * 100))
+
+    a_by_month = dict(zip(a["months"], a["activity_days"]))
+    b_by_month = dict(zip(b["months"], b["activity_days"]))
+    monthly = [
+        {
+            "month": mo.strftime("%b %y"),
+            "earlier_days": a_by_month.get(mo, 0),
+            "later_days": b_by_month.get(mo, 0),
+        }
+        for mo in sorted(set(a_by_month) | set(b_by_month))
+    ]
+
+    def _us(d):
+        return d.strftime("%m/%d/%Y") if d else None
+
+    return {
+        "source": "computed",
+        "compression_pct": compression_pct,
+        "earlier_data_date": _us(a["data_date"]),
+        "later_data_date": _us(b["data_date"]),
+        "earlier_finish": _us(a["finish"]),
+        "later_finish": _us(b["finish"]),
+        "earlier_activity_days": a["total_activity_days"],
+        "later_activity_days": b["total_activity_days"],
+        "earlier_span_days": a["remaining_span_days"],
+        "later_span_days": b["remaining_span_days"],
+        "monthly": monthly,
+    }
+
+
+def crosscheck_compression(computed: Dict, pdf_data: Optional[Dict]) -> List[str]:
+    """
+    Compare the computed histogram against a validator PDF extraction.
+    Returns human-readable discrepancy notes (empty if they agree or no PDF).
+    """
+    if not computed or not pdf_data:
+        return []
+    notes = []
+    c_pct, p_pct = computed.get("compression_pct"), pdf_data.get("compression_pct")
+    if c_pct is not None and p_pct is not None:
+        delta = c_pct - p_pct
+        agree = "agrees with" if abs(delta) <= 2 else "differs from"
+        notes.append(f"Computed compression {c_pct:+d}% {agree} validator PDF {p_pct:+d}% ({delta:+d} pts).")
+    pdf_months = {r["month"].lower(): r for r in pdf_data.get("monthly", [])}
+    big = []
+    for row in computed.get("monthly", []):
+        pr = pdf_months.get(row["month"].lower())
+        if not pr:
+            continue
+        for side in ("earlier_days", "later_days"):
+            if pr[side] and abs(row[side] - pr[side]) / pr[side] > 0.25:
+                big.append(row["month"])
+                break
+    if big:
+        notes.append(f"Monthly activity-days differ by more than 25% from the PDF in: {', '.join(big[:6])}.")
+    return notes
+
+
+def format_compression_histogram_for_context(data: Dict, pdf_data: Optional[Dict] = None) -> str:
+    """Format compute_compression_histogram() output as an LLM context block."""
+    if not data:
+        return ""
+    pct = data["compression_pct"]
+    direction = "compressed" if pct < 0 else "expanded" if pct > 0 else "unchanged"
+    lines = [
+        "=== REMAINING WORK COMPRESSION (computed from schedule data — monthly activity days) ===",
+        f"Remaining Work Compression: {pct:+d}% ({direction})",
+        f"Compared: {data['earlier_data_date']} (earlier) → {data['later_data_date']} (later)",
+        f"Finish Date: {data['earlier_finish']} → {data['later_finish']}",
+        f"Remaining activity-days: {data['earlier_activity_days']} → {data['later_activity_days']} | "
+        f"Remaining span: {data['earlier_span_days']} → {data['later_span_days']} calendar days",
+        "Monthly Activity Days (Earlier vs Later):",
+    ]
+    for row in data["monthly"]:
+        delta = row["later_days"] - row["earlier_days"]
+        lines.append(f"  {row['month']:8s}  Earlier: {row['earlier_days']:>4}  Later: {row['later_days']:>4}  Δ {delta:+d}")
+    for note in crosscheck_compression(data, pdf_data):
+        lines.append(f"CROSS-CHECK: {note}")
+    if pdf_data:
+        lines.append("NOTE: A verified validator PDF is also present — prefer its compression % where they differ.")
+    return "\n".join(lines)
+
+
 def format_variance_for_context(variance: Dict, max_items_per_phase: int = 5) -> str:
     """
     Formats the variance result into a compact LLM context block.
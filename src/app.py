@@ -4,6 +4,12 @@ import plotly.express as px
 import plotly.graph_objects as go
 import sys
 import os
+import time
+from functools import lru_cache
+import hashlib
+import importlib.util
+import pickle
+import re
 sys.path.insert(0, os.path.dirname(__file__))
 from parser import P6Parser
 from analyzer import ScheduleAnalyzer
@@ -11,13 +17,39 @@ from dashboard import DashboardGenerator
 from copilot import ScheduleCopilot
 from diff_engine import DiffEngine
 from config import config
-import os
-import tempfile
-import time
-from functools import lru_cache
-import hashlib
-import pickle
-import re
+
+
+def _load_copilot_web_module(name):
+    """
+    Import copilot_web/<name>.py by file path. copilot_web/ is never put on
+    sys.path: src/ has modules with the same names (parser, critical_path,
+    variance_engine) and whichever directory came first would win.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "copilot_web", f"{name}.py")
+    spec = importlib.util.spec_from_file_location(name, path)
+    if spec is None:
+        raise ImportError(f"copilot_web/{name}.py not found")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
+
+
+# Deterministic factual-answer engine is shared with the Flask app in copilot_web/.
+# search_index is loaded first so local_answers' own "from search_index import"
+# resolves to copilot_web's copy.
+try:
+    _load_copilot_web_module("search_index")
+    _local_answers = _load_copilot_web_module("local_answers")
+    answer_question, facts_from_parser = _local_answers.answer_question, _local_answers.facts_from_parser
+except (ImportError, OSError):
+    answer_question = None
 
 # Page Config
 st.set_page_config(
@@ -188,19 +220,30 @@ def load_last_uploaded_file():
             pass
     return None
 
-@st.cache_resource(ttl=3600)
+@st.cache_resource(ttl=3600, max_entries=4)
 def load_and_parse_xer(file_bytes, filename):
-    """Cached XER parsing for performance"""
-    tfile = tempfile.NamedTemporaryFile(delete=False, suffix=".xer")
-    tfile.write(file_bytes)
-    tfile.close()
-    
-    parser = P6Parser(tfile.name)
+    """Cached XER parsing for performance.
+    Only schedules the dashboard displays come through here: every tab reads the
+    full analyzer (df_main, critical path, procurement log from relationships),
+    which an ActivitySnapshot can't back. Files parsed just to diff against go
+    through compare_with_previous and are never held here."""
+    parser = P6Parser(file_bytes)  # parsed from memory — no temp file
+    # Identifies this schedule in other caches (compare_with_previous) by content
+    parser.content_digest = hashlib.sha256(file_bytes).hexdigest()
     analyzer = ScheduleAnalyzer(parser)
-    
-    os.unlink(tfile.name)  # Clean up temp file
     return parser, analyzer
 
+@st.cache_data(ttl=3600, max_entries=8, show_spinner=False)
+def compare_with_previous(old_bytes, old_name, current_key, _parser_current):
+    """Cached diff of an uploaded previous version against the current schedule,
+    so Streamlit reruns (tab clicks, widget changes) reuse the result.
+    current_key (the current file's content digest) identifies _parser_current,
+    which is not hashed.
+    The old file is parsed outside load_and_parse_xer: only the diff result is
+    kept, and the old parser is freed as soon as it has been compared."""
+    parser_old = P6Parser(old_bytes)
+    return DiffEngine(parser_old, _parser_current).run_diff()
+
 def main():
     # --- SIDEBAR ---
     with st.sidebar:
@@ -317,19 +360,34 @@ def main():
     # --- AI CHAT CONTAINER (Bottom of page, persistent) ---
     render_bottom_chat()
 
-def render_bottom_chat():
-    """Persistent AI chat container at bottom of page"""
-
-    def get_local_copilot_response(user_text: str, current_view: str) -> str | None:
-        if not user_text:
-            return None
+def get_local_copilot_response(user_text: str, current_view: str) -> str | None:
+    """
+    Answer UI-context and factual schedule questions (dates, counts, float,
+    % complete) without calling the LLM. Returns None when the question needs
+    narrative reasoning or nothing matches confidently.
+    """
+    if not user_text:
+        return None
 
-        t = user_text.strip().lower()
-        # Deterministic UI-context questions (avoid burning tokens + avoid model confusion)
-        if re.search(r"\b(what\s+page|what\s+tab|where\s+am\s+i|which\s+page|which\s+tab)\b", t):
-            return f"You're currently on: {current_view}."
+    t = user_text.strip().lower()
+    # Deterministic UI-context questions (avoid burning tokens + avoid model confusion)
+    if re.search(r"\b(what\s+page|what\s+tab|where\s+am\s+i|which\s+page|which\s+tab)\b", t):
+        return f"You're currently on: {current_view}."
 
+    parser = st.session_state.get('parser')
+    if answer_question is None or parser is None:
         return None
+    # Normalized task facts are built once per loaded schedule, not per question
+    cached = st.session_state.get('local_facts')
+    if not cached or cached[0] is not parser:
+        label = st.session_state.get('uploaded_filename') or "the current schedule"
+        cached = (parser, facts_from_parser(parser, label=label))
+        st.session_state.local_facts = cached
+    return answer_question(user_text, cached[1])
+
+
+def render_bottom_chat():
+    """Persistent AI chat container at bottom of page"""
     
     # Check if schedule is loaded
     has_parser = hasattr(st.session_state, 'parser') and st.session_state.parser is not None
@@ -596,6 +654,7 @@ def render_dashboard(uploaded_file):
         # Store in session state for sidebar access
         st.session_state.parser = parser
         st.session_state.analyzer = analyzer
+        st.session_state.uploaded_filename = uploaded_file.name
         
         dashboard_view = st.radio(
             "Dashboard View",
@@ -1455,22 +1514,25 @@ def render_compare_schedules(parser_current, analyzer_current):
     if comparison_file:
         try:
             with st.spinner("Analyzing changes..."):
-                parser_old, analyzer_old = load_and_parse_xer(comparison_file.getvalue(), comparison_file.name)
-                
-                # Run diff engine
-                diff = DiffEngine(parser_old, parser_current)
-                results = diff.run_diff()
+                # Run diff engine (cached per file pair — reruns don't re-parse or re-diff)
+                # Content digest, not id(): ids are reused once an evicted parser is freed
+                current_key = parser_current.content_digest
+                results = compare_with_previous(comparison_file.getvalue(), comparison_file.name,
+                                                current_key, parser_current)
+                logic_count = len(results['logic_added']) + len(results['logic_removed']) + len(results['logic_changed'])
                 
                 # Summary Metrics
-                col1, col2, col3 = st.columns(3)
+                col1, col2, col3, col4 = st.columns(4)
                 col1.metric("Activities Added", len(results['added']), delta=f"+{len(results['added'])}")
                 col2.metric("Activities Deleted", len(results['deleted']), delta=f"-{len(results['deleted'])}")
                 col3.metric("Activities Slipped", len(results['slips'][results['slips']['slip_days'] > 0]))
+                col4.metric("Logic Changes", logic_count)
                 
                 st.divider()
                 
                 # Detailed Results
-                tab_added, tab_deleted, tab_slips = st.tabs(["➕ Added", "➖ Deleted", "📉 Date Slips"])
+                tab_added, tab_deleted, tab_slips, tab_fields, tab_logic = st.tabs(
+                    ["➕ Added", "➖ Deleted", "📉 Date Slips", "📝 Field Changes", "🔗 Logic Changes"])
                 
                 with tab_added:
                     if not results['added'].empty:
@@ -1526,6 +1588,28 @@ def render_compare_schedules(parser_current, analyzer_current):
                         st.dataframe(styled_slips, use_container_width=True, height=400)
                     else:
                         st.success("✅ No date changes detected - schedule is stable!")
+                
+                with tab_fields:
+                    changes = results['changes']
+                    if not changes.empty:
+                        st.subheader(f"Field Changes ({len(changes)})")
+                        field_filter = st.multiselect("Fields", sorted(changes['field'].unique()),
+                                                      key="compare_field_filter")
+                        if field_filter:
+                            changes = changes[changes['field'].isin(field_filter)]
+                        st.dataframe(changes.astype({'old': str, 'new': str}), use_container_width=True, height=400)
+                    else:
+                        st.info("✅ No field changes on matching activities")
+                
+                with tab_logic:
+                    if logic_count:
+                        for title, key in (("Ties Added", 'logic_added'), ("Ties Removed", 'logic_removed'),
+                                           ("Lag / Type Changes", 'logic_changed')):
+                            if not results[key].empty:
+                                st.subheader(f"{title} ({len(results[key])})")
+                                st.dataframe(results[key], use_container_width=True)
+                    else:
+                        st.info("✅ No relationship changes")
         
         except Exception as e:
             st.error(f"❌ Error comparing schedules: {str(e)}")
@@ -1663,10 +1747,7 @@ def render_sidebar_ai_copilot():
         st.session_state.messages.append({"role": "user", "content": prompt})
         try:
             history = [{"role": m["role"], "content": m["content"]} for m in st.session_state.messages[:-1]]
-            local_response = None
-            t = prompt.strip().lower()
-            if re.search(r"\b(what\s+page|what\s+tab|where\s+am\s+i|which\s+page|which\s+tab)\b", t):
-                local_response = f"You're currently on: {current_view}."
+            local_response = get_local_copilot_response(prompt, current_view)
 
             if local_response is not None:
                 response = local_response
@@ -1753,10 +1834,7 @@ def render_ai_copilot(parser, analyzer):
                 
                 with st.spinner("Thinking..."):
                     current_view = st.session_state.get('current_view', 'AI Copilot')
-                    local_response = None
-                    t = prompt.strip().lower()
-                    if re.search(r"\b(what\s+page|what\s+tab|where\s+am\s+i|which\s+page|which\s+tab)\b", t):
-                        local_response = f"You're currently on: {current_view}."
+                    local_response = get_local_copilot_response(prompt, current_view)
 
                     if local_response is not None:
                         response = local_response
@@ -143,12 +143,39 @@ if "panel_image_payload" not in st.session_state:
     st.session_state.panel_image_payload = None
 
 # --- API client ---
+@st.cache_resource
+def _shared_client(api_key: str, base_url):
+    """One client per key/endpoint for the whole server — keeps HTTPS connections alive."""
+    return openai.OpenAI(api_key=api_key, base_url=base_url)
+
+def _load_llm_pool():
+    """copilot_web/llm_pool.py by file path — copilot_web/ stays off sys.path (src/ has same-named modules)."""
+    if "llm_pool" not in sys.modules:
+        import importlib.util
+        spec = importlib.util.spec_from_file_location(
+            "llm_pool", Path(__file__).parent.parent / "copilot_web" / "llm_pool.py")
+        if spec is None:
+            raise ImportError("copilot_web/llm_pool.py not found")
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        sys.modules["llm_pool"] = module
+    return sys.modules["llm_pool"]
+
 def get_client():
     api_key = config.get("api_key") or os.getenv("OPENAI_API_KEY")
-    base_url = config.get("api_base_url")
+    base_url = config.get("api_base_url") or os.getenv("OPENAI_BASE_URL") or None
     if not api_key:
         return None
-    return openai.OpenAI(api_key=api_key, base_url=base_url)
+    if "panel_client_id" not in st.session_state:
+        import uuid
+        st.session_state.panel_client_id = uuid.uuid4().hex[:12]
+    try:
+        # Same FairLimiter as the Flask copilot (per-session cap + FIFO queue), but
+        # Streamlit is its own process: this pool and its caps cover panel traffic only
+        llm_pool = _load_llm_pool()
+        return llm_pool.get_limited_client(user=st.session_state.panel_client_id, api_key=api_key, base_url=base_url)
+    except (ImportError, OSError):
+        return _shared_client(api_key, base_url)
 
 # --- File upload ---
 with st.expander("📎 Attach file or screenshot", expanded=False):
@@ -1,58 +1,353 @@
+import gzip
+import json
+import os
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Iterator, Optional
 from parser import P6Parser
 
+# Columns kept by ActivitySnapshot — everything DiffEngine and its reports read.
+SNAPSHOT_COLUMNS = [
+    'task_code', 'task_id', 'task_name', 'wbs_id', 'task_type', 'status_code',
+    'complete_pct', 'total_float_hr_cnt',
+    'target_start_date', 'target_end_date', 'early_start_date', 'early_end_date',
+    'act_start_date', 'act_end_date',
+    'target_drtn_hr_cnt', 'remain_drtn_hr_cnt', 'calendar_name', 'cstr_type', 'cstr_date',
+]
+DATE_COLUMNS = [c for c in SNAPSHOT_COLUMNS if c.endswith('_date')]
+SNAPSHOT_FORMAT = 1
+
+# Fields compared for every activity present in both versions -> label in the changes table.
+# delta is days for dates, hours for *_hr_cnt, points for percent; None for calendar/constraint type.
+COMPARE_FIELDS = {
+    'target_start_date': 'start',
+    'target_end_date': 'finish',
+    'target_drtn_hr_cnt': 'original duration',
+    'remain_drtn_hr_cnt': 'remaining duration',
+    'total_float_hr_cnt': 'total float',
+    'complete_pct': 'percent complete',
+    'calendar_name': 'calendar',  # by name: clndr_id is renumbered on every export
+    'cstr_type': 'constraint type',
+    'cstr_date': 'constraint date',
+}
+CHANGE_COLUMNS = ['task_code', 'task_name', 'field', 'old', 'new', 'delta']
+SLIP_COLUMNS = ['task_name', 'old_finish', 'new_finish', 'slip_days']
+LOGIC_COLUMNS = ['pred_code', 'succ_code', 'pred_type', 'lag_hr_cnt']
+LOGIC_CHANGE_COLUMNS = ['pred_code', 'succ_code', 'old_pred_type', 'new_pred_type', 'old_lag_hr_cnt', 'new_lag_hr_cnt']
+
+
+def _cell(value):
+    """JSON-safe scalar: NaN/NaT -> None, timestamps -> ISO text, numpy -> python."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat(sep=' ')
+    if hasattr(value, 'item'):
+        return value.item()
+    return value if isinstance(value, (int, float, str)) else str(value)
+
+
+def read_snapshot_header(path: str) -> Optional[dict]:
+    """First line of a saved snapshot (columns, row count, source, timestamp), or None if unreadable."""
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+    except (OSError, ValueError, EOFError):
+        return None
+    return header if header.get('format') == SNAPSHOT_FORMAT else None
+
+
+def iter_snapshot_rows(path: str) -> Iterator[dict]:
+    """Rows of a saved snapshot one at a time, in task_code order."""
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format in {path}: {header.get('format')}")
+        columns = header['columns']
+        for line in f:
+            yield dict(zip(columns, json.loads(line)))
+
+
+class ActivitySnapshot:
+    """
+    Compact stand-in for a P6Parser when only its activities are needed later
+    (e.g. the monitor's previous-version cache). Keeps SNAPSHOT_COLUMNS only,
+    with text columns stored as pandas categoricals, and drops the xerparser
+    object graph, relationships and cached LLM context.
+    Exposes get_activities() so it can be passed to DiffEngine in place of a
+    parser (the logic diff is then empty — a snapshot has no relationships).
+    """
+
+    def __init__(self, df_activities: pd.DataFrame):
+        self.df_activities = df_activities
+
+    @classmethod
+    def from_parser(cls, parser) -> "ActivitySnapshot":
+        df = parser.get_activities()
+        if df is None:
+            return cls(pd.DataFrame(columns=['task_code']))
+        df = df[[c for c in SNAPSHOT_COLUMNS if c in df.columns]].copy()
+        for col in df.columns:
+            if df[col].dtype == object:
+                df[col] = df[col].astype('category')
+        return cls(df.reset_index(drop=True))
+
+    def get_activities(self) -> pd.DataFrame:
+        return self.df_activities
+
+    def memory_bytes(self) -> int:
+        return int(self.df_activities.memory_usage(deep=True).sum())
+
+    def save(self, path: str, **header) -> None:
+        """
+        Write as gzipped JSON lines: a header line, then one row per activity
+        sorted by task_code (what StreamingDiff relies on). Written to a temp
+        file and renamed so a crash never leaves a truncated snapshot.
+        """
+        df = self.df_activities
+        columns = [c for c in SNAPSHOT_COLUMNS if c in df.columns]
+        keys = df['task_code'].astype(str).tolist() if 'task_code' in df.columns else []
+        values = [[_cell(v) for v in df[c].tolist()] for c in columns]
+        tmp = f"{path}.tmp"
+        with gzip.open(tmp, 'wt', encoding='utf-8') as f:
+            f.write(json.dumps({'format': SNAPSHOT_FORMAT, 'columns': columns, 'rows': len(keys), **header},
+                               default=str) + "\n")
+            for i in sorted(range(len(keys)), key=keys.__getitem__):
+                f.write(json.dumps([col[i] for col in values]) + "\n")
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ActivitySnapshot":
+        header = read_snapshot_header(path) or {}
+        df = pd.DataFrame(list(iter_snapshot_rows(path)), columns=header.get('columns'))
+        for col in df.columns:
+            if col in DATE_COLUMNS:
+                df[col] = pd.to_datetime(df[col])
+            elif df[col].dtype == object:
+                df[col] = df[col].astype('category')
+        return cls(df)
+
+
+def _key_hash(df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """64-bit hash per row of the given columns plus each row's occurrence number
+    among rows sharing those values, so duplicate keys still align one-to-one."""
+    parts = df[columns].copy()
+    for col in columns:
+        if not pd.api.types.is_numeric_dtype(parts[col]):
+            parts[col] = parts[col].astype(str)  # '1001' and 1001 must hash alike
+    parts['_seq'] = parts.groupby(columns, sort=False).cumcount()
+    return pd.util.hash_pandas_object(parts, index=False).to_numpy()
+
+
+def _hash_join(old_keys: np.ndarray, new_keys: np.ndarray):
+    """One hash join on key hashes -> (old positions only, new positions only, matched old/new positions)."""
+    m = pd.merge(pd.DataFrame({'_k': old_keys, '_o': np.arange(len(old_keys))}),
+                 pd.DataFrame({'_k': new_keys, '_n': np.arange(len(new_keys))}),
+                 on='_k', how='outer', indicator=True)
+    deleted = m.loc[m['_merge'] == 'left_only', '_o'].astype(int).to_numpy()
+    added = m.loc[m['_merge'] == 'right_only', '_n'].astype(int).to_numpy()
+    both = m[m['_merge'] == 'both']
+    return deleted, added, both['_o'].astype(int).to_numpy(), both['_n'].astype(int).to_numpy()
+
+
+def _plain(series: pd.Series, col: str) -> pd.Series:
+    if col in DATE_COLUMNS:
+        return pd.to_datetime(series, errors='coerce')
+    if col.endswith(('_cnt', '_pct')):
+        return pd.to_numeric(series, errors='coerce')
+    return series.astype(object).where(series.notna(), None)
+
+
+def compare_aligned(old: pd.DataFrame, new: pd.DataFrame):
+    """
+    Field-by-field comparison of two row-aligned activity frames (row i of old
+    is the same activity as row i of new). Each COMPARE_FIELDS column is
+    compared as a whole array; returns (changes, slips) where changes is one
+    row per changed field and slips keeps the finish-only view used by reports.
+    """
+    old = old.reset_index(drop=True)
+    new = new.reset_index(drop=True)
+    codes = new['task_code'].astype(object)
+    names = new['task_name'].astype(object) if 'task_name' in new.columns else pd.Series(None, index=new.index)
+    frames = []
+    finish_changed = None
+    for col, label in COMPARE_FIELDS.items():
+        if col not in old.columns or col not in new.columns:
+            continue
+        a, b = _plain(old[col], col), _plain(new[col], col)
+        changed = (a != b) & ~(a.isna() & b.isna())
+        if col in DATE_COLUMNS:
+            delta = (b - a).dt.days
+        elif col.endswith(('_cnt', '_pct')):
+            delta = b - a
+        else:
+            delta = pd.Series(None, index=a.index, dtype=object)
+        if col == 'target_end_date':
+            finish_changed = changed
+        if changed.any():
+            frames.append(pd.DataFrame({
+                'task_code': codes[changed], 'task_name': names[changed], 'field': label,
+                'old': a[changed].astype(object), 'new': b[changed].astype(object), 'delta': delta[changed],
+            }))
+    changes = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=CHANGE_COLUMNS)
+
+    if finish_changed is None:
+        return changes, pd.DataFrame(columns=SLIP_COLUMNS)
+    old_finish = pd.to_datetime(old['target_end_date'], errors='coerce')
+    new_finish = pd.to_datetime(new['target_end_date'], errors='coerce')
+    df_slips = pd.DataFrame({
+        'task_name': names,
+        'old_finish': old_finish,
+        'new_finish': new_finish,
+        'slip_days': (new_finish - old_finish).dt.days
+    })[finish_changed]
+    df_slips.index = pd.Index(codes[finish_changed], name='task_code')
+    return changes, df_slips.sort_values(by='slip_days', ascending=False)
+
+
 class DiffEngine:
     """
-    Compares two schedule snapshots (P6Parser objects) to detect changes.
-    Tracks:
+    Compares two schedule snapshots (P6Parser objects, or ActivitySnapshots)
+    to detect changes. Activities are aligned by a hashed composite key
+    (task_code plus occurrence number, so duplicate codes stay one-to-one) in
+    a single hash join, and every COMPARE_FIELDS column is diffed as a whole
+    array — linear in the number of activities. Tracks:
     - Activity Added/Deleted
-    - Date Slips (Start/Finish variance)
-    - Critical Path entry/exit
+    - Field changes (start, finish, durations, float, % complete, calendar, constraint)
+    - Date Slips (finish variance)
+    - Logic changes (relationship ties added/removed, lag and type changes)
     """
     
-    def __init__(self, parser_old: P6Parser, parser_new: P6Parser):
-        self.old = parser_old.get_activities().set_index('task_code')
-        self.new = parser_new.get_activities().set_index('task_code')
+    def __init__(self, parser_old: P6Parser, parser_new: P6Parser, key: tuple = ('task_code',)):
+        self.key = list(key)
+        self.old = parser_old.get_activities().reset_index(drop=True)
+        self.new = parser_new.get_activities().reset_index(drop=True)
+        self.old_links = getattr(parser_old, 'df_relationships', None)
+        self.new_links = getattr(parser_new, 'df_relationships', None)
         
     def run_diff(self) -> Dict[str, pd.DataFrame]:
         """Execute all comparisons and return categorized DataFrames."""
         
-        # 1. Identify Added/Deleted/Common
-        old_ids = set(self.old.index)
-        new_ids = set(self.new.index)
-        
-        added_ids = list(new_ids - old_ids)
-        deleted_ids = list(old_ids - new_ids)
-        common_ids = list(old_ids & new_ids)
-        
-        df_added = self.new.loc[added_ids].copy()
-        df_deleted = self.old.loc[deleted_ids].copy()
+        # 1. Align activities: one hash join on the composite key
+        deleted, added, old_pos, new_pos = _hash_join(_key_hash(self.old, self.key), _key_hash(self.new, self.key))
+        df_added = self.new.iloc[added].set_index('task_code')
+        df_deleted = self.old.iloc[deleted].set_index('task_code')
         
-        # 2. Check for Date Slips (in Common tasks)
-        df_common_old = self.old.loc[common_ids].sort_index()
-        df_common_new = self.new.loc[common_ids].sort_index()
+        # 2. Field changes and finish slips on the matched activities
+        df_changes, df_slips = compare_aligned(self.old.iloc[old_pos], self.new.iloc[new_pos])
         
-        # Ensure dates are datetime
-        df_common_old['target_end_date'] = pd.to_datetime(df_common_old['target_end_date'])
-        df_common_new['target_end_date'] = pd.to_datetime(df_common_new['target_end_date'])
-        
-        # Variance = New Finish - Old Finish
-        finish_variance = (df_common_new['target_end_date'] - df_common_old['target_end_date']).dt.days
-        
-        # Create Diff Report
-        df_diff = pd.DataFrame({
-            'task_name': df_common_new['task_name'],
-            'old_finish': df_common_old['target_end_date'],
-            'new_finish': df_common_new['target_end_date'],
-            'slip_days': finish_variance
+        return {
+            "added": df_added,
+            "deleted": df_deleted,
+            "slips": df_slips,
+            "changes": df_changes,
+            **self._diff_logic()
+        }
+
+    def _edges(self, acts: pd.DataFrame, links) -> pd.DataFrame:
+        """Relationships with both ends mapped from task_id to the activity's composite key."""
+        if links is None or links.empty or acts.empty or 'task_id' not in acts.columns:
+            return pd.DataFrame(columns=LOGIC_COLUMNS + ['pred_key', 'succ_key'])
+        ids = acts['task_id'].astype(str)
+        code = pd.Series(acts['task_code'].astype(object).to_numpy(), index=ids)
+        key = pd.Series(_key_hash(acts, self.key), index=ids)
+        code, key = code[~code.index.duplicated()], key[~key.index.duplicated()]
+        pred, succ = links['pred_task_id'].astype(str), links['task_id'].astype(str)
+        edges = pd.DataFrame({
+            'pred_code': pred.map(code), 'succ_code': succ.map(code),
+            'pred_type': links['pred_type'].astype(object), 'lag_hr_cnt': pd.to_numeric(links['lag_hr_cnt'], errors='coerce'),
+            'pred_key': pred.map(key), 'succ_key': succ.map(key),
         })
-        
-        # Filter only items that moved
-        df_slips = df_diff[df_diff['slip_days'] != 0].sort_values(by='slip_days', ascending=False)
-        
+        # Ties to activities outside this schedule (other projects) can't be compared
+        return edges.dropna(subset=['pred_key', 'succ_key']).sort_values('pred_type', kind='stable').reset_index(drop=True)
+
+    def _diff_logic(self) -> Dict[str, pd.DataFrame]:
+        if self.old_links is None or self.new_links is None:
+            # An ActivitySnapshot on either side: no relationships to compare
+            return {"logic_added": pd.DataFrame(columns=LOGIC_COLUMNS),
+                    "logic_removed": pd.DataFrame(columns=LOGIC_COLUMNS),
+                    "logic_changed": pd.DataFrame(columns=LOGIC_CHANGE_COLUMNS)}
+        old = self._edges(self.old, self.old_links)
+        new = self._edges(self.new, self.new_links)
+        removed, added, old_pos, new_pos = _hash_join(_key_hash(old, ['pred_key', 'succ_key']),
+                                                      _key_hash(new, ['pred_key', 'succ_key']))
+        o, n = old.iloc[old_pos].reset_index(drop=True), new.iloc[new_pos].reset_index(drop=True)
+        changed = (o['pred_type'] != n['pred_type']) | ((o['lag_hr_cnt'] != n['lag_hr_cnt'])
+                                                        & ~(o['lag_hr_cnt'].isna() & n['lag_hr_cnt'].isna()))
+        df_changed = pd.DataFrame({
+            'pred_code': n['pred_code'], 'succ_code': n['succ_code'],
+            'old_pred_type': o['pred_type'], 'new_pred_type': n['pred_type'],
+            'old_lag_hr_cnt': o['lag_hr_cnt'], 'new_lag_hr_cnt': n['lag_hr_cnt'],
+        })[changed].reset_index(drop=True)
+        return {
+            "logic_added": new.iloc[added][LOGIC_COLUMNS].reset_index(drop=True),
+            "logic_removed": old.iloc[removed][LOGIC_COLUMNS].reset_index(drop=True),
+            "logic_changed": df_changed,
+        }
+
+
+class StreamingDiff:
+    """
+    DiffEngine against a snapshot saved with ActivitySnapshot.save(): the old
+    version is read row by row from disk and merge-joined with the new
+    schedule on (task_code, occurrence), so it is never held in memory as a
+    whole — only rows whose compared fields differ are kept. Returns the same
+    frames as DiffEngine.run_diff(); the logic diff is empty (snapshots carry
+    no relationships).
+    """
+
+    def __init__(self, snapshot_path: str, parser_new: P6Parser):
+        self.snapshot_path = snapshot_path
+        new = parser_new.get_activities().copy()
+        new['_key'] = new['task_code'].astype(str)
+        new = new.sort_values('_key', kind='stable').reset_index(drop=True)
+        new['_seq'] = new.groupby('_key', sort=False).cumcount()
+        self.new = new
+
+    def run_diff(self) -> Dict[str, pd.DataFrame]:
+        new_keys = list(zip(self.new['_key'].tolist(), self.new['_seq'].tolist()))
+        # Snapshots saved before a field was added to SNAPSHOT_COLUMNS don't compare it
+        saved = (read_snapshot_header(self.snapshot_path) or {}).get('columns', SNAPSHOT_COLUMNS)
+        fields = [c for c in COMPARE_FIELDS if c in self.new.columns and c in saved]
+        new_cells = {c: [_cell(v) for v in _plain(self.new[c], c).tolist()] for c in fields}
+        added, deleted, moved, old_rows = [], [], [], []  # new positions / old rows / matched pairs that differ
+
+        i, prev, seq = 0, None, 0
+        for row in iter_snapshot_rows(self.snapshot_path):
+            code = str(row['task_code'])
+            seq = seq + 1 if code == prev else 0
+            prev, key = code, (code, seq)
+            while i < len(new_keys) and new_keys[i] < key:
+                added.append(i)
+                i += 1
+            if i < len(new_keys) and new_keys[i] == key:
+                if any(row.get(c) != new_cells[c][i] for c in fields):
+                    moved.append(i)
+                    old_rows.append(row)
+                i += 1
+            else:
+                deleted.append(row)
+        added.extend(range(i, len(new_keys)))
+
+        new = self.new.drop(columns=['_key', '_seq'])
+        df_added = new.iloc[added].set_index('task_code')
+        df_deleted = self._frame(deleted, saved).set_index('task_code')
+        df_changes, df_slips = compare_aligned(self._frame(old_rows, saved), new.iloc[moved])
+
         return {
             "added": df_added,
             "deleted": df_deleted,
-            "slips": df_slips
+            "slips": df_slips,
+            "changes": df_changes,
+            "logic_added": pd.DataFrame(columns=LOGIC_COLUMNS),
+            "logic_removed": pd.DataFrame(columns=LOGIC_COLUMNS),
+            "logic_changed": pd.DataFrame(columns=LOGIC_CHANGE_COLUMNS),
         }
+
+    @staticmethod
+    def _frame(rows: List[dict], columns: List[str]) -> pd.DataFrame:
+        df = pd.DataFrame(rows, columns=columns)
+        for col in DATE_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col])
+        return df
@@ -1,13 +1,17 @@
 import time
 import os
 import logging
+import queue
+import shutil
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from parser import P6Parser
 from analyzer import ScheduleAnalyzer
 from dashboard import DashboardGenerator
-from diff_engine import DiffEngine
+from diff_engine import DiffEngine, StreamingDiff, ActivitySnapshot, read_snapshot_header
 from datetime import datetime
 import json
 
@@ -31,8 +35,33 @@ class XERFileHandler(FileSystemEventHandler):
         self.config_path = config_path
         self.config = self._load_config()
         
-        self.last_processed = {}  # Track last processing time to avoid duplicates
-        self.previous_schedules = {}  # Store previous versions for comparison
+        self.last_processed = {}  # Track last processing time per file
+        
+        # Previous versions for comparison. Every processed file's compact
+        # ActivitySnapshot is persisted to snapshot_dir, so comparisons resume
+        # after a restart; only the max_cached_snapshots most recently used are
+        # also kept in memory (LRU) — older ones are diffed straight from disk.
+        self.snapshot_dir = Path(self.config['snapshot_dir'] or self.output_dir / "snapshots")
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        self.previous_schedules = OrderedDict()  # {base_name: {'snapshot', 'timestamp'}}
+        self.snapshot_index = self._load_snapshot_index()  # {base_name: {'path', 'timestamp', 'rows'}}
+        
+        # Event pipeline: observer thread -> per-path debounce -> bounded queue -> worker pool.
+        # Work for one base_name never runs concurrently; a newer file for a busy
+        # base_name waits in _parked and replaces any older one still waiting.
+        self._cond = threading.Condition()
+        self._pending = {}   # {path: {"first", "last", "stat", "events"}} — waiting for the file to settle
+        self._queue = queue.Queue(maxsize=self.config['max_queue_size'])
+        self._active = set()  # base_names being processed
+        self._parked = {}     # {base_name: (path, enqueued_at)} — ready, but that base_name is busy
+        self._processed_stat = {}  # {path: (size, mtime_ns)} of the content last handed to _process_xer_file
+        self._threads = []
+        self._stop = threading.Event()
+        self._metrics = {
+            "events": 0, "coalesced": 0, "enqueued": 0, "processed": 0, "failed": 0, "skipped_unchanged": 0,
+            "superseded": 0, "deferred_queue_full": 0, "max_queue_depth": 0,
+            "wait_seconds": 0.0, "process_seconds": 0.0,
+        }
         
         logger.info(f"Monitoring directory: {self.watch_dir}")
         logger.info(f"Output directory: {self.output_dir}")
@@ -42,7 +71,12 @@ class XERFileHandler(FileSystemEventHandler):
         default_config = {
             "auto_generate_excel": True,
             "auto_compare": True,
-            "min_processing_interval": 60,  # seconds
+            "debounce_seconds": 2,  # quiet time + unchanged size before a file is parsed
+            "max_debounce_seconds": 300,  # parse anyway if a file keeps changing this long
+            "worker_count": 2,
+            "max_queue_size": 32,
+            "snapshot_dir": None,  # default: <output_dir>/snapshots
+            "max_cached_snapshots": 8,
             "notification_email": None,
             "archive_previous_versions": True
         }
@@ -60,20 +94,205 @@ class XERFileHandler(FileSystemEventHandler):
         """Handle new file creation"""
         if not event.is_directory and event.src_path.endswith('.xer'):
             logger.info(f"New XER file detected: {event.src_path}")
-            self._process_xer_file(event.src_path)
+            self._schedule(event.src_path)
     
     def on_modified(self, event):
         """Handle file modification"""
         if not event.is_directory and event.src_path.endswith('.xer'):
-            # Check if enough time has passed since last processing
-            current_time = time.time()
-            last_time = self.last_processed.get(event.src_path, 0)
-            
-            if current_time - last_time > self.config['min_processing_interval']:
-                logger.info(f"XER file modified: {event.src_path}")
-                self._process_xer_file(event.src_path)
+            logger.debug(f"XER file modified: {event.src_path}")
+            self._schedule(event.src_path)
+    
+    def on_moved(self, event):
+        """Handle files renamed into place (e.g. download.tmp -> schedule.xer)"""
+        if not event.is_directory and event.dest_path.endswith('.xer'):
+            logger.info(f"XER file moved in: {event.dest_path}")
+            self._schedule(event.dest_path)
+    
+    # --- Snapshots ---
+    
+    def _snapshot_path(self, base_name):
+        return self.snapshot_dir / f"{base_name}.snapshot.jsonl.gz"
+    
+    def _load_snapshot_index(self):
+        """Headers of the snapshots already on disk — no activity rows are loaded"""
+        index = {}
+        for path in sorted(self.snapshot_dir.glob("*.snapshot.jsonl.gz")):
+            header = read_snapshot_header(str(path))
+            if header is None:
+                logger.warning(f"Ignoring unreadable snapshot: {path}")
+                continue
+            base_name = path.name[:-len(".snapshot.jsonl.gz")]
+            index[base_name] = {'path': path, 'timestamp': header.get('timestamp'), 'rows': header.get('rows')}
+        if index:
+            logger.info(f"Resuming change detection for {len(index)} file(s) from {self.snapshot_dir}")
+        return index
+    
+    def _previous_diff(self, base_name, parser):
+        """DiffEngine over the cached snapshot, else StreamingDiff over the persisted one, else None"""
+        with self._cond:
+            cached = self.previous_schedules.get(base_name)
+            if cached is not None:
+                self.previous_schedules.move_to_end(base_name)
+            entry = self.snapshot_index.get(base_name)
+        if cached is not None:
+            return DiffEngine(cached['snapshot'], parser)
+        if entry is not None:
+            return StreamingDiff(str(entry['path']), parser)
+        return None
+    
+    def _store_snapshot(self, base_name, parser, file_path, timestamp):
+        """Persist the new version's snapshot (archiving the old one) and cache it in memory"""
+        snapshot = ActivitySnapshot.from_parser(parser)
+        path = self._snapshot_path(base_name)
+        previous = self.snapshot_index.get(base_name)
+        if previous is not None and self.config['archive_previous_versions'] and path.exists():
+            archive_dir = self.output_dir / "archive"
+            archive_dir.mkdir(exist_ok=True)
+            shutil.copy2(path, archive_dir / f"{base_name}_{previous['timestamp']}.snapshot.jsonl.gz")
+        snapshot.save(str(path), source=str(file_path), timestamp=timestamp)
+        with self._cond:
+            self.snapshot_index[base_name] = {'path': path, 'timestamp': timestamp,
+                                              'rows': len(snapshot.get_activities())}
+            self.previous_schedules[base_name] = {'snapshot': snapshot, 'timestamp': timestamp}
+            self.previous_schedules.move_to_end(base_name)
+            while len(self.previous_schedules) > max(0, int(self.config['max_cached_snapshots'])):
+                self.previous_schedules.popitem(last=False)
+    
+    # --- Pipeline ---
+    
+    def start(self):
+        """Start the debounce thread and the worker pool"""
+        self._spawn(self._debounce_loop, "xer-debounce")
+        for i in range(max(1, int(self.config['worker_count']))):
+            self._spawn(self._worker_loop, f"xer-worker-{i}")
+    
+    def stop(self):
+        """Stop the pipeline; files still debouncing or queued are dropped"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+        for t in self._threads:
+            t.join(timeout=5)
+    
+    def _spawn(self, target, name):
+        t = threading.Thread(target=target, name=name, daemon=True)
+        t.start()
+        self._threads.append(t)
+    
+    def _schedule(self, file_path):
+        """Called on the observer thread — only records the event and returns"""
+        now = time.monotonic()
+        with self._cond:
+            self._metrics['events'] += 1
+            entry = self._pending.get(file_path)
+            if entry is None:
+                self._pending[file_path] = {"first": now, "last": now, "stat": None, "events": 1}
             else:
-                logger.debug(f"Skipping {event.src_path} - processed recently")
+                entry['last'] = now
+                entry['events'] += 1
+                self._metrics['coalesced'] += 1
+            self._cond.notify()
+    
+    def _debounce_loop(self):
+        """Move files that have been quiet and size-stable for debounce_seconds onto the work queue"""
+        debounce = float(self.config['debounce_seconds'])
+        max_wait = float(self.config['max_debounce_seconds'])
+        while not self._stop.is_set():
+            with self._cond:
+                now = time.monotonic()
+                due = [p for p, e in self._pending.items() if now - e['last'] >= debounce]
+                if not due:
+                    waits = [e['last'] + debounce - now for e in self._pending.values()]
+                    self._cond.wait(timeout=max(min(waits, default=debounce), 0.05))
+                    continue
+            for path in due:
+                try:
+                    st = os.stat(path)
+                    stat = (st.st_size, st.st_mtime_ns)
+                except OSError:
+                    stat = None  # deleted or renamed away before it settled
+                with self._cond:
+                    entry = self._pending.get(path)
+                    if entry is None:
+                        continue
+                    if stat is None:
+                        del self._pending[path]
+                        continue
+                    settled = stat == entry['stat'] and stat[0] > 0
+                    if not settled and time.monotonic() - entry['first'] < max_wait:
+                        # Still being written (or first look) — check again after another quiet period
+                        entry['stat'] = stat
+                        entry['last'] = time.monotonic()
+                        continue
+                    del self._pending[path]
+                self._dispatch(path, entry)
+    
+    def _dispatch(self, path, entry):
+        """Queue a settled file, or park it behind a running job for the same base_name"""
+        base_name = Path(path).stem
+        with self._cond:
+            if base_name in self._active or base_name in self._parked:
+                if base_name in self._parked:
+                    self._metrics['superseded'] += 1
+                self._parked[base_name] = (path, time.monotonic())
+                return True
+            self._active.add(base_name)
+        return self._enqueue(path, base_name, time.monotonic(), entry)
+    
+    def _enqueue(self, path, base_name, enqueued_at, entry=None):
+        """Bounded put; when the workers are saturated the file goes back to debounce instead of blocking"""
+        try:
+            self._queue.put_nowait((path, base_name, enqueued_at))
+        except queue.Full:
+            with self._cond:
+                self._active.discard(base_name)
+                self._metrics['deferred_queue_full'] += 1
+                now = time.monotonic()
+                first = entry['first'] if entry else now
+                self._pending.setdefault(path, {"first": first, "last": now, "stat": None, "events": 1})
+                self._cond.notify()
+            logger.warning(f"Work queue full ({self._queue.maxsize}) — deferring {Path(path).name}")
+            return False
+        with self._cond:
+            self._metrics['enqueued'] += 1
+            self._metrics['max_queue_depth'] = max(self._metrics['max_queue_depth'], self._queue.qsize())
+        return True
+    
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            item = self._queue.get()
+            if item is None:
+                return
+            path, base_name, enqueued_at = item
+            try:
+                st = os.stat(path)
+                stat = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                stat = None
+            started = time.monotonic()
+            if stat is not None and self._processed_stat.get(path) == stat:
+                # A late event for content an earlier job already parsed
+                outcome = 'skipped_unchanged'
+            else:
+                outcome = 'processed' if self._process_xer_file(path) else 'failed'
+                self._processed_stat[path] = stat
+            finished = time.monotonic()
+            with self._cond:
+                self._metrics[outcome] += 1
+                if outcome != 'skipped_unchanged':
+                    self._metrics['wait_seconds'] += started - enqueued_at
+                    self._metrics['process_seconds'] += finished - started
+                parked = self._parked.pop(base_name, None)
+                if parked is None:
+                    self._active.discard(base_name)
+            if parked is not None:
+                # base_name stays active: hand the newer file straight to the queue
+                self._enqueue(parked[0], base_name, parked[1])
     
     def _process_xer_file(self, file_path):
         """Main processing logic"""
@@ -100,12 +319,11 @@ class XERFileHandler(FileSystemEventHandler):
                 
                 logger.info(f"✅ Excel generated: {excel_path}")
             
-            # Compare with previous version
-            if self.config['auto_compare'] and base_name in self.previous_schedules:
-                logger.info("Running change detection...")
+            # Compare with previous version (in-memory snapshot, or streamed from disk)
+            diff = self._previous_diff(base_name, parser) if self.config['auto_compare'] else None
+            if diff is not None:
+                logger.info(f"Running change detection ({type(diff).__name__})...")
                 
-                parser_old = self.previous_schedules[base_name]['parser']
-                diff = DiffEngine(parser_old, parser)
                 results = diff.run_diff()
                 
                 # Generate change report
@@ -116,7 +334,8 @@ class XERFileHandler(FileSystemEventHandler):
                     "added_count": len(results['added']),
                     "deleted_count": len(results['deleted']),
                     "slipped_count": len(results['slips'][results['slips']['slip_days'] > 0]),
-                    "top_slips": results['slips'].head(10).to_dict('records') if not results['slips'].empty else []
+                    "top_slips": results['slips'].head(10).to_dict('records') if not results['slips'].empty else [],
+                    "changes_by_field": results['changes']['field'].value_counts().to_dict()
                 }
                 
                 with open(report_path, 'w') as f:
@@ -126,36 +345,56 @@ class XERFileHandler(FileSystemEventHandler):
                 logger.info(f"   Added: {change_report['added_count']}, "
                           f"Deleted: {change_report['deleted_count']}, "
                           f"Slipped: {change_report['slipped_count']}")
-                
-                # Archive previous version if configured
-                if self.config['archive_previous_versions']:
-                    archive_dir = self.output_dir / "archive"
-                    archive_dir.mkdir(exist_ok=True)
-                    # Previous parser is already stored, no need to copy file
             
-            # Store current version for future comparisons
-            self.previous_schedules[base_name] = {
-                'parser': parser,
-                'analyzer': analyzer,
-                'timestamp': timestamp
-            }
+            # Store current version for future comparisons — only the activity
+            # columns DiffEngine needs, so the parser/analyzer can be released.
+            # The previous snapshot is copied to archive/ first if configured.
+            self._store_snapshot(base_name, parser, file_path, timestamp)
             
             logger.info(f"✅ Processing complete: {file_path}")
+            return True
             
         except Exception as e:
             logger.error(f"❌ Error processing {file_path}: {str(e)}", exc_info=True)
+            return False
     
     def get_status_report(self):
-        """Generate a status report of monitored files"""
+        """Generate a status report of monitored files and pipeline backpressure"""
+        with self._cond:
+            tracked = sorted(self.snapshot_index)
+            cached = list(self.previous_schedules.keys())
+            m = dict(self._metrics)
+            pipeline = {
+                "workers": sum(1 for t in self._threads if t.name.startswith("xer-worker") and t.is_alive()),
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "max_queue_depth": m['max_queue_depth'],
+                "debouncing": len(self._pending),
+                "in_flight": len(self._active),
+                "parked_behind_same_base": len(self._parked),
+                "events": m['events'],
+                "coalesced_events": m['coalesced'],
+                "superseded": m['superseded'],
+                "deferred_queue_full": m['deferred_queue_full'],
+                "enqueued": m['enqueued'],
+                "processed": m['processed'],
+                "failed": m['failed'],
+                "skipped_unchanged": m['skipped_unchanged'],
+                "avg_queue_wait_seconds": round(m['wait_seconds'] / max(m['processed'] + m['failed'], 1), 3),
+                "avg_process_seconds": round(m['process_seconds'] / max(m['processed'] + m['failed'], 1), 3),
+            }
         report = {
             "watch_directory": str(self.watch_dir),
             "output_directory": str(self.output_dir),
-            "files_tracked": len(self.previous_schedules),
-            "tracked_files": list(self.previous_schedules.keys()),
+            "files_tracked": len(tracked),
+            "tracked_files": tracked,
+            "snapshot_directory": str(self.snapshot_dir),
+            "snapshots_in_memory": cached,
             "last_processed": {
                 Path(k).name: datetime.fromtimestamp(v).isoformat()
-                for k, v in self.last_processed.items()
-            }
+                for k, v in list(self.last_processed.items())
+            },
+            "pipeline": pipeline
         }
         return report
 
@@ -178,6 +417,7 @@ class ScheduleMonitor:
         
         # Create handler
         self.handler = XERFileHandler(self.watch_dir, self.output_dir, self.config_path)
+        self.handler.start()
         
         # Create observer
         self.observer = Observer()
@@ -192,7 +432,10 @@ class ScheduleMonitor:
                 # Periodic status log
                 if hasattr(self.handler, 'get_status_report'):
                     status = self.handler.get_status_report()
-                    logger.debug(f"Status: Tracking {status['files_tracked']} files")
+                    pipe = status['pipeline']
+                    logger.debug(f"Status: Tracking {status['files_tracked']} files, "
+                                 f"queue {pipe['queue_depth']}/{pipe['queue_capacity']}, "
+                                 f"{pipe['debouncing']} settling, {pipe['in_flight']} in flight")
         
         except KeyboardInterrupt:
             logger.info("Stopping monitor...")
@@ -203,6 +446,8 @@ class ScheduleMonitor:
         if self.observer:
             self.observer.stop()
             self.observer.join()
+        if self.handler:
+            self.handler.stop()
         logger.info("✅ Monitor stopped.")
     
     def status(self):
@@ -216,7 +461,12 @@ def create_default_config(config_path="monitor_config.json"):
     default_config = {
         "auto_generate_excel": True,
         "auto_compare": True,
-        "min_processing_interval": 60,
+        "debounce_seconds": 2,
+        "max_debounce_seconds": 300,
+        "worker_count": 2,
+        "max_queue_size": 32,
+        "snapshot_dir": None,
+        "max_cached_snapshots": 8,
         "notification_email": None,
         "archive_previous_versions": True,
         "watch_directory": "./watch",
@@ -1,6 +1,6 @@
 import pandas as pd
 from xerparser import Xer
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union, BinaryIO
 import logging
 import io
 from datetime import datetime
@@ -9,14 +9,23 @@ from datetime import datetime
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def _iso_date(value) -> Optional[str]:
+    """YYYY-MM-DD for a date/timestamp cell, None for empty or NaT."""
+    if value is None or pd.isna(value):
+        return None
+    return str(value)[:10]
+
+
 class P6Parser:
     """
     Robust wrapper around xerparser (0.9.4) to extract and normalize P6 schedule data.
     Designed to feed both the Excel Dashboard engine and the AI Copilot.
     """
     
-    def __init__(self, xer_path: str):
-        self.xer_path = xer_path
+    def __init__(self, xer_path: Union[str, BinaryIO, bytes]):
+        # A path, an open binary file (e.g. crypto.open_decrypted) or raw bytes
+        self.xer_path = io.BytesIO(xer_path) if isinstance(xer_path, (bytes, bytearray)) else xer_path
         self.reader = None
         self.df_activities = None
         self.df_relationships = None
@@ -29,20 +38,22 @@ class P6Parser:
 
     def _load_data(self):
         """Parse XER and load tables into Pandas DataFrames with type enforcement."""
-        logger.info(f"Parsing XER file: {self.xer_path}")
+        logger.info(f"Parsing XER file: {self.xer_path if isinstance(self.xer_path, str) else '<stream>'}")
         
         try:
             # Xer expects file content as string, not file path
+            if isinstance(self.xer_path, str):
+                with open(self.xer_path, 'rb') as f:
+                    raw = f.read()
+            else:
+                raw = self.xer_path.read()
             # Attempt to read with standard encoding
             try:
-                with open(self.xer_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                self.reader = Xer(content)
+                content = raw.decode('utf-8')
             except UnicodeDecodeError:
                 logger.warning("UTF-8 parsing failed. Retrying with 'cp1252' (Windows)...")
-                with open(self.xer_path, 'r', encoding='cp1252', errors='replace') as f:
-                    content = f.read()
-                self.reader = Xer(content)
+                content = raw.decode('cp1252', errors='replace')
+            self.reader = Xer(content)
 
             # parsing is done by Xer init
             parser = self.reader
@@ -76,8 +87,12 @@ class P6Parser:
                         'target_drtn_hr_cnt': getattr(task, 'target_drtn_hr_cnt', 0),
                         'remain_drtn_hr_cnt': getattr(task, 'remain_drtn_hr_cnt', 0),
                         'complete_pct': getattr(task, 'phys_complete_pct', 0),
-                        'task_type': getattr(task, 'task_type', '').name if hasattr(getattr(task, 'task_type', ''), 'name') else str(getattr(task, 'task_type', '')),
+                        # xerparser exposes the activity type as .type (TaskType enum, e.g. TT_FinMile)
+                        'task_type': getattr(task, 'type', '').name if hasattr(getattr(task, 'type', ''), 'name') else str(getattr(task, 'type', '') or getattr(task, 'task_type', '') or ''),
                         'wbs_id': getattr(task, 'wbs_id', None),
+                        'calendar_name': getattr(getattr(task, 'calendar', None), 'name', None),
+                        'cstr_type': getattr(task, 'cstr_type', None).name if hasattr(getattr(task, 'cstr_type', None), 'name') else getattr(task, 'cstr_type', None),
+                        'cstr_date': getattr(task, 'cstr_date', None),
                     }
                     tasks.append(task_dict)
                 
@@ -103,7 +118,7 @@ class P6Parser:
                 for rel_id, rel in parser.relationships.items():
                     pred_dict = {
                         'pred_id': rel_id,
-                        'pred_task_id': getattr(rel, 'predecessor_task_id', None),
+                        'pred_task_id': getattr(rel, 'pred_task_id', None) or getattr(rel, 'predecessor_task_id', None),
                         'task_id': getattr(rel, 'task_id', None),
                         'pred_type': getattr(rel, 'pred_type', '').name if hasattr(getattr(rel, 'pred_type', ''), 'name') else str(getattr(rel, 'pred_type', '')),
                         'lag_hr_cnt': getattr(rel, 'lag_hr_cnt', 0),
@@ -154,7 +169,7 @@ class P6Parser:
         """Clean up date formats and handle nulls."""
         if self.df_activities.empty: return
 
-        date_cols = ['target_start_date', 'target_end_date', 'act_start_date', 'act_end_date', 'early_start_date', 'early_end_date']
+        date_cols = ['target_start_date', 'target_end_date', 'act_start_date', 'act_end_date', 'early_start_date', 'early_end_date', 'cstr_date']
         
         for col in date_cols:
             if col in self.df_activities.columns:
@@ -196,7 +211,7 @@ class P6Parser:
         """Normalize a df_activities row to a standard task dict for CP engine."""
         task_type_raw = str(row.get("task_type", "") or "").strip()
         task_type_lo = task_type_raw.lower()
-        is_milestone = task_type_lo in ("tt_mile", "milestone", "tt_finishmile")
+        is_milestone = task_type_lo in ("tt_mile", "milestone", "tt_finmile", "tt_finishmile")
         is_summary   = task_type_lo in ("tt_wbs", "wbs_summary", "tt_rsrc")
         float_hrs = float(row.get("total_float_hr_cnt", 1) or 1)
         return {
@@ -204,7 +219,11 @@ class P6Parser:
             "name": str(row.get("task_name", "") or ""),
             "milestone": is_milestone,
             "summary": is_summary,
-            "percent_complete": float(row.get("complete_pct", 0) or 0),
+            # xerparser gives phys_complete_pct as a 0-1 fraction; task dicts use 0-100 like MPP
+            "percent_complete": round(float(row.get("complete_pct", 0) or 0) * 100, 1),
+            "status": str(row.get("status_code", "") or ""),
+            "actual_start": _iso_date(row.get("act_start_date")),
+            "actual_finish": _iso_date(row.get("act_end_date")),
             "critical": float_hrs <= 0,
             "near_critical": 0 < float_hrs <= 80,  # 80h = 10 working days
             "total_float_hrs": float_hrs,